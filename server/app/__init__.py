@@ -5,9 +5,24 @@ from .config import Config
 from .extensions import db, migrate, mqtt, cors
 from . import models 
 from .api import api_bp 
+from .utils.swipe_cache import swipe_cache
+from .utils.swipe_dedup import recent_swipes
+from .utils.auth_cache import auth_cache
+from .utils.password_hashing import password_hasher
+from .utils.metrics import metrics
+from .utils.log import init_logging
+from .utils.query_profiler import query_profiler
+from .utils.analytics_store import analytics_store
+from .commands import register_commands
 
 
-def create_app():
+def create_app(mqtt_consumer=None):
+    """
+    application factory shared by every entry point
+
+    mqtt_consumer: True for the dedicated mqtt consumer process (mqtt_consumer.py),
+    False for http workers (wsgi.py), None to follow MQTT_CONSUMER_ENABLED
+    """
     app = Flask(__name__)
     app.config.from_object(Config)
 
@@ -54,10 +69,20 @@ def create_app():
     
     Swagger(app, config=swagger_config, template=swagger_template)
 
+    # logging có cấu trúc qua queue (trước các extension để log lúc khởi động cũng đi qua queue)
+    init_logging(app.config)
+
     # 1. khởi tạo extensions
     db.init_app(app)
     migrate.init_app(app, db)
     mqtt.init_app(app)
+    swipe_cache.init_app(app)
+    recent_swipes.init_app(app)
+    auth_cache.init_app(app)
+    password_hasher.init_app(app)
+    metrics.init_app(app)
+    query_profiler.init_app(app)
+    analytics_store.init_app(app)
     
     # khởi tạo CORS - cho phép frontend truy cập API
     cors.init_app(app, resources={
@@ -72,13 +97,26 @@ def create_app():
     # 2. đăng ký blueprint
     app.register_blueprint(api_bp, url_prefix='/api')
     
+    # đăng ký flask cli commands (vd: flask work-summary rebuild)
+    register_commands(app)
+    
     # 3. root route - redirect to api docs
     @app.route('/')
     def index():
         return redirect('/apidocs')
 
-    # 4. import mqtt handlers after app initialization
-    with app.app_context():
-        from .api import mqtt_handlers
+    # 4. register mqtt handlers after app initialization
+    # chỉ 1 process (consumer) subscribe và xử lý message, các http worker chỉ publish
+    from .api.mqtt_handlers import mqtt_consumer_enabled, register_mqtt_handlers
+    if mqtt_consumer is None:
+        mqtt_consumer = mqtt_consumer_enabled(app)
+    # /api/mqtt/ingest-stats: chỉ process consumer có hàng đợi ingest
+    app.extensions['mqtt_consumer'] = bool(mqtt_consumer)
+    if mqtt_consumer:
+        register_mqtt_handlers()
+    else:
+        # http worker: chỉ nhận message invalidation để xoá cache user / device
+        from .utils.cache_invalidation import register_cache_invalidation_handlers
+        register_cache_invalidation_handlers()
 
     return app
\ No newline at end of file
@@ -4,4 +4,4 @@ from flask import Blueprint
 api_bp = Blueprint('api', __name__)
 
 # Import routes 
-from . import user_crud, auth, dev_admin, attendance_logs_crud, mqtt_handlers, mqtt_info, work_day_handler, device_control
\ No newline at end of file
+from . import user_crud, auth, dev_admin, attendance_logs_crud, mqtt_handlers, mqtt_info, work_day_handler, device_control, analytics
\ No newline at end of file
@@ -0,0 +1,350 @@
+from flask import request, current_app
+from datetime import datetime, timedelta
+from . import api_bp
+from app.utils.responses import success_response, error_response
+from app.utils.auth_decorators import require_admin
+from app.utils.analytics_store import analytics_store, AnalyticsNotReadyError
+
+
+# khoảng mặc định khi không truyền start_date / end_date
+DEFAULT_RANGE_DAYS = 30
+DEVICE_TRAFFIC_GROUPS = ('hour', 'day', 'month', 'total')
+LATENESS_GROUPS = ('day', 'week', 'month')
+
+
+def parse_analytics_range(args):
+    """
+    [start, end) datetime range from start_date / end_date (YYYY-MM-DD, both inclusive)
+
+    returns (start, end, None) or (None, None, (message, error_code))
+    """
+    try:
+        end_date = datetime.strptime(args['end_date'], '%Y-%m-%d').date() if args.get('end_date') else datetime.now().date()
+        if args.get('start_date'):
+            start_date = datetime.strptime(args['start_date'], '%Y-%m-%d').date()
+        else:
+            start_date = end_date - timedelta(days=DEFAULT_RANGE_DAYS - 1)
+    except ValueError:
+        return None, None, ('dinh dang date khong hop le, su dung YYYY-MM-DD', 'INVALID_FORMAT')
+    if start_date > end_date:
+        return None, None, ('start_date phai nho hon hoac bang end_date', 'INVALID_RANGE')
+    start = datetime.combine(start_date, datetime.min.time())
+    return start, datetime.combine(end_date + timedelta(days=1), datetime.min.time()), None
+
+
+def snapshot_info(state, start, end):
+    return {
+        'start_date': start.strftime('%Y-%m-%d'),
+        'end_date': (end - timedelta(days=1)).strftime('%Y-%m-%d'),
+        'snapshot': {
+            'refreshed_at': state['refreshed_at'],
+            'max_id': state['max_id']
+        }
+    }
+
+
+def format_period(value):
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+
+# per-device traffic
+# URL: GET /api/analytics/device-traffic?start_date=2025-12-01&end_date=2025-12-31&group=day
+@api_bp.route('/analytics/device-traffic', methods=['GET'])
+@require_admin
+def get_device_traffic():
+    """
+    swipes per device and period from the analytics snapshot (admin only)
+    ---
+    tags:
+      - Analytics
+    security:
+      - Bearer: []
+    parameters:
+      - in: query
+        name: start_date
+        type: string
+        description: "start date (YYYY-MM-DD), default 30 days before end_date"
+        example: "2025-12-01"
+      - in: query
+        name: end_date
+        type: string
+        description: "end date (YYYY-MM-DD), default today"
+        example: "2025-12-31"
+      - in: query
+        name: group
+        type: string
+        enum: [hour, day, month, total]
+        default: day
+    responses:
+      200:
+        description: "traffic rows: device_id, name, period, swipes, users (distinct cards), errors"
+      400:
+        description: invalid date format or group
+      401:
+        description: unauthorized - admin access required
+      503:
+        description: analytics snapshot not built yet
+    """
+    start, end, error = parse_analytics_range(request.args)
+    if error:
+        return error_response(*error, 400)
+    group = request.args.get('group', 'day')
+    if group not in DEVICE_TRAFFIC_GROUPS:
+        return error_response('group khong hop le, su dung hour, day, month hoac total', 'INVALID_GROUP', 400)
+
+    period = 'NULL' if group == 'total' else f"date_trunc('{group}', l.timestamp)"
+    try:
+        rows, state = analytics_store.query(
+            f'''
+            SELECT l.device_id, any_value(d.name) AS name, {period} AS period,
+                   count(*) AS swipes, count(DISTINCT l.rfid_uid) AS users, count(l.error_code) AS errors
+            FROM attendance_logs l
+            LEFT JOIN devices d ON d.device_id = l.device_id
+            WHERE l.timestamp >= ? AND l.timestamp < ?
+            GROUP BY l.device_id, period
+            ORDER BY period, l.device_id
+            ''',
+            [start, end]
+        )
+    except AnalyticsNotReadyError as e:
+        return error_response(str(e), 'ANALYTICS_NOT_READY', 503)
+    except Exception as e:
+        return error_response(str(e), 'SERVER_ERROR', 500)
+
+    for row in rows:
+        row['period'] = format_period(row['period'])
+    data = snapshot_info(state, start, end)
+    data.update({'group': group, 'traffic': rows})
+    return success_response(data=data, message='lay thong ke luu luong thiet bi thanh cong')
+
+
+# swipes per weekday and hour
+# URL: GET /api/analytics/hourly-heatmap?start_date=2025-12-01&end_date=2025-12-31&device_id=xxx
+@api_bp.route('/analytics/hourly-heatmap', methods=['GET'])
+@require_admin
+def get_hourly_heatmap():
+    """
+    swipe counts per weekday and hour of day from the analytics snapshot (admin only)
+    ---
+    tags:
+      - Analytics
+    security:
+      - Bearer: []
+    parameters:
+      - in: query
+        name: start_date
+        type: string
+        description: "start date (YYYY-MM-DD), default 30 days before end_date"
+      - in: query
+        name: end_date
+        type: string
+        description: "end date (YYYY-MM-DD), default today"
+      - in: query
+        name: device_id
+        type: string
+        description: "only this device"
+    responses:
+      200:
+        description: "matrix[weekday][hour] swipe counts, weekday 0 = monday"
+      400:
+        description: invalid date format
+      401:
+        description: unauthorized - admin access required
+      503:
+        description: analytics snapshot not built yet
+    """
+    start, end, error = parse_analytics_range(request.args)
+    if error:
+        return error_response(*error, 400)
+
+    sql = '''
+        SELECT isodow(timestamp) - 1 AS weekday, hour(timestamp) AS hour, count(*) AS swipes
+        FROM attendance_logs
+        WHERE timestamp >= ? AND timestamp < ?
+    '''
+    params = [start, end]
+    device_id = request.args.get('device_id')
+    if device_id:
+        sql += ' AND device_id = ?'
+        params.append(device_id)
+    sql += ' GROUP BY weekday, hour'
+
+    try:
+        rows, state = analytics_store.query(sql, params)
+    except AnalyticsNotReadyError as e:
+        return error_response(str(e), 'ANALYTICS_NOT_READY', 503)
+    except Exception as e:
+        return error_response(str(e), 'SERVER_ERROR', 500)
+
+    matrix = [[0] * 24 for _ in range(7)]
+    for row in rows:
+        matrix[row['weekday']][row['hour']] = row['swipes']
+    data = snapshot_info(state, start, end)
+    data.update({'device_id': device_id, 'total': sum(map(sum, matrix)), 'matrix': matrix})
+    return success_response(data=data, message='lay heatmap theo gio thanh cong')
+
+
+# lateness trend
+# URL: GET /api/analytics/lateness?start_date=2025-10-01&end_date=2025-12-31&group=week&late_after=08:30
+@api_bp.route('/analytics/lateness', methods=['GET'])
+@require_admin
+def get_lateness():
+    """
+    lateness trend and most-late employees from the analytics snapshot (admin only)
+
+    a day is late when the first successful swipe of the employee is after late_after
+    ---
+    tags:
+      - Analytics
+    security:
+      - Bearer: []
+    parameters:
+      - in: query
+        name: start_date
+        type: string
+        description: "start date (YYYY-MM-DD), default 30 days before end_date"
+      - in: query
+        name: end_date
+        type: string
+        description: "end date (YYYY-MM-DD), default today"
+      - in: query
+        name: group
+        type: string
+        enum: [day, week, month]
+        default: week
+      - in: query
+        name: late_after
+        type: string
+        description: "HH:MM, default ANALYTICS_LATE_AFTER"
+        example: "08:30"
+      - in: query
+        name: rfid_uid
+        type: string
+        description: "only this employee"
+      - in: query
+        name: limit
+        type: integer
+        default: 10
+        description: "number of employees in top_late"
+    responses:
+      200:
+        description: "trend: period, present_days, late_days, late_rate, avg_first_swipe; top_late: rfid_uid, full_name, present_days, late_days"
+      400:
+        description: invalid date, time or group
+      401:
+        description: unauthorized - admin access required
+      503:
+        description: analytics snapshot not built yet
+    """
+    start, end, error = parse_analytics_range(request.args)
+    if error:
+        return error_response(*error, 400)
+    group = request.args.get('group', 'week')
+    if group not in LATENESS_GROUPS:
+        return error_response('group khong hop le, su dung day, week hoac month', 'INVALID_GROUP', 400)
+    late_after_str = request.args.get('late_after', current_app.config['ANALYTICS_LATE_AFTER'])
+    try:
+        late_after = datetime.strptime(late_after_str, '%H:%M').time()
+    except ValueError:
+        return error_response('dinh dang late_after khong hop le, su dung HH:MM', 'INVALID_FORMAT', 400)
+    limit = min(max(request.args.get('limit', 10, type=int), 1), 100)
+
+    # lần quẹt thẻ thành công đầu tiên của mỗi nhân viên trong mỗi ngày
+    first_swipes = '''
+        WITH first_swipes AS (
+            SELECT rfid_uid, CAST(timestamp AS DATE) AS day, min(timestamp) AS first_swipe
+            FROM attendance_logs
+            WHERE timestamp >= ? AND timestamp < ? AND error_code IS NULL {user_filter}
+            GROUP BY rfid_uid, day
+        ), days AS (
+            SELECT *, CAST(first_swipe AS TIME) > ? AS late FROM first_swipes
+        )
+    '''
+    params = [start, end]
+    user_filter = ''
+    rfid_uid = request.args.get('rfid_uid')
+    if rfid_uid:
+        user_filter = 'AND rfid_uid = ?'
+        params.append(rfid_uid)
+    params.append(late_after)
+    first_swipes = first_swipes.format(user_filter=user_filter)
+
+    try:
+        trend, state = analytics_store.query(
+            first_swipes + f'''
+            SELECT date_trunc('{group}', day) AS period, count(*) AS present_days,
+                   count(*) FILTER (WHERE late) AS late_days,
+                   avg(hour(first_swipe) * 60 + minute(first_swipe)) AS avg_first_minute
+            FROM days
+            GROUP BY period
+            ORDER BY period
+            ''',
+            params
+        )
+        top_late, _ = analytics_store.query(
+            first_swipes + '''
+            SELECT d.rfid_uid, any_value(u.full_name) AS full_name, count(*) AS present_days,
+                   count(*) FILTER (WHERE d.late) AS late_days
+            FROM days d
+            LEFT JOIN users u ON u.rfid_uid = d.rfid_uid
+            GROUP BY d.rfid_uid
+            HAVING late_days > 0
+            ORDER BY late_days DESC, d.rfid_uid
+            LIMIT ?
+            ''',
+            params + [limit]
+        )
+    except AnalyticsNotReadyError as e:
+        return error_response(str(e), 'ANALYTICS_NOT_READY', 503)
+    except Exception as e:
+        return error_response(str(e), 'SERVER_ERROR', 500)
+
+    for row in trend:
+        row['period'] = format_period(row['period'])
+        row['late_rate'] = round(row['late_days'] / row['present_days'], 4)
+        minutes = round(row.pop('avg_first_minute'))
+        row['avg_first_swipe'] = f'{minutes // 60:02d}:{minutes % 60:02d}'
+    data = snapshot_info(state, start, end)
+    data.update({
+        'group': group,
+        'late_after': late_after.strftime('%H:%M'),
+        'trend': trend,
+        'top_late': top_late
+    })
+    return success_response(data=data, message='lay thong ke di muon thanh cong')
+
+
+# snapshot status
+# URL: GET /api/analytics/status
+@api_bp.route('/analytics/status', methods=['GET'])
+@require_admin
+def get_analytics_status():
+    """
+    state of the analytics snapshot (admin only)
+    ---
+    tags:
+      - Analytics
+    security:
+      - Bearer: []
+    responses:
+      200:
+        description: "version, refreshed_at, max_id (last log id included), rows, files"
+      401:
+        description: unauthorized - admin access required
+      503:
+        description: analytics snapshot not built yet
+    """
+    state = analytics_store.load_state()
+    if state is None:
+        return error_response('chua co du lieu analytics, chay flask analytics refresh', 'ANALYTICS_NOT_READY', 503)
+    return success_response(
+        data={
+            'version': state['version'],
+            'refreshed_at': state['refreshed_at'],
+            'max_id': state['max_id'],
+            'rows': state['rows'],
+            'log_files': len(state['log_parts']),
+            'archives': len(state['archives'])
+        },
+        message='lay trang thai analytics thanh cong'
+    )
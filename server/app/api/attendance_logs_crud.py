@@ -1,11 +1,125 @@
-from flask import request
+from flask import request, current_app, Response
 from app.extensions import db
 from app.models import Attendance_logs
 from . import api_bp
-from app.utils import paginate_query
+from app.utils import paginate_query, paginate_merged, InvalidCursorError
 from app.utils.responses import success_response, error_response
-from app.utils.auth_decorators import require_auth, require_admin
+from app.utils.auth_decorators import require_auth, require_admin, require_device
+from app.utils.work_day_summary import mark_work_day_summaries, refresh_work_day_summaries, summary_key
+from app.utils.time_ranges import day_range, month_range
+from app.utils.attendance_ingest import parse_swipe_batch, ingest_swipe_batch
+from app.utils.attendance_export import EXPORT_FORMATS, build_export_statement, iter_export_chunks
+from app.utils.attendance_archive import (
+    archived_log_paths, archive_filters, archived_rows_condition, read_archived_page,
+    count_archived_logs, merge_archived_logs, iter_archived_logs
+)
 from datetime import datetime
+from sqlalchemy.exc import IntegrityError
+from app.utils.log import get_logger
+
+
+logger = get_logger(__name__)
+
+def apply_attendance_log_filters(query, args):
+    """
+    apply the day / month / rfid_uid / device_id filters shared by
+    /attendance-logs/filter and /attendance-logs/export
+
+    works with both Attendance_logs.query and db.select(...) statements
+    returns (query, None) or (None, (message, error_code)) on invalid input
+    """
+    # filter by day (format: YYYY-MM-DD)
+    day = args.get('day')
+    if day:
+        try:
+            day_date = datetime.strptime(day, '%Y-%m-%d').date()
+        except ValueError:
+            return None, ('dinh dang ngay khong hop le, su dung YYYY-MM-DD', 'INVALID_DAY_FORMAT')
+        # filter for records on this specific day (half-open range, dùng được index)
+        day_start, day_end = day_range(day_date)
+        query = query.filter(
+            Attendance_logs.timestamp >= day_start,
+            Attendance_logs.timestamp < day_end
+        )
+
+    # filter by month (format: YYYY-MM)
+    month = args.get('month')
+    if month:
+        try:
+            month_date = datetime.strptime(month, '%Y-%m')
+        except ValueError:
+            return None, ('dinh dang thang khong hop le, su dung YYYY-MM', 'INVALID_MONTH_FORMAT')
+        # filter for records in this specific month (half-open range, dùng được index)
+        month_start, month_end = month_range(month_date.year, month_date.month)
+        query = query.filter(
+            Attendance_logs.timestamp >= month_start,
+            Attendance_logs.timestamp < month_end
+        )
+
+    # filter by rfid_uid
+    rfid_uid = args.get('rfid_uid')
+    if rfid_uid:
+        query = query.filter(Attendance_logs.rfid_uid == rfid_uid)
+
+    # filter by device_id
+    device_id = args.get('device_id')
+    if device_id:
+        query = query.filter(Attendance_logs.device_id == device_id)
+
+    return query, None
+
+
+def attendance_log_window(args):
+    """
+    [start, end) datetime range selected by the (already validated) day / month filters,
+    None when neither is given
+    """
+    start, end = None, None
+    if args.get('day'):
+        start, end = day_range(datetime.strptime(args['day'], '%Y-%m-%d').date())
+    if args.get('month'):
+        month_date = datetime.strptime(args['month'], '%Y-%m')
+        month_start, month_end = month_range(month_date.year, month_date.month)
+        start = max(start, month_start) if start else month_start
+        end = min(end, month_end) if end else month_end
+    return (start, end) if start else None
+
+
+def paginate_attendance_logs(query, args, rfid_uid=None, device_id=None):
+    """
+    paginate filtered attendance logs, including archived logs when the day / month
+    filter reaches a month that was moved to parquet
+
+    query must already carry the same filters; without a day / month filter
+    only attendance_logs is read
+    """
+    window = attendance_log_window(args)
+    paths = archived_log_paths(*window) if window and window[0] < window[1] else []
+    if not paths:
+        return paginate_query(
+            query,
+            serialize_func=lambda log: log.to_dict(),
+            data_key_name='attendance_logs',
+            keyset=(Attendance_logs.timestamp, Attendance_logs.id)
+        )
+
+    # tháng đã archive: phần còn trong database chỉ là log đến muộn, mỗi trang đọc
+    # tối đa per_page + 1 log từ mỗi nguồn theo cursor rồi gộp lại
+    filters = archive_filters(*window, rfid_uids=[rfid_uid] if rfid_uid else None, device_id=device_id)
+    return paginate_merged(
+        query,
+        (Attendance_logs.timestamp, Attendance_logs.id),
+        fetch_other=lambda bound, limit, newer: read_archived_page(paths, filters, limit, bound, newer),
+        merge=merge_archived_logs,
+        # log có ở cả 2 nguồn (archive bị ngắt giữa chừng) chỉ đếm 1 lần
+        count_other=lambda: (
+            count_archived_logs(paths, filters)
+            - query.filter(archived_rows_condition(paths)).order_by(None).count()
+        ),
+        serialize_func=lambda log: log.to_dict(),
+        data_key_name='attendance_logs'
+    )
+
 
 # create new attendance log
 # URL: POST /api/attendance-logs
@@ -50,6 +164,8 @@ def create_attendance_log():
         description: missing fields or invalid timestamp format
       401:
         description: unauthorized
+      409:
+        description: same rfid_uid, device_id and timestamp already exists
     """
     try:
         data = request.get_json()
@@ -71,7 +187,10 @@ def create_attendance_log():
         )
 
         db.session.add(new_log)
+        new_key = summary_key(new_log.rfid_uid, new_log.timestamp)
+        mark_work_day_summaries({new_key})
         db.session.commit()
+        refresh_work_day_summaries({new_key})
 
         return success_response(
             data=new_log.to_dict(),
@@ -79,6 +198,84 @@ def create_attendance_log():
             status_code=201
         )
 
+    except IntegrityError:
+        db.session.rollback()
+        return error_response('attendance log da ton tai (trung rfid_uid, device_id, timestamp)', 'DUPLICATE_ATTENDANCE_LOG', 409)
+    except Exception as e:
+        db.session.rollback()
+        return error_response(str(e), 'DATABASE_ERROR', 500)
+
+
+# create attendance logs in bulk (offline sync)
+# URL: POST /api/attendance-logs/batch
+@api_bp.route('/attendance-logs/batch', methods=['POST'])
+@require_device
+def create_attendance_log_batch():
+    """
+    create attendance logs in bulk from a device offline buffer (device or service token)
+
+    same ingest path as esp32/<device_id>/attendance_batch: all users are
+    validated from the swipe cache, logs are written with one multi-row
+    insert through the spool (fsynced locally when the database fails or is
+    slow), and one consolidated ack is returned
+    ---
+    tags:
+      - Attendance Logs
+    security:
+      - Bearer: []
+    parameters:
+      - in: body
+        name: body
+        required: true
+        schema:
+          type: object
+          required:
+            - device_id
+            - swipes
+          properties:
+            device_id:
+              type: string
+              example: "device001"
+            batch_id:
+              type: string
+              example: "sync-20251224-01"
+            swipes:
+              type: array
+              items:
+                type: object
+                properties:
+                  rfid_uid:
+                    type: string
+                    example: "ABC123456"
+                  timestamp:
+                    type: string
+                    example: "2025-12-24T08:01:00Z"
+                  code:
+                    type: string
+                    example: "OFFLINE_SYNC"
+                    description: "defaults to OFFLINE_SYNC"
+    responses:
+      201:
+        description: "batch saved; data has received, saved, duplicates, spooled, rejected and per-swipe results"
+      400:
+        description: missing device_id, invalid payload or batch too large
+      401:
+        description: "missing or invalid device token (DEVICE_API_TOKENS / DEVICE_SERVICE_TOKEN)"
+    """
+    data = request.get_json(silent=True)
+
+    batch, error_code = parse_swipe_batch(
+        data['device_id'], data, current_app.config['ATTENDANCE_BATCH_MAX_SWIPES']
+    )
+    if error_code == 'BATCH_TOO_LARGE':
+        return error_response('so luong swipes vuot qua gioi han', error_code, 400)
+    if error_code:
+        return error_response('danh sach swipes khong hop le', error_code, 400)
+
+    try:
+        ack = ingest_swipe_batch(batch)
+        return success_response(data=ack, message='dong bo attendance logs thanh cong', status_code=201)
+
     except Exception as e:
         db.session.rollback()
         return error_response(str(e), 'DATABASE_ERROR', 500)
@@ -105,6 +302,25 @@ def get_attendance_logs():
         name: per_page
         type: integer
         default: 10
+      - in: query
+        name: pagination
+        type: string
+        enum: [offset, cursor]
+        description: "cursor: keyset pagination (no OFFSET, no COUNT by default)"
+      - in: query
+        name: after
+        type: string
+        description: "cursor mode: next_cursor token from the previous page"
+      - in: query
+        name: before
+        type: string
+        description: "cursor mode: prev_cursor token from the previous page"
+      - in: query
+        name: count
+        type: string
+        enum: [none, cached, exact]
+        default: none
+        description: "cursor mode: how to compute total_items"
       - in: query
         name: rfid_uid
         type: string
@@ -129,7 +345,15 @@ def get_attendance_logs():
     if device_id:
         query = query.filter_by(device_id=device_id)
     
-    result = paginate_query(query, serialize_func=lambda log: log.to_dict(), data_key_name='attendance_logs')
+    try:
+        result = paginate_query(
+            query,
+            serialize_func=lambda log: log.to_dict(),
+            data_key_name='attendance_logs',
+            keyset=(Attendance_logs.timestamp, Attendance_logs.id)
+        )
+    except InvalidCursorError as e:
+        return error_response(str(e), 'INVALID_CURSOR', 400)
     return success_response(data=result, message='lay danh sach attendance logs thanh cong')
 
 
@@ -212,6 +436,8 @@ def update_attendance_log(log_id):
         description: log not found
       401:
         description: unauthorized - admin access required
+      409:
+        description: same rfid_uid, device_id and timestamp already exists
     """
     try:
         log = Attendance_logs.query.get(log_id)
@@ -222,6 +448,9 @@ def update_attendance_log(log_id):
         if not data:
             return error_response('du lieu khong hop le', 'INVALID_DATA', 400)
 
+        # ngày cũ của log cũng cần tính lại nếu đổi rfid_uid hoặc timestamp
+        previous_key = summary_key(log.rfid_uid, log.timestamp)
+
         if 'rfid_uid' in data:
             log.rfid_uid = data['rfid_uid']
         
@@ -237,12 +466,18 @@ def update_attendance_log(log_id):
         if 'code' in data:
             log.code = data['code']
 
+        changed_keys = {previous_key, summary_key(log.rfid_uid, log.timestamp)}
+        mark_work_day_summaries(changed_keys)
         db.session.commit()
+        refresh_work_day_summaries(changed_keys)
         return success_response(
             data=log.to_dict(),
             message='cap nhat attendance log thanh cong'
         )
 
+    except IntegrityError:
+        db.session.rollback()
+        return error_response('attendance log da ton tai (trung rfid_uid, device_id, timestamp)', 'DUPLICATE_ATTENDANCE_LOG', 409)
     except Exception as e:
         db.session.rollback()
         return error_response(str(e), 'DATABASE_ERROR', 500)
@@ -279,8 +514,11 @@ def delete_attendance_log(log_id):
         if not log:
             return error_response('attendance log khong ton tai', 'LOG_NOT_FOUND', 404)
 
+        deleted_key = summary_key(log.rfid_uid, log.timestamp)
         db.session.delete(log)
+        mark_work_day_summaries({deleted_key})
         db.session.commit()
+        refresh_work_day_summaries({deleted_key})
         return success_response(message='xoa attendance log thanh cong')
     except Exception as e:
         db.session.rollback()
@@ -294,6 +532,8 @@ def delete_attendance_log(log_id):
 def get_my_attendance_logs():
     """
     get current user's attendance logs with optional filters
+
+    with a day / month filter, logs of archived months are read back from the parquet archive
     ---
     tags:
       - Attendance Logs
@@ -318,6 +558,25 @@ def get_my_attendance_logs():
         name: per_page
         type: integer
         default: 10
+      - in: query
+        name: pagination
+        type: string
+        enum: [offset, cursor]
+        description: "cursor: keyset pagination (no OFFSET, no COUNT by default)"
+      - in: query
+        name: after
+        type: string
+        description: "cursor mode: next_cursor token from the previous page"
+      - in: query
+        name: before
+        type: string
+        description: "cursor mode: prev_cursor token from the previous page"
+      - in: query
+        name: count
+        type: string
+        enum: [none, cached, exact]
+        default: none
+        description: "cursor mode: how to compute total_items"
     responses:
       200:
         description: user's attendance logs retrieved successfully
@@ -335,8 +594,10 @@ def get_my_attendance_logs():
         if day:
             try:
                 day_date = datetime.strptime(day, '%Y-%m-%d').date()
+                day_start, day_end = day_range(day_date)
                 query = query.filter(
-                    db.func.date(Attendance_logs.timestamp) == day_date
+                    Attendance_logs.timestamp >= day_start,
+                    Attendance_logs.timestamp < day_end
                 )
             except ValueError:
                 return error_response('dinh dang ngay khong hop le, su dung YYYY-MM-DD', 'INVALID_DAY_FORMAT', 400)
@@ -348,18 +609,21 @@ def get_my_attendance_logs():
                 month_date = datetime.strptime(month, '%Y-%m')
                 year = month_date.year
                 month_num = month_date.month
+                month_start, month_end = month_range(year, month_num)
                 query = query.filter(
-                    db.extract('year', Attendance_logs.timestamp) == year,
-                    db.extract('month', Attendance_logs.timestamp) == month_num
+                    Attendance_logs.timestamp >= month_start,
+                    Attendance_logs.timestamp < month_end
                 )
             except ValueError:
                 return error_response('dinh dang thang khong hop le, su dung YYYY-MM', 'INVALID_MONTH_FORMAT', 400)
         
         query = query.order_by(Attendance_logs.timestamp.desc())
         
-        result = paginate_query(query, serialize_func=lambda log: log.to_dict(), data_key_name='attendance_logs')
+        result = paginate_attendance_logs(query, request.args, rfid_uid=current_user.rfid_uid)
         return success_response(data=result, message='lay danh sach attendance logs cua ban thanh cong')
     
+    except InvalidCursorError as e:
+        return error_response(str(e), 'INVALID_CURSOR', 400)
     except Exception as e:
         return error_response(str(e), 'QUERY_ERROR', 500)
 
@@ -371,6 +635,8 @@ def get_my_attendance_logs():
 def get_filtered_attendance_logs():
     """
     get filtered attendance logs with multiple criteria (admin only)
+
+    with a day / month filter, logs of archived months are read back from the parquet archive
     ---
     tags:
       - Attendance Logs
@@ -403,6 +669,25 @@ def get_filtered_attendance_logs():
         name: per_page
         type: integer
         default: 10
+      - in: query
+        name: pagination
+        type: string
+        enum: [offset, cursor]
+        description: "cursor: keyset pagination (no OFFSET, no COUNT by default)"
+      - in: query
+        name: after
+        type: string
+        description: "cursor mode: next_cursor token from the previous page"
+      - in: query
+        name: before
+        type: string
+        description: "cursor mode: prev_cursor token from the previous page"
+      - in: query
+        name: count
+        type: string
+        enum: [none, cached, exact]
+        default: none
+        description: "cursor mode: how to compute total_items"
     responses:
       200:
         description: filtered logs retrieved successfully
@@ -412,50 +697,113 @@ def get_filtered_attendance_logs():
         description: unauthorized - admin access required
     """
     try:
-        query = Attendance_logs.query
-        
-        # filter by day (format: YYYY-MM-DD)
-        day = request.args.get('day')
-        if day:
-            try:
-                day_date = datetime.strptime(day, '%Y-%m-%d').date()
-                # filter for records on this specific day
-                query = query.filter(
-                    db.func.date(Attendance_logs.timestamp) == day_date
-                )
-            except ValueError:
-                return error_response('dinh dang ngay khong hop le, su dung YYYY-MM-DD', 'INVALID_DAY_FORMAT', 400)
-        
-        # filter by month (format: YYYY-MM)
-        month = request.args.get('month')
-        if month:
-            try:
-                month_date = datetime.strptime(month, '%Y-%m')
-                year = month_date.year
-                month_num = month_date.month
-                # filter for records in this specific month
-                query = query.filter(
-                    db.extract('year', Attendance_logs.timestamp) == year,
-                    db.extract('month', Attendance_logs.timestamp) == month_num
-                )
-            except ValueError:
-                return error_response('dinh dang thang khong hop le, su dung YYYY-MM', 'INVALID_MONTH_FORMAT', 400)
-        
-        # filter by rfid_uid
-        rfid_uid = request.args.get('rfid_uid')
-        if rfid_uid:
-            query = query.filter_by(rfid_uid=rfid_uid)
-        
-        # filter by device_id
-        device_id = request.args.get('device_id')
-        if device_id:
-            query = query.filter_by(device_id=device_id)
+        query, error = apply_attendance_log_filters(Attendance_logs.query, request.args)
+        if error:
+            return error_response(*error, 400)
         
         # order by timestamp descending
         query = query.order_by(Attendance_logs.timestamp.desc())
         
-        result = paginate_query(query, serialize_func=lambda log: log.to_dict(), data_key_name='attendance_logs')
+        result = paginate_attendance_logs(
+            query,
+            request.args,
+            rfid_uid=request.args.get('rfid_uid'),
+            device_id=request.args.get('device_id')
+        )
         return success_response(data=result, message='lay danh sach attendance logs thanh cong')
     
+    except InvalidCursorError as e:
+        return error_response(str(e), 'INVALID_CURSOR', 400)
     except Exception as e:
         return error_response(str(e), 'FILTER_ERROR', 500)
+
+
+# export attendance logs (streaming)
+# URL: GET /api/attendance-logs/export?format=csv&month=2025-12&rfid_uid=xxx&device_id=xxx
+@api_bp.route('/attendance-logs/export', methods=['GET'])
+@require_admin
+def export_attendance_logs():
+    """
+    stream all attendance logs matching the filter as csv or ndjson (admin only)
+
+    logs of archived months are read back from the parquet archive and merged in order
+    ---
+    tags:
+      - Attendance Logs
+    security:
+      - Bearer: []
+    produces:
+      - text/csv
+      - application/x-ndjson
+    parameters:
+      - in: query
+        name: format
+        type: string
+        enum: [csv, ndjson]
+        default: csv
+      - in: query
+        name: day
+        type: string
+        description: "filter by specific day (YYYY-MM-DD)"
+        example: "2025-12-24"
+      - in: query
+        name: month
+        type: string
+        description: "filter by month (YYYY-MM)"
+        example: "2025-12"
+      - in: query
+        name: rfid_uid
+        type: string
+        description: "filter by rfid uid"
+      - in: query
+        name: device_id
+        type: string
+        description: "filter by device id"
+    responses:
+      200:
+        description: file stream, rows ordered by timestamp ascending
+      400:
+        description: invalid format or date format
+      401:
+        description: unauthorized - admin access required
+    """
+    export_format = request.args.get('format', 'csv').lower()
+    if export_format not in EXPORT_FORMATS:
+        return error_response('dinh dang export khong hop le, su dung csv hoac ndjson', 'INVALID_FORMAT', 400)
+
+    try:
+        statement, error = apply_attendance_log_filters(build_export_statement(), request.args)
+        if error:
+            return error_response(*error, 400)
+
+        # generator chạy sau khi view trả về: lấy engine ngay trong request context
+        engine = db.engine
+        chunk_size = current_app.config['ATTENDANCE_EXPORT_CHUNK_SIZE']
+
+        # tháng đã archive được đọc lại từ file parquet (không có filter day / month: mọi file)
+        start, end = attendance_log_window(request.args) or (None, None)
+        paths = [] if start is not None and start >= end else archived_log_paths(start, end)
+        archived = None
+        if paths:
+            rfid_uid = request.args.get('rfid_uid')
+            filters = archive_filters(start, end, [rfid_uid] if rfid_uid else None, request.args.get('device_id'))
+            archived = iter_archived_logs(paths, filters, current_app.config['ATTENDANCE_ARCHIVE_DIR'], chunk_size)
+
+        def generate():
+            try:
+                yield from iter_export_chunks(engine, statement, export_format, chunk_size, archived)
+            except Exception as e:
+                # header 200 đã gửi đi nên không thể trả về error_response: raise lại để server
+                # cắt kết nối (chunked không có chunk kết thúc), client không nhận file thiếu như file đủ
+                logger.error('attendance log export failed', format=export_format, error=str(e))
+                raise
+
+        filename = f'attendance_logs_{datetime.now().strftime("%Y%m%d_%H%M%S")}.{export_format}'
+        return Response(
+            generate(),
+            mimetype=EXPORT_FORMATS[export_format],
+            headers={'Content-Disposition': f'attachment; filename={filename}'}
+        )
+
+    except Exception as e:
+        return error_response(str(e), 'EXPORT_ERROR', 500)
@@ -4,9 +4,14 @@ from app.extensions import db
 from app.models import User
 from . import api_bp
 from app.utils.responses import success_response, error_response
+from app.utils.password_hashing import password_hasher, PasswordPoolBusy
+from app.utils.log import get_logger
 import jwt
 from datetime import datetime, timedelta
 
+
+logger = get_logger(__name__)
+
 def generate_token(user):
     payload = {
         'id': user.id,
@@ -87,6 +92,8 @@ def login():
         description: missing required fields
       401:
         description: invalid credentials
+      503:
+        description: too many concurrent logins, retry later
     """
     data = request.get_json()
 
@@ -95,9 +102,27 @@ def login():
 
     user = User.query.filter_by(email=data['email']).first()
 
-    if not user or not user.check_password(data['password']):
+    # email không tồn tại: từ chối ngay, không chiếm slot hash
+    if not user or not user.password_hash:
+        return error_response('email hoac password khong dung', 'INVALID_CREDENTIALS', 401)
+
+    try:
+        password_ok = password_hasher.verify(user.password_hash, data['password'])
+    except PasswordPoolBusy:
+        return error_response('he thong dang ban, vui long thu lai', 'LOGIN_BUSY', 503)
+
+    if not password_ok:
         return error_response('email hoac password khong dung', 'INVALID_CREDENTIALS', 401)
 
+    # opt-in: chuyển hash sang method rẻ hơn (PASSWORD_REHASH_METHOD), lỗi thì vẫn cho đăng nhập
+    if password_hasher.needs_rehash(user.password_hash):
+        try:
+            user.password_hash = password_hasher.rehash(data['password'])
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error('failed to rehash password', user_id=user.id, error=str(e))
+
     token = generate_token(user)
 
     return success_response(
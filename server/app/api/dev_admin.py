@@ -1,8 +1,11 @@
-from flask import jsonify
+from flask import jsonify, request
 from app.extensions import db
 from app.models import User
 from . import api_bp
 from app.utils.responses import success_response, error_response
+from app.utils.swipe_cache import swipe_cache
+from app.utils.auth_decorators import require_admin
+from app.utils.query_profiler import query_profiler
 
 # dev api: create default admin user
 # URL: GET /api/dev/create-admin
@@ -70,6 +73,7 @@ def create_admin():
     try:
         db.session.add(admin_user)
         db.session.commit()
+        swipe_cache.upsert_user(admin_user)
         
         return success_response(
             data={
@@ -87,3 +91,109 @@ def create_admin():
     except Exception as e:
         db.session.rollback()
         return error_response(str(e), 'DATABASE_ERROR', 500)
+
+
+# api: xem slow query log của process hiện tại (bật bằng DB_PROFILER_ENABLED)
+# URL: GET /api/debug/slow-queries?limit=50
+@api_bp.route('/debug/slow-queries', methods=['GET'])
+@require_admin
+def get_slow_queries():
+    """
+    get the rolling slow query log of this process (admin only)
+    ---
+    tags:
+      - Development
+    security:
+      - Bearer: []
+    parameters:
+      - in: query
+        name: limit
+        type: integer
+        description: newest entries to return (default all)
+    responses:
+      200:
+        description: slow queries, newest first
+        schema:
+          type: object
+          properties:
+            is_success:
+              type: boolean
+              example: true
+            data:
+              type: object
+              properties:
+                enabled:
+                  type: boolean
+                  description: "DB_PROFILER_ENABLED"
+                threshold_ms:
+                  type: number
+                  example: 200
+                sample_rate:
+                  type: number
+                  example: 0.01
+                total:
+                  type: integer
+                  description: "slow queries recorded since start / last clear"
+                queries:
+                  type: array
+                  items:
+                    type: object
+                    properties:
+                      at:
+                        type: string
+                        example: "2026-01-05T08:30:12.345"
+                      ms:
+                        type: number
+                        example: 812.4
+                      source:
+                        type: string
+                        example: "GET /api/worked-day/report"
+                        description: "http route, mqtt topic type or ingest queue"
+                      statement:
+                        type: string
+                      executemany:
+                        type: boolean
+      400:
+        description: invalid limit
+      401:
+        description: unauthorized
+      403:
+        description: forbidden - not admin
+    """
+    limit = request.args.get('limit')
+    if limit is not None:
+        try:
+            limit = int(limit)
+        except ValueError:
+            return error_response('limit phai la so nguyen', 'INVALID_LIMIT', 400)
+        if limit < 1:
+            return error_response('limit phai lon hon 0', 'INVALID_LIMIT', 400)
+
+    return success_response(
+        data=query_profiler.slow_queries(limit),
+        message='lay slow query log thanh cong'
+    )
+
+
+# api: xoá slow query log của process hiện tại
+# URL: DELETE /api/debug/slow-queries
+@api_bp.route('/debug/slow-queries', methods=['DELETE'])
+@require_admin
+def clear_slow_queries():
+    """
+    clear the slow query log of this process (admin only)
+    ---
+    tags:
+      - Development
+    security:
+      - Bearer: []
+    responses:
+      200:
+        description: slow query log cleared
+      401:
+        description: unauthorized
+      403:
+        description: forbidden - not admin
+    """
+    query_profiler.clear_slow_queries()
+    return success_response(message='xoa slow query log thanh cong')
@@ -35,6 +35,12 @@ from app.extensions import db, mqtt
 from app.models import Device
 from app.utils.responses import success_response, error_response
 from app.utils.auth_decorators import require_admin
+from app.utils.swipe_cache import swipe_cache
+from app.utils.cache_invalidation import publish_device_invalidation
+from app.utils.log import get_logger
+
+
+logger = get_logger(__name__)
 
 
 def publish_control_command(device_id, command, admin_id):
@@ -51,10 +57,10 @@ def publish_control_command(device_id, command, admin_id):
             'admin_id': admin_id
         }
         mqtt.publish(topic, json.dumps(payload))
-        print(f'control command published to {topic}: {payload}')
+        logger.info('control command published', topic=topic, command=command)
         return True
     except Exception as e:
-        print(f'failed to publish control command: {e}')
+        logger.error('failed to publish control command', device_id=device_id, command=command, error=str(e))
         return False
 
 
@@ -73,6 +79,7 @@ def get_or_create_device(device_id):
         )
         db.session.add(device)
         db.session.commit()
+        swipe_cache.set_device(device.device_id, device.rfid_enabled)
     return device
 
 
@@ -312,6 +319,8 @@ def control_rfid(device_id):
         # cập nhật trạng thái rfid trong database
         device.rfid_enabled = enabled
         db.session.commit()
+        swipe_cache.set_device(device_id, enabled)
+        publish_device_invalidation(device_id)
         
         # gửi lệnh đến ESP32 qua MQTT
         command = 'RFID_ENABLE' if enabled else 'RFID_DISABLE'
@@ -451,6 +460,7 @@ def update_device(device_id):
                 device.name = data['name']
         
         db.session.commit()
+        swipe_cache.set_device(device.device_id, device.rfid_enabled)
         
         return success_response(
             data=device.to_dict(),
@@ -491,6 +501,8 @@ def delete_device(device_id):
         
         db.session.delete(device)
         db.session.commit()
+        swipe_cache.remove_device(device_id)
+        publish_device_invalidation(device_id)
         
         return success_response(
             data={'device_id': device_id},
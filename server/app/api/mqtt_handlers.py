@@ -11,14 +11,36 @@ Subscribe: esp32/+/attendance
   - '+' is a wildcard matching any device_id
   - example: esp32/device001/attendance
 
+Subscribe: esp32/+/attendance_batch
+  - receives buffered offline swipes from ESP32 devices in one message
+  - example: esp32/device001/attendance_batch
+
 Subscribe: esp32/+/control_response
   - receives control command acknowledgement from ESP32 devices
   - example: esp32/device001/control_response
 
+Shared subscriptions (MQTT_SHARED_GROUP):
+----------------------------------------
+N consumer processes subscribe to $share/<group>/esp32/+/attendance and
+$share/<group>/esp32/+/attendance_batch and the broker splits messages
+between them; only the primary consumer subscribes to control_response.
+inside a consumer, swipes are queued per device_id so a device gets its
+responses in order; across consumers the order depends on the broker
+strategy (attendance pairing uses the swipe timestamp, not arrival order)
+
+Subscribe + publish: server/cache/invalidate (CACHE_INVALIDATION_TOPIC)
+  - user / device writes of one process (http worker or consumer) evict the
+    swipe cache and auth cache entries of every other process
+  - payload: {"origin": "<process id>", "users": [{"id": 1, "rfid_uids": ["ABC123456"]}], "devices": ["device001"]}
+
 Publish: esp32/<device_id>/response
   - sends response back to specific ESP32 device
   - example: esp32/device001/response
 
+Publish: esp32/<device_id>/batch_response
+  - one consolidated ack per attendance_batch message
+  - example: esp32/device001/batch_response
+
 Publish: esp32/<device_id>/control
   - sends control commands to ESP32 device
   - example: esp32/device001/control
@@ -34,9 +56,21 @@ Message Flow (Attendance):
    }
 
 2. Server processes the message:
-   - validates user exists and is active
-   - saves attendance log to database
-   - prepares response
+   - validates the payload and enqueues the swipe (bounded queue)
+   - a queue worker validates users for the whole batch from the
+     in-memory swipe cache (rfid_uid -> user, device_id -> rfid_enabled)
+   - saves attendance logs to database in one multi-row insert
+   - prepares and publishes the response (after the commit)
+   ATTENDANCE_DURABILITY_MODE changes when the response is sent:
+   - sync (default): as above
+   - queued: the worker publishes the responses before the write; requires
+     the spool (ATTENDANCE_SPOOL_ENABLED), the consumer refuses to start without it
+   - ack-first: the mqtt callback decides from the swipe cache, fsyncs the
+     log to a local journal and responds; the queue only persists the log,
+     journal leftovers are replayed (insert ignore) on the next connect
+   when the database write fails or exceeds ATTENDANCE_DB_LATENCY_BUDGET the
+   logs are fsynced to a local spool and bulk-loaded by a background
+   replayer once the database recovers (insert ignore, exactly once)
 
 3. Server publishes response to: esp32/<device_id>/response
    payload format:
@@ -49,6 +83,34 @@ Message Flow (Attendance):
      "time_stamp": "10:30"
    }
 
+Message Flow (Offline Sync Batch):
+---------------------------------
+1. ESP32 publishes its buffered swipes to: esp32/<device_id>/attendance_batch
+   payload format (a bare list of swipes is also accepted):
+   {
+     "batch_id": "sync-20251224-01",
+     "swipes": [
+       {"rfid_uid": "ABC123456", "timestamp": "2025-12-24T08:01:00Z"},
+       ...
+     ]
+   }
+   "code" defaults to "OFFLINE_SYNC" for every swipe
+
+2. Server validates all users with one IN (...) lookup, saves every log
+   with one multi-row insert and commits once
+
+3. Server publishes one ack to: esp32/<device_id>/batch_response
+   (only after the commit, so the device can clear its offline storage)
+   {
+     "batch_id": "sync-20251224-01",
+     "device_id": "device001",
+     "received": 120,
+     "saved": 119,
+     "rejected": 2,
+     "results": [{"index": 0, "rfid_uid": "ABC123456", "error_code": null}, ...]
+   }
+   on failure: {"batch_id": ..., "device_id": ..., "error_code": "DATABASE_ERROR" | "BATCH_TOO_LARGE" | "INVALID_PAYLOAD"}
+
 Message Flow (Control):
 ----------------------
 1. Admin sends control command via API
@@ -72,246 +134,282 @@ Error Codes:
 -----------
 - USER_NOT_FOUND: rfid_uid does not exist in database
 - USER_NOT_ACTIVE: user exists but is_active = false
+- INVALID_PAYLOAD: (batch) swipe is missing fields or has an invalid timestamp
 - null: no error, attendance recorded successfully
 """
 
 import json
 import os
+import time
 from datetime import datetime
 from app.extensions import mqtt, db
-from app.models import Attendance_logs, User, Device
-
-# chỉ đăng ký mqtt handlers khi không phải là parent process của reloader
-# điều này ngăn việc xử lý message 2 lần khi chạy Flask debug mode
-if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
-    
-    # subscribe to dynamic topic: esp32/+/attendance
-    # the '+' is a wildcard that matches any device ID
-    @mqtt.on_connect()
-    def handle_connect(client, userdata, flags, rc):
-        """
-        handle mqtt broker connection event
-        subscribes to esp32/+/attendance and esp32/+/control_response topics
-        """
-        if rc == 0:
-            print('connected to mqtt broker successfully')
-            # subscribe to attendance topic for receiving check-in data
-            mqtt.subscribe('esp32/+/attendance')
-            print('subscribed to topic: esp32/+/attendance')
-            # subscribe to control_response topic for receiving device feedback
-            mqtt.subscribe('esp32/+/control_response')
-            print('subscribed to topic: esp32/+/control_response')
-        else:
-                print(f'failed to connect to mqtt broker, return code: {rc}')
-
-    @mqtt.on_message()
-    def handle_mqtt_message(client, userdata, message):
-        """
-        handle incoming mqtt messages from esp32 devices
-        
-        routes messages to appropriate handlers based on topic type:
-        - esp32/<device_id>/attendance: attendance check-in data
-        - esp32/<device_id>/control_response: device control feedback
-        """
+from app.models import Device
+from app.utils.attendance_ingest import (
+    parse_swipe, parse_swipe_batch, publish_batch_response, acknowledge_swipe, check_durability_mode,
+    replay_swipe_journal, get_attendance_spool, get_attendance_queue, get_batch_queue
+)
+from app.utils.device_heartbeat import get_heartbeat_tracker
+from app.utils.swipe_cache import swipe_cache
+from app.utils.cache_invalidation import apply_cache_invalidation, publish_device_invalidation
+from app.utils.metrics import mqtt_messages
+from app.utils.log import get_logger
+from app.utils.query_profiler import query_profiler
+
+
+logger = get_logger(__name__)
+
+
+# subscribe to dynamic topic: esp32/+/attendance
+# the '+' is a wildcard that matches any device ID
+def handle_connect(client, userdata, flags, rc):
+    """
+    handle mqtt broker connection event
+    subscribes to the topics of get_subscription_topics
+    (esp32/+/attendance, esp32/+/attendance_batch, esp32/+/control_response)
+    """
+    if rc == 0:
+        logger.info('connected to mqtt broker')
+        for topic in get_subscription_topics(mqtt.app.config):
+            mqtt.subscribe(topic)
+            logger.info('subscribed to topic', topic=topic)
+        # nạp sẵn cache rfid -> user và device -> rfid_enabled cho luồng quẹt thẻ
         try:
-            # extract topic parts
-            topic_parts = message.topic.split('/')
-            if len(topic_parts) != 3 or topic_parts[0] != 'esp32':
-                print(f'invalid topic format: {message.topic}')
-                return
-
-            device_id = topic_parts[1]
-            topic_type = topic_parts[2]
-            payload = json.loads(message.payload.decode())
-
-            # update device last_seen timestamp
-            app = mqtt.app
-            with app.app_context():
-                update_device_last_seen(device_id)
-
-            # route to appropriate handler
+            with mqtt.app.app_context():
+                swipe_cache.load()
+        except Exception as e:
+            logger.error('failed to load swipe cache', error=str(e))
+        # ghi các log còn trong journal của lần chạy trước (ack-first bị dừng giữa chừng)
+        with mqtt.app.app_context():
+            replay_swipe_journal()
+        # khởi động replayer của spool (nạp lại các log spool của lần chạy trước)
+        get_attendance_spool()
+    else:
+        logger.error('failed to connect to mqtt broker', rc=rc)
+
+
+def handle_mqtt_message(client, userdata, message):
+    """
+    handle incoming mqtt messages from esp32 devices
+    
+    routes messages to appropriate handlers based on topic type:
+    - esp32/<device_id>/attendance: attendance check-in data
+    - esp32/<device_id>/attendance_batch: buffered offline swipes
+    - esp32/<device_id>/control_response: device control feedback
+    """
+    try:
+        # crud ở process khác vừa ghi user / device
+        if message.topic == mqtt.app.config['CACHE_INVALIDATION_TOPIC']:
+            mqtt_messages.inc('cache_invalidate')
+            apply_cache_invalidation(json.loads(message.payload.decode()))
+            return
+
+        # extract topic parts
+        topic_parts = message.topic.split('/')
+        if len(topic_parts) != 3 or topic_parts[0] != 'esp32':
+            mqtt_messages.inc('invalid')
+            logger.warning('invalid topic format', topic=message.topic)
+            return
+
+        device_id = topic_parts[1]
+        topic_type = topic_parts[2]
+        mqtt_messages.inc(topic_type)
+        payload = json.loads(message.payload.decode())
+
+        # update device last_seen timestamp (ghi xuống db theo chu kỳ)
+        update_device_last_seen(device_id)
+
+        # route to appropriate handler
+        with query_profiler.profile(f'mqtt {topic_type}'):
             if topic_type == 'attendance':
                 handle_attendance_message(device_id, payload)
+            elif topic_type == 'attendance_batch':
+                handle_attendance_batch_message(device_id, payload)
             elif topic_type == 'control_response':
                 handle_control_response_message(device_id, payload)
             else:
-                print(f'unknown topic type: {topic_type}')
-
-        except json.JSONDecodeError as e:
-            print(f'json decode error: {e}')
-        except Exception as e:
-            print(f'error processing mqtt message: {e}')
-
-
-    def update_device_last_seen(device_id):
-        """
-        update device last_seen timestamp in database
-        creates device if not exists
-        """
-        try:
+                logger.warning('unknown topic type', topic_type=topic_type, device_id=device_id)
+
+    except json.JSONDecodeError as e:
+        logger.warning('json decode error', topic=message.topic, error=str(e))
+    except Exception as e:
+        logger.exception('error processing mqtt message', topic=message.topic)
+
+
+def update_device_last_seen(device_id):
+    """
+    record device last_seen in memory
+    the heartbeat tracker flushes changed devices (and creates unknown ones) in bulk
+    """
+    get_heartbeat_tracker().touch(device_id)
+
+
+def handle_attendance_message(device_id, payload):
+    """
+    handle attendance check-in message from esp32
+
+    only validates the payload and enqueues the swipe; a queue worker
+    looks up the user, saves the log and publishes the response
+    (ack-first durability mode responds here and journals the log instead)
+    """
+    swipe = parse_swipe(device_id, payload)
+    if not swipe:
+        return
+    # mốc thời gian nhận swipe, dùng cho metric độ trễ swipe -> response
+    swipe['received_at'] = time.perf_counter()
+
+    if mqtt.app.config['ATTENDANCE_DURABILITY_MODE'] == 'ack-first':
+        acknowledge_swipe(swipe)
+        return
+
+    if not get_attendance_queue().put(swipe):
+        logger.warning('attendance queue full, swipe dropped', rfid_uid=swipe['rfid_uid'], device_id=device_id)
+
+
+def handle_attendance_batch_message(device_id, payload):
+    """
+    handle offline-sync batch message from esp32
+
+    the whole batch is enqueued as one item; the batch worker saves it in
+    one transaction and publishes one ack to esp32/<device_id>/batch_response
+    """
+    batch, error_code = parse_swipe_batch(
+        device_id, payload, mqtt.app.config['ATTENDANCE_BATCH_MAX_SWIPES']
+    )
+    if error_code:
+        logger.warning('invalid attendance batch', device_id=device_id, error_code=error_code)
+        batch_id = payload.get('batch_id') if isinstance(payload, dict) else None
+        publish_batch_response(device_id, {'batch_id': batch_id, 'device_id': device_id, 'error_code': error_code})
+        return
+
+    if not get_batch_queue().put(batch):
+        logger.warning('attendance batch queue full, batch dropped', device_id=device_id, swipes=len(batch['swipes']))
+        publish_batch_response(device_id, {'batch_id': batch['batch_id'], 'device_id': device_id, 'error_code': 'QUEUE_FULL'})
+
+
+def handle_control_response_message(device_id, payload):
+    """
+    handle control command response from esp32
+    
+    updates device state based on feedback from esp32
+    expected payload: {"command": "...", "status": "SUCCESS/FAILED", "message": "..."}
+    """
+    try:
+        command = payload.get('command')
+        status = payload.get('status')
+        message_text = payload.get('message', '')
+        
+        logger.info('control response', device_id=device_id, command=command, status=status, detail=message_text)
+        
+        app = mqtt.app
+        with app.app_context():
             device = Device.query.filter_by(device_id=device_id).first()
             if not device:
-                # tự động tạo device mới nếu chưa tồn tại
-                device = Device(
-                    device_id=device_id,
-                    name=f'Device {device_id}',
-                    is_active=True
-                )
-                db.session.add(device)
-            
-            device.last_seen = datetime.utcnow()
-            db.session.commit()
-            print(f'device {device_id} last_seen updated')
-        except Exception as e:
-            db.session.rollback()
-            print(f'failed to update device last_seen: {e}')
-
-
-    def handle_attendance_message(device_id, payload):
-        """
-        handle attendance check-in message from esp32
-        
-        validates user, saves attendance log, and publishes response
-        """
-        try:
-            # validate required fields
-            if 'rfid_uid' not in payload or 'timestamp' not in payload:
-                print(f'missing fields in payload from {device_id}')
+                logger.warning('device not found in database', device_id=device_id)
                 return
-
-            # parse timestamp
-            timestamp_str = payload['timestamp']
-            try:
-                timestamp = datetime.fromisoformat(timestamp_str.replace('Z', '+00:00'))
-            except Exception as e:
-                print(f'invalid timestamp format from device {device_id}: {timestamp_str}')
-                return
-
-            # get app instance from mqtt extension
-            app = mqtt.app
-            with app.app_context():
-                # kiểm tra device có được phép quẹt thẻ không
-                device = Device.query.filter_by(device_id=device_id).first()
-                if device and not device.rfid_enabled:
-                    print(f'rfid disabled on device {device_id}, ignoring attendance')
-                    # vẫn gửi response về cho ESP32 biết
-                    response_topic = f'esp32/{device_id}/response'
-                    response_payload = {
-                        'is_success': False,
-                        'user_id': None,
-                        'user_name': None,
-                        'rfid_uid': payload['rfid_uid'],
-                        'error_code': 'RFID_DISABLED',
-                        'time_stamp': datetime.now().strftime('%H:%M')
-                    }
-                    mqtt.publish(response_topic, json.dumps(response_payload))
-                    return
-
-                # kiểm tra user có tồn tại và có active không
-                user = User.query.filter_by(rfid_uid=payload['rfid_uid']).first()
-                print('user found: ', user)
-                error_code = None
-                if not user:
-                    print(f'user not found from device {device_id}: {payload["rfid_uid"]}')
-                    error_code = 'USER_NOT_FOUND'
-                elif not user.is_active:
-                    print(f'user is not active from device {device_id}: {payload["rfid_uid"]}')
-                    error_code = 'USER_NOT_ACTIVE'
-
-                # save attendance log to database
-                new_log = Attendance_logs(
-                    rfid_uid=payload['rfid_uid'],
-                    timestamp=timestamp,
-                    device_id=device_id,
-                    code=payload.get('code', 'REALTIME'),
-                    error_code=error_code
-                )
-                
-                db.session.add(new_log)
-                db.session.commit()
-                
-                print(f'attendance log created: rfid={payload["rfid_uid"]}, device={device_id}, timestamp={timestamp}')
-                
-                # prepare response message
-                response_topic = f'esp32/{device_id}/response'
-                response_payload = {
-                    'is_success': error_code is None,
-                    'user_id': user.id if user else None,
-                    'user_name': user.full_name if user else None,
-                    'rfid_uid': payload['rfid_uid'],
-                    'error_code': error_code,
-                    'time_stamp': datetime.now().strftime('%H:%M')
-                }
-                
-                # publish response to esp32
-                mqtt.publish(response_topic, json.dumps(response_payload))
-                print(f'response published to {response_topic}: {response_payload}')
-
-        except Exception as e:
-            app = mqtt.app
-            with app.app_context():
-                db.session.rollback()
-            print(f'error processing attendance message: {e}')
-
-
-    def handle_control_response_message(device_id, payload):
-        """
-        handle control command response from esp32
-        
-        updates device state based on feedback from esp32
-        expected payload: {"command": "...", "status": "SUCCESS/FAILED", "message": "..."}
-        """
-        try:
-            command = payload.get('command')
-            status = payload.get('status')
-            message_text = payload.get('message', '')
             
-            print(f'control response from {device_id}: command={command}, status={status}, message={message_text}')
-            
-            app = mqtt.app
-            with app.app_context():
-                device = Device.query.filter_by(device_id=device_id).first()
-                if not device:
-                    print(f'device {device_id} not found in database')
-                    return
+            # chỉ cập nhật state nếu command thành công
+            if status == 'SUCCESS':
+                if command == 'DOOR_OPEN':
+                    device.door_state = 'OPEN'
+                elif command == 'DOOR_CLOSE':
+                    device.door_state = 'CLOSED'
+                elif command == 'RFID_ENABLE':
+                    device.rfid_enabled = True
+                elif command == 'RFID_DISABLE':
+                    device.rfid_enabled = False
+                elif command == 'DEVICE_ACTIVATE':
+                    device.is_active = True
+                elif command == 'DEVICE_DEACTIVATE':
+                    device.is_active = False
                 
-                # chỉ cập nhật state nếu command thành công
-                if status == 'SUCCESS':
-                    if command == 'DOOR_OPEN':
-                        device.door_state = 'OPEN'
-                    elif command == 'DOOR_CLOSE':
-                        device.door_state = 'CLOSED'
-                    elif command == 'RFID_ENABLE':
-                        device.rfid_enabled = True
-                    elif command == 'RFID_DISABLE':
-                        device.rfid_enabled = False
-                    elif command == 'DEVICE_ACTIVATE':
-                        device.is_active = True
-                    elif command == 'DEVICE_DEACTIVATE':
-                        device.is_active = False
-                    
-                    db.session.commit()
-                    print(f'device {device_id} state updated: {command}')
-                else:
-                    print(f'command {command} failed on device {device_id}: {message_text}')
-
-        except Exception as e:
-            app = mqtt.app
-            with app.app_context():
-                db.session.rollback()
-            print(f'error processing control response: {e}')
-
-    @mqtt.on_disconnect()   
-    def handle_disconnect():
-        """
-        handle mqtt broker disconnection event
-        """
-        print('disconnected from mqtt broker')
-
-    @mqtt.on_subscribe()
-    def handle_subscribe(client, userdata, mid, granted_qos):
-        """
-        handle successful topic subscription event
-        """
-        print(f'subscribed successfully, qos: {granted_qos}')
+                db.session.commit()
+                swipe_cache.set_device(device_id, device.rfid_enabled)
+                if command in ('RFID_ENABLE', 'RFID_DISABLE'):
+                    publish_device_invalidation(device_id)
+                logger.info('device state updated', device_id=device_id, command=command)
+            else:
+                logger.warning('command failed on device', device_id=device_id, command=command, detail=message_text)
 
+    except Exception as e:
+        app = mqtt.app
+        with app.app_context():
+            db.session.rollback()
+        logger.exception('error processing control response', device_id=device_id)
+
+
+def handle_disconnect(client=None, userdata=None, rc=None):
+    """
+    handle mqtt broker disconnection event
+    """
+    logger.warning('disconnected from mqtt broker', rc=rc)
+
+
+def handle_subscribe(client, userdata, mid, granted_qos):
+    """
+    handle successful topic subscription event
+    """
+    logger.debug('subscribed successfully', granted_qos=granted_qos)
+
+
+def get_subscription_topics(config):
+    """
+    topics this consumer subscribes to
+
+    - esp32/+/attendance: attendance check-in data
+    - esp32/+/attendance_batch: offline-sync replays
+    - esp32/+/control_response: device control feedback
+    - CACHE_INVALIDATION_TOPIC: user / device writes of other processes
+
+    with MQTT_SHARED_GROUP the attendance topics become shared subscriptions
+    ($share/<group>/...), so the broker splits them between all consumers of
+    the group; control_response is only subscribed by the primary consumer
+    (MQTT_CONSUMER_PRIMARY), without sharing, so command feedback of a device
+    is always applied by one process in the order it was sent
+    """
+    group = config.get('MQTT_SHARED_GROUP')
+    prefix = f'$share/{group}/' if group else ''
+
+    topics = [
+        f'{prefix}esp32/+/attendance',
+        f'{prefix}esp32/+/attendance_batch',
+    ]
+    if not group or config.get('MQTT_CONSUMER_PRIMARY', True):
+        topics.append('esp32/+/control_response')
+    # không share: mọi consumer đều phải xoá cache của mình
+    topics.append(config.get('CACHE_INVALIDATION_TOPIC', 'server/cache/invalidate'))
+    return topics
+
+
+def mqtt_consumer_enabled(app):
+    """
+    whether this process should subscribe and handle mqtt messages
+
+    MQTT_CONSUMER_ENABLED:
+    - 'true': always (the dedicated consumer process, mqtt_consumer.py)
+    - 'false': never (http workers, wsgi.py), the client is only used to publish
+    - 'auto': only in the werkzeug reloader child, as with `python app.py`
+    """
+    mode = str(app.config.get('MQTT_CONSUMER_ENABLED', 'auto')).lower()
+    if mode == 'auto':
+        # chỉ đăng ký mqtt handlers khi không phải là parent process của reloader
+        # điều này ngăn việc xử lý message 2 lần khi chạy Flask debug mode
+        return os.environ.get('WERKZEUG_RUN_MAIN') == 'true'
+    return mode == 'true'
+
+
+def register_mqtt_handlers():
+    """
+    attach the handlers above to the shared mqtt client
+
+    must only run in one process per deployment, otherwise every
+    subscribed message is processed once per process
+    """
+    check_durability_mode(mqtt.app.config)
+    mqtt.on_connect()(handle_connect)
+    mqtt.on_message()(handle_mqtt_message)
+    mqtt.on_disconnect()(handle_disconnect)
+    mqtt.on_subscribe()(handle_subscribe)
+
+    # mqtt.init_app đã kết nối trước khi gắn handler: nếu on_connect đã chạy thì tự subscribe
+    if mqtt.connected:
+        handle_connect(mqtt.client, None, None, 0)
@@ -1,5 +1,17 @@
-from flask import jsonify
+import urllib.error
+import urllib.request
+
+from flask import Response, current_app, jsonify, request
 from . import api_bp
+from app.utils.log import get_logger
+from app.utils.responses import error_response, success_response
+from app.utils.auth_decorators import require_admin
+from app.utils.attendance_ingest import get_ingest_stats, get_batch_ingest_stats, get_journal_stats, get_spool_stats
+from app.utils.device_heartbeat import get_heartbeat_stats
+from app.utils.swipe_cache import swipe_cache
+from app.utils.swipe_dedup import recent_swipes
+
+logger = get_logger(__name__)
 
 @api_bp.route('/mqtt/info', methods=['GET'])
 def mqtt_info():
@@ -119,3 +131,199 @@ def mqtt_info():
             "attendance logs are saved automatically when messages are received"
         ]
     })
+
+
+
+# api: xem trạng thái hàng đợi ingest attendance và heartbeat của device
+# GET /api/mqtt/ingest-stats
+@api_bp.route('/mqtt/ingest-stats', methods=['GET'])
+@require_admin
+def mqtt_ingest_stats():
+    """
+    get attendance ingest queue and device heartbeat metrics (admin only)
+    ---
+    tags:
+      - MQTT Integration
+    security:
+      - Bearer: []
+    responses:
+      200:
+        description: queue depth, throughput, backpressure and heartbeat counters
+        schema:
+          type: object
+          properties:
+            is_success:
+              type: boolean
+              example: true
+            data:
+              type: object
+              properties:
+                attendance_queue:
+                  type: object
+                  properties:
+                    depth:
+                      type: integer
+                      example: 12
+                    capacity:
+                      type: integer
+                      example: 10000
+                    max_depth:
+                      type: integer
+                      example: 340
+                    enqueued:
+                      type: integer
+                    processed:
+                      type: integer
+                    batches:
+                      type: integer
+                    failed_batches:
+                      type: integer
+                    blocked_puts:
+                      type: integer
+                      description: "puts that had to wait because the queue was full"
+                    dropped:
+                      type: integer
+                      description: "swipes rejected after waiting enqueue timeout"
+                    running:
+                      type: boolean
+                attendance_batch_queue:
+                  type: object
+                  description: "offline-sync batch queue, same counters as attendance_queue (one item = one batch)"
+                attendance_journal:
+                  type: object
+                  description: "local write-ahead journal of ack-first durability mode"
+                  properties:
+                    appended:
+                      type: integer
+                    fsyncs:
+                      type: integer
+                    released:
+                      type: integer
+                      description: "journaled logs committed to the database"
+                    pending:
+                      type: integer
+                      description: "journaled logs not yet committed"
+                    replayed:
+                      type: integer
+                      description: "logs replayed from a previous run"
+                    segments:
+                      type: integer
+                attendance_spool:
+                  type: object
+                  description: "local spool used while the database fails or is over its latency budget"
+                  properties:
+                    written:
+                      type: integer
+                    spooled:
+                      type: integer
+                    failed_writes:
+                      type: integer
+                    slow_writes:
+                      type: integer
+                    replayed:
+                      type: integer
+                    failed_replays:
+                      type: integer
+                    degraded:
+                      type: boolean
+                      description: "writes currently bypass the database"
+                device_heartbeat:
+                  type: object
+                  properties:
+                    touches:
+                      type: integer
+                    pending:
+                      type: integer
+                      description: "devices seen since the last flush"
+                    flushes:
+                      type: integer
+                    failed_flushes:
+                      type: integer
+                    devices_updated:
+                      type: integer
+                    devices_created:
+                      type: integer
+                swipe_cache:
+                  type: object
+                  properties:
+                    users:
+                      type: integer
+                    devices:
+                      type: integer
+                    hits:
+                      type: integer
+                    misses:
+                      type: integer
+                    loads:
+                      type: integer
+                    loaded:
+                      type: boolean
+                dedup:
+                  type: object
+                  properties:
+                    duplicates:
+                      type: integer
+                      description: "duplicate swipes skipped in total"
+                    memory_duplicates:
+                      type: integer
+                      description: "dropped by the recent key set, no database write"
+                    db_duplicates:
+                      type: integer
+                      description: "ignored by the unique key of attendance_logs"
+                    recent_keys:
+                      type: integer
+                    capacity:
+                      type: integer
+      401:
+        description: unauthorized
+      403:
+        description: forbidden - not admin
+      502:
+        description: the mqtt consumer process did not answer (INGEST_STATS_UNAVAILABLE)
+      503:
+        description: http worker without INGEST_STATS_URL (INGEST_STATS_NOT_CONFIGURED)
+    """
+    # app không do create_app tạo (test, benchmark) chạy ingest ngay trong process
+    if not current_app.extensions.get('mqtt_consumer', True):
+        return _forward_ingest_stats()
+    return success_response(
+        data={
+            'attendance_queue': get_ingest_stats(),
+            'attendance_batch_queue': get_batch_ingest_stats(),
+            'attendance_journal': get_journal_stats(),
+            'attendance_spool': get_spool_stats(),
+            'device_heartbeat': get_heartbeat_stats(),
+            'swipe_cache': swipe_cache.stats(),
+            'dedup': recent_swipes.stats()
+        },
+        message='lay thong tin hang doi ingest thanh cong'
+    )
+
+
+def _forward_ingest_stats():
+    """
+    http worker: the ingest queues live in the mqtt consumer process, ask its
+    stats server (INGEST_STATS_URL) with the caller's admin token
+    """
+    url = current_app.config['INGEST_STATS_URL']
+    if not url:
+        return error_response(
+            message='hang doi ingest nam trong process mqtt consumer, chua cau hinh INGEST_STATS_URL',
+            error_code='INGEST_STATS_NOT_CONFIGURED',
+            status_code=503
+        )
+
+    stats_request = urllib.request.Request(url, headers={'Authorization': request.headers.get('Authorization', '')})
+    try:
+        with urllib.request.urlopen(stats_request, timeout=current_app.config['INGEST_STATS_TIMEOUT']) as response:
+            status, body = response.status, response.read()
+    except urllib.error.HTTPError as e:
+        status, body = e.code, e.read()
+    except OSError as e:
+        logger.warning('ingest stats request failed', url=url, error=str(e))
+        return error_response(
+            message='khong lay duoc thong tin hang doi ingest tu mqtt consumer',
+            error_code='INGEST_STATS_UNAVAILABLE',
+            status_code=502
+        )
+    return Response(body, status=status, content_type='application/json')
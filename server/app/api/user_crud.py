@@ -2,9 +2,12 @@ from flask import request
 from app.extensions import db
 from app.models import User
 from . import api_bp 
-from app.utils import paginate_query
+from app.utils import paginate_query, InvalidCursorError
 from app.utils.responses import success_response, error_response
 from app.utils.auth_decorators import require_auth, require_admin
+from app.utils.swipe_cache import swipe_cache
+from app.utils.auth_cache import auth_cache
+from app.utils.cache_invalidation import publish_user_invalidation
 
 # API Tạo User mới (Admin only)
 # URL: POST /api/users
@@ -84,6 +87,7 @@ def create_user():
     try:
         db.session.add(new_user)
         db.session.commit()
+        swipe_cache.upsert_user(new_user)
 
         return success_response(
             data=new_user.to_dict(),
@@ -119,6 +123,25 @@ def get_users():
         type: integer
         default: 10
         description: items per page
+      - in: query
+        name: pagination
+        type: string
+        enum: [offset, cursor]
+        description: "cursor: keyset pagination (no OFFSET, no COUNT by default)"
+      - in: query
+        name: after
+        type: string
+        description: "cursor mode: next_cursor token from the previous page"
+      - in: query
+        name: before
+        type: string
+        description: "cursor mode: prev_cursor token from the previous page"
+      - in: query
+        name: count
+        type: string
+        enum: [none, cached, exact]
+        default: none
+        description: "cursor mode: how to compute total_items"
     responses:
       200:
         description: list of users retrieved successfully
@@ -126,7 +149,15 @@ def get_users():
         description: unauthorized - admin access required
     """
     query = User.query.order_by(User.created_at.desc())
-    result = paginate_query(query, serialize_func=lambda u: u.to_dict(), data_key_name='users')
+    try:
+        result = paginate_query(
+            query,
+            serialize_func=lambda u: u.to_dict(),
+            data_key_name='users',
+            keyset=(User.created_at, User.id)
+        )
+    except InvalidCursorError as e:
+        return error_response(str(e), 'INVALID_CURSOR', 400)
     return success_response(data=result, message='lay danh sach user thanh cong')
 
 
@@ -222,8 +253,9 @@ def get_me():
       401:
         description: unauthorized - authentication required
     """
+    user = db.session.get(User, request.current_user.id)
     return success_response(
-        data=request.current_user.to_dict(),
+        data=user.to_dict(),
         message='lay thong tin user thanh cong'
     )
 
@@ -266,12 +298,14 @@ def update_me():
         description: email or rfid already exists
     """
 
-    user = request.current_user
+    user = db.session.get(User, request.current_user.id)
     data = request.get_json()
     
     if not data:
         return error_response('du lieu khong hop le', 'INVALID_DATA', 400)
 
+    previous_rfid = user.rfid_uid
+
     new_email = data.get('email')
     new_rfid = data.get('rfid_uid')
     new_full_name = data.get('full_name')
@@ -293,6 +327,9 @@ def update_me():
 
     try:
         db.session.commit()
+        swipe_cache.upsert_user(user, previous_rfid_uid=previous_rfid)
+        auth_cache.invalidate_user(user.id)
+        publish_user_invalidation(user.id, user.rfid_uid, previous_rfid)
         return success_response(
             data=user.to_dict(),
             message='cap nhat user thanh cong'
@@ -336,6 +373,9 @@ def delete_user(user_id):
     try:
         db.session.delete(user)
         db.session.commit()
+        swipe_cache.remove_user(user.rfid_uid)
+        auth_cache.invalidate_user(user_id)
+        publish_user_invalidation(user_id, user.rfid_uid)
         return success_response(message='xoa user thanh cong')
     except Exception as e:
         db.session.rollback()
@@ -399,6 +439,7 @@ def update_user(user_id):
     if not data:
         return error_response('du lieu khong hop le', 'INVALID_DATA', 400)
 
+    previous_rfid = user.rfid_uid
     new_email = data.get('email')
     new_rfid = data.get('rfid_uid')
     new_full_name = data.get('full_name')
@@ -428,6 +469,9 @@ def update_user(user_id):
 
     try:
         db.session.commit()
+        swipe_cache.upsert_user(user, previous_rfid_uid=previous_rfid)
+        auth_cache.invalidate_user(user.id)
+        publish_user_invalidation(user.id, user.rfid_uid, previous_rfid)
         return success_response(
             data=user.to_dict(),
             message='cap nhat user thanh cong'
@@ -4,8 +4,14 @@ from calendar import monthrange
 from app.extensions import db
 from . import api_bp
 from app.utils.responses import success_response, error_response
-from app.utils.auth_decorators import require_auth
-from app.utils.work_day_calculator import calculate_work_day_data
+from app.models import User
+from app.utils.auth_decorators import require_auth, require_admin
+from app.utils.work_day_calculator import (
+    calculate_work_day_data,
+    calculate_work_day_range,
+    calculate_work_day_report,
+    build_work_day_series
+)
 
 
 # get worked days by month for current user
@@ -116,15 +122,12 @@ def get_worked_days_by_month():
             # nếu là tháng khác, lấy đến ngày cuối tháng
             _, end_day = monthrange(target_year, target_month)
         
-        # tính toán work data cho mỗi ngày
-        worked_days = []
-        for day in range(start_day, end_day + 1):
-            current_date = date(target_year, target_month, day)
-            work_data = calculate_work_day_data(current_date, rfid_uid)
-            
-            # thêm field date vào kết quả
-            work_data['date'] = current_date.strftime('%Y-%m-%d')
-            worked_days.append(work_data)
+        # tính toán work data cho cả tháng bằng 1 query
+        worked_days = calculate_work_day_range(
+            date(target_year, target_month, start_day),
+            date(target_year, target_month, end_day),
+            rfid_uid
+        )
         
         return success_response(
             data={
@@ -240,20 +243,8 @@ def get_worked_days_by_range():
         if start_date > end_date:
             return error_response('start_date phai nho hon hoac bang end_date', 'INVALID_RANGE', 400)
         
-        # tính toán work data cho mỗi ngày trong khoảng
-        worked_days = []
-        current_date = start_date
-        
-        while current_date <= end_date:
-            work_data = calculate_work_day_data(current_date, rfid_uid)
-            
-            # thêm field date vào kết quả
-            work_data['date'] = current_date.strftime('%Y-%m-%d')
-            worked_days.append(work_data)
-            
-            # tăng ngày
-            from datetime import timedelta
-            current_date += timedelta(days=1)
+        # tính toán work data cho mọi ngày trong khoảng bằng 1 query
+        worked_days = calculate_work_day_range(start_date, end_date, rfid_uid)
         
         return success_response(
             data={
@@ -362,3 +353,170 @@ def get_worked_day_single():
     
     except Exception as e:
         return error_response(str(e), 'SERVER_ERROR', 500)
+
+
+# get worked days report for all users (or a filtered set) in a month
+# URL: GET /api/worked-day/report?month=YYYY-MM&rfid_uid=xxx&detail=true
+@api_bp.route('/worked-day/report', methods=['GET'])
+@require_admin
+def get_worked_days_report():
+    """
+    get organization-wide work day report for a month (admin only)
+    ---
+    tags:
+      - Work Day Calculation
+    security:
+      - Bearer: []
+    parameters:
+      - in: query
+        name: month
+        type: string
+        description: "month to query (YYYY-MM), defaults to current month"
+        example: "2025-12"
+      - in: query
+        name: rfid_uid
+        type: string
+        description: "only include these users (repeatable or comma separated)"
+        example: "ABC123456,DEF789012"
+      - in: query
+        name: detail
+        type: boolean
+        default: true
+        description: "include per-day worked_days for each user"
+    responses:
+      200:
+        description: report computed successfully
+        schema:
+          type: object
+          properties:
+            is_success:
+              type: boolean
+              example: true
+            message:
+              type: string
+            data:
+              type: object
+              properties:
+                month:
+                  type: string
+                  example: "2025-12"
+                start_date:
+                  type: string
+                  example: "2025-12-01"
+                end_date:
+                  type: string
+                  example: "2025-12-31"
+                users:
+                  type: array
+                  items:
+                    type: object
+                    properties:
+                      user_id:
+                        type: integer
+                        example: 1
+                      full_name:
+                        type: string
+                        example: "Nguyen Van A"
+                      rfid_uid:
+                        type: string
+                        example: "ABC123456"
+                      is_active:
+                        type: boolean
+                        example: true
+                      total_times:
+                        type: number
+                        example: 168.5
+                        description: "total work hours in the month"
+                      work_days:
+                        type: number
+                        example: 21.5
+                        description: "sum of day types (1 / 0.5 / 0)"
+                      worked_days:
+                        type: array
+                        description: "same items as /worked-day/month (only when detail=true)"
+                        items:
+                          type: object
+      400:
+        description: invalid month format
+      401:
+        description: unauthorized
+      403:
+        description: forbidden - not admin
+    """
+    # tính bảng công cho toàn bộ nhân viên (hoặc danh sách rfid_uid) trong 1 tháng
+    # chỉ dùng 1 query cho users và 1 lượt quét log sắp xếp theo (rfid_uid, timestamp)
+    try:
+        month_str = request.args.get('month')
+
+        if month_str:
+            try:
+                target_date = datetime.strptime(month_str, '%Y-%m')
+                target_year = target_date.year
+                target_month = target_date.month
+            except ValueError:
+                return error_response('dinh dang month khong hop le, su dung YYYY-MM', 'INVALID_FORMAT', 400)
+        else:
+            now = datetime.now()
+            target_year = now.year
+            target_month = now.month
+
+        # tháng hiện tại: chỉ tính đến ngày hiện tại, tháng khác: đến ngày cuối tháng
+        now = datetime.now()
+        if target_year == now.year and target_month == now.month:
+            end_day = now.day
+        else:
+            _, end_day = monthrange(target_year, target_month)
+
+        start_date = date(target_year, target_month, 1)
+        end_date = date(target_year, target_month, end_day)
+
+        # lọc theo rfid_uid (có thể lặp lại param hoặc ngăn cách bằng dấu phẩy)
+        rfid_filter = [
+            uid.strip()
+            for value in request.args.getlist('rfid_uid')
+            for uid in value.split(',')
+            if uid.strip()
+        ]
+        detail = request.args.get('detail', 'true').lower() != 'false'
+
+        user_query = db.select(User.id, User.full_name, User.rfid_uid, User.is_active).order_by(User.id.asc())
+        if rfid_filter:
+            user_query = user_query.where(User.rfid_uid.in_(rfid_filter))
+        users = db.session.execute(user_query).all()
+
+        report = calculate_work_day_report(
+            start_date,
+            end_date,
+            [user.rfid_uid for user in users] if rfid_filter else None
+        )
+
+        result = []
+        for user in users:
+            worked_days = report.get(user.rfid_uid)
+            if worked_days is None:
+                worked_days = build_work_day_series(start_date, end_date, {})
+
+            item = {
+                'user_id': user.id,
+                'full_name': user.full_name,
+                'rfid_uid': user.rfid_uid,
+                'is_active': user.is_active,
+                'total_times': round(sum(day['total_times'] for day in worked_days), 2),
+                'work_days': sum(day['type'] for day in worked_days)
+            }
+            if detail:
+                item['worked_days'] = worked_days
+            result.append(item)
+
+        return success_response(
+            data={
+                'month': f'{target_year}-{target_month:02d}',
+                'start_date': start_date.strftime('%Y-%m-%d'),
+                'end_date': end_date.strftime('%Y-%m-%d'),
+                'users': result
+            },
+            message=f'lay bang cong thang {target_month:02d}-{target_year} thanh cong'
+        )
+
+    except Exception as e:
+        return error_response(str(e), 'SERVER_ERROR', 500)
@@ -0,0 +1,157 @@
+# app/commands.py
+from datetime import datetime
+import click
+from flask.cli import AppGroup
+
+
+work_summary_cli = AppGroup('work-summary', help='quan ly bang daily_work_summary')
+attendance_logs_cli = AppGroup('attendance-logs', help='quan ly partition va archive cua attendance_logs')
+analytics_cli = AppGroup('analytics', help='quan ly snapshot parquet cho analytics')
+
+
+def parse_date_option(value):
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise click.BadParameter('dinh dang date khong hop le, su dung YYYY-MM-DD')
+
+
+@work_summary_cli.command('rebuild')
+@click.option('--start', 'start_str', help='ngay bat dau (YYYY-MM-DD), mac dinh log dau tien')
+@click.option('--end', 'end_str', help='ngay ket thuc (YYYY-MM-DD), mac dinh log cuoi cung')
+def rebuild_work_summary(start_str, end_str):
+    """
+    backfill / rebuild daily_work_summary from attendance_logs
+    """
+    from app.utils.work_day_summary import rebuild_work_day_summaries
+
+    start_date = parse_date_option(start_str)
+    end_date = parse_date_option(end_str)
+    try:
+        written = rebuild_work_day_summaries(start_date, end_date)
+        click.echo(f'rebuilt daily_work_summary: {written} rows')
+    except Exception as e:
+        raise click.ClickException(f'failed to rebuild daily_work_summary: {e}')
+
+
+@work_summary_cli.command('retry')
+@click.option('--limit', type=int, default=10000, show_default=True, help='so ngay toi da tinh lai')
+def retry_work_summary(limit):
+    """
+    recompute the days left in daily_work_summary_pending by failed refreshes
+    """
+    from app.extensions import db
+    from app.models import Daily_work_summary_pending
+    from app.utils.work_day_summary import retry_work_day_summaries
+
+    written = retry_work_day_summaries(older_than=0, limit=limit)
+    remaining = db.session.execute(db.select(db.func.count()).select_from(Daily_work_summary_pending)).scalar()
+    click.echo(f'rewrote daily_work_summary: {written} rows, {remaining} days still pending')
+
+
+def parse_month_option(value):
+    try:
+        return datetime.strptime(value, '%Y-%m')
+    except ValueError:
+        raise click.BadParameter('dinh dang month khong hop le, su dung YYYY-MM')
+
+
+@attendance_logs_cli.command('partitions')
+def list_attendance_partitions():
+    """
+    list the monthly partitions of attendance_logs (mysql)
+    """
+    from app.utils.attendance_partitions import partitioning_supported, list_partitions
+
+    if not partitioning_supported():
+        click.echo('attendance_logs is not partitioned on this database')
+        return
+    for partition in list_partitions():
+        upper_bound = partition['upper_bound'].strftime('%Y-%m-%d') if partition['upper_bound'] else 'MAXVALUE'
+        click.echo(f"{partition['name']}\t< {upper_bound}\t~{partition['rows']} rows")
+
+
+@attendance_logs_cli.command('add-partitions')
+@click.option('--months-ahead', type=int, help='so thang tuong lai, mac dinh ATTENDANCE_PARTITION_MONTHS_AHEAD')
+def add_attendance_partitions(months_ahead):
+    """
+    create the partitions of the coming months (mysql)
+    """
+    from flask import current_app
+    from app.utils.attendance_partitions import ensure_future_partitions
+
+    if months_ahead is None:
+        months_ahead = current_app.config['ATTENDANCE_PARTITION_MONTHS_AHEAD']
+    try:
+        created = ensure_future_partitions(months_ahead)
+        click.echo(f"created partitions: {', '.join(created) if created else 'none'}")
+    except Exception as e:
+        raise click.ClickException(f'failed to add partitions: {e}')
+
+
+@attendance_logs_cli.command('archive')
+@click.option('--month', 'month_str', help='chi archive thang nay (YYYY-MM), mac dinh moi thang qua han luu tru')
+@click.option('--dry-run', is_flag=True, help='chi dem so log se duoc archive')
+def archive_attendance_logs(month_str, dry_run):
+    """
+    move months older than ATTENDANCE_RETENTION_MONTHS to parquet files (run monthly)
+    """
+    from flask import current_app
+    from app.extensions import db
+    from app.utils.attendance_archive import archive_boundary, archivable_months, archive_month
+    from app.utils.attendance_partitions import ensure_future_partitions
+
+    boundary = archive_boundary()
+    if month_str:
+        month = parse_month_option(month_str)
+        if month >= boundary:
+            raise click.BadParameter(f'chi archive duoc cac thang truoc {boundary:%Y-%m}', param_hint='--month')
+        months = [month]
+    else:
+        months = archivable_months(boundary)
+
+    try:
+        if not dry_run:
+            # job chạy hằng tháng: tạo luôn partition cho các tháng sắp tới
+            created = ensure_future_partitions(current_app.config['ATTENDANCE_PARTITION_MONTHS_AHEAD'])
+            if created:
+                click.echo(f"created partitions: {', '.join(created)}")
+        for month in months:
+            result = archive_month(month, dry_run=dry_run)
+            if result is None:
+                continue
+            if dry_run:
+                click.echo(f"{result['month']}: {result['row_count']} rows (dry run)")
+            else:
+                click.echo(f"{result['month']}: {result['row_count']} rows -> {result['path']}")
+    except Exception as e:
+        db.session.rollback()
+        raise click.ClickException(f'failed to archive attendance logs: {e}')
+
+
+@analytics_cli.command('refresh')
+@click.option('--full', is_flag=True, help='tao lai snapshot tu dau (sau khi sua / xoa log cu)')
+def refresh_analytics(full):
+    """
+    refresh the analytics snapshot incrementally (safe to run from cron)
+    """
+    from app.extensions import db
+    from app.utils.analytics_store import analytics_store
+
+    try:
+        result = analytics_store.refresh(full=full)
+        click.echo(
+            f"analytics snapshot v{result['version']}: +{result['new_rows']} rows, "
+            f"+{result['archived_rows']} archived rows, {result['rows']} rows in {result['parts']} files"
+        )
+    except Exception as e:
+        db.session.rollback()
+        raise click.ClickException(f'failed to refresh analytics snapshot: {e}')
+
+
+def register_commands(app):
+    app.cli.add_command(work_summary_cli)
+    app.cli.add_command(attendance_logs_cli)
+    app.cli.add_command(analytics_cli)
@@ -16,4 +16,136 @@ class Config:
     MQTT_USERNAME = os.environ.get('MQTT_USERNAME')
     MQTT_PASSWORD = os.environ.get('MQTT_PASSWORD')
     MQTT_KEEPALIVE = int(os.environ.get('MQTT_KEEPALIVE', 60))
-    MQTT_TLS_ENABLED = os.environ.get('MQTT_TLS_ENABLED', 'False').lower() == 'true'
\ No newline at end of file
+    MQTT_TLS_ENABLED = os.environ.get('MQTT_TLS_ENABLED', 'False').lower() == 'true'
+    # process nào subscribe và xử lý message mqtt: 'auto' (reloader child của dev server), 'true', 'false'
+    MQTT_CONSUMER_ENABLED = os.environ.get('MQTT_CONSUMER_ENABLED', 'auto').lower()
+    # shared subscription: các consumer cùng group chia nhau message attendance ($share/<group>/esp32/+/attendance)
+    # để trống = subscribe thường (1 consumer)
+    MQTT_SHARED_GROUP = os.environ.get('MQTT_SHARED_GROUP', '')
+    # consumer primary subscribe thêm esp32/+/control_response (không share, giữ thứ tự lệnh theo device)
+    MQTT_CONSUMER_PRIMARY = os.environ.get('MQTT_CONSUMER_PRIMARY', 'True').lower() == 'true'
+    # url database cho async_mqtt_consumer.py, để trống = suy ra từ DATABASE_URL (pymysql -> aiomysql)
+    ASYNC_DATABASE_URL = os.environ.get('ASYNC_DATABASE_URL', '')
+
+    # attendance ingest queue (mqtt callback chỉ enqueue, worker ghi theo batch)
+    ATTENDANCE_QUEUE_MAXSIZE = int(os.environ.get('ATTENDANCE_QUEUE_MAXSIZE', 10000))
+    ATTENDANCE_QUEUE_WORKERS = int(os.environ.get('ATTENDANCE_QUEUE_WORKERS', 2))
+    ATTENDANCE_BATCH_SIZE = int(os.environ.get('ATTENDANCE_BATCH_SIZE', 200))
+    ATTENDANCE_FLUSH_INTERVAL = float(os.environ.get('ATTENDANCE_FLUSH_INTERVAL', 0.2))
+    ATTENDANCE_ENQUEUE_TIMEOUT = float(os.environ.get('ATTENDANCE_ENQUEUE_TIMEOUT', 1.0))
+    # chia queue theo device_id: mỗi device luôn do cùng 1 worker xử lý (giữ thứ tự theo device)
+    ATTENDANCE_QUEUE_PARTITION_BY_DEVICE = os.environ.get('ATTENDANCE_QUEUE_PARTITION_BY_DEVICE', 'True').lower() == 'true'
+    # thời điểm phản hồi esp32: sync (ghi xong mới phản hồi), queued (worker phản hồi rồi mới ghi, cần bật spool),
+    # ack-first (phản hồi ngay trong mqtt callback, log được fsync vào journal và ghi database sau)
+    ATTENDANCE_DURABILITY_MODE = os.environ.get('ATTENDANCE_DURABILITY_MODE', 'sync').lower()
+    # thư mục journal (write-ahead) của ack-first, replay khi consumer khởi động; mỗi process ghi vào thư mục con <hostname>-<pid>
+    ATTENDANCE_JOURNAL_DIR = os.environ.get('ATTENDANCE_JOURNAL_DIR', 'journal')
+    ATTENDANCE_JOURNAL_SEGMENT_BYTES = int(os.environ.get('ATTENDANCE_JOURNAL_SEGMENT_BYTES', 4 * 1024 * 1024))
+    # spool cục bộ khi database lỗi / chậm: log được fsync vào ATTENDANCE_SPOOL_DIR và replay khi database ổn định
+    ATTENDANCE_SPOOL_ENABLED = os.environ.get('ATTENDANCE_SPOOL_ENABLED', 'True').lower() == 'true'
+    ATTENDANCE_SPOOL_DIR = os.environ.get('ATTENDANCE_SPOOL_DIR', 'spool')
+    # ghi database chậm hơn ngân sách này (giây) thì chuyển sang spool trong ATTENDANCE_SPOOL_COOLDOWN giây
+    ATTENDANCE_DB_LATENCY_BUDGET = float(os.environ.get('ATTENDANCE_DB_LATENCY_BUDGET', 2.0))
+    ATTENDANCE_SPOOL_COOLDOWN = float(os.environ.get('ATTENDANCE_SPOOL_COOLDOWN', 10.0))
+    ATTENDANCE_SPOOL_REPLAY_INTERVAL = float(os.environ.get('ATTENDANCE_SPOOL_REPLAY_INTERVAL', 5.0))
+
+    # chu kỳ (giây) ghi last_seen của các device xuống database
+    DEVICE_HEARTBEAT_FLUSH_INTERVAL = float(os.environ.get('DEVICE_HEARTBEAT_FLUSH_INTERVAL', 5.0))
+
+    # chu kỳ (giây) nạp lại cache rfid -> user / device -> rfid_enabled cho luồng quẹt thẻ,
+    # là thời gian cache cũ tối đa khi mất message invalidation
+    SWIPE_CACHE_REFRESH_INTERVAL = float(os.environ.get('SWIPE_CACHE_REFRESH_INTERVAL', 10))
+    # topic mqtt báo các process khác xoá cache user / device sau khi crud ghi database
+    CACHE_INVALIDATION_TOPIC = os.environ.get('CACHE_INVALIDATION_TOPIC', 'server/cache/invalidate')
+
+    # đọc các ngày đã kết thúc từ bảng daily_work_summary (chạy `flask work-summary rebuild` trước khi bật)
+    WORK_SUMMARY_ENABLED = os.environ.get('WORK_SUMMARY_ENABLED', 'False').lower() == 'true'
+    # chu kỳ (giây) quét lại các ngày có refresh bị lỗi (daily_work_summary_pending) và số ngày mỗi lượt
+    WORK_SUMMARY_RETRY_INTERVAL = float(os.environ.get('WORK_SUMMARY_RETRY_INTERVAL', 30))
+    WORK_SUMMARY_RETRY_BATCH = int(os.environ.get('WORK_SUMMARY_RETRY_BATCH', 500))
+    # tính lại bảng tổng hợp trong thread riêng, response của swipe / ack của batch không chờ (False = tính ngay sau commit)
+    WORK_SUMMARY_BACKGROUND_REFRESH = os.environ.get('WORK_SUMMARY_BACKGROUND_REFRESH', 'True').lower() == 'true'
+
+    # offline-sync theo batch (esp32/<device_id>/attendance_batch, POST /api/attendance-logs/batch)
+    ATTENDANCE_BATCH_QUEUE_MAXSIZE = int(os.environ.get('ATTENDANCE_BATCH_QUEUE_MAXSIZE', 100))
+    ATTENDANCE_BATCH_MAX_SWIPES = int(os.environ.get('ATTENDANCE_BATCH_MAX_SWIPES', 5000))
+    # token của thiết bị cho POST /api/attendance-logs/batch: "device001:token1,device002:token2"
+    DEVICE_API_TOKENS = os.environ.get('DEVICE_API_TOKENS', '')
+    # token dịch vụ (gateway đồng bộ) gửi batch thay cho mọi thiết bị (rỗng = tắt)
+    DEVICE_SERVICE_TOKEN = os.environ.get('DEVICE_SERVICE_TOKEN', '')
+
+    # số lượng / thời gian (giây) giữ khoá (rfid_uid, device_id, timestamp) đã lưu để bỏ swipe trùng
+    ATTENDANCE_DEDUP_CACHE_SIZE = int(os.environ.get('ATTENDANCE_DEDUP_CACHE_SIZE', 50000))
+    ATTENDANCE_DEDUP_TTL = float(os.environ.get('ATTENDANCE_DEDUP_TTL', 86400))
+
+    # cache xác thực: token đã verify và thông tin quyền (principal) của user theo id
+    AUTH_TOKEN_CACHE_SIZE = int(os.environ.get('AUTH_TOKEN_CACHE_SIZE', 10000))
+    AUTH_TOKEN_CACHE_TTL = float(os.environ.get('AUTH_TOKEN_CACHE_TTL', 300))
+    AUTH_PRINCIPAL_CACHE_SIZE = int(os.environ.get('AUTH_PRINCIPAL_CACHE_SIZE', 10000))
+    AUTH_PRINCIPAL_CACHE_TTL = float(os.environ.get('AUTH_PRINCIPAL_CACHE_TTL', 30))
+
+    # process pool hash password cho /api/login (-1 = số cpu, 0 = chạy trực tiếp trên thread request)
+    # pool dùng 'spawn' nên chỉ bật khi chạy bằng wsgi server, không bật với `python app.py`
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 0))
+    # số request login tối đa đang hash / chờ hash, quá thời gian chờ thì trả về 503
+    PASSWORD_HASH_QUEUE_SIZE = int(os.environ.get('PASSWORD_HASH_QUEUE_SIZE', 64))
+    PASSWORD_HASH_QUEUE_TIMEOUT = float(os.environ.get('PASSWORD_HASH_QUEUE_TIMEOUT', 2.0))
+    # opt-in: hash lại password theo method này khi login thành công (vd 'pbkdf2:sha256:100000'), rỗng = tắt
+    PASSWORD_REHASH_METHOD = os.environ.get('PASSWORD_REHASH_METHOD', '')
+
+    # opt-in: GET /metrics (prometheus) và đo độ trễ http theo route
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'False').lower() == 'true'
+    # bearer token cho prometheus scrape /metrics (rỗng = chỉ admin jwt)
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+    # port http riêng phục vụ /metrics và /api/mqtt/ingest-stats trong process mqtt_consumer.py (0 = tắt)
+    METRICS_PORT = int(os.environ.get('METRICS_PORT', 0))
+    # http worker không chạy hàng đợi ingest: /api/mqtt/ingest-stats chuyển tiếp tới url này của consumer
+    # (vd http://mqtt-consumer:9100/api/mqtt/ingest-stats), để trống = trả về 503
+    INGEST_STATS_URL = os.environ.get('INGEST_STATS_URL', '')
+    INGEST_STATS_TIMEOUT = float(os.environ.get('INGEST_STATS_TIMEOUT', 2.0))
+
+    # logging: mức log (DEBUG/INFO/WARNING/ERROR), định dạng json hoặc text
+    LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+    LOG_FORMAT = os.environ.get('LOG_FORMAT', 'json').lower()
+    # tỉ lệ giữ lại các dòng debug theo từng message (vd user not found), 1.0 = giữ hết
+    LOG_DEBUG_SAMPLE_RATE = float(os.environ.get('LOG_DEBUG_SAMPLE_RATE', 0.01))
+    # số dòng log chờ ghi tối đa, đầy thì bỏ dòng mới (không chặn luồng xử lý)
+    LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', 10000))
+
+    # opt-in: đếm query / thời gian db theo từng request và mqtt message, ghi slow query log
+    DB_PROFILER_ENABLED = os.environ.get('DB_PROFILER_ENABLED', 'False').lower() == 'true'
+    # trả header X-DB-Query-Count / X-DB-Time-Ms cho mọi request (luôn bật khi app chạy debug)
+    DB_PROFILER_HEADERS = os.environ.get('DB_PROFILER_HEADERS', 'False').lower() == 'true'
+    # tỉ lệ request / mqtt message được ghi log 'db profile' (0 = không lấy mẫu)
+    DB_PROFILER_SAMPLE_RATE = float(os.environ.get('DB_PROFILER_SAMPLE_RATE', 0.0))
+    # số câu chậm nhất giữ lại trong mỗi profile
+    DB_PROFILER_TOP_QUERIES = int(os.environ.get('DB_PROFILER_TOP_QUERIES', 5))
+    # câu sql chạy lâu hơn ngưỡng này (ms) được ghi vào slow query log
+    DB_SLOW_QUERY_MS = float(os.environ.get('DB_SLOW_QUERY_MS', 200))
+    # số câu gần nhất giữ trong slow query log (GET /api/debug/slow-queries)
+    DB_SLOW_QUERY_LOG_SIZE = int(os.environ.get('DB_SLOW_QUERY_LOG_SIZE', 200))
+
+    # số dòng đọc mỗi lần từ server-side cursor khi export attendance logs
+    ATTENDANCE_EXPORT_CHUNK_SIZE = int(os.environ.get('ATTENDANCE_EXPORT_CHUNK_SIZE', 1000))
+
+    # archive attendance_logs: số tháng giữ trong database (tính cả tháng hiện tại), các tháng cũ hơn
+    # được chuyển ra file parquet trong ATTENDANCE_ARCHIVE_DIR (flask attendance-logs archive)
+    ATTENDANCE_RETENTION_MONTHS = int(os.environ.get('ATTENDANCE_RETENTION_MONTHS', 12))
+    ATTENDANCE_ARCHIVE_DIR = os.environ.get('ATTENDANCE_ARCHIVE_DIR', 'archive')
+    # số dòng mỗi row group khi ghi file parquet
+    ATTENDANCE_ARCHIVE_CHUNK_SIZE = int(os.environ.get('ATTENDANCE_ARCHIVE_CHUNK_SIZE', 50000))
+    # mysql: số tháng tương lai luôn có sẵn partition riêng
+    ATTENDANCE_PARTITION_MONTHS_AHEAD = int(os.environ.get('ATTENDANCE_PARTITION_MONTHS_AHEAD', 3))
+
+    # analytics: duckdb trên snapshot parquet của attendance_logs / users / devices trong ANALYTICS_DIR (`flask analytics refresh`)
+    ANALYTICS_DIR = os.environ.get('ANALYTICS_DIR', 'analytics')
+    # chu kỳ refresh snapshot (giây) bằng thread trong mqtt_consumer.py, 0 = tắt (chỉ refresh bằng cli / cron)
+    ANALYTICS_REFRESH_INTERVAL = float(os.environ.get('ANALYTICS_REFRESH_INTERVAL', 0))
+    # log ghi trong số giây gần nhất chưa được đưa vào snapshot (chờ các transaction đang ghi commit xong)
+    ANALYTICS_SETTLE_SECONDS = int(os.environ.get('ANALYTICS_SETTLE_SECONDS', 60))
+    # số file parquet tối đa của attendance_logs trong snapshot, nhiều hơn thì gộp lại thành 1 file
+    ANALYTICS_MAX_PARTS = int(os.environ.get('ANALYTICS_MAX_PARTS', 48))
+    # số thread duckdb dùng cho mỗi query analytics (không tranh cpu với request khác)
+    ANALYTICS_DUCKDB_THREADS = int(os.environ.get('ANALYTICS_DUCKDB_THREADS', 2))
+    # quẹt thẻ thành công đầu tiên trong ngày sau giờ này (HH:MM) được tính là đi muộn
+    ANALYTICS_LATE_AFTER = os.environ.get('ANALYTICS_LATE_AFTER', '08:30')
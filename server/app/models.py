@@ -58,6 +58,10 @@ class User(db.Model):
 # - code: varchar, mã trạng thái
 # - error_code: varchar, mã lỗi
 # - created_at: datetime, server time
+# - unique (rfid_uid, timestamp, device_id): chống lưu trùng, đồng thời là index cho filter theo user + ngày/tháng
+# - index (device_id, timestamp) cho các filter theo thiết bị
+# - mysql: partition theo tháng (RANGE COLUMNS(timestamp)), primary key thực tế là (id, timestamp)
+#   vì mọi unique key của bảng partition phải chứa cột partition; id vẫn duy nhất nên orm giữ id làm khoá
 
 # model Device:
 # - id: int, primary key
@@ -101,6 +105,11 @@ class Device(db.Model):
 
 class Attendance_logs(db.Model):
     __tablename__ = 'attendance_logs'
+    __table_args__ = (
+        # 1 lần quẹt thẻ chỉ được lưu 1 lần (chống trùng khi esp32 gửi lại / offline sync)
+        db.UniqueConstraint('rfid_uid', 'timestamp', 'device_id', name='uq_attendance_logs_rfid_uid_timestamp_device_id'),
+        db.Index('ix_attendance_logs_device_id_timestamp', 'device_id', 'timestamp'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     rfid_uid = db.Column(db.String(50), nullable=False, index=True)  
@@ -120,3 +129,94 @@ class Attendance_logs(db.Model):
             'error_code': self.error_code, # 'USER_NOT_FOUND', 'USER_FORBIDDEN', 'UNKNOWN_ERROR'
             'created_at': self.created_at.isoformat()
         }
+
+
+# model Attendance_archive:
+# - id: int, primary key
+# - month: date, ngày đầu tháng của các log trong file
+# - path: varchar, file parquet (đường dẫn tương đối trong ATTENDANCE_ARCHIVE_DIR), unique
+# - row_count: int, số log trong file
+# - min_id, max_id: int, khoảng id của các log trong file
+# - size_bytes: int, dung lượng file
+# - archived_at: datetime, thời điểm archive
+# - 1 tháng có thể có nhiều file (log offline sync đến muộn được archive thêm)
+
+class Attendance_archive(db.Model):
+    __tablename__ = 'attendance_archives'
+
+    id = db.Column(db.Integer, primary_key=True)
+    month = db.Column(db.Date, nullable=False, index=True)
+    path = db.Column(db.String(500), unique=True, nullable=False)
+    row_count = db.Column(db.Integer, nullable=False)
+    min_id = db.Column(db.BigInteger, nullable=False)
+    max_id = db.Column(db.BigInteger, nullable=False)
+    size_bytes = db.Column(db.BigInteger, nullable=False)
+    archived_at = db.Column(db.DateTime, server_default=db.func.now())
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'month': self.month.strftime('%Y-%m'),
+            'path': self.path,
+            'row_count': self.row_count,
+            'min_id': self.min_id,
+            'max_id': self.max_id,
+            'size_bytes': self.size_bytes,
+            'archived_at': self.archived_at.isoformat() if self.archived_at else None
+        }
+
+
+# model Daily_work_summary:
+# - id: int, primary key
+# - rfid_uid: varchar, rfid uid của nhân viên
+# - date: date, ngày làm việc
+# - total_times: float, tổng số giờ làm việc trong ngày
+# - type: float, 0 / 0.5 / 1
+# - times: json, danh sách [HH:MM, code] trong ngày
+# - ot_times: json, danh sách [HH:MM, code] sau 18:00
+# - updated_at: datetime, lần cuối tính lại
+# - unique (rfid_uid, date)
+
+class Daily_work_summary(db.Model):
+    __tablename__ = 'daily_work_summary'
+    __table_args__ = (
+        db.UniqueConstraint('rfid_uid', 'date', name='uq_daily_work_summary_rfid_uid_date'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    rfid_uid = db.Column(db.String(50), nullable=False)
+    date = db.Column(db.Date, nullable=False, index=True)
+    total_times = db.Column(db.Float, nullable=False, default=0.0)
+    type = db.Column(db.Float, nullable=False, default=0)
+    times = db.Column(db.JSON, nullable=False)
+    ot_times = db.Column(db.JSON, nullable=False)
+    updated_at = db.Column(db.DateTime, server_default=db.func.now(), onupdate=db.func.now())
+
+    def to_work_data(self):
+        """
+        same structure as calculate_work_day_data (plus date)
+        """
+        # type lưu dạng float, trả về 0 / 0.5 / 1 giống calculate_work_day_data
+        work_type = int(self.type) if float(self.type).is_integer() else self.type
+        return {
+            'times': self.times,
+            'total_times': self.total_times,
+            'type': work_type,
+            'ot_times': self.ot_times,
+            'date': self.date.strftime('%Y-%m-%d')
+        }
+
+
+# model Daily_work_summary_pending:
+# - rfid_uid, date: primary key, ngày cần tính lại daily_work_summary
+# - version: int, tăng mỗi lần ngày được đánh dấu lại
+# - marked_at: datetime, lần đánh dấu cuối
+# - được ghi cùng transaction với log, chỉ xoá sau khi dòng tổng hợp đã được ghi lại
+
+class Daily_work_summary_pending(db.Model):
+    __tablename__ = 'daily_work_summary_pending'
+
+    rfid_uid = db.Column(db.String(50), primary_key=True)
+    date = db.Column(db.Date, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=1)
+    marked_at = db.Column(db.DateTime, nullable=False, index=True)
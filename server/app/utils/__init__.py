@@ -1 +1 @@
-from .paginator import paginate_query
\ No newline at end of file
+from .paginator import paginate_query, paginate_merged, InvalidCursorError
\ No newline at end of file
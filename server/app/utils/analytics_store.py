@@ -0,0 +1,384 @@
+# app/utils/analytics_store.py
+import atexit
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from flask import current_app
+from app.extensions import db
+from app.models import Attendance_logs, Attendance_archive, User, Device
+from app.utils.attendance_archive import ARCHIVE_COLUMNS, write_logs_parquet
+from app.utils.log import get_logger
+
+try:
+    import fcntl
+except ImportError:
+    # windows: không khoá file, chỉ chạy 1 refresher tại 1 thời điểm
+    fcntl = None
+
+
+logger = get_logger(__name__)
+
+STATE_FILE = 'state.json'
+USER_COLUMNS = ('id', 'rfid_uid', 'full_name', 'is_active', 'is_admin')
+DEVICE_COLUMNS = ('id', 'device_id', 'name', 'is_active')
+
+
+class AnalyticsNotReadyError(RuntimeError):
+    """
+    no snapshot has been written yet (run `flask analytics refresh`)
+    """
+
+
+def empty_state():
+    return {
+        'version': 0,
+        'refreshed_at': None,
+        'max_id': 0,
+        'rows': 0,
+        'log_parts': [],
+        'archives': [],
+        'users': None,
+        'devices': None,
+        'retired': []
+    }
+
+
+def parquet_source(paths):
+    """
+    read_parquet([...]) over the given files as sql text (paths are built by the store, quoted anyway)
+    """
+    quoted = ', '.join("'" + path.replace("'", "''") + "'" for path in paths)
+    return f'read_parquet([{quoted}])'
+
+
+class AnalyticsStore:
+    """
+    embedded columnar store for historical analytics: parquet snapshots of
+    attendance_logs, users and devices queried in-process with duckdb
+
+    - refresh() appends the logs inserted since the previous snapshot as a
+      new parquet part (id watermark), folds in months moved to the parquet
+      archive and rewrites the small users / devices tables; it runs from
+      `flask analytics refresh` or the refresher thread of mqtt_consumer.py
+    - query() runs sql on a duckdb connection whose views point at the
+      current snapshot files, analytics never touch the ingest database
+
+    files replaced by a refresh are deleted by the next one, so readers
+    holding the previous views keep working in between
+    """
+
+    def __init__(self):
+        self.app = None
+        self.directory = 'analytics'
+        self.threads = 2
+        self._conn = None
+        self._conn_lock = threading.Lock()
+        self._views_mtime = None
+        self._state = None
+        self._refresh_thread_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def init_app(self, app):
+        self.app = app
+        self.directory = app.config['ANALYTICS_DIR']
+        self.threads = app.config['ANALYTICS_DUCKDB_THREADS']
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def load_state(self):
+        """
+        current snapshot state, None before the first refresh
+        """
+        try:
+            with open(self.path(STATE_FILE)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    # ---------- refresh ----------
+
+    def refresh(self, full=False):
+        """
+        bring the snapshot up to date (requires app context); full=True rebuilds it from scratch
+
+        returns dict with the new version and the rows added
+        """
+        config = current_app.config
+        started = time.perf_counter()
+        os.makedirs(self.path('attendance_logs'), exist_ok=True)
+
+        with self._refresh_lock():
+            previous = self.load_state() or empty_state()
+            version = previous['version'] + 1
+            state = empty_state() if full else dict(previous)
+            state['version'] = version
+            retired = []
+            if full:
+                retired.extend(previous['log_parts'])
+                retired.extend(name for name in (previous['users'], previous['devices']) if name)
+            state['log_parts'] = list(state['log_parts'])
+            state['archives'] = list(state['archives'])
+
+            new_rows = self._append_new_logs(state, config)
+            archived_rows = self._fold_archives(state)
+
+            if not state['log_parts']:
+                # view cần ít nhất 1 file: ghi 1 part rỗng đúng schema
+                part, _ = self._write_logs_part(iter(()), f'attendance_logs/v{version}-empty.parquet', 1)
+                state['log_parts'].append(part)
+
+            compacted = False
+            if len(state['log_parts']) > config['ANALYTICS_MAX_PARTS']:
+                retired.extend(state['log_parts'])
+                state['log_parts'] = [self._compact(state['log_parts'], f'attendance_logs/v{version}-compacted.parquet')]
+                compacted = True
+
+            for table, model, columns in (('users', User, USER_COLUMNS), ('devices', Device, DEVICE_COLUMNS)):
+                if state[table]:
+                    retired.append(state[table])
+                state[table] = self._write_table_snapshot(model, columns, f'{table}-v{version}.parquet')
+
+            state['rows'] = state['rows'] + new_rows + archived_rows
+            state['refreshed_at'] = datetime.now().isoformat(timespec='seconds')
+            state['retired'] = sorted(set(retired) - set(state['log_parts']))
+            self._write_state(state)
+
+            # file bị thay ở lần refresh trước: reader đã chuyển sang view mới nên xoá được
+            for name in previous['retired']:
+                try:
+                    os.remove(self.path(name))
+                except FileNotFoundError:
+                    pass
+
+        summary = {
+            'version': version,
+            'new_rows': new_rows,
+            'archived_rows': archived_rows,
+            'rows': state['rows'],
+            'max_id': state['max_id'],
+            'parts': len(state['log_parts']),
+            'compacted': compacted,
+            'seconds': round(time.perf_counter() - started, 3)
+        }
+        logger.info('analytics snapshot refreshed', **summary)
+        return summary
+
+    @contextmanager
+    def _refresh_lock(self):
+        # khoá trong process (thread refresher) và giữa các process (cli + mqtt_consumer.py)
+        with self._refresh_thread_lock:
+            with open(self.path('.refresh.lock'), 'w') as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                yield
+
+    def _settled_watermark(self, max_id, settle_seconds):
+        """
+        highest id such that every log in (max_id, id] is older than settle_seconds
+
+        ids are allocated before commit, so a recent transaction may still
+        commit lower ids than logs already visible; stopping below the first
+        recent log keeps the watermark from skipping over them
+        """
+        now = db.session.execute(db.select(db.func.now())).scalar()
+        if isinstance(now, str):
+            # sqlite: CURRENT_TIMESTAMP trả về chuỗi
+            now = datetime.fromisoformat(now)
+        cutoff = now - timedelta(seconds=settle_seconds)
+
+        unsettled = db.session.execute(
+            db.select(db.func.min(Attendance_logs.id))
+            .where(Attendance_logs.id > max_id, Attendance_logs.created_at >= cutoff)
+        ).scalar()
+        if unsettled is not None:
+            return unsettled - 1
+        latest = db.session.execute(
+            db.select(db.func.max(Attendance_logs.id)).where(Attendance_logs.id > max_id)
+        ).scalar()
+        return latest if latest is not None else max_id
+
+    def _append_new_logs(self, state, config):
+        watermark = self._settled_watermark(state['max_id'], config['ANALYTICS_SETTLE_SECONDS'])
+        if watermark <= state['max_id']:
+            return 0
+
+        chunk_size = config['ATTENDANCE_ARCHIVE_CHUNK_SIZE']
+        rows = db.session.execute(
+            db.select(*[getattr(Attendance_logs, name) for name in ARCHIVE_COLUMNS])
+            .where(Attendance_logs.id > state['max_id'], Attendance_logs.id <= watermark)
+            .order_by(Attendance_logs.id.asc())
+            .execution_options(yield_per=chunk_size)
+        )
+        name = f"attendance_logs/v{state['version']}-{state['max_id'] + 1}-{watermark}.parquet"
+        part, row_count = self._write_logs_part(rows, name, chunk_size)
+        if row_count:
+            state['log_parts'].append(part)
+        else:
+            os.remove(self.path(part))
+        state['max_id'] = watermark
+        return row_count
+
+    def _write_logs_part(self, rows, name, chunk_size):
+        path = self.path(name)
+        tmp_path = path + '.tmp'
+        try:
+            row_count, _ = write_logs_parquet(rows, tmp_path, chunk_size)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return name, row_count
+
+    def _fold_archives(self, state):
+        """
+        add the logs of archive files not seen yet that the snapshot does not already hold
+
+        logs archived after they were snapshotted are skipped by id, logs
+        archived before the first snapshot (or before analytics was enabled)
+        are copied from the archive file
+        """
+        catalog = db.session.execute(
+            db.select(Attendance_archive.id, Attendance_archive.path, Attendance_archive.min_id, Attendance_archive.max_id)
+            .order_by(Attendance_archive.id.asc())
+        ).all()
+        known = set(state['archives'])
+        pending = [archive for archive in catalog if archive.path not in known]
+        if not pending:
+            return 0
+
+        import duckdb
+
+        archive_dir = current_app.config['ATTENDANCE_ARCHIVE_DIR']
+        added = 0
+        with duckdb.connect(config={'threads': self.threads}) as conn:
+            for archive in pending:
+                source = parquet_source([os.path.join(archive_dir, archive.path)])
+                conn.execute(f'CREATE OR REPLACE TEMP TABLE archived AS SELECT * FROM {source}')
+                if state['log_parts']:
+                    conn.execute(
+                        f"DELETE FROM archived WHERE id IN (SELECT id FROM {parquet_source(self._files(state['log_parts']))} "
+                        'WHERE id BETWEEN ? AND ?)',
+                        [archive.min_id, archive.max_id]
+                    )
+                row_count = conn.execute('SELECT count(*) FROM archived').fetchone()[0]
+                if row_count:
+                    name = f"attendance_logs/v{state['version']}-archive-{archive.id}.parquet"
+                    self._copy_to_parquet(conn, 'SELECT * FROM archived ORDER BY timestamp', name)
+                    state['log_parts'].append(name)
+                    added += row_count
+                state['archives'].append(archive.path)
+        return added
+
+    def _compact(self, parts, name):
+        import duckdb
+
+        with duckdb.connect(config={'threads': self.threads}) as conn:
+            self._copy_to_parquet(conn, f'SELECT * FROM {parquet_source(self._files(parts))} ORDER BY timestamp', name)
+        return name
+
+    def _copy_to_parquet(self, conn, select_sql, name):
+        path = self.path(name)
+        tmp_path = path + '.tmp'
+        escaped = tmp_path.replace("'", "''")
+        conn.execute(f"COPY ({select_sql}) TO '{escaped}' (FORMAT parquet, COMPRESSION zstd)")
+        os.replace(tmp_path, path)
+
+    def _write_table_snapshot(self, model, columns, name):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        rows = db.session.execute(db.select(*[getattr(model, column) for column in columns])).all()
+        table = pa.Table.from_pylist([dict(zip(columns, row)) for row in rows])
+        if not rows:
+            table = pa.table({column: pa.array([], pa.string()) for column in columns})
+        path = self.path(name)
+        pq.write_table(table, path + '.tmp', compression='zstd')
+        os.replace(path + '.tmp', path)
+        return name
+
+    def _write_state(self, state):
+        path = self.path(STATE_FILE)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(state, f, indent=1)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + '.tmp', path)
+
+    def _files(self, names):
+        return [self.path(name) for name in names]
+
+    # ---------- query ----------
+
+    def _cursor(self):
+        """
+        cursor on the shared duckdb connection, views re-pointed when state.json changes
+        """
+        try:
+            mtime = os.stat(self.path(STATE_FILE)).st_mtime_ns
+        except FileNotFoundError:
+            raise AnalyticsNotReadyError('chua co du lieu analytics, chay flask analytics refresh')
+
+        with self._conn_lock:
+            if self._conn is None:
+                import duckdb
+                self._conn = duckdb.connect(config={'threads': self.threads})
+            if mtime != self._views_mtime:
+                state = self.load_state()
+                self._conn.execute(
+                    f"CREATE OR REPLACE VIEW attendance_logs AS SELECT * FROM {parquet_source(self._files(state['log_parts']))}"
+                )
+                self._conn.execute(f"CREATE OR REPLACE VIEW users AS SELECT * FROM {parquet_source(self._files([state['users']]))}")
+                self._conn.execute(f"CREATE OR REPLACE VIEW devices AS SELECT * FROM {parquet_source(self._files([state['devices']]))}")
+                self._state, self._views_mtime = state, mtime
+            return self._conn.cursor(), self._state
+
+    def query(self, sql, params=None):
+        """
+        run sql against the attendance_logs / users / devices views
+
+        returns (list of dict rows, snapshot state)
+        """
+        cursor, state = self._cursor()
+        try:
+            result = cursor.execute(sql, params or [])
+            columns = [column[0] for column in result.description]
+            return [dict(zip(columns, row)) for row in result.fetchall()], state
+        finally:
+            cursor.close()
+
+    # ---------- background refresher ----------
+
+    def start_refresher(self, interval):
+        """
+        refresh now and then every `interval` seconds on a daemon thread (one process only)
+        """
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, args=(interval,), name='analytics-refresher', daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(30)
+
+    def _run(self, interval):
+        while not self._stop_event.is_set():
+            with self.app.app_context():
+                try:
+                    self.refresh()
+                except Exception as e:
+                    db.session.rollback()
+                    logger.error('analytics refresh failed', error=str(e))
+            if self._stop_event.wait(interval):
+                break
+
+
+analytics_store = AnalyticsStore()
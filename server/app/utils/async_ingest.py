@@ -0,0 +1,587 @@
+# app/utils/async_ingest.py
+import asyncio
+import json
+import os
+import time
+
+import aiomqtt
+from flask import Flask
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from app.extensions import db
+from app.models import Device
+from app.api.mqtt_handlers import get_subscription_topics
+from app.utils.attendance_ingest import (
+    parse_swipe, parse_swipe_batch, insert_ignore_attendance_logs, evaluate_swipes,
+    build_batch_ack, count_saved_rows, observe_response_latency, check_durability_mode
+)
+from app.utils.attendance_spool import AttendanceSpool
+from app.utils.auth_cache import auth_cache
+from app.utils.cache_invalidation import PROCESS_ID, apply_cache_invalidation
+from app.utils.device_heartbeat import get_heartbeat_tracker
+from app.utils.metrics import metrics, mqtt_messages, db_commit_seconds, start_metrics_server
+from app.utils.swipe_cache import swipe_cache
+from app.utils.swipe_dedup import recent_swipes
+from app.utils.swipe_journal import SwipeJournal
+from app.utils.work_day_summary import (
+    summary_key, clean_summary_keys, pending_upsert_statement, pending_rows, queue_work_day_summaries
+)
+from app.utils.log import get_logger
+
+
+logger = get_logger(__name__)
+
+
+# driver sync -> driver async tương ứng
+ASYNC_DRIVERS = {
+    'mysql': 'mysql+aiomysql',
+    'mysql+pymysql': 'mysql+aiomysql',
+    'mysql+mysqldb': 'mysql+aiomysql',
+    'sqlite': 'sqlite+aiosqlite',
+    'sqlite+pysqlite': 'sqlite+aiosqlite',
+}
+
+# sentinel báo cho writer dừng sau khi đã drain hết queue
+_STOP = object()
+
+
+def to_async_database_url(url):
+    """
+    mysql+pymysql://... -> mysql+aiomysql://... (sqlite -> sqlite+aiosqlite)
+    """
+    scheme, rest = url.split('://', 1)
+    return f'{ASYNC_DRIVERS.get(scheme, scheme)}://{rest}'
+
+
+def create_ingest_app(config_object):
+    """
+    flask app of the asyncio consumer: flask-sqlalchemy, the caches of the
+    shared ingest functions and GET /metrics, without create_app()'s
+    flask-mqtt connection (aiomqtt owns the broker connection)
+    """
+    app = Flask('app')
+    app.config.from_object(config_object)
+    db.init_app(app)
+    swipe_cache.init_app(app)
+    recent_swipes.init_app(app)
+    auth_cache.init_app(app)
+    metrics.init_app(app)
+    return app
+
+
+class AsyncIngestService:
+    """
+    asyncio alternative to the paho / flask_mqtt consumer (mqtt_handlers.py)
+
+    one process, one event loop: an async mqtt client receives messages from
+    every device, swipes are queued per device_id partition and written by
+    writer tasks in batches through an async mysql driver, so slow database
+    round trips never block message reception. topics and payloads are
+    exactly the ones documented in mqtt_handlers.py
+
+    only the attendance inserts and device updates go through the async
+    driver; the swipe cache, cache invalidation, device heartbeats, daily
+    work summaries, journal, spool and metrics are the ones of
+    attendance_ingest.py and mqtt_consumer.py, run on worker threads with
+    the app context of app (create_ingest_app). every
+    ATTENDANCE_DURABILITY_MODE is supported
+    """
+
+    def __init__(self, app):
+        config = app.config
+        check_durability_mode(config)
+        self.app = app
+        self.config = config
+        self.engine = create_async_engine(
+            config.get('ASYNC_DATABASE_URL') or to_async_database_url(config['SQLALCHEMY_DATABASE_URI']),
+            pool_pre_ping=True
+        )
+        self.sessions = async_sessionmaker(self.engine, expire_on_commit=False)
+        self.client = None
+        self.heartbeats = get_heartbeat_tracker(app)
+
+        workers = max(1, config['ATTENDANCE_QUEUE_WORKERS'])
+        partition_size = max(1, config['ATTENDANCE_QUEUE_MAXSIZE'] // workers)
+        self._swipe_queues = [asyncio.Queue(maxsize=partition_size) for _ in range(workers)]
+        self._batch_queue = asyncio.Queue(maxsize=config['ATTENDANCE_BATCH_QUEUE_MAXSIZE'])
+        self._tasks = []
+        self._stop_event = asyncio.Event()
+        self._loop = None
+        self.journal = None
+        self.spool = None
+        self._metrics_server = None
+
+        self.stats = {
+            'messages': 0,
+            'swipes_enqueued': 0,
+            'swipes_dropped': 0,
+            'logs_saved': 0,
+            'batches_saved': 0,
+            'failed_writes': 0,
+        }
+
+    @classmethod
+    def from_config(cls, config_object):
+        """
+        build the service and its app from the flask Config class
+        """
+        return cls(create_ingest_app(config_object))
+
+    # --- vòng đời service ---
+
+    async def serve(self):
+        """
+        run until stop() is called; reconnects to the broker on failure
+        """
+        self._loop = asyncio.get_running_loop()
+        self._start_spool()
+        self._start_metrics_server()
+        self._tasks = [
+            asyncio.create_task(self._swipe_writer(swipe_queue), name=f'swipe-writer-{i}')
+            for i, swipe_queue in enumerate(self._swipe_queues)
+        ]
+        self._tasks.append(asyncio.create_task(self._batch_writer(), name='batch-writer'))
+
+        try:
+            while not self._stop_event.is_set():
+                try:
+                    await self._consume()
+                except aiomqtt.MqttError as e:
+                    self.client = None
+                    logger.warning('mqtt connection lost', error=str(e))
+                    try:
+                        await asyncio.wait_for(self._stop_event.wait(), timeout=5.0)
+                    except asyncio.TimeoutError:
+                        pass
+        finally:
+            await self._shutdown()
+
+    def stop(self):
+        self._stop_event.set()
+
+    async def _consume(self):
+        async with aiomqtt.Client(
+            hostname=self.config['MQTT_BROKER_URL'],
+            port=self.config['MQTT_BROKER_PORT'],
+            username=self.config.get('MQTT_USERNAME') or None,
+            password=self.config.get('MQTT_PASSWORD') or None,
+            keepalive=self.config['MQTT_KEEPALIVE'],
+        ) as client:
+            self.client = client
+            logger.info('connected to mqtt broker')
+            for topic in get_subscription_topics(self.config):
+                await client.subscribe(topic)
+                logger.info('subscribed to topic', topic=topic)
+
+            try:
+                await self._run_sync(swipe_cache.load)
+            except Exception as e:
+                logger.error('failed to load swipe cache', error=str(e))
+            # ghi các log còn trong journal của lần chạy trước (ack-first bị dừng giữa chừng)
+            await self._replay_journal()
+
+            stop_waiter = asyncio.create_task(self._stop_event.wait())
+            messages = aiter(client.messages)
+            try:
+                while True:
+                    next_message = asyncio.ensure_future(anext(messages))
+                    done, _ = await asyncio.wait(
+                        {next_message, stop_waiter}, return_when=asyncio.FIRST_COMPLETED
+                    )
+                    if next_message not in done:
+                        next_message.cancel()
+                        return
+                    await self._dispatch(next_message.result())
+            finally:
+                stop_waiter.cancel()
+
+    async def _shutdown(self):
+        # drain các queue rồi ghi heartbeat còn lại trước khi đóng engine
+        for swipe_queue in self._swipe_queues:
+            await swipe_queue.put(_STOP)
+        await self._batch_queue.put(_STOP)
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        await asyncio.to_thread(self.heartbeats.stop)
+        if self.journal is not None:
+            await asyncio.to_thread(self.journal.close)
+        if self.spool is not None:
+            # replayer có thể đang chờ 1 lần ghi chạy trên event loop này
+            await asyncio.to_thread(self.spool.stop)
+        if self._metrics_server is not None:
+            await asyncio.to_thread(self._metrics_server.shutdown)
+        await self.engine.dispose()
+        logger.info('async ingest stopped', **self.stats)
+
+    # --- nhận message ---
+
+    async def _dispatch(self, message):
+        """
+        route one message by topic, same contract as handle_mqtt_message
+        """
+        self.stats['messages'] += 1
+        if message.topic.value == self.config['CACHE_INVALIDATION_TOPIC']:
+            mqtt_messages.inc('cache_invalidate')
+            try:
+                apply_cache_invalidation(json.loads(message.payload))
+            except (json.JSONDecodeError, UnicodeDecodeError) as e:
+                logger.warning('invalid cache invalidation message', error=str(e))
+            return
+
+        topic_parts = message.topic.value.split('/')
+        if len(topic_parts) != 3 or topic_parts[0] != 'esp32':
+            mqtt_messages.inc('invalid')
+            logger.warning('invalid topic format', topic=message.topic.value)
+            return
+
+        device_id, topic_type = topic_parts[1], topic_parts[2]
+        mqtt_messages.inc(topic_type)
+        try:
+            payload = json.loads(message.payload)
+        except (json.JSONDecodeError, UnicodeDecodeError) as e:
+            logger.warning('json decode error', topic=message.topic.value, error=str(e))
+            return
+
+        # update device last_seen timestamp (ghi xuống db theo chu kỳ)
+        self.heartbeats.touch(device_id)
+
+        try:
+            if topic_type == 'attendance':
+                await self._enqueue_swipe(device_id, payload)
+            elif topic_type == 'attendance_batch':
+                await self._enqueue_batch(device_id, payload)
+            elif topic_type == 'control_response':
+                await self._handle_control_response(device_id, payload)
+            else:
+                logger.warning('unknown topic type', topic_type=topic_type, device_id=device_id)
+        except Exception as e:
+            logger.exception('error processing mqtt message', topic=message.topic.value)
+
+    async def _enqueue_swipe(self, device_id, payload):
+        swipe = parse_swipe(device_id, payload)
+        if not swipe:
+            return
+        # mốc thời gian nhận swipe, dùng cho metric độ trễ swipe -> response
+        swipe['received_at'] = time.perf_counter()
+
+        if self.config['ATTENDANCE_DURABILITY_MODE'] == 'ack-first':
+            await self._acknowledge_swipe(swipe)
+            return
+
+        if not await self._put_swipe(device_id, swipe):
+            logger.warning('attendance queue full, swipe dropped', rfid_uid=swipe['rfid_uid'], device_id=device_id)
+
+    async def _acknowledge_swipe(self, swipe):
+        """
+        async counterpart of attendance_ingest.acknowledge_swipe: the row is
+        fsynced to the journal before the response, the writer releases it
+        """
+        rows, responses = await self._run_sync(evaluate_swipes, [swipe])
+
+        # ghi journal (fsync) trước khi phản hồi, crash sau đó vẫn không mất log
+        segment = await asyncio.to_thread(self._get_journal().append, rows) if rows else None
+        await self._publish_responses(responses)
+        observe_response_latency([swipe], 'ack-first')
+
+        for row in rows:
+            if not await self._put_swipe(row['device_id'], (segment, row)):
+                # log vẫn nằm trong journal, được replay khi consumer khởi động lại
+                logger.warning('attendance queue full, swipe kept in journal', rfid_uid=row['rfid_uid'], device_id=row['device_id'])
+
+    async def _put_swipe(self, device_id, item):
+        """
+        queue a swipe (or a journaled row) on the partition of its device; False when full
+        """
+        # swipe của cùng 1 device luôn vào cùng 1 partition (giữ thứ tự response)
+        swipe_queue = self._swipe_queues[hash(device_id) % len(self._swipe_queues)]
+        try:
+            await asyncio.wait_for(swipe_queue.put(item), timeout=self.config['ATTENDANCE_ENQUEUE_TIMEOUT'])
+        except asyncio.TimeoutError:
+            self.stats['swipes_dropped'] += 1
+            return False
+        self.stats['swipes_enqueued'] += 1
+        return True
+
+    async def _enqueue_batch(self, device_id, payload):
+        batch, error_code = parse_swipe_batch(device_id, payload, self.config['ATTENDANCE_BATCH_MAX_SWIPES'])
+        if error_code:
+            logger.warning('invalid attendance batch', device_id=device_id, error_code=error_code)
+            batch_id = payload.get('batch_id') if isinstance(payload, dict) else None
+            await self._publish(f'esp32/{device_id}/batch_response',
+                                {'batch_id': batch_id, 'device_id': device_id, 'error_code': error_code})
+            return
+        try:
+            self._batch_queue.put_nowait(batch)
+        except asyncio.QueueFull:
+            logger.warning('attendance batch queue full, batch dropped', device_id=device_id, swipes=len(batch['swipes']))
+            await self._publish(f'esp32/{device_id}/batch_response',
+                                {'batch_id': batch['batch_id'], 'device_id': device_id, 'error_code': 'QUEUE_FULL'})
+
+    async def _handle_control_response(self, device_id, payload):
+        """
+        apply SUCCESS control feedback to the device row (awaited inline so the
+        commands of a device are applied in the order they arrive)
+        """
+        command = payload.get('command')
+        status = payload.get('status')
+        logger.info('control response', device_id=device_id, command=command, status=status, detail=payload.get('message', ''))
+        if status != 'SUCCESS':
+            return
+
+        values = {
+            'DOOR_OPEN': {'door_state': 'OPEN'},
+            'DOOR_CLOSE': {'door_state': 'CLOSED'},
+            'RFID_ENABLE': {'rfid_enabled': True},
+            'RFID_DISABLE': {'rfid_enabled': False},
+            'DEVICE_ACTIVATE': {'is_active': True},
+            'DEVICE_DEACTIVATE': {'is_active': False},
+        }.get(command)
+        if not values:
+            return
+
+        async with self.sessions() as session:
+            result = await session.execute(
+                update(Device).where(Device.device_id == device_id).values(**values)
+            )
+            await session.commit()
+        if result.rowcount == 0:
+            logger.warning('device not found in database', device_id=device_id)
+            return
+        if 'rfid_enabled' in values:
+            swipe_cache.set_device(device_id, values['rfid_enabled'])
+            await self._publish(
+                self.config['CACHE_INVALIDATION_TOPIC'], {'origin': PROCESS_ID, 'devices': [device_id]}, qos=1
+            )
+        logger.info('device state updated', device_id=device_id, command=command)
+
+    # --- ghi database ---
+
+    async def _collect(self, work_queue, first_item):
+        """
+        gather up to ATTENDANCE_BATCH_SIZE items within ATTENDANCE_FLUSH_INTERVAL
+        returns (items, stop_after_flush)
+        """
+        items = [first_item]
+        deadline = time.monotonic() + self.config['ATTENDANCE_FLUSH_INTERVAL']
+        while len(items) < self.config['ATTENDANCE_BATCH_SIZE']:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    item = work_queue.get_nowait()
+                else:
+                    item = await asyncio.wait_for(work_queue.get(), timeout=remaining)
+            except (asyncio.QueueEmpty, asyncio.TimeoutError):
+                break
+            if item is _STOP:
+                return items, True
+            items.append(item)
+        return items, False
+
+    async def _swipe_writer(self, work_queue):
+        while True:
+            item = await work_queue.get()
+            if item is _STOP:
+                return
+            swipes, stop_after_flush = await self._collect(work_queue, item)
+            mode = self.config['ATTENDANCE_DURABILITY_MODE']
+            try:
+                if mode == 'ack-first':
+                    # đã phản hồi và ghi journal lúc nhận: chỉ còn ghi database
+                    await self._persist_journaled_rows(swipes)
+                else:
+                    await self._decide_and_write(swipes, mode)
+            except Exception as e:
+                self.stats['failed_writes'] += 1
+                logger.exception('failed to process batch', items=len(swipes))
+            if stop_after_flush:
+                return
+
+    async def _decide_and_write(self, swipes, mode):
+        """
+        async counterpart of attendance_ingest.process_attendance_batch
+        """
+        rows, responses = await self._run_sync(evaluate_swipes, swipes)
+        if mode == 'sync':
+            # phản hồi esp32 sau khi log đã được commit (hoặc đã fsync vào spool)
+            await self._write_rows(rows)
+            await self._publish_responses(responses)
+            observe_response_latency(swipes, mode)
+        else:
+            # phản hồi esp32 ngay sau khi quyết định, không chờ ghi database
+            await self._publish_responses(responses)
+            observe_response_latency(swipes, mode)
+            await self._write_rows(rows)
+
+    async def _persist_journaled_rows(self, items):
+        """
+        async counterpart of attendance_ingest.persist_journaled_rows: items are (journal segment, row)
+        """
+        # database lỗi: log được chuyển sang spool và replay trong process này
+        await self._write_rows([row for _, row in items])
+
+        released = {}
+        for segment, _ in items:
+            released[segment] = released.get(segment, 0) + 1
+        for segment, count in released.items():
+            self.journal.release(segment, count)
+
+    async def _batch_writer(self):
+        while True:
+            batch = await self._batch_queue.get()
+            if batch is _STOP:
+                return
+            try:
+                ack = await self._ingest_swipe_batch(batch)
+                self.stats['batches_saved'] += 1
+            except Exception as e:
+                self.stats['failed_writes'] += 1
+                logger.error('failed to save attendance batch', device_id=batch['device_id'], error=str(e))
+                ack = {'batch_id': batch['batch_id'], 'device_id': batch['device_id'], 'error_code': 'DATABASE_ERROR'}
+            await self._publish(f'esp32/{batch["device_id"]}/batch_response', ack)
+
+    async def _ingest_swipe_batch(self, batch):
+        """
+        async counterpart of attendance_ingest.ingest_swipe_batch (same ack format,
+        rows written through the spool like realtime swipes)
+        """
+        swipes = batch['swipes']
+        rows, results = await self._run_sync(evaluate_swipes, swipes) if swipes else ([], [])
+        written = await self._write_rows(rows)
+        if written is None:
+            # database lỗi / chậm: log đã fsync vào spool, replayer ghi sau
+            return build_batch_ack(batch, results, 0, 0, spooled=len(rows))
+        return build_batch_ack(batch, results, *written)
+
+    async def _write_rows(self, rows):
+        """
+        async counterpart of attendance_ingest.write_attendance_rows: through the
+        spool when enabled; returns (saved, duplicates), or None when spooled
+        """
+        if self.spool is None:
+            return await self._save_in_new_session(rows)
+        # AttendanceSpool là code đồng bộ: chạy trong thread, lần ghi database quay lại event loop
+        return await asyncio.to_thread(self.spool.write, rows)
+
+    def _save_rows_blocking(self, rows):
+        """
+        save() of the spool, called from a worker or the replayer thread
+        """
+        return asyncio.run_coroutine_threadsafe(self._save_in_new_session(rows), self._loop).result()
+
+    async def _save_in_new_session(self, rows):
+        async with self.sessions() as session:
+            return await self._save_rows(session, rows)
+
+    async def _save_rows(self, session, rows):
+        """
+        async counterpart of attendance_ingest.save_attendance_rows; returns (saved, duplicates)
+        """
+        fresh_rows = recent_swipes.filter_new(rows)
+        if not fresh_rows:
+            return 0, len(rows)
+
+        summary_keys = set()
+        if self.config.get('WORK_SUMMARY_ENABLED'):
+            summary_keys = clean_summary_keys({summary_key(row['rfid_uid'], row['timestamp']) for row in fresh_rows})
+
+        with db_commit_seconds.time('attendance_insert'):
+            result = await session.execute(insert_ignore_attendance_logs(), fresh_rows)
+            if summary_keys:
+                # đánh dấu ngày cần tính lại trong cùng transaction với log
+                await session.execute(pending_upsert_statement(self.engine.dialect.name), pending_rows(summary_keys))
+            await session.commit()
+        saved = count_saved_rows(recent_swipes, fresh_rows, result)
+        self.stats['logs_saved'] += saved
+
+        # cập nhật bảng tổng hợp như consumer flask (cả ngày thuộc tháng đã archive)
+        if summary_keys:
+            await self._run_sync(queue_work_day_summaries, summary_keys)
+        return saved, len(rows) - saved
+
+    # --- code đồng bộ dùng chung với consumer flask ---
+
+    async def _run_sync(self, func, *args):
+        """
+        run a shared flask-sqlalchemy function on a worker thread, inside an app context
+        """
+        return await asyncio.to_thread(self._call_in_app_context, func, *args)
+
+    def _call_in_app_context(self, func, *args):
+        with self.app.app_context():
+            return func(*args)
+
+    def _get_journal(self):
+        """
+        journal of ack-first mode, same directory and layout as attendance_ingest.get_swipe_journal
+        """
+        if self.journal is None:
+            self.journal = SwipeJournal(
+                self.config['ATTENDANCE_JOURNAL_DIR'],
+                segment_bytes=self.config['ATTENDANCE_JOURNAL_SEGMENT_BYTES']
+            )
+            self.journal.open()
+        return self.journal
+
+    async def _replay_journal(self):
+        """
+        async counterpart of attendance_ingest.replay_swipe_journal
+        """
+        if self.config['ATTENDANCE_DURABILITY_MODE'] != 'ack-first' and not os.path.isdir(self.config['ATTENDANCE_JOURNAL_DIR']):
+            return 0
+        try:
+            journal = await asyncio.to_thread(self._get_journal)
+            await asyncio.to_thread(journal.adopt)
+            replayed = await asyncio.to_thread(journal.replay, self._save_rows_blocking)
+        except Exception as e:
+            logger.error('failed to replay attendance journal', error=str(e))
+            return 0
+        if replayed:
+            logger.info('attendance journal replayed', logs=replayed)
+        return replayed
+
+    # --- spool / metrics ---
+
+    def _start_spool(self):
+        if not self.config['ATTENDANCE_SPOOL_ENABLED']:
+            return
+        self.spool = AttendanceSpool(
+            None,
+            SwipeJournal(
+                self.config['ATTENDANCE_SPOOL_DIR'],
+                prefix='spool',
+                segment_bytes=self.config['ATTENDANCE_JOURNAL_SEGMENT_BYTES']
+            ),
+            self._save_rows_blocking,
+            latency_budget=self.config['ATTENDANCE_DB_LATENCY_BUDGET'],
+            cooldown=self.config['ATTENDANCE_SPOOL_COOLDOWN'],
+            replay_interval=self.config['ATTENDANCE_SPOOL_REPLAY_INTERVAL'],
+            replay_chunk_size=self.config['ATTENDANCE_BATCH_SIZE']
+        )
+        self.spool.start()
+
+    def _start_metrics_server(self):
+        """
+        GET /metrics of the ingest app on METRICS_PORT, same as mqtt_consumer.py
+        """
+        if not (self.config['METRICS_ENABLED'] and self.config['METRICS_PORT']):
+            return
+        self._metrics_server = start_metrics_server(self.app, self.config['METRICS_PORT'])
+        logger.info('metrics server started', port=self.config['METRICS_PORT'])
+
+    # --- publish ---
+
+    async def _publish_responses(self, responses):
+        await asyncio.gather(*[
+            self._publish(f'esp32/{device_id}/response', response_payload)
+            for device_id, response_payload in responses
+        ])
+
+    async def _publish(self, topic, payload, qos=0):
+        client = self.client
+        if client is None:
+            logger.warning('not connected, response dropped', topic=topic)
+            return
+        try:
+            await client.publish(topic, json.dumps(payload), qos=qos)
+        except Exception as e:
+            logger.error('failed to publish', topic=topic, error=str(e))
@@ -0,0 +1,391 @@
+# app/utils/attendance_archive.py
+import heapq
+import os
+from collections import namedtuple
+from itertools import groupby
+from datetime import datetime, timedelta
+from flask import current_app
+from app.extensions import db
+from app.models import Attendance_logs, Attendance_archive
+from app.utils.attendance_partitions import partitioning_supported, drop_month_partition
+from app.utils.log import get_logger
+from app.utils.time_ranges import month_range, add_months
+
+
+logger = get_logger(__name__)
+
+# cột của attendance_logs được lưu vào file parquet (giữ nguyên id để dedup / tra cứu)
+ARCHIVE_COLUMNS = ('id', 'rfid_uid', 'timestamp', 'device_id', 'code', 'error_code', 'created_at')
+
+
+class ArchivedLog(namedtuple('ArchivedLog', ARCHIVE_COLUMNS)):
+    """
+    attendance log read back from a parquet archive
+
+    has the same fields and to_dict() as Attendance_logs so reports and
+    list endpoints can mix archived and live logs
+    """
+    __slots__ = ()
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'rfid_uid': self.rfid_uid,
+            'timestamp': self.timestamp.isoformat(),
+            'device_id': self.device_id,
+            'code': self.code,
+            'error_code': self.error_code,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'archived': True
+        }
+
+
+def logs_parquet_schema():
+    import pyarrow as pa
+
+    return pa.schema([
+        ('id', pa.int64()),
+        ('rfid_uid', pa.string()),
+        ('timestamp', pa.timestamp('us')),
+        ('device_id', pa.string()),
+        ('code', pa.string()),
+        ('error_code', pa.string()),
+        ('created_at', pa.timestamp('us')),
+    ])
+
+
+def archive_boundary(retention_months=None):
+    """
+    first day of the oldest month kept in attendance_logs
+
+    only months strictly before the boundary can be archived, so reads
+    starting at or after it never need to look at the archive
+    """
+    if retention_months is None:
+        retention_months = current_app.config['ATTENDANCE_RETENTION_MONTHS']
+    now = datetime.now()
+    return add_months(datetime(now.year, now.month, 1), -(max(retention_months, 1) - 1))
+
+
+def archivable_months(boundary):
+    """
+    first days of the months that still have logs in attendance_logs and can be archived
+    """
+    first = db.session.execute(db.select(db.func.min(Attendance_logs.timestamp))).scalar()
+    if first is None:
+        return []
+    months = []
+    month = datetime(first.year, first.month, 1)
+    while month < boundary:
+        months.append(month)
+        month = add_months(month, 1)
+    return months
+
+
+def write_logs_parquet(rows, tmp_path, chunk_size):
+    """
+    write attendance log rows (ARCHIVE_COLUMNS, in order) to tmp_path in
+    chunk_size row groups and fsync it; returns (row_count, min_id)
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = logs_parquet_schema()
+    row_count = 0
+    min_id = None
+    columns = {name: [] for name in ARCHIVE_COLUMNS}
+
+    with pq.ParquetWriter(tmp_path, schema, compression='zstd') as writer:
+        for row in rows:
+            for name in ARCHIVE_COLUMNS:
+                columns[name].append(getattr(row, name))
+            row_count += 1
+            min_id = row.id if min_id is None else min(min_id, row.id)
+            if len(columns['id']) >= chunk_size:
+                writer.write_table(pa.Table.from_pydict(columns, schema=schema))
+                columns = {name: [] for name in ARCHIVE_COLUMNS}
+        if columns['id']:
+            writer.write_table(pa.Table.from_pydict(columns, schema=schema))
+
+    # fsync trước khi đổi tên để file trong catalog luôn đầy đủ
+    with open(tmp_path, 'rb') as f:
+        os.fsync(f.fileno())
+    return row_count, min_id
+
+
+def archive_month(month_start, archive_dir=None, chunk_size=None, dry_run=False):
+    """
+    move one closed month of attendance_logs to a parquet file and out of the database
+
+    1. snapshot max(id) of the month, later swipes are left for the next run
+    2. stream the month ordered by (rfid_uid, timestamp) into a tmp file,
+       check the row count, fsync and rename it into place
+    3. record the file in attendance_archives, then drop the month's
+       partition (mysql, see drop_archived_partition) or delete the archived rows
+
+    returns the catalog entry as dict, None when the month has no logs
+    """
+    import pyarrow.parquet as pq
+
+    config = current_app.config
+    archive_dir = archive_dir or config['ATTENDANCE_ARCHIVE_DIR']
+    chunk_size = chunk_size or config['ATTENDANCE_ARCHIVE_CHUNK_SIZE']
+
+    if month_start >= archive_boundary():
+        raise ValueError(f'thang {month_start:%Y-%m} chua het thoi gian luu tru')
+
+    start, end = month_range(month_start.year, month_start.month)
+    in_month = (Attendance_logs.timestamp >= start, Attendance_logs.timestamp < end)
+
+    max_id = db.session.execute(db.select(db.func.max(Attendance_logs.id)).where(*in_month)).scalar()
+    if max_id is None:
+        return None
+
+    if dry_run:
+        row_count = db.session.execute(
+            db.select(db.func.count()).select_from(Attendance_logs).where(*in_month, Attendance_logs.id <= max_id)
+        ).scalar()
+        return {'month': f'{month_start:%Y-%m}', 'row_count': row_count, 'dry_run': True}
+
+    relative_path = os.path.join(
+        'attendance_logs', f'{month_start:%Y}', f'{month_start:%m}',
+        f'part-{datetime.now():%Y%m%d%H%M%S}-{max_id}.parquet'
+    )
+    path = os.path.join(archive_dir, relative_path)
+    tmp_path = path + '.tmp'
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    rows = db.session.execute(
+        db.select(*[getattr(Attendance_logs, name) for name in ARCHIVE_COLUMNS])
+        .where(*in_month, Attendance_logs.id <= max_id)
+        .order_by(Attendance_logs.rfid_uid.asc(), Attendance_logs.timestamp.asc(), Attendance_logs.id.asc())
+        .execution_options(yield_per=chunk_size)
+    )
+    try:
+        row_count, min_id = write_logs_parquet(rows, tmp_path, chunk_size)
+        written = pq.ParquetFile(tmp_path).metadata.num_rows
+        if written != row_count:
+            raise RuntimeError(f'file parquet co {written} dong, can {row_count} dong')
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    archive = Attendance_archive(
+        month=month_start.date(),
+        path=relative_path,
+        row_count=row_count,
+        min_id=min_id,
+        max_id=max_id,
+        size_bytes=os.path.getsize(path)
+    )
+    db.session.add(archive)
+
+    dropped = False
+    if partitioning_supported():
+        # DROP PARTITION là ddl (tự commit): ghi catalog trước để file không bị mất dấu
+        db.session.commit()
+        dropped = drop_archived_partition(month_start, max_id)
+
+    if not dropped:
+        db.session.execute(db.delete(Attendance_logs).where(*in_month, Attendance_logs.id <= max_id))
+    db.session.commit()
+
+    logger.info(
+        'attendance month archived', month=f'{month_start:%Y-%m}', rows=row_count,
+        path=relative_path, size_bytes=archive.size_bytes, dropped_partition=dropped
+    )
+    return archive.to_dict()
+
+
+def drop_archived_partition(month_start, max_id):
+    """
+    drop the partition of an archived month unless logs of that month newer
+    than max_id (not in the file) arrived while it was written
+
+    the check and the DROP PARTITION run on one connection holding
+    LOCK TABLES attendance_logs WRITE: no log can be inserted between them
+    and be dropped with the partition. returns True when dropped
+    """
+    start, end = month_range(month_start.year, month_start.month)
+    with db.engine.connect() as connection:
+        connection.exec_driver_sql('LOCK TABLES attendance_logs WRITE')
+        try:
+            # tháng đã quá ATTENDANCE_RETENTION_MONTHS nên gần như không còn log offline sync mới
+            late = connection.execute(
+                db.select(Attendance_logs.id)
+                .where(Attendance_logs.timestamp >= start, Attendance_logs.timestamp < end, Attendance_logs.id > max_id)
+                .limit(1)
+            ).first()
+            if late is not None:
+                logger.info('late logs in archived month, partition kept', month=f'{month_start:%Y-%m}')
+                return False
+            return drop_month_partition(month_start, connection)
+        finally:
+            connection.exec_driver_sql('UNLOCK TABLES')
+
+
+def archived_log_paths(start=None, end=None):
+    """
+    (month, path, max_id) of the archive files whose month intersects [start, end),
+    oldest month first; every file when start is None
+
+    costs nothing (no catalog query) when the range starts inside the retention window
+    """
+    if start is not None and start >= archive_boundary():
+        return []
+
+    query = db.select(Attendance_archive.month, Attendance_archive.path, Attendance_archive.max_id)
+    if start is not None:
+        # catalog lưu ngày đầu tháng: lấy các tháng giao với [start, end)
+        query = query.where(
+            Attendance_archive.month >= datetime(start.year, start.month, 1).date(),
+            Attendance_archive.month <= (end - timedelta(microseconds=1)).date()
+        )
+    return db.session.execute(
+        query.order_by(Attendance_archive.month.asc(), Attendance_archive.id.asc())
+    ).all()
+
+
+def archive_filters(start=None, end=None, rfid_uids=None, device_id=None):
+    """
+    pyarrow filters of a parquet read of the archive
+    """
+    filters = []
+    if start is not None:
+        filters += [('timestamp', '>=', start), ('timestamp', '<', end)]
+    if rfid_uids is not None:
+        filters.append(('rfid_uid', 'in', list(rfid_uids)))
+    if device_id:
+        filters.append(('device_id', '==', device_id))
+    return filters
+
+
+def read_archive_table(path, filters, columns=ARCHIVE_COLUMNS, archive_dir=None):
+    import pyarrow.parquet as pq
+
+    archive_dir = archive_dir or current_app.config['ATTENDANCE_ARCHIVE_DIR']
+    return pq.read_table(os.path.join(archive_dir, path), columns=list(columns), filters=filters or None)
+
+
+def table_logs(table):
+    columns = [table.column(name).to_pylist() for name in ARCHIVE_COLUMNS]
+    return [ArchivedLog(*values) for values in zip(*columns)]
+
+
+def read_archived_logs(start, end, rfid_uids=None, device_id=None):
+    """
+    archived logs with start <= timestamp < end, sorted by (rfid_uid, timestamp, id)
+
+    costs nothing when the range starts inside the retention window
+    (no catalog query), otherwise one catalog query plus one filtered
+    parquet read per file of the months involved
+
+    returns list ArchivedLog
+    """
+    paths = archived_log_paths(start, end)
+    if not paths:
+        return []
+
+    filters = archive_filters(start, end, rfid_uids, device_id)
+    logs = []
+    for entry in paths:
+        logs.extend(table_logs(read_archive_table(entry.path, filters)))
+
+    logs.sort(key=lambda log: (log.rfid_uid, log.timestamp, log.id))
+    return logs
+
+
+def read_archived_page(paths, filters, limit, bound=None, newer=False):
+    """
+    at most limit archived logs next to a (timestamp, id) keyset bound
+
+    ordered by (timestamp, id) descending and older than bound, or
+    ascending and newer than bound when newer is set (bound None: no bound);
+    the cursor condition is pushed into the parquet read and the sort /
+    limit run in arrow, only the returned logs become python objects
+    """
+    import pyarrow as pa
+
+    if bound is not None:
+        timestamp, log_id = bound
+        op = '>' if newer else '<'
+        # (timestamp, id) < bound viết dưới dạng OR của 2 nhánh AND cho pyarrow
+        filters = [
+            filters + [('timestamp', op, timestamp)],
+            filters + [('timestamp', '==', timestamp), ('id', op, log_id)]
+        ]
+
+    tables = [read_archive_table(entry.path, filters) for entry in paths]
+    if not tables:
+        return []
+    order = 'ascending' if newer else 'descending'
+    table = pa.concat_tables(tables).sort_by([('timestamp', order), ('id', order)]).slice(0, limit)
+    return table_logs(table)
+
+
+def count_archived_logs(paths, filters):
+    """
+    number of archived logs matching filters, reading only the filtered columns
+    """
+    columns = {'id'} | {condition[0] for condition in filters}
+    return sum(read_archive_table(entry.path, filters, columns=sorted(columns)).num_rows for entry in paths)
+
+
+def archived_rows_condition(paths):
+    """
+    condition on attendance_logs matching the rows already copied to these
+    archive files (left behind by an interrupted archive run)
+    """
+    max_ids = {}
+    for entry in paths:
+        max_ids[entry.month] = max(max_ids.get(entry.month, 0), entry.max_id)
+    conditions = []
+    for month, max_id in max_ids.items():
+        start, end = month_range(month.year, month.month)
+        conditions.append(db.and_(
+            Attendance_logs.timestamp >= start,
+            Attendance_logs.timestamp < end,
+            Attendance_logs.id <= max_id
+        ))
+    return db.or_(*conditions)
+
+
+def iter_archived_logs(paths, filters, archive_dir, chunk_size=1000):
+    """
+    yield archived logs ordered by (timestamp, id), one month in memory at a time
+
+    paths comes from archived_log_paths (oldest month first); files of the
+    same month (late logs archived by a later run) are sorted together.
+    takes archive_dir explicitly so it can run outside the app context
+    (streamed responses)
+    """
+    import pyarrow as pa
+
+    for _, month_paths in groupby(paths, key=lambda entry: entry.month):
+        tables = [read_archive_table(entry.path, filters, archive_dir=archive_dir) for entry in month_paths]
+        table = pa.concat_tables(tables).sort_by([('timestamp', 'ascending'), ('id', 'ascending')])
+        for batch in table.to_batches(max_chunksize=chunk_size):
+            yield from table_logs(batch)
+
+
+def merge_archived_logs(archived, rows, key, reverse=False):
+    """
+    merge archived logs into rows of the same order (both sorted by key,
+    descending when reverse is set)
+
+    a log present in both (archive run interrupted before the rows were
+    removed) is yielded once, compared by id among logs with the same key
+    """
+    last_key = None
+    seen = set()
+    for log in heapq.merge(archived, rows, key=key, reverse=reverse):
+        log_key = key(log)
+        if log_key != last_key:
+            last_key = log_key
+            seen = set()
+        if log.id in seen:
+            continue
+        seen.add(log.id)
+        yield log
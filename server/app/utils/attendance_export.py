@@ -0,0 +1,77 @@
+# app/utils/attendance_export.py
+import csv
+import io
+import json
+from itertools import islice
+from app.extensions import db
+from app.models import Attendance_logs
+from app.utils.attendance_archive import merge_archived_logs
+
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+EXPORT_COLUMNS = ['id', 'rfid_uid', 'timestamp', 'device_id', 'code', 'error_code', 'created_at']
+
+
+def build_export_statement():
+    """
+    select only the exported columns, oldest first, so the stream is stable
+    """
+    return (
+        db.select(*[getattr(Attendance_logs, column) for column in EXPORT_COLUMNS])
+        .order_by(Attendance_logs.timestamp.asc(), Attendance_logs.id.asc())
+    )
+
+
+def _format_value(value):
+    if value is None:
+        return None
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+
+def iter_export_chunks(engine, statement, export_format, chunk_size=1000, archived=None):
+    """
+    stream rows of statement as csv / ndjson text chunks
+
+    uses a server-side cursor (stream_results) and fetches chunk_size rows
+    at a time, so memory stays constant regardless of how many rows match
+
+    archived: archived logs in the same (timestamp, id) order (iter_archived_logs),
+    merged into the stream
+    """
+    if export_format == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_COLUMNS)
+        yield buffer.getvalue()
+
+    with engine.connect() as connection:
+        result = connection.execution_options(
+            stream_results=True,
+            yield_per=chunk_size
+        ).execute(statement)
+
+        stream = iter(result)
+        if archived is not None:
+            stream = merge_archived_logs(archived, stream, key=lambda row: (row.timestamp, row.id))
+
+        for rows in iter(lambda: list(islice(stream, chunk_size)), []):
+            if export_format == 'csv':
+                buffer = io.StringIO()
+                writer = csv.writer(buffer)
+                for row in rows:
+                    writer.writerow([_format_value(value) for value in row])
+                yield buffer.getvalue()
+            else:
+                yield ''.join(
+                    json.dumps({
+                        column: _format_value(value)
+                        for column, value in zip(EXPORT_COLUMNS, row)
+                    }) + '\n'
+                    for row in rows
+                )
@@ -0,0 +1,586 @@
+# app/utils/attendance_ingest.py
+import atexit
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from flask import current_app
+from app.extensions import mqtt, db
+from app.models import Attendance_logs
+from app.utils.batch_queue import BatchQueue
+from app.utils.metrics import swipe_results, swipe_response_seconds, db_commit_seconds
+from app.utils.log import get_logger
+from app.utils.swipe_cache import swipe_cache
+from app.utils.swipe_dedup import recent_swipes
+from app.utils.swipe_journal import SwipeJournal
+from app.utils.attendance_spool import AttendanceSpool
+from app.utils.work_day_summary import mark_work_day_summaries, queue_work_day_summaries, summary_key
+
+
+logger = get_logger(__name__)
+
+_attendance_queue = None
+_attendance_queue_lock = threading.Lock()
+_batch_queue = None
+_swipe_journal = None
+_attendance_spool = None
+
+DURABILITY_MODES = ('queued', 'sync', 'ack-first')
+
+
+def check_durability_mode(config):
+    """
+    refuse to consume with a durability mode that can lose acknowledged swipes
+
+    queued publishes the responses before the batch is written: a failed
+    write is only kept by the spool, so queued requires ATTENDANCE_SPOOL_ENABLED
+    """
+    mode = config['ATTENDANCE_DURABILITY_MODE']
+    if mode not in DURABILITY_MODES:
+        raise ValueError(f'ATTENDANCE_DURABILITY_MODE={mode} khong hop le, su dung sync, queued hoac ack-first')
+    if mode == 'queued' and not config['ATTENDANCE_SPOOL_ENABLED']:
+        raise ValueError('ATTENDANCE_DURABILITY_MODE=queued phan hoi truoc khi ghi database, can ATTENDANCE_SPOOL_ENABLED=True')
+
+
+def parse_swipe(device_id, payload, default_code='REALTIME'):
+    """
+    validate an attendance payload from esp32 and normalize it into a swipe dict
+
+    returns None if the payload is missing fields or has an invalid timestamp
+    """
+    if not isinstance(payload, dict) or 'rfid_uid' not in payload or 'timestamp' not in payload:
+        logger.warning('missing fields in payload', device_id=device_id)
+        return None
+
+    timestamp_str = payload['timestamp']
+    try:
+        timestamp = datetime.fromisoformat(timestamp_str.replace('Z', '+00:00'))
+    except Exception:
+        logger.warning('invalid timestamp format', device_id=device_id, timestamp=timestamp_str)
+        return None
+
+    return {
+        'device_id': device_id,
+        'rfid_uid': payload['rfid_uid'],
+        'timestamp': timestamp,
+        'code': payload.get('code', default_code),
+    }
+
+
+def parse_swipe_batch(device_id, payload, max_swipes):
+    """
+    validate an offline-sync batch: {"batch_id": "...", "swipes": [...]} or a bare list
+
+    returns (batch, error): batch is {'device_id', 'batch_id', 'swipes', 'invalid'}
+    where invalid holds the indexes of swipes that failed parse_swipe
+    """
+    if isinstance(payload, list):
+        batch_id, items = None, payload
+    elif isinstance(payload, dict) and isinstance(payload.get('swipes'), list):
+        batch_id, items = payload.get('batch_id'), payload['swipes']
+    else:
+        return None, 'INVALID_PAYLOAD'
+
+    if len(items) > max_swipes:
+        return None, 'BATCH_TOO_LARGE'
+
+    swipes = []
+    invalid = []
+    for index, item in enumerate(items):
+        swipe = parse_swipe(device_id, item, default_code='OFFLINE_SYNC')
+        if swipe:
+            swipes.append(swipe)
+        else:
+            invalid.append(index)
+
+    return {'device_id': device_id, 'batch_id': batch_id, 'swipes': swipes, 'invalid': invalid}, None
+
+
+def build_response_payload(rfid_uid, error_code, user=None):
+    """
+    build the esp32/<device_id>/response payload for one swipe
+    """
+    return {
+        'is_success': error_code is None,
+        'user_id': user.id if user else None,
+        'user_name': user.full_name if user else None,
+        'rfid_uid': rfid_uid,
+        'error_code': error_code,
+        'time_stamp': datetime.now().strftime('%H:%M')
+    }
+
+
+def evaluate_swipes(swipes):
+    """
+    decide the outcome of each swipe (requires app context)
+
+    users are resolved from the swipe cache, unknown cards with one IN (...) query
+
+    returns (rows, results): rows to insert into attendance_logs and, for every
+    swipe in order, (device_id, response payload)
+    """
+    swipe_cache.ensure_loaded()
+    users = swipe_cache.resolve_users({swipe['rfid_uid'] for swipe in swipes})
+    return decide_swipes(swipes, users, swipe_cache.is_rfid_enabled)
+
+
+def decide_swipes(swipes, users, is_rfid_enabled):
+    """
+    outcome of each swipe from resolved users (rfid_uid -> CachedUser) and
+    is_rfid_enabled(device_id); shared by the flask and asyncio consumers
+
+    returns (rows, results) like evaluate_swipes
+    """
+    rows = []
+    results = []
+    for swipe in swipes:
+        device_id = swipe['device_id']
+        rfid_uid = swipe['rfid_uid']
+
+        # thiết bị đang tắt quẹt thẻ: không lưu log, chỉ phản hồi RFID_DISABLED
+        if not is_rfid_enabled(device_id):
+            logger.debug('rfid disabled on device, ignoring attendance', sample=True, device_id=device_id)
+            results.append((device_id, build_response_payload(rfid_uid, 'RFID_DISABLED')))
+            continue
+
+        user = users.get(rfid_uid)
+        error_code = None
+        if not user:
+            logger.debug('user not found', sample=True, device_id=device_id, rfid_uid=rfid_uid)
+            error_code = 'USER_NOT_FOUND'
+        elif not user.is_active:
+            logger.debug('user is not active', sample=True, device_id=device_id, rfid_uid=rfid_uid)
+            error_code = 'USER_NOT_ACTIVE'
+
+        rows.append({
+            'rfid_uid': rfid_uid,
+            'timestamp': swipe['timestamp'],
+            'device_id': device_id,
+            'code': swipe['code'],
+            'error_code': error_code
+        })
+        results.append((device_id, build_response_payload(rfid_uid, error_code, user)))
+
+    for _, response_payload in results:
+        swipe_results.inc(response_payload['error_code'] or 'OK')
+    return rows, results
+
+
+def insert_ignore_attendance_logs():
+    """
+    multi-row insert into attendance_logs that skips rows violating the
+    (rfid_uid, timestamp, device_id) unique key instead of failing the batch
+    """
+    return (
+        db.insert(Attendance_logs.__table__)
+        .prefix_with('IGNORE', dialect='mysql')
+        .prefix_with('OR IGNORE', dialect='sqlite')
+    )
+
+
+def save_attendance_rows(rows):
+    """
+    persist attendance rows with one multi-row insert and one commit (requires app context)
+
+    duplicates (same rfid_uid, device_id, timestamp) are dropped by the recent
+    key set first, then ignored by the unique key; returns (saved, duplicates)
+    """
+    fresh_rows = recent_swipes.filter_new(rows)
+    if not fresh_rows:
+        return 0, len(rows)
+
+    summary_keys = {summary_key(row['rfid_uid'], row['timestamp']) for row in fresh_rows}
+
+    # 1 câu INSERT nhiều dòng cho cả batch thay vì commit từng log,
+    # các ngày cần tính lại bảng tổng hợp được đánh dấu trong cùng transaction
+    with db_commit_seconds.time('attendance_insert'):
+        result = db.session.execute(insert_ignore_attendance_logs(), fresh_rows)
+        mark_work_day_summaries(summary_keys)
+        db.session.commit()
+    saved = count_saved_rows(recent_swipes, fresh_rows, result)
+    logger.debug('attendance batch saved', saved=saved, duplicates=len(rows) - saved)
+
+    # cập nhật bảng tổng hợp cho các (rfid_uid, ngày) vừa có log mới, ngoài luồng phản hồi
+    queue_work_day_summaries(summary_keys)
+    return saved, len(rows) - saved
+
+
+def count_saved_rows(recent, fresh_rows, result):
+    """
+    remember committed rows in the recent key set and return how many the insert ignore really wrote
+    """
+    recent.remember(fresh_rows)
+
+    # rowcount = số dòng thực sự được ghi, phần còn lại đã tồn tại trong database
+    saved = result.rowcount if result.rowcount is not None and result.rowcount >= 0 else len(fresh_rows)
+    if saved < len(fresh_rows):
+        recent.count_duplicates('db_duplicates', len(fresh_rows) - saved)
+    return saved
+
+
+def write_attendance_rows(rows):
+    """
+    save_attendance_rows through the spool (requires app context)
+
+    when the database write fails or the database is over its latency
+    budget, rows are fsynced to the local spool and replayed later;
+    returns (saved, duplicates), or None when the rows were spooled
+    """
+    if not current_app.config['ATTENDANCE_SPOOL_ENABLED']:
+        return save_attendance_rows(rows)
+    return get_attendance_spool().write(rows)
+
+
+def process_attendance_batch(swipes):
+    """
+    validate, acknowledge and persist a batch of swipes
+
+    runs on a queue worker thread; all logs are saved with one multi-row insert.
+    ATTENDANCE_DURABILITY_MODE=sync publishes the responses only after the
+    commit (or the spool fsync), queued publishes them right away
+    """
+    app = mqtt.app
+    with app.app_context():
+        try:
+            rows, responses = evaluate_swipes(swipes)
+
+            mode = app.config['ATTENDANCE_DURABILITY_MODE']
+            if mode == 'sync':
+                # phản hồi esp32 sau khi log đã được commit (hoặc đã fsync vào spool)
+                write_attendance_rows(rows)
+                publish_responses(responses)
+                observe_response_latency(swipes, mode)
+            else:
+                # phản hồi esp32 ngay sau khi quyết định, không chờ ghi database
+                publish_responses(responses)
+                observe_response_latency(swipes, mode)
+                write_attendance_rows(rows)
+
+        except Exception:
+            db.session.rollback()
+            raise
+
+
+def acknowledge_swipe(swipe):
+    """
+    ATTENDANCE_DURABILITY_MODE=ack-first: decide and respond from the mqtt callback
+
+    the outcome comes from the swipe cache, the log is fsynced to the local
+    journal, the response is published and the row is queued; a queue worker
+    persists it and releases it from the journal
+    """
+    app = mqtt.app
+    with app.app_context():
+        rows, responses = evaluate_swipes([swipe])
+
+    # ghi journal (fsync) trước khi phản hồi, crash sau đó vẫn không mất log
+    segment = get_swipe_journal().append(rows) if rows else None
+    publish_responses(responses)
+    observe_response_latency([swipe], 'ack-first')
+
+    for row in rows:
+        if not get_attendance_queue().put((segment, row)):
+            # log vẫn nằm trong journal, được replay khi consumer khởi động lại
+            logger.warning('attendance queue full, swipe kept in journal', rfid_uid=row['rfid_uid'], device_id=row['device_id'])
+
+
+def persist_journaled_rows(items):
+    """
+    queue handler of ack-first mode: items are (journal segment, row)
+    """
+    app = mqtt.app
+    with app.app_context():
+        try:
+            # database lỗi: log được chuyển sang spool và replay trong process này
+            write_attendance_rows([row for _, row in items])
+        except Exception:
+            db.session.rollback()
+            raise
+
+    released = {}
+    for segment, _ in items:
+        released[segment] = released.get(segment, 0) + 1
+    journal = get_swipe_journal()
+    for segment, count in released.items():
+        journal.release(segment, count)
+
+
+def replay_swipe_journal():
+    """
+    persist rows left in the journal by a previous process (requires app context)
+
+    safe to call in any durability mode and more than once: only segments
+    found at startup or left by consumers that have stopped since (other
+    processes sharing ATTENDANCE_JOURNAL_DIR) are replayed and duplicates
+    are ignored by the unique key
+    """
+    config = mqtt.app.config
+    if config['ATTENDANCE_DURABILITY_MODE'] != 'ack-first' and not os.path.isdir(config['ATTENDANCE_JOURNAL_DIR']):
+        return 0
+
+    journal = get_swipe_journal()
+    try:
+        journal.adopt()
+        replayed = journal.replay(save_attendance_rows)
+    except Exception as e:
+        db.session.rollback()
+        logger.error('failed to replay attendance journal', error=str(e))
+        return 0
+    if replayed:
+        logger.info('attendance journal replayed', logs=replayed)
+    return replayed
+
+
+def ingest_swipe_batch(batch):
+    """
+    validate and persist one offline-sync batch in a single transaction (requires app context)
+
+    used by esp32/<device_id>/attendance_batch and POST /api/attendance-logs/batch;
+    rows are written through the spool like realtime swipes. returns the
+    consolidated ack: counters plus one result per submitted swipe (a
+    duplicate swipe keeps its result but is not counted in saved), in the
+    submitted order; it is only built once the rows are committed or fsynced
+    to the spool, so the device can safely clear its offline storage when it
+    receives it
+    """
+    swipes = batch['swipes']
+    try:
+        rows, results = evaluate_swipes(swipes) if swipes else ([], [])
+        written = write_attendance_rows(rows)
+    except Exception:
+        db.session.rollback()
+        raise
+
+    if written is None:
+        # database lỗi / chậm: log đã fsync vào spool, replayer ghi sau
+        return build_batch_ack(batch, results, 0, 0, spooled=len(rows))
+    return build_batch_ack(batch, results, *written)
+
+
+def build_batch_ack(batch, results, saved, duplicates, spooled=0):
+    """
+    consolidated ack of a persisted batch: counters plus one result per submitted
+    swipe, in the submitted order (invalid swipes get INVALID_PAYLOAD)
+    """
+    pending_results = iter(results)
+    invalid = set(batch['invalid'])
+    total = len(batch['swipes']) + len(invalid)
+    items = []
+    for index in range(total):
+        if index in invalid:
+            items.append({'index': index, 'rfid_uid': None, 'error_code': 'INVALID_PAYLOAD'})
+            continue
+        _, response_payload = next(pending_results)
+        items.append({
+            'index': index,
+            'rfid_uid': response_payload['rfid_uid'],
+            'error_code': response_payload['error_code']
+        })
+
+    return {
+        'batch_id': batch['batch_id'],
+        'device_id': batch['device_id'],
+        'received': total,
+        'saved': saved,
+        'duplicates': duplicates,
+        'spooled': spooled,
+        'rejected': sum(1 for item in items if item['error_code']),
+        'results': items
+    }
+
+
+def process_swipe_batches(batches):
+    """
+    queue handler for esp32/<device_id>/attendance_batch: one transaction and
+    one esp32/<device_id>/batch_response ack per batch
+    """
+    app = mqtt.app
+    with app.app_context():
+        for batch in batches:
+            try:
+                ack = ingest_swipe_batch(batch)
+            except Exception as e:
+                logger.error('failed to save attendance batch', device_id=batch['device_id'], error=str(e))
+                ack = {
+                    'batch_id': batch['batch_id'],
+                    'device_id': batch['device_id'],
+                    'error_code': 'DATABASE_ERROR'
+                }
+            publish_batch_response(batch['device_id'], ack)
+
+
+def observe_response_latency(swipes, mode):
+    """
+    record receive -> response time of swipes stamped with received_at by the mqtt callback
+    """
+    now = time.perf_counter()
+    for swipe in swipes:
+        received_at = swipe.get('received_at')
+        if received_at is not None:
+            swipe_response_seconds.observe(now - received_at, mode)
+
+
+def publish_batch_response(device_id, ack):
+    """
+    publish the consolidated ack of a batch to esp32/<device_id>/batch_response
+    """
+    try:
+        mqtt.publish(f'esp32/{device_id}/batch_response', json.dumps(ack))
+    except Exception as e:
+        logger.error('failed to publish batch response', device_id=device_id, error=str(e))
+
+
+def publish_responses(responses):
+    """
+    publish (device_id, payload) pairs to esp32/<device_id>/response
+    """
+    for device_id, response_payload in responses:
+        try:
+            mqtt.publish(f'esp32/{device_id}/response', json.dumps(response_payload))
+        except Exception as e:
+            logger.error('failed to publish response', device_id=device_id, error=str(e))
+
+
+def swipe_device_id(swipe):
+    return swipe['device_id']
+
+
+def journaled_device_id(item):
+    return item[1]['device_id']
+
+
+def get_attendance_queue():
+    """
+    return the process-wide attendance ingest queue, creating it on first use
+    """
+    global _attendance_queue
+    if _attendance_queue is None:
+        with _attendance_queue_lock:
+            if _attendance_queue is None:
+                config = mqtt.app.config
+                # ack-first: queue chứa (segment, row) đã được phản hồi, worker chỉ ghi database
+                ack_first = config['ATTENDANCE_DURABILITY_MODE'] == 'ack-first'
+                partition_key = journaled_device_id if ack_first else swipe_device_id
+                _attendance_queue = BatchQueue(
+                    name='attendance',
+                    handler=persist_journaled_rows if ack_first else process_attendance_batch,
+                    maxsize=config['ATTENDANCE_QUEUE_MAXSIZE'],
+                    batch_size=config['ATTENDANCE_BATCH_SIZE'],
+                    flush_interval=config['ATTENDANCE_FLUSH_INTERVAL'],
+                    workers=config['ATTENDANCE_QUEUE_WORKERS'],
+                    enqueue_timeout=config['ATTENDANCE_ENQUEUE_TIMEOUT'],
+                    # swipe của cùng 1 device luôn do 1 worker xử lý, response trả về đúng thứ tự
+                    partition_key=partition_key if config['ATTENDANCE_QUEUE_PARTITION_BY_DEVICE'] else None
+                )
+    return _attendance_queue
+
+
+def get_batch_queue():
+    """
+    return the process-wide offline-sync batch queue, creating it on first use
+
+    each item is a whole batch, so workers take one batch at a time
+    """
+    global _batch_queue
+    if _batch_queue is None:
+        with _attendance_queue_lock:
+            if _batch_queue is None:
+                config = mqtt.app.config
+                _batch_queue = BatchQueue(
+                    name='attendance-batch',
+                    handler=process_swipe_batches,
+                    maxsize=config['ATTENDANCE_BATCH_QUEUE_MAXSIZE'],
+                    batch_size=1,
+                    flush_interval=0,
+                    workers=1,
+                    enqueue_timeout=config['ATTENDANCE_ENQUEUE_TIMEOUT']
+                )
+    return _batch_queue
+
+
+def get_swipe_journal():
+    """
+    return the process-wide attendance journal, creating it on first use
+    """
+    global _swipe_journal
+    if _swipe_journal is None:
+        with _attendance_queue_lock:
+            if _swipe_journal is None:
+                config = mqtt.app.config
+                journal = SwipeJournal(
+                    config['ATTENDANCE_JOURNAL_DIR'],
+                    segment_bytes=config['ATTENDANCE_JOURNAL_SEGMENT_BYTES']
+                )
+                journal.open()
+                # đăng ký trước queue nên chạy sau khi queue đã drain (atexit chạy ngược thứ tự)
+                atexit.register(journal.close)
+                _swipe_journal = journal
+    return _swipe_journal
+
+
+def get_attendance_spool():
+    """
+    return the process-wide attendance spool (None if ATTENDANCE_SPOOL_ENABLED is off)
+
+    the replayer thread is started on first use
+    """
+    global _attendance_spool
+    if _attendance_spool is None:
+        config = mqtt.app.config
+        if not config['ATTENDANCE_SPOOL_ENABLED']:
+            return None
+        with _attendance_queue_lock:
+            if _attendance_spool is None:
+                spool = AttendanceSpool(
+                    mqtt.app,
+                    SwipeJournal(
+                        config['ATTENDANCE_SPOOL_DIR'],
+                        prefix='spool',
+                        segment_bytes=config['ATTENDANCE_JOURNAL_SEGMENT_BYTES']
+                    ),
+                    save_attendance_rows,
+                    latency_budget=config['ATTENDANCE_DB_LATENCY_BUDGET'],
+                    cooldown=config['ATTENDANCE_SPOOL_COOLDOWN'],
+                    replay_interval=config['ATTENDANCE_SPOOL_REPLAY_INTERVAL'],
+                    replay_chunk_size=config['ATTENDANCE_BATCH_SIZE']
+                )
+                spool.start()
+                _attendance_spool = spool
+    return _attendance_spool
+
+
+def get_spool_stats():
+    """
+    counters of the attendance spool (empty if not started)
+    """
+    if _attendance_spool is None:
+        return {'running': False}
+    return _attendance_spool.stats()
+
+
+def get_journal_stats():
+    """
+    counters of the attendance journal (empty if not opened)
+    """
+    if _swipe_journal is None:
+        return {'opened': False}
+    return _swipe_journal.stats()
+
+
+def get_ingest_stats():
+    """
+    backpressure metrics of the attendance queue (empty if not started)
+    """
+    if _attendance_queue is None:
+        return {'name': 'attendance', 'running': False}
+    return _attendance_queue.stats()
+
+
+def get_batch_ingest_stats():
+    """
+    backpressure metrics of the offline-sync batch queue (empty if not started)
+    """
+    if _batch_queue is None:
+        return {'name': 'attendance-batch', 'running': False}
+    return _batch_queue.stats()
@@ -0,0 +1,94 @@
+# app/utils/attendance_partitions.py
+from datetime import datetime
+from app.extensions import db
+from app.utils.time_ranges import add_months
+
+
+# partition cuối nhận mọi timestamp lớn hơn các partition theo tháng
+CATCH_ALL_PARTITION = 'pmax'
+
+
+def partition_name(month_start):
+    return f'p{month_start:%Y%m}'
+
+
+def partitioning_supported():
+    """
+    attendance_logs is only partitioned on mysql (migration d1f5b8a3c7e4)
+    """
+    return db.engine.dialect.name == 'mysql'
+
+
+def list_partitions(connection=None):
+    """
+    monthly partitions of attendance_logs in order (requires app context)
+
+    returns list of dict name, upper_bound (datetime or None for pmax),
+    estimated rows; empty when the table is not partitioned
+    """
+    if not partitioning_supported():
+        return []
+    rows = (connection or db.session).execute(db.text(
+        'SELECT PARTITION_NAME, PARTITION_DESCRIPTION, TABLE_ROWS '
+        'FROM information_schema.PARTITIONS '
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'attendance_logs' AND PARTITION_NAME IS NOT NULL "
+        'ORDER BY PARTITION_ORDINAL_POSITION'
+    ))
+    partitions = []
+    for name, description, table_rows in rows:
+        upper_bound = None
+        if description != 'MAXVALUE':
+            upper_bound = datetime.fromisoformat(description.strip("'"))
+        partitions.append({'name': name, 'upper_bound': upper_bound, 'rows': table_rows})
+    return partitions
+
+
+def ensure_future_partitions(months_ahead):
+    """
+    split pmax so every month up to `months_ahead` after the current one has its own partition
+
+    returns the names of the partitions created
+    """
+    partitions = list_partitions()
+    if not partitions:
+        return []
+
+    bounds = [partition['upper_bound'] for partition in partitions if partition['upper_bound'] is not None]
+    now = datetime.now()
+    target = add_months(datetime(now.year, now.month, 1), months_ahead + 1)
+    month = bounds[-1] if bounds else datetime(now.year, now.month, 1)
+
+    created = []
+    definitions = []
+    while month < target:
+        upper = add_months(month, 1)
+        created.append(partition_name(month))
+        definitions.append(f"PARTITION {partition_name(month)} VALUES LESS THAN ('{upper:%Y-%m-%d %H:%M:%S}')")
+        month = upper
+    if not definitions:
+        return []
+
+    # các log đã rơi vào pmax (nếu có) được chuyển sang partition mới tương ứng
+    definitions.append(f'PARTITION {CATCH_ALL_PARTITION} VALUES LESS THAN (MAXVALUE)')
+    db.session.execute(db.text(
+        f'ALTER TABLE attendance_logs REORGANIZE PARTITION {CATCH_ALL_PARTITION} INTO ({", ".join(definitions)})'
+    ))
+    return created
+
+
+def drop_month_partition(month_start, connection=None):
+    """
+    drop the partition holding exactly month_start's logs, if it exists; returns True when dropped
+
+    the month's range then belongs to the next partition, so logs that
+    arrive later for that month are still accepted. connection: run on
+    that connection (e.g. one holding LOCK TABLES) instead of db.session
+    """
+    executor = connection or db.session
+    name = partition_name(month_start)
+    partitions = {partition['name']: partition for partition in list_partitions(connection)}
+    partition = partitions.get(name)
+    if partition is None or partition['upper_bound'] != add_months(month_start, 1):
+        return False
+    executor.execute(db.text(f'ALTER TABLE attendance_logs DROP PARTITION {name}'))
+    return True
@@ -0,0 +1,175 @@
+# app/utils/attendance_spool.py
+import atexit
+import contextlib
+import threading
+import time
+from app.extensions import db
+from app.utils.log import get_logger
+
+
+logger = get_logger(__name__)
+
+
+class AttendanceSpool:
+    """
+    local fallback for attendance rows while the database is failing or slow
+
+    write() calls save(rows); when it raises, the rows are appended to the
+    spool journal (one fsync per batch) instead of being lost. a failed
+    write, or one slower than latency_budget seconds, puts the spool in
+    degraded mode for cooldown seconds: rows go straight to the spool
+    without touching the database. a background replayer seals the spool
+    every replay_interval seconds and bulk-loads it with save() once the
+    database answers again; the (rfid_uid, timestamp, device_id) unique
+    key and insert-ignore make every row land exactly once
+
+    consumers may share the spool directory: each one spools into its own
+    subdirectory and the replayer only adopts those of stopped processes
+    (see SwipeJournal)
+
+    app is None when save() does not use flask-sqlalchemy (asyncio consumer):
+    no app context is pushed and no session is rolled back
+    """
+
+    def __init__(self, app, journal, save, latency_budget=2.0, cooldown=10.0,
+                 replay_interval=5.0, replay_chunk_size=1000):
+        self.app = app
+        self.journal = journal
+        self.save = save
+        self.latency_budget = latency_budget
+        self.cooldown = cooldown
+        self.replay_interval = replay_interval
+        self.replay_chunk_size = replay_chunk_size
+
+        self._lock = threading.Lock()
+        self._degraded_until = 0.0
+        self._stop_event = threading.Event()
+        self._thread = None
+
+        self._stats = {
+            'written': 0,
+            'spooled': 0,
+            'failed_writes': 0,
+            'slow_writes': 0,
+            'replayed': 0,
+            'failed_replays': 0,
+        }
+
+    def start(self):
+        """
+        start the replayer (idempotent); spool files of a previous process are replayed first
+        """
+        with self._lock:
+            if self._thread is not None:
+                return
+            self.journal.open()
+            self._thread = threading.Thread(
+                target=self._run,
+                name='attendance-spool-replayer',
+                daemon=True
+            )
+            self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(self.replay_interval + 5)
+        self.journal.close()
+
+    def write(self, rows):
+        """
+        persist rows with save(rows) or spool them (requires app context)
+
+        returns save()'s result, or None when the rows were spooled
+        """
+        if not rows:
+            return self.save(rows)
+        if self.degraded():
+            self._spool(rows)
+            return None
+
+        started = time.monotonic()
+        try:
+            result = self.save(rows)
+        except Exception as e:
+            self._rollback()
+            self._trip('failed_writes')
+            logger.error('attendance write failed, logs spooled', logs=len(rows), error=str(e))
+            self._spool(rows)
+            return None
+
+        elapsed = time.monotonic() - started
+        with self._lock:
+            self._stats['written'] += len(rows)
+        if elapsed > self.latency_budget:
+            # đã ghi xong nhưng quá chậm: các batch sau ghi vào spool trong thời gian cooldown
+            self._trip('slow_writes')
+            logger.warning('attendance write over latency budget, spooling', seconds=round(elapsed, 3),
+                           budget=self.latency_budget, cooldown=self.cooldown)
+        return result
+
+    def degraded(self):
+        return time.monotonic() < self._degraded_until
+
+    def replay(self):
+        """
+        bulk-load sealed spool segments into the database; returns rows replayed
+        """
+        self.journal.seal()
+        with self.app.app_context() if self.app is not None else contextlib.nullcontext():
+            try:
+                replayed = self.journal.replay(self.save, chunk_size=self.replay_chunk_size)
+            except Exception as e:
+                self._rollback()
+                self._trip('failed_replays')
+                logger.error('failed to replay attendance spool', error=str(e))
+                return 0
+        if replayed:
+            with self._lock:
+                self._stats['replayed'] += replayed
+            logger.info('attendance spool replayed', logs=replayed)
+        return replayed
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._stats)
+        data['degraded'] = self.degraded()
+        data['latency_budget'] = self.latency_budget
+        data['journal'] = self.journal.stats()
+        data['running'] = self._thread is not None and not self._stop_event.is_set()
+        return data
+
+    def _rollback(self):
+        if self.app is not None:
+            db.session.rollback()
+
+    def _spool(self, rows):
+        self.journal.append(rows)
+        with self._lock:
+            self._stats['spooled'] += len(rows)
+
+    def _trip(self, counter):
+        with self._lock:
+            self._stats[counter] += 1
+            self._degraded_until = time.monotonic() + self.cooldown
+
+    def _run(self):
+        while True:
+            # chỉ replay khi database đã hết thời gian cooldown
+            if not self.degraded():
+                self._adopt()
+                if self.journal.has_replayable():
+                    self.replay()
+            if self._stop_event.wait(self.replay_interval):
+                return
+
+    def _adopt(self):
+        # spool của consumer khác (cùng thư mục) đã dừng: nhận về để replay
+        try:
+            adopted = self.journal.adopt()
+        except OSError as e:
+            logger.error('failed to adopt attendance spool', error=str(e))
+            return
+        if adopted:
+            logger.info('attendance spool of a stopped process adopted', segments=adopted)
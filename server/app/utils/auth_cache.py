@@ -0,0 +1,93 @@
+# app/utils/auth_cache.py
+import time
+from collections import namedtuple
+from app.extensions import db
+from app.models import User
+from app.utils.ttl_cache import TTLCache
+
+
+Principal = namedtuple('Principal', ['id', 'rfid_uid', 'is_active', 'is_admin'])
+
+
+class AuthCache:
+    """
+    process-local cache for the require_auth / require_admin path
+
+    - token -> verified jwt payload (never kept past the token exp)
+    - user id -> Principal(id, rfid_uid, is_active, is_admin)
+
+    user writes in this process invalidate the principal explicitly;
+    other processes see changes after at most principal_ttl seconds
+    """
+
+    def __init__(self):
+        self._tokens = TTLCache()
+        self._principals = TTLCache()
+
+    def init_app(self, app):
+        self._tokens = TTLCache(
+            maxsize=app.config['AUTH_TOKEN_CACHE_SIZE'],
+            ttl=app.config['AUTH_TOKEN_CACHE_TTL']
+        )
+        self._principals = TTLCache(
+            maxsize=app.config['AUTH_PRINCIPAL_CACHE_SIZE'],
+            ttl=app.config['AUTH_PRINCIPAL_CACHE_TTL']
+        )
+
+    def get_payload(self, token, decode):
+        """
+        return the verified payload of token, calling decode(token) only on a miss
+
+        invalid tokens are not cached so they keep failing through decode()
+        """
+        payload = self._tokens.get(token)
+        if payload is not None:
+            return payload
+
+        payload = decode(token)
+        if payload is None:
+            return None
+
+        # không giữ token trong cache lâu hơn thời điểm hết hạn của nó
+        ttl = self._tokens.ttl
+        if 'exp' in payload:
+            ttl = min(ttl, payload['exp'] - time.time())
+        if ttl > 0:
+            self._tokens.set(token, payload, ttl=ttl)
+        return payload
+
+    def get_principal(self, user_id):
+        """
+        return the Principal of user_id, loading it with one query on a miss
+
+        returns None if the user does not exist (not cached)
+        """
+        if user_id is None:
+            return None
+
+        principal = self._principals.get(user_id)
+        if principal is not None:
+            return principal
+
+        row = db.session.execute(
+            db.select(User.id, User.rfid_uid, User.is_active, User.is_admin)
+            .where(User.id == user_id)
+        ).first()
+        if row is None:
+            return None
+
+        principal = Principal(row.id, row.rfid_uid, bool(row.is_active), bool(row.is_admin))
+        self._principals.set(user_id, principal)
+        return principal
+
+    def invalidate_user(self, user_id):
+        self._principals.pop(user_id)
+
+    def stats(self):
+        return {
+            'tokens': self._tokens.stats(),
+            'principals': self._principals.stats()
+        }
+
+
+auth_cache = AuthCache()
@@ -1,8 +1,9 @@
 from functools import wraps
 from flask import request
-from app.models import User
+from app.utils.auth_cache import auth_cache
 from app.utils.responses import error_response
 from flask import current_app
+import hmac
 import jwt
 
 def get_token_from_header():
@@ -39,25 +40,40 @@ def decode_token(token):
     except jwt.InvalidTokenError:
         return None
 
+def authenticate():
+    """
+    resolve the principal of the current request from the jwt
+
+    uses the auth cache, so a repeated token of a known user needs no database query
+    returns (principal, None) or (None, error response)
+    """
+    token = get_token_from_header()
+    if not token:
+        return None, error_response('token khong ton tai', 'MISSING_TOKEN', 401)
+
+    payload = auth_cache.get_payload(token, decode_token)
+    if not payload:
+        return None, error_response('token khong hop le hoac da het han', 'INVALID_TOKEN', 401)
+
+    principal = auth_cache.get_principal(payload.get('id'))
+    if not principal:
+        return None, error_response('user khong ton tai', 'USER_NOT_FOUND', 401)
+
+    if not principal.is_active:
+        return None, error_response('tai khoan da bi vo hieu hoa', 'ACCOUNT_INACTIVE', 403)
+
+    return principal, None
+
 def require_auth(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        token = get_token_from_header()
-        if not token:
-            return error_response('token khong ton tai', 'MISSING_TOKEN', 401)
+        principal, error = authenticate()
+        if error:
+            return error
         
-        payload = decode_token(token)
-        if not payload:
-            return error_response('token khong hop le hoac da het han', 'INVALID_TOKEN', 401)
-        
-        user = User.query.get(payload.get('id'))
-        if not user:
-            return error_response('user khong ton tai', 'USER_NOT_FOUND', 401)
-        
-        if not user.is_active:
-            return error_response('tai khoan da bi vo hieu hoa', 'ACCOUNT_INACTIVE', 403)
-        
-        request.current_user = user
+        # request.current_user là Principal(id, rfid_uid, is_active, is_admin),
+        # handler cần đầy đủ thông tin user thì tự load theo current_user.id
+        request.current_user = principal
         return f(*args, **kwargs)
     
     return decorated_function
@@ -65,25 +81,61 @@ def require_auth(f):
 def require_admin(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        token = get_token_from_header()
-        if not token:
-            return error_response('token khong ton tai', 'MISSING_TOKEN', 401)
-        
-        payload = decode_token(token)
-        if not payload:
-            return error_response('token khong hop le hoac da het han', 'INVALID_TOKEN', 401)
+        principal, error = authenticate()
+        if error:
+            return error
         
-        user = User.query.get(payload.get('id'))
-        if not user:
-            return error_response('user khong ton tai', 'USER_NOT_FOUND', 401)
-        
-        if not user.is_active:
-            return error_response('tai khoan da bi vo hieu hoa', 'ACCOUNT_INACTIVE', 403)
-        
-        if not user.is_admin:
+        if not principal.is_admin:
             return error_response('ban khong co quyen truy cap', 'FORBIDDEN', 403)
         
-        request.current_user = user
+        request.current_user = principal
         return f(*args, **kwargs)
     
     return decorated_function
+
+def parse_device_tokens(value):
+    """
+    DEVICE_API_TOKENS ("device001:token1,device002:token2") -> {device_id: token}
+    """
+    tokens = {}
+    for item in value.split(','):
+        device_id, _, token = item.strip().partition(':')
+        if device_id and token:
+            tokens[device_id] = token
+    return tokens
+
+def authenticate_device(device_id):
+    """
+    check the bearer token of a device request: the token of device_id in
+    DEVICE_API_TOKENS or the service token DEVICE_SERVICE_TOKEN (a sync
+    gateway sending for every device); user jwts are not accepted
+
+    returns None or an error response
+    """
+    token = get_token_from_header()
+    if not token:
+        return error_response('token khong ton tai', 'MISSING_TOKEN', 401)
+
+    config = current_app.config
+    accepted = [config['DEVICE_SERVICE_TOKEN'], parse_device_tokens(config['DEVICE_API_TOKENS']).get(device_id, '')]
+    if not any(expected and hmac.compare_digest(token.encode(), expected.encode()) for expected in accepted):
+        return error_response('token thiet bi khong hop le', 'INVALID_DEVICE_TOKEN', 401)
+    return None
+
+def require_device(f):
+    """
+    device / service token for the device_id of the json body (see authenticate_device)
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        data = request.get_json(silent=True)
+        device_id = data.get('device_id') if isinstance(data, dict) else None
+        if not device_id:
+            return error_response('thieu thong tin device_id hoac swipes', 'MISSING_FIELDS', 400)
+
+        error = authenticate_device(device_id)
+        if error:
+            return error
+        return f(*args, **kwargs)
+
+    return decorated_function
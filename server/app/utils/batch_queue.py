@@ -0,0 +1,200 @@
+# app/utils/batch_queue.py
+import atexit
+import queue
+import threading
+import time
+from app.utils.log import get_logger
+from app.utils.query_profiler import query_profiler
+
+
+logger = get_logger(__name__)
+
+# sentinel báo cho worker dừng sau khi đã drain hết queue
+_STOP = object()
+
+
+class BatchQueue:
+    """
+    bounded in-process queue drained by a pool of worker threads
+
+    producers call put() (cheap, non-blocking up to enqueue_timeout);
+    workers collect items into batches and hand each batch to `handler`.
+    a batch is flushed when it reaches batch_size items or when
+    flush_interval seconds have passed since its first item.
+
+    with partition_key, every worker owns its own queue and items with the
+    same key always go to the same worker, so they are handled in order
+    """
+
+    def __init__(self, name, handler, maxsize=10000, batch_size=200,
+                 flush_interval=0.5, workers=2, enqueue_timeout=1.0,
+                 partition_key=None):
+        self.name = name
+        self.handler = handler
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.worker_count = max(1, workers)
+        self.enqueue_timeout = enqueue_timeout
+        self.partition_key = partition_key
+
+        if partition_key is None:
+            # 1 queue dùng chung cho mọi worker
+            self._queues = [queue.Queue(maxsize=maxsize)]
+        else:
+            # mỗi worker 1 queue riêng, chia đều sức chứa
+            partition_size = max(1, maxsize // self.worker_count)
+            self._queues = [queue.Queue(maxsize=partition_size) for _ in range(self.worker_count)]
+        self._threads = []
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._started = False
+        self._stopping = False
+
+        self._stats = {
+            'enqueued': 0,
+            'processed': 0,
+            'batches': 0,
+            'failed_batches': 0,
+            'dropped': 0,
+            'blocked_puts': 0,
+            'max_depth': 0,
+        }
+
+    def start(self):
+        """
+        start worker threads (idempotent)
+        """
+        with self._start_lock:
+            if self._started:
+                return
+            for i in range(self.worker_count):
+                thread = threading.Thread(
+                    target=self._worker_loop,
+                    args=(self._queues[i % len(self._queues)],),
+                    name=f'{self.name}-worker-{i}',
+                    daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+            self._started = True
+            atexit.register(self.stop)
+
+    def put(self, item):
+        """
+        enqueue an item, applying backpressure when the queue is full
+
+        blocks up to enqueue_timeout seconds; returns False if the item
+        could not be enqueued (queue still full or queue is stopping)
+        """
+        if self._stopping:
+            self._incr('dropped')
+            return False
+
+        if not self._started:
+            self.start()
+
+        target = self._queue_for(item)
+        try:
+            target.put_nowait(item)
+        except queue.Full:
+            # queue đầy: chặn producer một khoảng ngắn để tạo backpressure
+            self._incr('blocked_puts')
+            try:
+                target.put(item, timeout=self.enqueue_timeout)
+            except queue.Full:
+                self._incr('dropped')
+                return False
+
+        depth = self._depth()
+        with self._stats_lock:
+            self._stats['enqueued'] += 1
+            if depth > self._stats['max_depth']:
+                self._stats['max_depth'] = depth
+        return True
+
+    def stop(self, timeout=10.0):
+        """
+        stop accepting items and drain what is already queued
+        """
+        with self._start_lock:
+            if not self._started or self._stopping:
+                return
+            self._stopping = True
+
+        # mỗi worker nhận 1 sentinel, nằm sau toàn bộ item đang chờ
+        for i in range(len(self._threads)):
+            self._queues[i % len(self._queues)].put(_STOP)
+
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+
+    def stats(self):
+        """
+        snapshot of queue counters and current depth
+        """
+        with self._stats_lock:
+            data = dict(self._stats)
+        data.update({
+            'name': self.name,
+            'depth': self._depth(),
+            'capacity': sum(q.maxsize for q in self._queues),
+            'workers': self.worker_count,
+            'partitioned': self.partition_key is not None,
+            'running': self._started and not self._stopping,
+        })
+        return data
+
+    def _queue_for(self, item):
+        if len(self._queues) == 1:
+            return self._queues[0]
+        return self._queues[hash(self.partition_key(item)) % len(self._queues)]
+
+    def _depth(self):
+        return sum(q.qsize() for q in self._queues)
+
+    def _incr(self, key, amount=1):
+        with self._stats_lock:
+            self._stats[key] += amount
+
+    def _worker_loop(self, work_queue):
+        while True:
+            item = work_queue.get()
+            if item is _STOP:
+                return
+
+            batch = [item]
+            stop_after_flush = False
+
+            # gom thêm item cho tới khi đủ batch_size hoặc hết flush_interval
+            # tính từ lúc nhận item đầu tiên của batch
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    if remaining <= 0:
+                        next_item = work_queue.get_nowait()
+                    else:
+                        next_item = work_queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if next_item is _STOP:
+                    stop_after_flush = True
+                    break
+                batch.append(next_item)
+
+            self._flush(batch)
+
+            if stop_after_flush:
+                return
+
+    def _flush(self, batch):
+        try:
+            with query_profiler.profile(f'queue {self.name}'):
+                self.handler(batch)
+            with self._stats_lock:
+                self._stats['processed'] += len(batch)
+                self._stats['batches'] += 1
+        except Exception:
+            self._incr('failed_batches')
+            logger.exception('failed to process batch', queue=self.name, items=len(batch))
@@ -0,0 +1,92 @@
+# app/utils/cache_invalidation.py
+import json
+import uuid
+from app.extensions import mqtt
+from app.utils.auth_cache import auth_cache
+from app.utils.swipe_cache import swipe_cache
+from app.utils.log import get_logger
+
+
+logger = get_logger(__name__)
+
+
+# id của process hiện tại, bỏ qua message do chính process này publish
+PROCESS_ID = uuid.uuid4().hex
+
+
+def publish_user_invalidation(user_id, *rfid_uids):
+    """
+    tell every other process to drop its cached copy of a user that was written
+
+    call after the commit, next to the local swipe_cache / auth_cache update
+    """
+    publish_cache_invalidation({
+        'users': [{'id': user_id, 'rfid_uids': [rfid_uid for rfid_uid in rfid_uids if rfid_uid]}]
+    })
+
+
+def publish_device_invalidation(device_id):
+    """
+    tell every other process that rfid_enabled of a device may have changed
+    """
+    publish_cache_invalidation({'devices': [device_id]})
+
+
+def publish_cache_invalidation(payload):
+    """
+    publish to CACHE_INVALIDATION_TOPIC; a lost message is covered by
+    SWIPE_CACHE_REFRESH_INTERVAL / AUTH_PRINCIPAL_CACHE_TTL
+    """
+    payload['origin'] = PROCESS_ID
+    try:
+        mqtt.publish(mqtt.app.config['CACHE_INVALIDATION_TOPIC'], json.dumps(payload), qos=1)
+    except Exception as e:
+        logger.error('failed to publish cache invalidation', error=str(e))
+
+
+def apply_cache_invalidation(payload):
+    """
+    drop the cache entries named by an invalidation message
+
+    messages only name keys to evict, never values: entries are re-read
+    from the database on the next use, so a forged message costs a query
+    """
+    if not isinstance(payload, dict) or payload.get('origin') == PROCESS_ID:
+        return
+
+    for user in payload.get('users') or []:
+        swipe_cache.evict_users(user.get('rfid_uids') or [])
+        if user.get('id') is not None:
+            auth_cache.invalidate_user(user['id'])
+
+    if payload.get('devices'):
+        # device không có trong cache được coi là rfid_enabled, nên nạp lại thay vì xoá
+        swipe_cache.expire()
+
+    logger.debug('cache invalidated', users=len(payload.get('users') or []), devices=len(payload.get('devices') or []))
+
+
+def handle_cache_connect(client, userdata, flags, rc):
+    """
+    on_connect of http workers (no mqtt consumer): only subscribe to cache invalidation
+    """
+    if rc == 0:
+        mqtt.subscribe(mqtt.app.config['CACHE_INVALIDATION_TOPIC'], qos=1)
+
+
+def handle_cache_message(client, userdata, message):
+    try:
+        apply_cache_invalidation(json.loads(message.payload.decode()))
+    except Exception as e:
+        logger.warning('invalid cache invalidation message', topic=message.topic, error=str(e))
+
+
+def register_cache_invalidation_handlers():
+    """
+    attach the cache invalidation handlers in processes that do not consume
+    esp32 messages (the consumer handles the topic in handle_mqtt_message)
+    """
+    mqtt.on_connect()(handle_cache_connect)
+    mqtt.on_message()(handle_cache_message)
+    if mqtt.connected:
+        handle_cache_connect(mqtt.client, None, None, 0)
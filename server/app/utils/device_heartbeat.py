@@ -0,0 +1,184 @@
+# app/utils/device_heartbeat.py
+import atexit
+import threading
+import time
+from datetime import datetime
+from app.extensions import mqtt, db
+from app.models import Device
+from app.utils.metrics import db_commit_seconds
+from app.utils.log import get_logger
+from app.utils.query_profiler import query_profiler
+
+
+logger = get_logger(__name__)
+
+_heartbeat_tracker = None
+_heartbeat_tracker_lock = threading.Lock()
+
+
+class DeviceHeartbeatTracker:
+    """
+    coalesces device last_seen updates in memory
+
+    touch() is O(1) and never hits the database; a background flusher
+    writes only the devices seen since the previous flush, creating
+    unknown devices with one multi-row insert and updating the rest
+    with one bulk UPDATE
+    """
+
+    def __init__(self, app, flush_interval=5.0):
+        self.app = app
+        self.flush_interval = flush_interval
+
+        # device_id -> last_seen (utc) chưa được ghi xuống database
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+        self._stats = {
+            'touches': 0,
+            'flushes': 0,
+            'failed_flushes': 0,
+            'devices_updated': 0,
+            'devices_created': 0,
+        }
+
+    def touch(self, device_id):
+        """
+        record that a device has just sent a message
+        """
+        with self._lock:
+            self._pending[device_id] = datetime.utcnow()
+            self._stats['touches'] += 1
+        if self._thread is None:
+            self.start()
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(
+                target=self._run,
+                name='device-heartbeat-flusher',
+                daemon=True
+            )
+            self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        """
+        stop the flusher and write whatever is still pending
+        """
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(self.flush_interval + 5)
+        self.flush()
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._stats)
+            data['pending'] = len(self._pending)
+        data['flush_interval'] = self.flush_interval
+        data['running'] = self._thread is not None and not self._stop_event.is_set()
+        return data
+
+    def flush(self):
+        """
+        write pending last_seen values in bulk; returns number of devices written
+        """
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return 0
+
+            with self.app.app_context(), query_profiler.profile('device heartbeat flush'):
+                try:
+                    started = time.perf_counter()
+                    device_ids = list(pending)
+                    existing = {
+                        row[0] for row in db.session.execute(
+                            db.select(Device.device_id).where(Device.device_id.in_(device_ids))
+                        )
+                    }
+
+                    # tự động tạo các device mới trong 1 câu insert nhiều dòng
+                    new_rows = [
+                        {
+                            'device_id': device_id,
+                            'name': f'Device {device_id}',
+                            'is_active': True,
+                            'last_seen': pending[device_id]
+                        }
+                        for device_id in device_ids if device_id not in existing
+                    ]
+                    if new_rows:
+                        db.session.execute(db.insert(Device), new_rows)
+
+                    # cập nhật last_seen của các device đã có bằng 1 câu UPDATE ... CASE
+                    if existing:
+                        db.session.execute(
+                            db.update(Device)
+                            .where(Device.device_id.in_(existing))
+                            .values(last_seen=db.case(
+                                {device_id: pending[device_id] for device_id in existing},
+                                value=Device.device_id
+                            ))
+                        )
+
+                    db.session.commit()
+                    db_commit_seconds.observe(time.perf_counter() - started, 'device_heartbeat')
+                except Exception as e:
+                    db.session.rollback()
+                    self._restore(pending)
+                    with self._lock:
+                        self._stats['failed_flushes'] += 1
+                    logger.error('failed to flush device last_seen', devices=len(pending), error=str(e))
+                    return 0
+
+            with self._lock:
+                self._stats['flushes'] += 1
+                self._stats['devices_updated'] += len(existing)
+                self._stats['devices_created'] += len(new_rows)
+            return len(pending)
+
+    def _restore(self, pending):
+        # đưa lại các giá trị chưa ghi được, giữ giá trị mới hơn nếu device đã được touch lại
+        with self._lock:
+            for device_id, last_seen in pending.items():
+                current = self._pending.get(device_id)
+                if current is None or current < last_seen:
+                    self._pending[device_id] = last_seen
+
+    def _run(self):
+        while not self._stop_event.wait(self.flush_interval):
+            self.flush()
+
+
+def get_heartbeat_tracker(app=None):
+    """
+    return the process-wide device heartbeat tracker, creating it on first use
+
+    app defaults to the flask-mqtt app (the asyncio consumer passes its own)
+    """
+    global _heartbeat_tracker
+    if _heartbeat_tracker is None:
+        with _heartbeat_tracker_lock:
+            if _heartbeat_tracker is None:
+                app = app or mqtt.app
+                _heartbeat_tracker = DeviceHeartbeatTracker(
+                    app,
+                    flush_interval=app.config['DEVICE_HEARTBEAT_FLUSH_INTERVAL']
+                )
+    return _heartbeat_tracker
+
+
+def get_heartbeat_stats():
+    """
+    counters of the heartbeat tracker (empty if not started)
+    """
+    if _heartbeat_tracker is None:
+        return {'running': False}
+    return _heartbeat_tracker.stats()
@@ -0,0 +1,165 @@
+# app/utils/log.py
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import threading
+from datetime import datetime, timezone
+from app.utils.metrics import metrics
+
+
+# các thuộc tính chuẩn của LogRecord, không đưa vào phần fields
+_RESERVED = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+
+_listener = None
+_listener_lock = threading.Lock()
+_queue_handler = None
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    one json object per line: ts, level, logger, msg and the structured fields
+    """
+
+    def format(self, record):
+        data = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname.lower(),
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED:
+                data[key] = value
+        if record.exc_info:
+            data['exc'] = self.formatException(record.exc_info)
+        return json.dumps(data, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    """
+    human readable line for development: time level logger msg key=value ...
+    """
+
+    def format(self, record):
+        fields = ' '.join(f'{key}={value}' for key, value in vars(record).items() if key not in _RESERVED)
+        line = (
+            f'{datetime.fromtimestamp(record.created).strftime("%H:%M:%S.%f")[:-3]} '
+            f'{record.levelname.lower():<7} {record.name}: {record.getMessage()}'
+        )
+        if fields:
+            line = f'{line} {fields}'
+        if record.exc_info:
+            line = f'{line}\n{self.formatException(record.exc_info)}'
+        return line
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """
+    never blocks the caller: when the queue is full the record is dropped and counted
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def prepare(self, record):
+        # format msg % args ngay trên thread gọi, giữ nguyên các field có cấu trúc
+        record.msg = record.getMessage()
+        record.args = None
+        record.exc_text = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class StructuredLogger:
+    """
+    thin wrapper over logging.Logger taking structured fields as keyword arguments
+
+        logger.info('attendance batch saved', saved=10, duplicates=0)
+        logger.debug('swipe received', sample=True, rfid_uid=rfid_uid)
+
+    the level check happens before anything is built; debug lines marked
+    sample=True are only emitted for LOG_DEBUG_SAMPLE_RATE of the calls
+    """
+
+    sample_rate = 1.0
+
+    def __init__(self, name):
+        self.logger = logging.getLogger(name)
+
+    def debug(self, msg, sample=False, **fields):
+        if not self.logger.isEnabledFor(logging.DEBUG):
+            return
+        if sample and random.random() >= self.sample_rate:
+            return
+        self.logger.debug(msg, extra=fields, stacklevel=2)
+
+    def info(self, msg, **fields):
+        if self.logger.isEnabledFor(logging.INFO):
+            self.logger.info(msg, extra=fields, stacklevel=2)
+
+    def warning(self, msg, **fields):
+        if self.logger.isEnabledFor(logging.WARNING):
+            self.logger.warning(msg, extra=fields, stacklevel=2)
+
+    def error(self, msg, **fields):
+        if self.logger.isEnabledFor(logging.ERROR):
+            self.logger.error(msg, extra=fields, stacklevel=2)
+
+    def exception(self, msg, **fields):
+        self.logger.error(msg, extra=fields, exc_info=True, stacklevel=2)
+
+
+def get_logger(name):
+    return StructuredLogger(name)
+
+
+def init_logging(config):
+    """
+    route the 'app' logger through a bounded queue to one writer thread
+
+    callers only format the record and put it on the queue; the listener
+    thread writes to stdout, so hot paths never wait on the stdout lock.
+    idempotent: one listener per process even if create_app runs twice
+    """
+    global _listener, _queue_handler
+    StructuredLogger.sample_rate = config['LOG_DEBUG_SAMPLE_RATE']
+
+    logger = logging.getLogger('app')
+    logger.setLevel(config['LOG_LEVEL'])
+    # không đẩy lên root logger (tránh in 2 lần qua handler của werkzeug / gunicorn)
+    logger.propagate = False
+
+    with _listener_lock:
+        if _listener is not None:
+            return
+        stream_handler = logging.StreamHandler(sys.stdout)
+        stream_handler.setFormatter(JsonFormatter() if config['LOG_FORMAT'] == 'json' else TextFormatter())
+
+        log_queue = queue.Queue(maxsize=config['LOG_QUEUE_SIZE'])
+        _queue_handler = DroppingQueueHandler(log_queue)
+        logger.addHandler(_queue_handler)
+
+        _listener = logging.handlers.QueueListener(log_queue, stream_handler)
+        _listener.start()
+        # ghi hết các dòng còn trong queue trước khi process thoát
+        atexit.register(_listener.stop)
+
+
+def _dropped_records():
+    return {(): _queue_handler.dropped if _queue_handler is not None else 0}
+
+
+metrics.gauge('log_records_dropped', 'log records dropped because the log queue was full', [], _dropped_records)
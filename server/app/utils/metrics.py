@@ -0,0 +1,318 @@
+# app/utils/metrics.py
+import abc
+import bisect
+import hmac
+import threading
+import time
+import weakref
+from flask import Response, current_app, request
+from werkzeug.serving import make_server
+
+
+# bucket mặc định (giây) cho các histogram độ trễ
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _ShardOwner:
+    """
+    kept in the thread-local: collected when its thread ends
+    """
+    __slots__ = ('__weakref__',)
+
+
+class _Sharded(abc.ABC):
+    """
+    per-thread shards: a thread only ever writes its own dict, so the hot
+    path takes no lock; a scrape merges copies of every shard
+
+    when a thread ends its shard is folded into a retired total, so
+    short-lived threads (threaded servers) do not grow the shard list
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._shards = []
+        self._retired = {}
+        # RLock: finalizer có thể chạy (gc) ngay trong thread đang giữ lock
+        self._shards_lock = threading.RLock()
+
+    def _shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = {}
+            owner = self._local.owner = _ShardOwner()
+            with self._shards_lock:
+                self._shards.append(shard)
+            weakref.finalize(owner, self._retire, shard)
+        return shard
+
+    def _retire(self, shard):
+        with self._shards_lock:
+            self._fold(self._retired, shard)
+            self._shards = [item for item in self._shards if item is not shard]
+
+    @abc.abstractmethod
+    def _fold(self, totals, shard):
+        """
+        add the values of shard into totals (a retired total), in place
+        """
+
+    def _snapshots(self):
+        with self._shards_lock:
+            shards = list(self._shards)
+            retired = {key: value.copy() if isinstance(value, list) else value for key, value in self._retired.items()}
+        # dict.copy() là 1 thao tác nguyên tử dưới GIL
+        return [retired] + [shard.copy() for shard in shards]
+
+
+class Counter(_Sharded):
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__()
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def inc(self, *labelvalues, amount=1):
+        shard = self._shard()
+        shard[labelvalues] = shard.get(labelvalues, 0) + amount
+
+    def _fold(self, totals, shard):
+        for labelvalues, value in shard.items():
+            totals[labelvalues] = totals.get(labelvalues, 0) + value
+
+    def collect(self):
+        totals = {}
+        for snapshot in self._snapshots():
+            for labelvalues, value in snapshot.items():
+                totals[labelvalues] = totals.get(labelvalues, 0) + value
+        return [(self.name, labelvalues, value) for labelvalues, value in sorted(totals.items())]
+
+    kind = 'counter'
+
+
+class Histogram(_Sharded):
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__()
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, *labelvalues):
+        shard = self._shard()
+        # [số mẫu theo từng bucket..., +Inf, sum]
+        data = shard.get(labelvalues)
+        if data is None:
+            data = shard[labelvalues] = [0] * (len(self.buckets) + 1) + [0.0]
+        data[bisect.bisect_left(self.buckets, value)] += 1
+        data[-1] += value
+
+    def time(self, *labelvalues):
+        return _Timer(self, labelvalues)
+
+    def _fold(self, totals, shard):
+        for labelvalues, data in shard.items():
+            merged = totals.get(labelvalues)
+            if merged is None:
+                totals[labelvalues] = list(data)
+            else:
+                for index, value in enumerate(data):
+                    merged[index] += value
+
+    def collect(self):
+        totals = {}
+        for snapshot in self._snapshots():
+            for labelvalues, data in snapshot.items():
+                data = list(data)
+                merged = totals.get(labelvalues)
+                if merged is None:
+                    totals[labelvalues] = data
+                else:
+                    for index, value in enumerate(data):
+                        merged[index] += value
+
+        samples = []
+        for labelvalues, data in sorted(totals.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), data):
+                cumulative += count
+                samples.append((f'{self.name}_bucket', labelvalues + (_format_bound(bound),), cumulative))
+            samples.append((f'{self.name}_sum', labelvalues, data[-1]))
+            samples.append((f'{self.name}_count', labelvalues, cumulative))
+        return samples
+
+    kind = 'histogram'
+
+
+class Gauge:
+    """
+    value computed at scrape time: callback() returns {labelvalues tuple: value}
+    """
+
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames, callback):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.callback = callback
+
+    def collect(self):
+        return [(self.name, labelvalues, value) for labelvalues, value in sorted(self.callback().items())]
+
+
+class _Timer:
+    def __init__(self, histogram, labelvalues):
+        self.histogram = histogram
+        self.labelvalues = labelvalues
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, *self.labelvalues)
+
+
+def _format_bound(bound):
+    return '+Inf' if bound == float('inf') else repr(float(bound))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+class MetricsRegistry:
+    """
+    process-local metrics rendered in the prometheus text format (0.0.4)
+
+    every process (gunicorn worker, mqtt consumer) has its own registry;
+    scrape each of them
+    """
+
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def gauge(self, name, documentation, labelnames, callback):
+        return self._register(Gauge(name, documentation, labelnames, callback))
+
+    def init_app(self, app):
+        """
+        expose GET /metrics and time every request by route
+        """
+        if not app.config['METRICS_ENABLED']:
+            return
+
+        @app.before_request
+        def start_request_timer():
+            request.metrics_started = time.perf_counter()
+
+        @app.after_request
+        def observe_request(response):
+            started = getattr(request, 'metrics_started', None)
+            if started is not None:
+                # dùng rule (vd /api/users/<int:user_id>) thay vì path để tránh label vô hạn
+                route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+                http_request_seconds.observe(
+                    time.perf_counter() - started, request.method, route, str(response.status_code)
+                )
+            return response
+
+        app.add_url_rule('/metrics', 'metrics', self.render_response)
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for name, labelvalues, value in metric.collect():
+                labelnames = metric.labelnames + (('le',) if name.endswith('_bucket') else ())
+                if labelnames:
+                    labels = ','.join(f'{key}="{_escape(val)}"' for key, val in zip(labelnames, labelvalues))
+                    lines.append(f'{name}{{{labels}}} {value}')
+                else:
+                    lines.append(f'{name} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def render_response(self):
+        """
+        GET /metrics: bearer METRICS_TOKEN when configured, otherwise an admin jwt
+        """
+        # import trễ để tránh import vòng (auth_decorators -> models)
+        from app.utils.auth_decorators import get_token_from_header, require_admin
+
+        metrics_token = current_app.config['METRICS_TOKEN']
+        token = get_token_from_header()
+        if metrics_token and token and hmac.compare_digest(token.encode(), metrics_token.encode()):
+            return self._text_response()
+        return require_admin(self._text_response)()
+
+    def _text_response(self):
+        return Response(self.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+
+metrics = MetricsRegistry()
+
+
+def start_metrics_server(app, port):
+    """
+    serve app (GET /metrics, GET /api/mqtt/ingest-stats) on a background thread
+    of an ingest consumer that has no http server of its own; returns the
+    server (shutdown() to stop)
+    """
+    server = make_server('0.0.0.0', port, app, threaded=True)
+    threading.Thread(target=server.serve_forever, name='metrics-server', daemon=True).start()
+    return server
+
+mqtt_messages = metrics.counter(
+    'mqtt_messages_total', 'mqtt messages received by topic type', ['topic_type']
+)
+swipe_results = metrics.counter(
+    'attendance_swipes_total', 'swipes by outcome (error_code, OK when accepted)', ['error_code']
+)
+swipe_response_seconds = metrics.histogram(
+    'attendance_swipe_response_seconds', 'time from receiving a swipe to publishing its response', ['mode']
+)
+db_commit_seconds = metrics.histogram(
+    'db_commit_seconds', 'duration of ingest database writes including the commit', ['operation']
+)
+api_errors = metrics.counter(
+    'api_errors_total', 'error responses returned by the api by error code', ['error_code', 'status']
+)
+http_request_seconds = metrics.histogram(
+    'http_request_duration_seconds', 'http request latency by route', ['method', 'route', 'status']
+)
+
+
+def _queue_depths():
+    """
+    depth of the queues running in this process: http workers (no ingest)
+    report none instead of zeros, the consumer process serves the real ones
+    """
+    # import trễ để tránh import vòng (attendance_ingest dùng các metric ở trên)
+    from app.utils.attendance_ingest import get_ingest_stats, get_batch_ingest_stats
+    from app.utils.device_heartbeat import get_heartbeat_stats
+    from app.utils.work_day_summary import get_summary_queue_stats
+    depths = {}
+    for name, stats, key in (
+        ('attendance', get_ingest_stats(), 'depth'),
+        ('attendance-batch', get_batch_ingest_stats(), 'depth'),
+        ('device-heartbeat', get_heartbeat_stats(), 'pending'),
+        ('work-day-summary', get_summary_queue_stats(), 'depth'),
+    ):
+        if stats.get('running'):
+            depths[(name,)] = stats[key]
+    return depths
+
+
+queue_depth = metrics.gauge('ingest_queue_depth', 'items waiting in the ingest queues', ['queue'], _queue_depths)
@@ -1,20 +1,199 @@
 # app/utils/paginator.py
+import base64
+import hashlib
+import json
+from datetime import datetime
+from itertools import islice
 from flask import request, jsonify
+from app.extensions import db
+from app.utils.ttl_cache import TTLCache
 
-def paginate_query(query, serialize_func=None, data_key_name='data'):
+
+# cache số lượng bản ghi cho chế độ cursor (count=cached), tránh COUNT(*) mỗi trang
+_count_cache = TTLCache(maxsize=256, ttl=60.0)
+
+
+class InvalidCursorError(ValueError):
+    """
+    cursor token không giải mã được hoặc không khớp với endpoint / filter
+    """
+
+
+# tham số chỉ điều khiển phân trang, không thuộc fingerprint của cursor
+PAGINATION_ARGS = frozenset(('after', 'before', 'page', 'per_page', 'count', 'pagination'))
+
+
+def cursor_fingerprint():
+    """
+    Fingerprint ngắn của endpoint và các filter của request hiện tại.
+
+    Cursor mang theo fingerprint này, dùng cursor của endpoint hoặc bộ filter
+    khác sẽ bị từ chối thay vì trả về một trang sai.
+    """
+    args = sorted(
+        (key, value) for key, values in request.args.lists() if key not in PAGINATION_ARGS
+        for value in values
+    )
+    raw = json.dumps([request.endpoint, args], separators=(',', ':')).encode()
+    return hashlib.sha1(raw).hexdigest()[:8]
+
+
+def encode_cursor(sort_value, item_id, fingerprint=None):
+    """
+    Mã hoá (giá trị cột sắp xếp, id, fingerprint) thành token opaque dạng base64 url-safe.
+    """
+    if isinstance(sort_value, datetime):
+        payload = ['dt', sort_value.isoformat(), item_id, fingerprint]
+    else:
+        payload = ['v', sort_value, item_id, fingerprint]
+    raw = json.dumps(payload, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token, fingerprint=None):
+    """
+    Giải mã token thành (giá trị cột sắp xếp, id), kiểm tra fingerprint của request.
+    """
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        kind, sort_value, item_id, token_fingerprint = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if kind == 'dt':
+            sort_value = datetime.fromisoformat(sort_value)
+        item_id = int(item_id)
+    except Exception:
+        raise InvalidCursorError('cursor khong hop le')
+    if token_fingerprint != fingerprint:
+        raise InvalidCursorError('cursor khong thuoc endpoint hoac bo loc hien tai')
+    return sort_value, item_id
+
+
+def count_query(query, mode):
+    """
+    Đếm tổng số bản ghi theo mode: 'exact' luôn COUNT(*), 'cached' dùng kết quả
+    COUNT(*) đã cache (có thể lệch trong thời gian TTL), còn lại không đếm.
+    """
+    if mode == 'exact':
+        return query.order_by(None).count()
+    if mode == 'cached':
+        compiled = query.statement.compile()
+        key = str(compiled) + repr(sorted(compiled.params.items()))
+        total = _count_cache.get(key)
+        if total is None:
+            total = query.order_by(None).count()
+            _count_cache.set(key, total)
+        return total
+    return None
+
+
+def keyset_page_query(query, keyset, bound=None, newer=False):
+    """
+    Sắp xếp query theo (cột sắp xếp, id) giảm dần, chỉ lấy các bản ghi "cũ hơn" bound;
+    newer=True: các bản ghi "mới hơn" bound theo thứ tự tăng dần (trang trước, cần đảo lại).
+    """
+    sort_column, id_column = keyset
+    query = query.order_by(None)
+    if newer:
+        sort_value, item_id = bound
+        return query.filter(
+            sort_column >= sort_value,
+            db.or_(sort_column > sort_value, id_column > item_id)
+        ).order_by(sort_column.asc(), id_column.asc())
+
+    query = query.order_by(sort_column.desc(), id_column.desc())
+    if bound is not None:
+        sort_value, item_id = bound
+        query = query.filter(
+            sort_column <= sort_value,
+            db.or_(sort_column < sort_value, id_column < item_id)
+        )
+    return query
+
+
+def paginate_keyset(query, keyset, per_page, serialize_func=None, data_key_name='data'):
+    """
+    Phân trang theo cursor (keyset) trên cặp (cột sắp xếp, id), thứ tự giảm dần.
+
+    Không dùng OFFSET: mỗi trang chỉ là 1 range scan trên index bắt đầu
+    từ cursor, nên tốc độ không phụ thuộc vào việc đã cuộn sâu bao nhiêu trang.
+    """
+    sort_column, id_column = keyset
+    after = request.args.get('after')
+    before = request.args.get('before')
+    count_mode = request.args.get('count', 'none')
+    fingerprint = cursor_fingerprint()
+
+    # tổng số đếm trên query gốc, trước khi áp điều kiện cursor
+    total = count_query(query, count_mode)
+
+    cursor = before or after
+    bound = decode_cursor(cursor, fingerprint) if cursor else None
+    query = keyset_page_query(query, keyset, bound, newer=bool(before))
+
+    # lấy dư 1 bản ghi để biết còn trang tiếp theo hay không
+    rows = query.limit(per_page + 1).all()
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+
+    if before:
+        rows.reverse()
+        has_prev = has_more
+        has_next = True
+    else:
+        has_prev = bool(after)
+        has_next = has_more
+
+    def cursor_of(item):
+        return encode_cursor(getattr(item, sort_column.key), getattr(item, id_column.key), fingerprint)
+
+    items = rows
+    if serialize_func:
+        items = [serialize_func(item) for item in rows]
+
+    return {
+        data_key_name: items,
+        'pagination': {
+            'mode': 'cursor',
+            'per_page': per_page,
+            'next_cursor': cursor_of(rows[-1]) if rows and has_next else None,
+            'prev_cursor': cursor_of(rows[0]) if rows and has_prev else None,
+            'has_next': has_next,
+            'has_prev': has_prev,
+            'total_items': total,
+            'total_items_cached': count_mode == 'cached'
+        }
+    }
+
+
+def paginate_query(query, serialize_func=None, data_key_name='data', keyset=None):
     """
     Hàm phân trang tái sử dụng cho mọi Model.
-    
+
     Args:
         query: SQLAlchemy BaseQuery object (VD: User.query)
         serialize_func: Hàm để chuyển object thành dict (VD: user.to_dict)
+        keyset: (cột sắp xếp, cột id) để bật chế độ cursor
+                (VD: (Attendance_logs.timestamp, Attendance_logs.id))
+
+    Chế độ cursor (opt-in) khi URL có `pagination=cursor`, `after` hoặc `before`:
+        - after / before: token lấy từ next_cursor / prev_cursor của trang trước
+        - count: 'none' (mặc định, không COUNT), 'cached' hoặc 'exact'
+    Mặc định vẫn dùng page/per_page với cấu trúc response cũ.
     """
     # 1. Lấy tham số từ URL (Mặc định page 1, 10 item/page)
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 10, type=int)
-    
+
     # Giới hạn tối đa per_page để tránh bị tấn công DoS
     if per_page > 100: per_page = 100
+    if per_page < 1: per_page = 10
+
+    cursor_mode = (
+        request.args.get('pagination') == 'cursor'
+        or 'after' in request.args
+        or 'before' in request.args
+    )
+    if keyset is not None and cursor_mode:
+        return paginate_keyset(query, keyset, per_page, serialize_func, data_key_name)
 
     # 2. Sử dụng hàm paginate() có sẵn của Flask-SQLAlchemy
     # error_out=False: Trả về list rỗng thay vì lỗi 404 nếu page quá lớn
@@ -24,7 +203,7 @@ def paginate_query(query, serialize_func=None, data_key_name='data'):
     items = pagination.items
     if serialize_func:
         items = [serialize_func(item) for item in items]
-    
+
     # 4. Trả về cấu trúc JSON chuẩn
     return {
         data_key_name: items,
@@ -36,4 +215,87 @@ def paginate_query(query, serialize_func=None, data_key_name='data'):
             'has_next': pagination.has_next,
             'has_prev': pagination.has_prev
         }
-    }
\ No newline at end of file
+    }
+
+
+def paginate_merged(query, keyset, fetch_other, merge, count_other, serialize_func=None, data_key_name='data'):
+    """
+    Phân trang query gộp với 1 nguồn dữ liệu khác (VD: attendance_logs + file archive),
+    cùng tham số và cấu trúc response với paginate_query, thứ tự giảm dần theo keyset.
+
+    Điều kiện cursor và limit được đẩy xuống cả 2 nguồn rồi gộp có giới hạn,
+    mỗi trang chỉ đọc tối đa per_page + 1 bản ghi mỗi nguồn (offset: page * per_page):
+        fetch_other(bound, limit, newer): tối đa limit bản ghi của nguồn kia "cũ hơn"
+            bound theo thứ tự giảm dần (newer=True: "mới hơn" bound, tăng dần)
+        merge(a, b, key, reverse): gộp 2 danh sách cùng thứ tự, bỏ bản ghi có ở cả 2 nguồn
+        count_other(): số bản ghi của nguồn kia, chỉ gọi khi cần total_items
+    """
+    sort_column, id_column = keyset
+    page = request.args.get('page', 1, type=int)
+    per_page = request.args.get('per_page', 10, type=int)
+    if per_page > 100: per_page = 100
+    if per_page < 1: per_page = 10
+    if page < 1: page = 1
+
+    def key_of(item):
+        return getattr(item, sort_column.key), getattr(item, id_column.key)
+
+    def fetch(bound, limit, newer):
+        rows = keyset_page_query(query, keyset, bound, newer).limit(limit).all()
+        return list(islice(merge(fetch_other(bound, limit, newer), rows, key=key_of, reverse=not newer), limit))
+
+    def serialize(items):
+        return [serialize_func(item) for item in items] if serialize_func else items
+
+    after = request.args.get('after')
+    before = request.args.get('before')
+    if request.args.get('pagination') == 'cursor' or after or before:
+        count_mode = request.args.get('count', 'none')
+        fingerprint = cursor_fingerprint()
+        total = count_query(query, count_mode)
+        if total is not None:
+            total += count_other()
+
+        cursor = before or after
+        bound = decode_cursor(cursor, fingerprint) if cursor else None
+        # lấy dư 1 bản ghi để biết còn trang tiếp theo hay không
+        rows = fetch(bound, per_page + 1, newer=bool(before))
+        has_more = len(rows) > per_page
+        items = rows[:per_page]
+        if before:
+            items.reverse()
+            has_prev = has_more
+            has_next = True
+        else:
+            has_prev = bool(after)
+            has_next = has_more
+
+        return {
+            data_key_name: serialize(items),
+            'pagination': {
+                'mode': 'cursor',
+                'per_page': per_page,
+                'next_cursor': encode_cursor(*key_of(items[-1]), fingerprint) if items and has_next else None,
+                'prev_cursor': encode_cursor(*key_of(items[0]), fingerprint) if items and has_prev else None,
+                'has_next': has_next,
+                'has_prev': has_prev,
+                'total_items': total,
+                'total_items_cached': count_mode == 'cached'
+            }
+        }
+
+    # offset: giống OFFSET của sql, trang càng sâu càng phải đọc nhiều bản ghi
+    total = query.order_by(None).count() + count_other()
+    total_pages = (total + per_page - 1) // per_page
+    items = fetch(None, page * per_page, newer=False)[(page - 1) * per_page:]
+    return {
+        data_key_name: serialize(items),
+        'pagination': {
+            'page': page,
+            'per_page': per_page,
+            'total_items': total,
+            'total_pages': total_pages,
+            'has_next': page < total_pages,
+            'has_prev': page > 1
+        }
+    }
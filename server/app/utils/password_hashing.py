@@ -0,0 +1,125 @@
+# app/utils/password_hashing.py
+import atexit
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class PasswordPoolBusy(Exception):
+    """
+    no hashing slot became free within the queue timeout
+    """
+
+
+def hash_method(password_hash):
+    """
+    method part of a werkzeug hash, e.g. 'pbkdf2:sha256:600000'
+    """
+    return password_hash.split('$', 1)[0] if password_hash else None
+
+
+class PasswordHasher:
+    """
+    runs password hashing on a dedicated process pool
+
+    at most `workers` hashes run at once and at most `queue_size` requests
+    may hold or wait for a slot; others wait up to `queue_timeout` seconds
+    and are then rejected with PasswordPoolBusy, so a login burst cannot pin
+    every web worker thread on CPU-bound pbkdf2
+    workers = 0 runs hashing inline on the calling thread (development)
+    """
+
+    def __init__(self, workers=0, queue_size=64, queue_timeout=2.0, rehash_method=None):
+        self.workers = workers
+        self.queue_timeout = queue_timeout
+        self.rehash_method = rehash_method or None
+        self._target_method = None
+        self._slots = threading.BoundedSemaphore(max(1, queue_size))
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {'verified': 0, 'rehashed': 0, 'rejected_busy': 0}
+
+    def init_app(self, app):
+        workers = app.config['PASSWORD_HASH_WORKERS']
+        # workers < 0: dùng số cpu của máy
+        self.workers = (os.cpu_count() or 1) if workers < 0 else workers
+        self.queue_timeout = app.config['PASSWORD_HASH_QUEUE_TIMEOUT']
+        self.rehash_method = app.config['PASSWORD_REHASH_METHOD'] or None
+        self._target_method = None
+        self._slots = threading.BoundedSemaphore(max(1, app.config['PASSWORD_HASH_QUEUE_SIZE']))
+
+    def verify(self, password_hash, password):
+        """
+        check password against password_hash; raises PasswordPoolBusy when saturated
+        """
+        result = self._run(check_password_hash, password_hash, password)
+        self._incr('verified')
+        return result
+
+    def needs_rehash(self, password_hash):
+        """
+        True when password_hash was not made with the configured rehash method and parameters
+        """
+        if self.rehash_method is None:
+            return False
+        return hash_method(password_hash) != self.target_method()
+
+    def target_method(self):
+        """
+        full method prefix werkzeug writes for the configured rehash method
+
+        short forms ('scrypt', 'pbkdf2:sha256') are expanded with werkzeug's
+        default parameters by hashing a probe password once
+        """
+        if self._target_method is None:
+            self._target_method = hash_method(generate_password_hash('', self.rehash_method))
+        return self._target_method
+
+    def rehash(self, password):
+        """
+        hash password with the configured rehash method
+        """
+        result = self._run(generate_password_hash, password, self.rehash_method)
+        self._incr('rehashed')
+        return result
+
+    def stats(self):
+        with self._stats_lock:
+            data = dict(self._stats)
+        data['workers'] = self.workers
+        data['rehash_method'] = self.rehash_method
+        return data
+
+    def _run(self, func, *args):
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            self._incr('rejected_busy')
+            raise PasswordPoolBusy('password hashing pool is saturated')
+        try:
+            if self.workers == 0:
+                return func(*args)
+            return self._get_executor().submit(func, *args).result()
+        finally:
+            self._slots.release()
+
+    def _get_executor(self):
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    # spawn: không fork các thread mqtt / queue worker của process web
+                    # (process con import lại __main__, nên __main__ không được gọi create_app)
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        mp_context=multiprocessing.get_context('spawn')
+                    )
+                    atexit.register(self._executor.shutdown, wait=False, cancel_futures=True)
+        return self._executor
+
+    def _incr(self, key):
+        with self._stats_lock:
+            self._stats[key] += 1
+
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,207 @@
+# app/utils/query_profiler.py
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from flask import request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app.utils.log import get_logger
+
+
+logger = get_logger(__name__)
+
+# độ dài tối đa của câu sql lưu trong slow query log / log
+STATEMENT_MAX_LENGTH = 1000
+
+
+class QueryProfile:
+    """
+    queries of one unit of work: an http request, an mqtt message or an ingest batch
+    """
+
+    def __init__(self, label, top, sampled=True):
+        self.label = label
+        self.top = top
+        self.sampled = sampled
+        self.queries = 0
+        self.seconds = 0.0
+        self.slowest = []
+
+    def record(self, statement, elapsed):
+        self.queries += 1
+        self.seconds += elapsed
+        # giữ top câu chậm nhất, danh sách nhỏ nên sort lại là đủ
+        if len(self.slowest) < self.top or elapsed > self.slowest[-1][0]:
+            self.slowest.append((elapsed, statement))
+            self.slowest.sort(key=lambda item: item[0], reverse=True)
+            del self.slowest[self.top:]
+
+    def summary(self):
+        return {
+            'source': self.label,
+            'queries': self.queries,
+            'db_time_ms': round(self.seconds * 1000, 2),
+            'slowest': [
+                {'ms': round(elapsed * 1000, 2), 'statement': statement[:STATEMENT_MAX_LENGTH]}
+                for elapsed, statement in self.slowest
+            ],
+        }
+
+
+class QueryProfiler:
+    """
+    opt-in sql instrumentation through sqlalchemy engine events (DB_PROFILER_ENABLED)
+
+    - every statement slower than DB_SLOW_QUERY_MS goes to a rolling slow
+      query log (GET /api/debug/slow-queries) and to the log
+    - per unit of work (http request, mqtt message, ingest batch): query
+      count, total db time and the slowest statements; http responses get
+      X-DB-Query-Count / X-DB-Time-Ms headers when DB_PROFILER_HEADERS is on
+      (or the app runs in debug), and DB_PROFILER_SAMPLE_RATE of the units
+      are logged as one 'db profile' line
+
+    disabled, nothing is registered and the cost is zero; enabled, an
+    unsampled statement costs two perf_counter() calls
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.headers = False
+        self.sample_rate = 0.0
+        self.slow_query_seconds = 0.2
+        self.top = 5
+        self._local = threading.local()
+        self._slow_queries = deque(maxlen=200)
+        self._slow_lock = threading.Lock()
+        self._slow_total = 0
+        self._listening = False
+
+    def init_app(self, app):
+        if not app.config['DB_PROFILER_ENABLED']:
+            return
+        self.enabled = True
+        self.headers = app.config['DB_PROFILER_HEADERS'] or app.debug
+        self.sample_rate = app.config['DB_PROFILER_SAMPLE_RATE']
+        self.slow_query_seconds = app.config['DB_SLOW_QUERY_MS'] / 1000
+        self.top = app.config['DB_PROFILER_TOP_QUERIES']
+        with self._slow_lock:
+            self._slow_queries = deque(self._slow_queries, maxlen=app.config['DB_SLOW_QUERY_LOG_SIZE'])
+
+        # lắng nghe trên class Engine: áp dụng cho mọi engine của process (cả sync_engine của engine async)
+        if not self._listening:
+            event.listen(Engine, 'before_cursor_execute', self._before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', self._after_cursor_execute)
+            event.listen(Engine, 'handle_error', self._handle_error)
+            self._listening = True
+
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+        app.teardown_request(self._teardown_request)
+
+    @contextmanager
+    def profile(self, label):
+        """
+        profile the queries run by this thread inside the block (sampled)
+
+        nested blocks are counted in the outermost profile
+        """
+        if (not self.enabled or getattr(self._local, 'profile', None) is not None
+                or random.random() >= self.sample_rate):
+            yield
+            return
+        self._local.profile = QueryProfile(label, self.top)
+        try:
+            yield
+        finally:
+            profile, self._local.profile = self._local.profile, None
+            logger.info('db profile', **profile.summary())
+
+    def slow_queries(self, limit=None):
+        """
+        rolling slow query log, newest first
+        """
+        with self._slow_lock:
+            entries = list(self._slow_queries)
+            total = self._slow_total
+        entries.reverse()
+        return {
+            'enabled': self.enabled,
+            'threshold_ms': round(self.slow_query_seconds * 1000, 2),
+            'sample_rate': self.sample_rate,
+            'total': total,
+            'queries': entries[:limit] if limit else entries,
+        }
+
+    def clear_slow_queries(self):
+        with self._slow_lock:
+            self._slow_queries.clear()
+            self._slow_total = 0
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        stack = conn.info.get('query_started')
+        if not stack:
+            # câu lệnh bắt đầu trước khi listener được đăng ký
+            return
+        elapsed = time.perf_counter() - stack.pop()
+
+        profile = getattr(self._local, 'profile', None)
+        if profile is not None:
+            profile.record(statement, elapsed)
+
+        if elapsed >= self.slow_query_seconds:
+            source = profile.label if profile is not None else threading.current_thread().name
+            entry = {
+                'at': datetime.now().isoformat(timespec='milliseconds'),
+                'ms': round(elapsed * 1000, 2),
+                'source': source,
+                # không lưu parameters (rfid_uid, email, ...) vào log
+                'statement': statement[:STATEMENT_MAX_LENGTH],
+                'executemany': executemany,
+            }
+            with self._slow_lock:
+                self._slow_queries.append(entry)
+                self._slow_total += 1
+            logger.warning('slow query', ms=entry['ms'], source=source, statement=entry['statement'])
+
+    def _handle_error(self, exception_context):
+        # câu lệnh lỗi không qua after_cursor_execute: bỏ thời điểm bắt đầu của nó,
+        # nếu không mọi câu sau trên connection (trong pool) bị đo lệch
+        connection = exception_context.connection
+        if connection is None:
+            # lỗi khi mở connection, chưa có câu lệnh nào
+            return
+        stack = connection.info.get('query_started')
+        if stack:
+            stack.pop()
+
+    def _start_request(self):
+        sampled = random.random() < self.sample_rate
+        if not (sampled or self.headers):
+            return
+        # dùng rule (vd /api/users/<int:user_id>) thay vì path để gom theo endpoint
+        route = request.url_rule.rule if request.url_rule is not None else request.path
+        self._local.profile = QueryProfile(f'{request.method} {route}', self.top, sampled)
+
+    def _finish_request(self, response):
+        profile, self._local.profile = getattr(self._local, 'profile', None), None
+        if profile is None:
+            return response
+        if self.headers:
+            response.headers['X-DB-Query-Count'] = str(profile.queries)
+            response.headers['X-DB-Time-Ms'] = f'{profile.seconds * 1000:.2f}'
+        if profile.sampled:
+            logger.info('db profile', status=response.status_code, **profile.summary())
+        return response
+
+    def _teardown_request(self, exc):
+        # request lỗi không qua after_request: bỏ profile để không lẫn sang request sau của thread
+        self._local.profile = None
+
+
+query_profiler = QueryProfiler()
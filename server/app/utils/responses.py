@@ -1,4 +1,5 @@
 from flask import jsonify
+from app.utils.metrics import api_errors
 
 def success_response(data=None, message="Thao tac thanh cong", status_code=200):
     return jsonify({
@@ -9,6 +10,7 @@ def success_response(data=None, message="Thao tac thanh cong", status_code=200):
     }), status_code
 
 def error_response(message="Thao tac that bai", error_code=None, status_code=400):
+    api_errors.inc(error_code or 'NONE', str(status_code))
     return jsonify({
         "is_success": False,
         "message": message,
@@ -0,0 +1,145 @@
+# app/utils/swipe_cache.py
+import threading
+import time
+from collections import namedtuple
+from app.extensions import db
+from app.models import User, Device
+
+
+CachedUser = namedtuple('CachedUser', ['id', 'full_name', 'is_active'])
+
+
+class SwipeAuthCache:
+    """
+    process-local authorization data for the swipe path
+
+    - rfid_uid -> CachedUser(id, full_name, is_active)
+    - device_id -> rfid_enabled
+
+    loaded from users/devices in one pass and refreshed every
+    refresh_interval seconds; crud endpoints update it explicitly when
+    they write so this process never serves stale data for its own writes,
+    and other processes drop their copy on the cache invalidation message
+    (cache_invalidation.py)
+    """
+
+    def __init__(self, refresh_interval=60.0):
+        self.refresh_interval = refresh_interval
+        self._users = {}
+        self._devices = {}
+        self._loaded_at = None
+        self._lock = threading.Lock()
+        self._stats = {'loads': 0, 'hits': 0, 'misses': 0}
+
+    def init_app(self, app):
+        self.refresh_interval = app.config['SWIPE_CACHE_REFRESH_INTERVAL']
+
+    def load(self):
+        """
+        rebuild the cache from the database (requires app context)
+        """
+        users = {
+            row.rfid_uid: CachedUser(row.id, row.full_name, bool(row.is_active))
+            for row in db.session.execute(
+                db.select(User.id, User.rfid_uid, User.full_name, User.is_active)
+            )
+        }
+        devices = {
+            row.device_id: row.rfid_enabled is not False
+            for row in db.session.execute(
+                db.select(Device.device_id, Device.rfid_enabled)
+            )
+        }
+        with self._lock:
+            self._users = users
+            self._devices = devices
+            self._loaded_at = time.monotonic()
+            self._stats['loads'] += 1
+
+    def ensure_loaded(self):
+        """
+        load the cache if it is empty or older than refresh_interval
+        """
+        loaded_at = self._loaded_at
+        if loaded_at is None or time.monotonic() - loaded_at >= self.refresh_interval:
+            self.load()
+
+    def resolve_users(self, rfid_uids):
+        """
+        map rfid_uids to CachedUser, querying the database once (IN ...) for misses
+
+        rfid_uids missing from both cache and database are absent from the result
+        """
+        result = {}
+        misses = []
+        for rfid_uid in rfid_uids:
+            user = self._users.get(rfid_uid)
+            if user is None:
+                misses.append(rfid_uid)
+            else:
+                result[rfid_uid] = user
+
+        if misses:
+            # thẻ chưa có trong cache (vd user vừa được tạo ở process khác)
+            for row in db.session.execute(
+                db.select(User.id, User.rfid_uid, User.full_name, User.is_active)
+                .where(User.rfid_uid.in_(misses))
+            ):
+                user = CachedUser(row.id, row.full_name, bool(row.is_active))
+                result[row.rfid_uid] = user
+                with self._lock:
+                    self._users[row.rfid_uid] = user
+
+        with self._lock:
+            self._stats['hits'] += len(rfid_uids) - len(misses)
+            self._stats['misses'] += len(misses)
+        return result
+
+    def is_rfid_enabled(self, device_id):
+        """
+        unknown devices are allowed, same as when the device row does not exist
+        """
+        return self._devices.get(device_id, True)
+
+    def upsert_user(self, user, previous_rfid_uid=None):
+        with self._lock:
+            if previous_rfid_uid and previous_rfid_uid != user.rfid_uid:
+                self._users.pop(previous_rfid_uid, None)
+            self._users[user.rfid_uid] = CachedUser(user.id, user.full_name, user.is_active is not False)
+
+    def remove_user(self, rfid_uid):
+        with self._lock:
+            self._users.pop(rfid_uid, None)
+
+    def evict_users(self, rfid_uids):
+        """
+        drop cached users, the next swipe re-reads them from the database
+        """
+        with self._lock:
+            for rfid_uid in rfid_uids:
+                self._users.pop(rfid_uid, None)
+
+    def expire(self):
+        """
+        reload everything on the next ensure_loaded()
+        """
+        self._loaded_at = None
+
+    def set_device(self, device_id, rfid_enabled):
+        with self._lock:
+            self._devices[device_id] = rfid_enabled is not False
+
+    def remove_device(self, device_id):
+        with self._lock:
+            self._devices.pop(device_id, None)
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._stats)
+            data['users'] = len(self._users)
+            data['devices'] = len(self._devices)
+        data['loaded'] = self._loaded_at is not None
+        return data
+
+
+swipe_cache = SwipeAuthCache()
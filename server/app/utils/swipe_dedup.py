@@ -0,0 +1,71 @@
+# app/utils/swipe_dedup.py
+import threading
+from app.utils.ttl_cache import TTLCache
+
+
+def swipe_key(rfid_uid, device_id, timestamp):
+    """
+    identity of a swipe, matching the unique key of attendance_logs
+
+    timestamp is compared as stored: naive and truncated to seconds
+    """
+    return (rfid_uid, device_id, timestamp.replace(tzinfo=None, microsecond=0))
+
+
+class RecentSwipeKeys:
+    """
+    bounded set of swipe keys persisted recently by this process
+
+    fast path for QoS retries and OFFLINE_SYNC replays: duplicates are dropped
+    before reaching the database; the unique constraint on attendance_logs
+    (with insert-ignore) stays the backstop for keys evicted or seen by
+    another process
+    """
+
+    def __init__(self, maxsize=50000, ttl=86400.0):
+        self._keys = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        self._stats = {'memory_duplicates': 0, 'db_duplicates': 0}
+
+    def init_app(self, app):
+        self._keys = TTLCache(
+            maxsize=app.config['ATTENDANCE_DEDUP_CACHE_SIZE'],
+            ttl=app.config['ATTENDANCE_DEDUP_TTL']
+        )
+
+    def filter_new(self, rows):
+        """
+        drop rows already persisted recently or repeated inside `rows`
+
+        keys are only remembered by remember() after the commit succeeded
+        """
+        fresh = {}
+        duplicates = 0
+        for row in rows:
+            key = swipe_key(row['rfid_uid'], row['device_id'], row['timestamp'])
+            if key in fresh or self._keys.get(key) is not None:
+                duplicates += 1
+                continue
+            fresh[key] = row
+        if duplicates:
+            self.count_duplicates('memory_duplicates', duplicates)
+        return list(fresh.values())
+
+    def remember(self, rows):
+        for row in rows:
+            self._keys.set(swipe_key(row['rfid_uid'], row['device_id'], row['timestamp']), True)
+
+    def count_duplicates(self, source, amount):
+        with self._lock:
+            self._stats[source] += amount
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._stats)
+        data['duplicates'] = data['memory_duplicates'] + data['db_duplicates']
+        data['recent_keys'] = len(self._keys)
+        data['capacity'] = self._keys.maxsize
+        return data
+
+
+recent_swipes = RecentSwipeKeys()
@@ -0,0 +1,327 @@
+# app/utils/swipe_journal.py
+import json
+import os
+import socket
+import threading
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:
+    # windows: không khoá file, chỉ chạy 1 process trên 1 thư mục journal
+    fcntl = None
+
+
+OWNER_LOCK = 'owner.lock'
+
+
+class SwipeJournal:
+    """
+    append-only, segmented write-ahead journal of attendance rows
+
+    append() writes rows as json lines to the open segment and fsyncs before
+    returning, so a row that was acknowledged to a device survives a crash.
+    every segment counts its rows still waiting for the database; release()
+    decrements the count and a full, closed segment is deleted once it
+    reaches zero. segments left over by a previous process are replayed
+    with replay() (the unique key makes the replay idempotent)
+
+    every process writes to its own <hostname>-<pid> subdirectory and holds
+    a lock on its owner.lock while running, so consumers sharing a directory
+    never replay each other's live segments; adopt() moves the segments of
+    directories whose lock is free (process gone) into this one
+    """
+
+    def __init__(self, directory, prefix='attendance', segment_bytes=4 * 1024 * 1024):
+        self.directory = directory
+        self.owner_directory = os.path.join(directory, f'{socket.gethostname()}-{os.getpid()}')
+        self.prefix = prefix
+        self.segment_bytes = segment_bytes
+
+        self._lock = threading.Lock()
+        self._owner_lock = None
+        self._file = None
+        self._segment = None
+        # segment -> số dòng chưa được ghi xuống database
+        self._pending = {}
+        self._recovered = None
+
+        self._stats = {
+            'appended': 0,
+            'fsyncs': 0,
+            'released': 0,
+            'segments_deleted': 0,
+            'replayed': 0,
+            'adopted': 0,
+        }
+
+    def open(self):
+        """
+        lock the owner directory and remember the segments written by previous processes
+        """
+        with self._lock:
+            if self._recovered is not None:
+                return
+            self._owner_lock = self._lock_directory(self.owner_directory, blocking=True)
+            self._recovered = self._list_segments(self.owner_directory)
+            self._segment = (self._recovered[-1] + 1) if self._recovered else 1
+        self._adopt()
+
+    def adopt(self):
+        """
+        move the segments of directories whose owner is gone (lock free) and
+        of the flat layout used before owner directories into this process's
+        directory, queued for replay(); returns the number of segments adopted
+        """
+        if self._recovered is None:
+            self.open()
+        return self._adopt()
+
+    def append(self, rows):
+        """
+        write rows durably (one fsync for the whole call); returns the segment number
+        """
+        if self._recovered is None:
+            self.open()
+        data = ''.join(json.dumps(self._encode(row)) + '\n' for row in rows).encode()
+
+        with self._lock:
+            if self._file is not None and self._file.tell() >= self.segment_bytes:
+                self._rotate()
+            if self._file is None:
+                self._file = open(self._path(self._segment), 'ab')
+                self._pending.setdefault(self._segment, 0)
+
+            self._file.write(data)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+            self._pending[self._segment] += len(rows)
+            self._stats['appended'] += len(rows)
+            self._stats['fsyncs'] += 1
+            return self._segment
+
+    def release(self, segment, count):
+        """
+        mark count rows of segment as persisted in the database
+        """
+        with self._lock:
+            if segment not in self._pending:
+                return
+            self._pending[segment] -= count
+            self._stats['released'] += count
+            if self._pending[segment] <= 0 and segment != self._segment:
+                self._delete(segment)
+
+    def seal(self):
+        """
+        close the open segment and queue every segment holding rows for
+        replay(), together with the segments of a previous process (used by
+        the spool, whose rows are never released one by one)
+        """
+        if self._recovered is None:
+            self.open()
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+                self._segment += 1
+            for segment in sorted(self._pending):
+                if self._pending[segment] > 0:
+                    self._recovered.append(segment)
+                    del self._pending[segment]
+                else:
+                    self._delete(segment)
+
+    def has_replayable(self):
+        with self._lock:
+            return bool(self._recovered) or any(count > 0 for count in self._pending.values())
+
+    def replay(self, save, chunk_size=1000):
+        """
+        feed rows of the segments left by a previous process (and sealed
+        segments) to save(rows), in chunks, deleting each segment once all
+        its rows were saved; returns the number of rows replayed
+        """
+        if self._recovered is None:
+            self.open()
+        with self._lock:
+            segments, self._recovered = self._recovered, []
+
+        replayed = 0
+        for index, segment in enumerate(segments):
+            rows = self.read_segment(segment)
+            try:
+                for start in range(0, len(rows), chunk_size):
+                    save(rows[start:start + chunk_size])
+            except Exception:
+                # giữ lại segment chưa replay xong cho lần sau
+                with self._lock:
+                    self._recovered = segments[index:] + self._recovered
+                raise
+            replayed += len(rows)
+            with self._lock:
+                self._stats['replayed'] += len(rows)
+                self._delete(segment)
+        return replayed
+
+    def read_segment(self, segment):
+        """
+        rows of a segment; a torn last line (crash during write) is skipped
+        """
+        rows = []
+        with open(self._path(segment), 'rb') as f:
+            for line in f:
+                try:
+                    rows.append(self._decode(json.loads(line)))
+                except (ValueError, KeyError):
+                    continue
+        return rows
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+                if self._pending.get(self._segment, 0) <= 0:
+                    self._delete(self._segment)
+                self._segment += 1
+            if self._owner_lock is not None and not self._pending and not self._recovered:
+                # không còn log chờ ghi: xoá thư mục, process sau tự tạo thư mục của nó
+                self._remove_directory(self.owner_directory, self._owner_lock)
+                self._owner_lock.close()
+                self._owner_lock = None
+                self._recovered = None
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._stats)
+            data['pending'] = sum(self._pending.values())
+            data['segments'] = len(self._pending) + len(self._recovered or [])
+            data['current_segment'] = self._segment
+        data['directory'] = self.owner_directory
+        return data
+
+    def _rotate(self):
+        # đóng segment hiện tại, xóa luôn nếu mọi dòng đã được ghi xuống database
+        self._file.close()
+        self._file = None
+        if self._pending.get(self._segment, 0) <= 0:
+            self._delete(self._segment)
+        self._segment += 1
+
+    def _delete(self, segment):
+        self._pending.pop(segment, None)
+        try:
+            os.remove(self._path(segment))
+            self._stats['segments_deleted'] += 1
+        except FileNotFoundError:
+            pass
+
+    def _adopt(self):
+        sources = [self.directory]
+        for name in sorted(os.listdir(self.directory)):
+            path = os.path.join(self.directory, name)
+            if path != self.owner_directory and os.path.isdir(path):
+                sources.append(path)
+
+        adopted = 0
+        for source in sources:
+            lock_file = None
+            if source != self.directory:
+                lock_file = self._lock_directory(source, blocking=False)
+                if lock_file is None:
+                    # process khác vẫn đang ghi vào thư mục này
+                    continue
+            try:
+                for segment in self._list_segments(source):
+                    with self._lock:
+                        if self._file is not None:
+                            # segment đang mở giữ số hiện tại, segment adopt lấy số tiếp theo
+                            self._rotate()
+                        target = self._segment
+                        self._segment += 1
+                        try:
+                            os.replace(self._path(segment, source), self._path(target))
+                        except FileNotFoundError:
+                            # process khác vừa adopt segment này
+                            continue
+                        self._recovered.append(target)
+                        self._stats['adopted'] += 1
+                    adopted += 1
+                if lock_file is not None:
+                    self._remove_directory(source, lock_file)
+            finally:
+                if lock_file is not None:
+                    lock_file.close()
+        return adopted
+
+    def _lock_directory(self, directory, blocking):
+        """
+        open and lock directory/owner.lock, returns the open file or None if
+        another process holds it (blocking=False)
+
+        the lock file is re-checked after locking: a process adopting the
+        directory deletes it while holding the lock, the lock is then taken
+        again on a fresh file
+        """
+        while True:
+            if blocking:
+                os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, OWNER_LOCK)
+            try:
+                lock_file = open(path, 'a')
+            except FileNotFoundError:
+                # thư mục vừa bị xoá
+                if not blocking:
+                    return None
+                continue
+            if fcntl is not None:
+                try:
+                    fcntl.lockf(lock_file, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    lock_file.close()
+                    return None
+            try:
+                if os.path.samestat(os.fstat(lock_file.fileno()), os.stat(path)):
+                    return lock_file
+            except FileNotFoundError:
+                pass
+            lock_file.close()
+            if not blocking:
+                return None
+
+    def _remove_directory(self, directory, lock_file):
+        # xoá owner.lock trước khi nhả lock, thư mục còn file khác (prefix khác) thì giữ lại
+        if os.listdir(directory) != [OWNER_LOCK]:
+            return
+        try:
+            os.remove(os.path.join(directory, OWNER_LOCK))
+            os.rmdir(directory)
+        except OSError:
+            pass
+
+    def _list_segments(self, directory):
+        segments = []
+        for name in os.listdir(directory):
+            stem, ext = os.path.splitext(name)
+            if ext == '.wal' and stem.startswith(self.prefix + '-'):
+                try:
+                    segments.append(int(stem[len(self.prefix) + 1:]))
+                except ValueError:
+                    continue
+        return sorted(segments)
+
+    def _path(self, segment, directory=None):
+        return os.path.join(directory or self.owner_directory, f'{self.prefix}-{segment:08d}.wal')
+
+    @staticmethod
+    def _encode(row):
+        data = dict(row)
+        data['timestamp'] = row['timestamp'].isoformat()
+        return data
+
+    @staticmethod
+    def _decode(data):
+        data['timestamp'] = datetime.fromisoformat(data['timestamp'])
+        return data
@@ -0,0 +1,36 @@
+# app/utils/time_ranges.py
+from datetime import datetime, timedelta
+
+
+def day_range(day):
+    """
+    half-open datetime range [00:00 of day, 00:00 of next day)
+
+    dùng với `timestamp >= start AND timestamp < end` thay cho
+    `DATE(timestamp) = day` để MySQL dùng được index trên timestamp
+    """
+    start = datetime.combine(day, datetime.min.time())
+    return start, start + timedelta(days=1)
+
+
+def month_range(year, month):
+    """
+    half-open datetime range [first day of month 00:00, first day of next month 00:00)
+
+    thay cho `EXTRACT(YEAR ...) = y AND EXTRACT(MONTH ...) = m`;
+    tháng 12 thì mốc kết thúc là ngày 1/1 của năm sau
+    """
+    start = datetime(year, month, 1)
+    if month == 12:
+        end = datetime(year + 1, 1, 1)
+    else:
+        end = datetime(year, month + 1, 1)
+    return start, end
+
+
+def add_months(month_start, count):
+    """
+    first day (00:00) of the month `count` months after month_start (count may be negative)
+    """
+    index = month_start.year * 12 + month_start.month - 1 + count
+    return datetime(index // 12, index % 12 + 1, 1)
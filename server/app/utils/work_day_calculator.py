@@ -1,16 +1,289 @@
 from datetime import datetime, timedelta
-from app.models import Attendance_logs
+from flask import current_app
+from app.models import Attendance_logs, Daily_work_summary, Daily_work_summary_pending
 from app.extensions import db
+from app.utils.attendance_archive import read_archived_logs, merge_archived_logs
+from app.utils.log import get_logger
+
+
+logger = get_logger(__name__)
+
+
+def empty_work_day_data():
+    """
+    dữ liệu mặc định cho ngày không có log
+    """
+    return {
+        'times': [],
+        'total_times': 0.0,
+        'type': 0,
+        'ot_times': []
+    }
+
+
+def build_work_day_data(logs):
+    """
+    tính toán thông tin làm việc từ danh sách log của 1 ngày
+
+    args:
+        logs: list các object có field timestamp, error_code
+              (Attendance_logs hoặc row), đã sắp xếp theo timestamp tăng dần
+
+    returns:
+        dict cùng cấu trúc với calculate_work_day_data
+    """
+    if not logs:
+        return empty_work_day_data()
+
+    # tạo times list
+    times = []
+    for log in logs:
+        time_str = log.timestamp.strftime('%H:%M')
+        # nếu có error_code thì dùng error_code, ngược lại dùng "SUCCESS"
+        code = log.error_code if log.error_code else 'SUCCESS'
+        times.append((time_str, code))
+
+    # tính total_times theo pattern in->out->in->out
+    # chỉ tính các cặp có code = "SUCCESS"
+    total_times = 0.0
+    success_logs = [log for log in logs if not log.error_code]
+
+    # xử lý theo cặp: index 0,1 là in-out, 2,3 là in-out, ...
+    for i in range(0, len(success_logs) - 1, 2):
+        in_time = success_logs[i].timestamp
+        out_time = success_logs[i + 1].timestamp
+
+        # tính số giờ làm việc (difference in hours)
+        time_diff = out_time - in_time
+        hours = time_diff.total_seconds() / 3600.0
+        total_times += hours
+
+    # xác định type
+    if total_times >= 6.5:
+        work_type = 1
+    elif total_times > 0 and total_times < 6.5:
+        work_type = 0.5
+    else:
+        work_type = 0
+
+    # tính ot_times - chỉ lấy các entry sau 18:00
+    ot_times = []
+    for log in logs:
+        if log.timestamp.hour >= 18:
+            time_str = log.timestamp.strftime('%H:%M')
+            code = log.error_code if log.error_code else 'SUCCESS'
+            ot_times.append((time_str, code))
+
+    return {
+        'times': times,
+        'total_times': round(total_times, 2),
+        'type': work_type,
+        'ot_times': ot_times
+    }
+
+
+def build_work_day_series(start_date, end_date, logs_by_date, summaries=None):
+    """
+    tạo danh sách work data cho mọi ngày trong [start_date, end_date]
+
+    args:
+        logs_by_date: dict date -> list log của ngày đó (đã sắp xếp theo timestamp)
+        summaries: dict date -> work data đã tính sẵn (daily_work_summary), ưu tiên dùng
+    """
+    summaries = summaries or {}
+    worked_days = []
+    current_date = start_date
+    while current_date <= end_date:
+        if current_date in summaries:
+            work_data = dict(summaries[current_date])
+        else:
+            work_data = build_work_day_data(logs_by_date.get(current_date))
+        work_data['date'] = current_date.strftime('%Y-%m-%d')
+        worked_days.append(work_data)
+        current_date += timedelta(days=1)
+    return worked_days
+
+
+def get_summary_end_date(start_date, end_date):
+    """
+    ngày cuối cùng trong [start_date, end_date] được đọc từ daily_work_summary
+
+    chỉ các ngày đã kết thúc (trước hôm nay) mới đọc từ bảng tổng hợp,
+    hôm nay vẫn tính trực tiếp từ log; trả về None nếu không dùng bảng tổng hợp
+    """
+    if not current_app.config.get('WORK_SUMMARY_ENABLED'):
+        return None
+    last_closed_date = datetime.now().date() - timedelta(days=1)
+    if start_date > last_closed_date:
+        return None
+    return min(end_date, last_closed_date)
+
+
+def load_work_day_summaries(start_date, end_date, rfid_uids=None):
+    """
+    đọc work data đã tính sẵn trong [start_date, end_date] (1 query theo index)
+
+    returns:
+        dict rfid_uid -> dict date -> work data
+    """
+    query = db.select(Daily_work_summary).where(
+        Daily_work_summary.date >= start_date,
+        Daily_work_summary.date <= end_date
+    )
+    if rfid_uids is not None:
+        query = query.where(Daily_work_summary.rfid_uid.in_(list(rfid_uids)))
+
+    summaries = {}
+    for summary in db.session.execute(query).scalars():
+        work_data = summary.to_work_data()
+        work_data.pop('date')
+        summaries.setdefault(summary.rfid_uid, {})[summary.date] = work_data
+
+    # ngày còn chờ tính lại (refresh chưa chạy hoặc bị lỗi): dòng tổng hợp có thể đã cũ, tính trực tiếp từ log
+    pending_query = db.select(Daily_work_summary_pending.rfid_uid, Daily_work_summary_pending.date).where(
+        Daily_work_summary_pending.date >= start_date,
+        Daily_work_summary_pending.date <= end_date
+    )
+    if rfid_uids is not None:
+        pending_query = pending_query.where(Daily_work_summary_pending.rfid_uid.in_(list(rfid_uids)))
+    pending = {(row.rfid_uid, row.date) for row in db.session.execute(pending_query)}
+    if pending:
+        logs_by_key = load_day_logs(pending)
+        for rfid_uid, day in pending:
+            logs = logs_by_key.get((rfid_uid, day))
+            if logs:
+                summaries.setdefault(rfid_uid, {})[day] = build_work_day_data(logs)
+            elif day in summaries.get(rfid_uid, {}):
+                del summaries[rfid_uid][day]
+    return summaries
+
+
+def select_day_logs(keys):
+    """
+    select of the attendance_logs rows (id, rfid_uid, timestamp, error_code)
+    that may belong to the (rfid_uid, date) keys, ordered by (rfid_uid, timestamp)
+
+    one indexed range query for all keys; filter the rows with group_day_logs
+    """
+    rfid_uids = {rfid_uid for rfid_uid, _ in keys}
+    dates = [day for _, day in keys]
+
+    # khoảng nửa mở [00:00 ngày nhỏ nhất, 00:00 ngày sau ngày lớn nhất)
+    start_datetime = datetime.combine(min(dates), datetime.min.time())
+    end_datetime = datetime.combine(max(dates) + timedelta(days=1), datetime.min.time())
+    return (
+        db.select(Attendance_logs.id, Attendance_logs.rfid_uid, Attendance_logs.timestamp, Attendance_logs.error_code)
+        .where(
+            Attendance_logs.rfid_uid.in_(rfid_uids),
+            Attendance_logs.timestamp >= start_datetime,
+            Attendance_logs.timestamp < end_datetime
+        )
+        .order_by(Attendance_logs.rfid_uid.asc(), Attendance_logs.timestamp.asc())
+    )
+
+
+def group_day_logs(rows, keys):
+    """
+    dict (rfid_uid, date) -> logs in time order, only for the given keys
+    """
+    logs_by_key = {}
+    for row in rows:
+        key = (row.rfid_uid, row.timestamp.date())
+        if key in keys:
+            logs_by_key.setdefault(key, []).append(row)
+    return logs_by_key
+
+
+def load_day_logs(keys):
+    """
+    logs of the (rfid_uid, date) keys from attendance_logs and the parquet archive
+
+    returns:
+        dict (rfid_uid, date) -> list row (id, rfid_uid, timestamp, error_code) theo thứ tự thời gian
+    """
+    keys = set(keys)
+    logs_by_key = group_day_logs(db.session.execute(select_day_logs(keys)), keys)
+
+    # ngày thuộc tháng đã archive (log offline sync đến muộn): gộp thêm log trong file parquet
+    dates = [day for _, day in keys]
+    start_datetime = datetime.combine(min(dates), datetime.min.time())
+    end_datetime = datetime.combine(max(dates) + timedelta(days=1), datetime.min.time())
+    archived = read_archived_logs(start_datetime, end_datetime, {rfid_uid for rfid_uid, _ in keys})
+    for key, logs in group_day_logs(archived, keys).items():
+        logs_by_key[key] = list(merge_archived_logs(logs, logs_by_key.get(key, []), key=lambda log: log.timestamp))
+    return logs_by_key
+
+
+def iter_user_day_logs(start_date, end_date, rfid_uids=None):
+    """
+    duyệt (streaming) log trong [start_date, end_date] sắp xếp theo (rfid_uid, timestamp)
+
+    các tháng đã archive ra parquet được đọc lại và gộp vào log của từng nhân viên
+
+    yields:
+        (rfid_uid, logs_by_date) cho từng nhân viên có log, logs_by_date là
+        dict date -> list row (id, timestamp, error_code) theo thứ tự thời gian
+    """
+    # khoảng nửa mở [00:00 ngày đầu, 00:00 ngày sau ngày cuối)
+    start_datetime = datetime.combine(start_date, datetime.min.time())
+    end_datetime = datetime.combine(end_date + timedelta(days=1), datetime.min.time())
+
+    query = (
+        db.select(Attendance_logs.id, Attendance_logs.rfid_uid, Attendance_logs.timestamp, Attendance_logs.error_code)
+        .where(
+            Attendance_logs.timestamp >= start_datetime,
+            Attendance_logs.timestamp < end_datetime
+        )
+        .order_by(Attendance_logs.rfid_uid.asc(), Attendance_logs.timestamp.asc())
+        .execution_options(yield_per=5000)
+    )
+    if rfid_uids is not None:
+        rfid_uids = list(rfid_uids)
+        query = query.where(Attendance_logs.rfid_uid.in_(rfid_uids))
+
+    # log archive gom theo rfid_uid: không merge theo thứ tự rfid_uid vì collation
+    # của database có thể khác thứ tự so sánh chuỗi của python
+    archived_by_uid = {}
+    for log in read_archived_logs(start_datetime, end_datetime, rfid_uids):
+        archived_by_uid.setdefault(log.rfid_uid, []).append(log)
+
+    def group_by_date(rfid_uid, rows):
+        archived = archived_by_uid.pop(rfid_uid, None)
+        if archived:
+            rows = merge_archived_logs(archived, rows, key=lambda log: log.timestamp)
+        logs_by_date = {}
+        for row in rows:
+            logs_by_date.setdefault(row.timestamp.date(), []).append(row)
+        return logs_by_date
+
+    current_uid = None
+    user_rows = []
+
+    # log đã sắp xếp theo (rfid_uid, timestamp): khi rfid_uid đổi thì user trước đã đủ log
+    for row in db.session.execute(query):
+        if row.rfid_uid != current_uid:
+            if current_uid is not None:
+                yield current_uid, group_by_date(current_uid, user_rows)
+            current_uid = row.rfid_uid
+            user_rows = []
+        user_rows.append(row)
+
+    if current_uid is not None:
+        yield current_uid, group_by_date(current_uid, user_rows)
+
+    # nhân viên chỉ có log trong archive
+    for rfid_uid in list(archived_by_uid):
+        yield rfid_uid, group_by_date(rfid_uid, [])
 
 
 def calculate_work_day_data(date, rfid_uid):
     """
     tính toán thông tin làm việc trong ngày cho 1 nhân viên
-    
+
     args:
         date: datetime.date hoặc datetime object - ngày cần tính toán
         rfid_uid: str - rfid uid của nhân viên
-    
+
     returns:
         dict với các field:
         - times: list of tuples (time_stamp "HH:MM", code)
@@ -24,80 +297,129 @@ def calculate_work_day_data(date, rfid_uid):
             target_date = date.date()
         else:
             target_date = date
-        
+
         # tạo datetime range cho ngày
         start_datetime = datetime.combine(target_date, datetime.min.time())
         end_datetime = datetime.combine(target_date, datetime.max.time())
-        
+
         # query tất cả attendance logs của user trong ngày
         logs = Attendance_logs.query.filter(
             Attendance_logs.rfid_uid == rfid_uid,
             Attendance_logs.timestamp >= start_datetime,
             Attendance_logs.timestamp <= end_datetime
         ).order_by(Attendance_logs.timestamp.asc()).all()
-        
+
+        # ngày thuộc tháng đã archive
+        archived = read_archived_logs(start_datetime, start_datetime + timedelta(days=1), [rfid_uid])
+        if archived:
+            logs = list(merge_archived_logs(archived, logs, key=lambda log: log.timestamp))
+
         # nếu không có log, trả về dữ liệu rỗng
         if not logs:
-            print('Empty logs')
-            return {
-                'times': [],
-                'total_times': 0.0,
-                'type': 0,
-                'ot_times': []
-            }
-        
-        # tạo times list
-        times = []
-        for log in logs:
-            time_str = log.timestamp.strftime('%H:%M')
-            # nếu có error_code thì dùng error_code, ngược lại dùng "SUCCESS"
-            code = log.error_code if log.error_code else 'SUCCESS'
-            times.append((time_str, code))
-        
-        # tính total_times theo pattern in->out->in->out
-        # chỉ tính các cặp có code = "SUCCESS"
-        total_times = 0.0
-        success_logs = [log for log in logs if not log.error_code]
-        
-        # xử lý theo cặp: index 0,1 là in-out, 2,3 là in-out, ...
-        for i in range(0, len(success_logs) - 1, 2):
-            in_time = success_logs[i].timestamp
-            out_time = success_logs[i + 1].timestamp
-            
-            # tính số giờ làm việc (difference in hours)
-            time_diff = out_time - in_time
-            hours = time_diff.total_seconds() / 3600.0
-            total_times += hours
-        
-        # xác định type
-        if total_times >= 6.5:
-            work_type = 1
-        elif total_times > 0 and total_times < 6.5:
-            work_type = 0.5
-        else:
-            work_type = 0
-        
-        # tính ot_times - chỉ lấy các entry sau 18:00
-        ot_times = []
-        for log in logs:
-            if log.timestamp.hour >= 18:
-                time_str = log.timestamp.strftime('%H:%M')
-                code = log.error_code if log.error_code else 'SUCCESS'
-                ot_times.append((time_str, code))
-        
-        return {
-            'times': times,
-            'total_times': round(total_times, 2),
-            'type': work_type,
-            'ot_times': ot_times
-        }
-    
+            logger.debug('empty logs', rfid_uid=rfid_uid)
+            return empty_work_day_data()
+
+        return build_work_day_data(logs)
+
     except Exception as e:
         # nếu có lỗi, trả về dữ liệu mặc định
-        print(f'error calculating work day data: {e}')
-        return {
-            'times': [],
-            'total_times': 0.0,
-            'type': 0,
-            'ot_times': []
-        }
+        logger.error('error calculating work day data', rfid_uid=rfid_uid, error=str(e))
+        return empty_work_day_data()
+
+
+def calculate_work_day_range(start_date, end_date, rfid_uid):
+    """
+    tính toán thông tin làm việc cho mọi ngày trong khoảng [start_date, end_date]
+
+    chỉ dùng 1 query lấy toàn bộ log của nhân viên trong khoảng, sắp xếp theo
+    timestamp, rồi gom theo ngày trong 1 lượt duyệt; khi bật WORK_SUMMARY_ENABLED
+    các ngày đã kết thúc được đọc từ daily_work_summary
+
+    args:
+        start_date, end_date: datetime.date - ngày đầu và ngày cuối (bao gồm)
+        rfid_uid: str - rfid uid của nhân viên
+
+    returns:
+        list dict (mỗi ngày 1 phần tử, theo thứ tự ngày) cùng cấu trúc với
+        calculate_work_day_data, có thêm field date "YYYY-MM-DD"
+    """
+    logs_by_date = {}
+    summaries = {}
+    try:
+        live_start_date = start_date
+        summary_end_date = get_summary_end_date(start_date, end_date)
+        if summary_end_date:
+            summaries = load_work_day_summaries(start_date, summary_end_date, [rfid_uid]).get(rfid_uid, {})
+            live_start_date = summary_end_date + timedelta(days=1)
+
+        if live_start_date <= end_date:
+            # khoảng nửa mở [00:00 ngày đầu, 00:00 ngày sau ngày cuối)
+            start_datetime = datetime.combine(live_start_date, datetime.min.time())
+            end_datetime = datetime.combine(end_date + timedelta(days=1), datetime.min.time())
+
+            rows = db.session.execute(
+                db.select(Attendance_logs.id, Attendance_logs.timestamp, Attendance_logs.error_code)
+                .where(
+                    Attendance_logs.rfid_uid == rfid_uid,
+                    Attendance_logs.timestamp >= start_datetime,
+                    Attendance_logs.timestamp < end_datetime
+                )
+                .order_by(Attendance_logs.timestamp.asc())
+            )
+            archived = read_archived_logs(start_datetime, end_datetime, [rfid_uid])
+            if archived:
+                rows = merge_archived_logs(archived, rows, key=lambda log: log.timestamp)
+
+            # log đã sắp xếp nên mỗi ngày giữ nguyên thứ tự thời gian
+            for row in rows:
+                logs_by_date.setdefault(row.timestamp.date(), []).append(row)
+
+    except Exception as e:
+        # nếu có lỗi, các ngày đều trả về dữ liệu mặc định
+        logger.error('error calculating work day range', rfid_uid=rfid_uid, error=str(e))
+        logs_by_date = {}
+        summaries = {}
+
+    return build_work_day_series(start_date, end_date, logs_by_date, summaries)
+
+
+def calculate_work_day_report(start_date, end_date, rfid_uids=None):
+    """
+    tính toán thông tin làm việc cho nhiều nhân viên trong khoảng [start_date, end_date]
+
+    duyệt 1 lần (streaming) toàn bộ log trong khoảng, sắp xếp theo
+    (rfid_uid, timestamp), gom theo (rfid_uid, ngày) và tính từng ngày
+    bằng build_work_day_data, không query theo từng user hay từng ngày;
+    khi bật WORK_SUMMARY_ENABLED các ngày đã kết thúc được đọc từ daily_work_summary
+
+    args:
+        start_date, end_date: datetime.date - ngày đầu và ngày cuối (bao gồm)
+        rfid_uids: iterable rfid uid cần tính, None = tất cả
+
+    returns:
+        dict rfid_uid -> list dict theo ngày (giống calculate_work_day_range)
+        chỉ chứa các rfid_uid có log trong khoảng
+    """
+    if rfid_uids is not None:
+        rfid_uids = list(rfid_uids)
+
+    live_start_date = start_date
+    summaries = {}
+    summary_end_date = get_summary_end_date(start_date, end_date)
+    if summary_end_date:
+        summaries = load_work_day_summaries(start_date, summary_end_date, rfid_uids)
+        live_start_date = summary_end_date + timedelta(days=1)
+
+    report = {}
+    if live_start_date <= end_date:
+        for rfid_uid, logs_by_date in iter_user_day_logs(live_start_date, end_date, rfid_uids):
+            report[rfid_uid] = build_work_day_series(
+                start_date, end_date, logs_by_date, summaries.get(rfid_uid)
+            )
+
+    # nhân viên chỉ có dữ liệu ở các ngày đã tổng hợp
+    for rfid_uid, user_summaries in summaries.items():
+        if rfid_uid not in report:
+            report[rfid_uid] = build_work_day_series(start_date, end_date, {}, user_summaries)
+
+    return report
@@ -0,0 +1,330 @@
+# app/utils/work_day_summary.py
+import threading
+import time
+from datetime import datetime, timedelta
+from flask import current_app
+from app.extensions import db
+from app.models import Attendance_logs, Daily_work_summary, Daily_work_summary_pending
+from app.utils.batch_queue import BatchQueue
+from app.utils.metrics import db_commit_seconds
+from app.utils.work_day_calculator import build_work_day_data, iter_user_day_logs, load_day_logs
+from app.utils.log import get_logger
+
+
+logger = get_logger(__name__)
+
+
+# các worker trong cùng process refresh lần lượt (sqlite không có khoá dòng, mysql khoá dòng pending)
+_refresh_lock = threading.Lock()
+
+# thời điểm (monotonic) được quét lại các ngày pending cũ
+_next_retry_at = 0.0
+
+_summary_queue = None
+_summary_queue_lock = threading.Lock()
+
+
+def summary_enabled():
+    return current_app.config.get('WORK_SUMMARY_ENABLED', False)
+
+
+def summary_key(rfid_uid, timestamp):
+    """
+    (rfid_uid, date) key of the summary row affected by a log
+    """
+    return (rfid_uid, timestamp.date())
+
+
+def build_summary_row(rfid_uid, day, logs):
+    work_data = build_work_day_data(logs)
+    return {
+        'rfid_uid': rfid_uid,
+        'date': day,
+        'total_times': work_data['total_times'],
+        'type': work_data['type'],
+        'times': [list(entry) for entry in work_data['times']],
+        'ot_times': [list(entry) for entry in work_data['ot_times']]
+    }
+
+
+def clean_summary_keys(keys):
+    return {key for key in keys if key[0] and key[1]}
+
+
+def pending_upsert_statement(dialect_name):
+    """
+    insert into daily_work_summary_pending, bumping version when the day is already pending
+
+    execute with pending_rows(keys); runs inside the caller's transaction
+    """
+    table = Daily_work_summary_pending.__table__
+    if dialect_name == 'mysql':
+        from sqlalchemy.dialects.mysql import insert
+        statement = insert(table)
+        return statement.on_duplicate_key_update(version=table.c.version + 1, marked_at=statement.inserted.marked_at)
+
+    from sqlalchemy.dialects.sqlite import insert
+    statement = insert(table)
+    return statement.on_conflict_do_update(
+        index_elements=[table.c.rfid_uid, table.c.date],
+        set_={'version': table.c.version + 1, 'marked_at': statement.excluded.marked_at}
+    )
+
+
+def summary_insert_statement(dialect_name):
+    """
+    insert into daily_work_summary that keeps the row already written for a
+    (rfid_uid, date) instead of failing on the unique key
+    """
+    table = Daily_work_summary.__table__
+    if dialect_name == 'mysql':
+        from sqlalchemy.dialects.mysql import insert
+        return insert(table).on_duplicate_key_update(rfid_uid=table.c.rfid_uid)
+
+    from sqlalchemy.dialects.sqlite import insert
+    return insert(table).on_conflict_do_nothing(index_elements=[table.c.rfid_uid, table.c.date])
+
+
+def pending_rows(keys):
+    marked_at = datetime.now()
+    return [{'rfid_uid': rfid_uid, 'date': day, 'version': 1, 'marked_at': marked_at} for rfid_uid, day in keys]
+
+
+def mark_work_day_summaries(keys):
+    """
+    record the (rfid_uid, date) keys touched by a write as pending, in the
+    caller's transaction (requires app context)
+
+    call before committing the log write: the mark is committed with the
+    logs or not at all, so a summary can never miss a committed log.
+    refresh_work_day_summaries then recomputes and clears the keys
+    """
+    keys = clean_summary_keys(keys)
+    if not keys or not summary_enabled():
+        return
+    db.session.execute(pending_upsert_statement(db.session.get_bind().dialect.name), pending_rows(keys))
+
+
+def refresh_work_day_summaries(keys):
+    """
+    recompute daily_work_summary rows for the given pending (rfid_uid, date) keys
+
+    called after the commit that marked the keys (mark_work_day_summaries).
+    errors are logged and never fail the write itself: the keys stay in
+    daily_work_summary_pending, reports compute them from the logs and they
+    are retried by a later refresh (WORK_SUMMARY_RETRY_INTERVAL) or by
+    `flask work-summary retry`
+
+    returns number of summary rows written
+    """
+    if not summary_enabled():
+        return 0
+    written = refresh_pending_summaries(clean_summary_keys(keys))
+
+    global _next_retry_at
+    if time.monotonic() >= _next_retry_at:
+        _next_retry_at = time.monotonic() + current_app.config['WORK_SUMMARY_RETRY_INTERVAL']
+        written += retry_work_day_summaries()
+    return written
+
+
+def queue_work_day_summaries(keys):
+    """
+    refresh_work_day_summaries on the summary worker thread (requires app context)
+
+    used by the ingest path so swipe responses and batch acks never wait for
+    the summary; the keys are already pending, so a full queue only delays
+    them to the next retry. WORK_SUMMARY_BACKGROUND_REFRESH=False refreshes
+    in the caller instead
+    """
+    keys = clean_summary_keys(keys)
+    if not keys or not summary_enabled():
+        return
+    if not current_app.config['WORK_SUMMARY_BACKGROUND_REFRESH']:
+        with db_commit_seconds.time('work_day_summary'):
+            refresh_work_day_summaries(keys)
+        return
+
+    summary_queue = get_summary_queue(current_app._get_current_object())
+    for key in keys:
+        if not summary_queue.put(key):
+            logger.warning('work summary queue full, days left for retry', days=len(keys))
+            return
+
+
+def get_summary_queue(app):
+    """
+    return the process-wide summary refresh queue, creating it on first use
+    """
+    global _summary_queue
+    if _summary_queue is None:
+        with _summary_queue_lock:
+            if _summary_queue is None:
+                def refresh_keys(keys):
+                    with app.app_context(), db_commit_seconds.time('work_day_summary'):
+                        refresh_work_day_summaries(set(keys))
+
+                _summary_queue = BatchQueue(
+                    name='work-day-summary',
+                    handler=refresh_keys,
+                    maxsize=app.config['ATTENDANCE_QUEUE_MAXSIZE'],
+                    batch_size=app.config['WORK_SUMMARY_RETRY_BATCH'],
+                    flush_interval=app.config['ATTENDANCE_FLUSH_INTERVAL'],
+                    workers=1,
+                    # không bao giờ chặn luồng ghi log: ngày không vào được queue vẫn pending
+                    enqueue_timeout=0
+                )
+    return _summary_queue
+
+
+def get_summary_queue_stats():
+    """
+    backpressure metrics of the summary refresh queue (empty if not started)
+    """
+    if _summary_queue is None:
+        return {'name': 'work-day-summary', 'running': False}
+    return _summary_queue.stats()
+
+
+def retry_work_day_summaries(older_than=None, limit=None):
+    """
+    recompute pending keys marked more than `older_than` seconds ago
+    (default WORK_SUMMARY_RETRY_INTERVAL), oldest first, at most `limit`
+    (default WORK_SUMMARY_RETRY_BATCH)
+
+    returns number of summary rows written
+    """
+    config = current_app.config
+    older_than = config['WORK_SUMMARY_RETRY_INTERVAL'] if older_than is None else older_than
+    limit = limit or config['WORK_SUMMARY_RETRY_BATCH']
+    try:
+        keys = {
+            (row.rfid_uid, row.date) for row in db.session.execute(
+                db.select(Daily_work_summary_pending.rfid_uid, Daily_work_summary_pending.date)
+                .where(Daily_work_summary_pending.marked_at <= datetime.now() - timedelta(seconds=older_than))
+                .order_by(Daily_work_summary_pending.marked_at.asc())
+                .limit(limit)
+            )
+        }
+    except Exception as e:
+        db.session.rollback()
+        logger.error('failed to read pending daily work summary', error=str(e))
+        return 0
+    return refresh_pending_summaries(keys)
+
+
+def refresh_pending_summaries(keys):
+    """
+    lock the pending rows of the keys, replace their summary rows and clear
+    them in one transaction
+
+    keys locked by another consumer (skip locked) or no longer pending are
+    left to that consumer; on error nothing is cleared
+    """
+    if not keys:
+        return 0
+
+    with _refresh_lock:
+        try:
+            # khoá dòng pending: 2 consumer không bao giờ delete + insert cùng 1 ngày song song
+            pending = db.session.execute(
+                db.select(Daily_work_summary_pending.rfid_uid, Daily_work_summary_pending.date, Daily_work_summary_pending.version)
+                .where(db.tuple_(Daily_work_summary_pending.rfid_uid, Daily_work_summary_pending.date).in_(list(keys)))
+                .with_for_update(skip_locked=True)
+            ).all()
+            if not pending:
+                db.session.commit()
+                return 0
+            keys = {(row.rfid_uid, row.date) for row in pending}
+
+            logs_by_key = load_day_logs(keys)
+
+            # ngày không còn log nào thì chỉ xoá dòng tổng hợp
+            db.session.execute(
+                db.delete(Daily_work_summary).where(
+                    db.tuple_(Daily_work_summary.rfid_uid, Daily_work_summary.date).in_(list(keys))
+                )
+            )
+            rows = [
+                build_summary_row(rfid_uid, day, logs)
+                for (rfid_uid, day), logs in logs_by_key.items()
+            ]
+            if rows:
+                db.session.execute(db.insert(Daily_work_summary), rows)
+
+            # chỉ xoá đúng version đã đọc, ngày được đánh dấu lại trong lúc tính vẫn còn pending
+            db.session.execute(
+                db.delete(Daily_work_summary_pending).where(
+                    db.tuple_(
+                        Daily_work_summary_pending.rfid_uid,
+                        Daily_work_summary_pending.date,
+                        Daily_work_summary_pending.version
+                    ).in_([tuple(row) for row in pending])
+                )
+            )
+            db.session.commit()
+            return len(rows)
+
+        except Exception as e:
+            db.session.rollback()
+            logger.error('failed to refresh daily work summary, days kept for retry', days=len(keys), error=str(e))
+            return 0
+
+
+def rebuild_work_day_summaries(start_date=None, end_date=None, chunk_size=1000):
+    """
+    backfill / rebuild daily_work_summary for [start_date, end_date]
+
+    defaults to the whole attendance_logs history; logs are streamed once in
+    (rfid_uid, timestamp) order and summary rows are written in chunks
+
+    rows are written with summary_insert_statement: a day refreshed by a
+    consumer while the rebuild runs keeps the row of that refresh, which
+    read the logs after the rebuild's delete (a later log marks the day
+    pending again)
+
+    returns number of summary rows written
+    """
+    if start_date is None or end_date is None:
+        first, last = db.session.execute(
+            db.select(db.func.min(Attendance_logs.timestamp), db.func.max(Attendance_logs.timestamp))
+        ).one()
+        if first is None:
+            return 0
+        start_date = start_date or first.date()
+        end_date = end_date or last.date()
+
+    # ghi bằng connection riêng để không đóng cursor streaming của session
+    with db.engine.begin() as connection:
+        connection.execute(
+            db.delete(Daily_work_summary).where(
+                Daily_work_summary.date >= start_date,
+                Daily_work_summary.date <= end_date
+            )
+        )
+        # log của các ngày pending đã commit trước lúc này nên được rebuild đọc lại
+        connection.execute(
+            db.delete(Daily_work_summary_pending).where(
+                Daily_work_summary_pending.date >= start_date,
+                Daily_work_summary_pending.date <= end_date,
+                Daily_work_summary_pending.marked_at <= datetime.now()
+            )
+        )
+
+    written = 0
+    rows = []
+    for rfid_uid, logs_by_date in iter_user_day_logs(start_date, end_date):
+        for day, logs in logs_by_date.items():
+            rows.append(build_summary_row(rfid_uid, day, logs))
+        if len(rows) >= chunk_size:
+            with db.engine.begin() as connection:
+                connection.execute(summary_insert_statement(connection.dialect.name), rows)
+            written += len(rows)
+            rows = []
+
+    if rows:
+        with db.engine.begin() as connection:
+            connection.execute(summary_insert_statement(connection.dialect.name), rows)
+        written += len(rows)
+
+    return written
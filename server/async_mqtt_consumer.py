@@ -0,0 +1,24 @@
+# asyncio mqtt entry point: python async_mqtt_consumer.py
+# thay thế mqtt_consumer.py (cùng topic / payload), 1 event loop xử lý message của mọi device
+import asyncio
+import signal
+
+from app.config import Config
+from app.utils.async_ingest import AsyncIngestService
+from app.utils.log import get_logger, init_logging
+
+
+async def main():
+    service = AsyncIngestService.from_config(Config)
+    init_logging(service.config)
+
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, service.stop)
+
+    get_logger('app.async_mqtt_consumer').info('async mqtt consumer started')
+    await service.serve()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
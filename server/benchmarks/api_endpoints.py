@@ -0,0 +1,368 @@
+"""
+HTTP API benchmark for the report and list endpoints
+====================================================
+
+Seeds a realistic data set, then drives
+
+    GET /api/worked-day/month         (user token)
+    GET /api/worked-day/range         (user token, one month)
+    GET /api/worked-day/report        (admin token: every user, one month)
+    GET /api/attendance-logs/me       (user token, one month)
+    GET /api/attendance-logs/filter   (admin token: month, month + device, month + rfid_uid)
+    GET /api/users                    (admin token: first page and a deep page)
+    GET /api/devices                  (admin token)
+
+and reports, per endpoint, the latency distribution (p50/p90/p99/max/mean),
+the status codes and the number of SQL queries per request.
+
+Two ways to drive the handlers:
+
+- client (default): Flask test client on create_app() in this process; the
+  queries of every request are counted with SQLAlchemy engine events, so
+  this is the micro-benchmark of the handler + database
+- server (--url): --concurrency threads against a running server (gunicorn
+  or `python app.py`), the macro-benchmark including HTTP and the WSGI server;
+  queries per request are read from the X-DB-Query-Count header when the
+  server runs with DB_PROFILER_ENABLED and DB_PROFILER_HEADERS
+
+Seeding is idempotent and shares the naming of
+benchmarks.explain_attendance_filters (cards BENCH00000.., devices
+bench-device-000..): users and devices are created when missing, then
+random swipes are inserted until --logs BENCH rows exist, and
+daily_work_summary is rebuilt for the seeded window. Use MySQL and
+`--logs 20000000` for production-like volumes; SQLite with the default is
+enough to compare two versions of a handler.
+
+Usage (from server/, with the environment of the server: DATABASE_URL, MQTT_*):
+
+    python -m benchmarks.api_endpoints --logs 1000000 --requests 200 --output api.json
+    python -m benchmarks.api_endpoints --skip-seed --url http://localhost:5000 --concurrency 16
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from datetime import date, datetime, timedelta
+
+
+SEED = 42
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def summarize(latencies, statuses, queries, elapsed):
+    result = {
+        'requests': len(latencies),
+        'requests_per_sec': round(len(latencies) / elapsed, 1) if elapsed else None,
+        'statuses': dict(statuses),
+        'latency_ms': {
+            name: round(percentile(latencies, fraction) * 1000, 2) if latencies else None
+            for name, fraction in (('p50', 0.50), ('p90', 0.90), ('p99', 0.99), ('max', 1.0))
+        },
+    }
+    result['latency_ms']['mean'] = round(statistics.mean(latencies) * 1000, 2) if latencies else None
+    if queries:
+        result['queries_per_request'] = {
+            'min': min(queries),
+            'median': statistics.median(queries),
+            'max': max(queries),
+        }
+    return result
+
+
+def seed(app, args):
+    """
+    create the BENCH users / devices / swipes that are missing; returns the seeded window
+    """
+    from sqlalchemy import func, insert, select, text
+    from app.extensions import db
+    from app.models import Attendance_logs, Device, User
+    from app.utils.attendance_ingest import insert_ignore_attendance_logs
+    from app.utils.work_day_summary import rebuild_work_day_summaries
+
+    end = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    start = end - timedelta(days=args.days)
+
+    with app.app_context():
+        if db.engine.dialect.name == 'sqlite':
+            db.create_all()
+            # rebuild daily_work_summary đọc streaming và ghi bằng connection khác: cần WAL trên sqlite
+            db.session.execute(text('PRAGMA journal_mode=WAL'))
+
+        existing_users = set(db.session.scalars(select(User.rfid_uid).where(User.rfid_uid.like('BENCH%'))))
+        users = [
+            {'full_name': f'bench user {i}', 'rfid_uid': f'BENCH{i:05d}', 'email': f'bench{i:05d}@bench.local',
+             'is_active': True, 'is_admin': False}
+            for i in range(args.users) if f'BENCH{i:05d}' not in existing_users
+        ]
+        if 'BENCHADMIN' not in existing_users:
+            users.append({'full_name': 'bench admin', 'rfid_uid': 'BENCHADMIN', 'email': 'bench-admin@bench.local',
+                          'is_active': True, 'is_admin': True})
+        if users:
+            db.session.execute(insert(User), users)
+
+        existing_devices = set(db.session.scalars(
+            select(Device.device_id).where(Device.device_id.like('bench-device-%'))
+        ))
+        devices = [
+            {'device_id': f'bench-device-{i:03d}', 'name': f'bench device {i}', 'is_active': True}
+            for i in range(args.devices) if f'bench-device-{i:03d}' not in existing_devices
+        ]
+        if devices:
+            db.session.execute(insert(Device), devices)
+        db.session.commit()
+        print(f'seeded {len(users)} users, {len(devices)} devices')
+
+        existing = db.session.scalar(
+            select(func.count()).select_from(Attendance_logs).where(Attendance_logs.rfid_uid.like('BENCH%'))
+        )
+        missing = args.logs - existing
+        if missing <= 0:
+            print(f'attendance_logs already has {existing} BENCH rows, skip seeding')
+            return start.date(), end.date()
+
+        print(f'seeding {missing} rows into attendance_logs...')
+        rng = random.Random(SEED + existing)
+        inserted = 0
+        while inserted < missing:
+            size = min(args.chunk_size, missing - inserted)
+            # giờ quẹt thẻ trong khoảng 7h - 19h như dữ liệu thật
+            rows = [
+                {
+                    'rfid_uid': f'BENCH{rng.randrange(args.users):05d}',
+                    'timestamp': start + timedelta(days=rng.randrange(args.days),
+                                                   seconds=rng.randrange(7 * 3600, 19 * 3600)),
+                    'device_id': f'bench-device-{rng.randrange(args.devices):03d}',
+                    'code': 'REALTIME',
+                    'error_code': None
+                }
+                for _ in range(size)
+            ]
+            db.session.execute(insert_ignore_attendance_logs(), rows)
+            db.session.commit()
+            inserted += size
+            print(f'  {inserted}/{missing}', end='\r')
+        print()
+
+        if not args.skip_summaries:
+            print('rebuilding daily_work_summary...')
+            written = rebuild_work_day_summaries(start.date(), end.date())
+            print(f'  {written} summary rows')
+    return start.date(), end.date()
+
+
+def build_scenarios(args, window_end):
+    """
+    (name, role, path builder) for every benchmarked request; builders get a random.Random
+    """
+    # tháng đầy đủ gần nhất trong dữ liệu seed
+    last_month_end = window_end.replace(day=1) - timedelta(days=1)
+    month = last_month_end.strftime('%Y-%m')
+    month_start = last_month_end.replace(day=1).isoformat()
+
+    def card(rng):
+        return f'BENCH{rng.randrange(args.users):05d}'
+
+    def device(rng):
+        return f'bench-device-{rng.randrange(args.devices):03d}'
+
+    deep_page = max(1, args.users // 50 // 2)
+    return [
+        ('worked-day/month', 'user', lambda rng: f'/api/worked-day/month?month={month}'),
+        ('worked-day/range', 'user',
+         lambda rng: f'/api/worked-day/range?start_date={month_start}&end_date={last_month_end.isoformat()}'),
+        ('worked-day/report', 'admin', lambda rng: f'/api/worked-day/report?month={month}&detail=false'),
+        ('attendance-logs/me?month', 'user', lambda rng: f'/api/attendance-logs/me?month={month}'),
+        ('attendance-logs/filter?month', 'admin', lambda rng: f'/api/attendance-logs/filter?month={month}'),
+        ('attendance-logs/filter?month&device_id', 'admin',
+         lambda rng: f'/api/attendance-logs/filter?month={month}&device_id={device(rng)}'),
+        ('attendance-logs/filter?month&rfid_uid', 'admin',
+         lambda rng: f'/api/attendance-logs/filter?month={month}&rfid_uid={card(rng)}'),
+        ('users?page=1', 'admin', lambda rng: '/api/users?page=1&per_page=50'),
+        (f'users?page={deep_page}', 'admin', lambda rng: f'/api/users?page={deep_page}&per_page=50'),
+        ('devices', 'admin', lambda rng: '/api/devices'),
+    ]
+
+
+def issue_tokens(app, args):
+    """
+    jwt of the bench admin and of --token-users random bench users (as /api/login would return)
+    """
+    from sqlalchemy import select
+    from app.api.auth import generate_token
+    from app.extensions import db
+    from app.models import User
+
+    rng = random.Random(SEED)
+    cards = {f'BENCH{rng.randrange(args.users):05d}' for _ in range(args.token_users)}
+    with app.app_context():
+        admin = db.session.scalar(select(User).where(User.rfid_uid == 'BENCHADMIN'))
+        users = db.session.scalars(select(User).where(User.rfid_uid.in_(cards))).all()
+        if admin is None or not users:
+            raise RuntimeError('bench users not found, run without --skip-seed first')
+        return generate_token(admin), [generate_token(user) for user in users]
+
+
+def bench_client(app, scenarios, tokens, args):
+    from sqlalchemy import event
+    from app.extensions import db
+
+    admin_token, user_tokens = tokens
+    client = app.test_client()
+    counter = {'queries': 0}
+
+    def count_query(conn, cursor, statement, parameters, context, executemany):
+        counter['queries'] += 1
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', count_query)
+
+    results = []
+    try:
+        for name, role, build_path in scenarios:
+            rng = random.Random(SEED)
+            latencies, statuses, queries = [], Counter(), []
+            for index in range(args.warmup + args.requests):
+                token = admin_token if role == 'admin' else rng.choice(user_tokens)
+                path = build_path(rng)
+                counter['queries'] = 0
+                started = time.perf_counter()
+                response = client.get(path, headers={'Authorization': f'Bearer {token}'})
+                elapsed = time.perf_counter() - started
+                if index < args.warmup:
+                    continue
+                latencies.append(elapsed)
+                statuses[response.status_code] += 1
+                queries.append(counter['queries'])
+            result = summarize(latencies, statuses, queries, sum(latencies))
+            result['endpoint'] = name
+            results.append(result)
+            print(f"{name:>40}: p50={result['latency_ms']['p50']} ms  p99={result['latency_ms']['p99']} ms  "
+                  f"queries={result['queries_per_request']['median']}  statuses={result['statuses']}")
+    finally:
+        event.remove(engine, 'before_cursor_execute', count_query)
+    return results
+
+
+def bench_server(scenarios, tokens, args):
+    admin_token, user_tokens = tokens
+    base_url = args.url.rstrip('/')
+
+    results = []
+    for name, role, build_path in scenarios:
+        latencies, statuses, queries = [], Counter(), []
+        lock = threading.Lock()
+        per_thread = (args.requests + args.concurrency - 1) // args.concurrency
+
+        def loop(worker):
+            rng = random.Random(SEED + worker)
+            local_latencies, local_statuses, local_queries = [], Counter(), []
+            for index in range(args.warmup + per_thread):
+                token = admin_token if role == 'admin' else rng.choice(user_tokens)
+                api_request = urllib.request.Request(
+                    base_url + build_path(rng),
+                    headers={'Authorization': f'Bearer {token}'}
+                )
+                started = time.perf_counter()
+                query_count = None
+                try:
+                    with urllib.request.urlopen(api_request, timeout=60) as response:
+                        response.read()
+                        status = response.status
+                        query_count = response.headers.get('X-DB-Query-Count')
+                except urllib.error.HTTPError as e:
+                    status = e.code
+                except Exception:
+                    status = 'error'
+                if index < args.warmup:
+                    continue
+                local_latencies.append(time.perf_counter() - started)
+                local_statuses[status] += 1
+                if query_count is not None:
+                    local_queries.append(int(query_count))
+            with lock:
+                latencies.extend(local_latencies)
+                statuses.update(local_statuses)
+                queries.extend(local_queries)
+
+        started = time.perf_counter()
+        workers = [threading.Thread(target=loop, args=(worker,)) for worker in range(args.concurrency)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        result = summarize(latencies, statuses, queries, time.perf_counter() - started)
+        result['endpoint'] = name
+        results.append(result)
+        print(f"{name:>40}: {result['requests_per_sec']} req/s  p50={result['latency_ms']['p50']} ms  "
+              f"p99={result['latency_ms']['p99']} ms  statuses={result['statuses']}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', help='overrides DATABASE_URL')
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--devices', type=int, default=200)
+    parser.add_argument('--logs', type=int, default=1000000, help='seed attendance_logs up to this many BENCH rows')
+    parser.add_argument('--days', type=int, default=180, help='seeded window ending today')
+    parser.add_argument('--chunk-size', type=int, default=20000)
+    parser.add_argument('--skip-seed', action='store_true')
+    parser.add_argument('--skip-summaries', action='store_true', help='do not rebuild daily_work_summary')
+    parser.add_argument('--requests', type=int, default=100, help='measured requests per endpoint')
+    parser.add_argument('--warmup', type=int, default=5, help='unmeasured requests per endpoint (per thread)')
+    parser.add_argument('--token-users', type=int, default=50, help='distinct users behind the user-token requests')
+    parser.add_argument('--url', help='benchmark a running server instead of the test client')
+    parser.add_argument('--concurrency', type=int, default=8, help='server mode: concurrent clients')
+    parser.add_argument('--output', help='write results as JSON to this file')
+    args = parser.parse_args()
+
+    if args.database_url:
+        os.environ['DATABASE_URL'] = args.database_url
+    # import trễ: Config đọc DATABASE_URL lúc import
+    from app import create_app
+
+    app = create_app(mqtt_consumer=False)
+    if args.skip_seed:
+        window_end = date.today()
+    else:
+        _, window_end = seed(app, args)
+
+    scenarios = build_scenarios(args, window_end)
+    tokens = issue_tokens(app, args)
+    results = bench_server(scenarios, tokens, args) if args.url else bench_client(app, scenarios, tokens, args)
+
+    report = {
+        'mode': 'server' if args.url else 'client',
+        'url': args.url,
+        'database': app.config['SQLALCHEMY_DATABASE_URI'].split('://', 1)[0],
+        'users': args.users,
+        'devices': args.devices,
+        'logs': args.logs,
+        'requests': args.requests,
+        'concurrency': args.concurrency if args.url else 1,
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f'results written to {args.output}')
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+"""
+EXPLAIN benchmark for the /attendance-logs/me and /attendance-logs/filter predicates
+====================================================================================
+
+Compares the old non-sargable filters
+
+    DATE(timestamp) = :day
+    EXTRACT(YEAR FROM timestamp) = :y AND EXTRACT(MONTH FROM timestamp) = :m
+
+with the half-open range filters now used by the endpoints
+
+    timestamp >= :start AND timestamp < :end
+
+on a seeded attendance_logs table. For every scenario it records the
+EXPLAIN plan (access type, chosen key, estimated rows) and the median wall
+time of the real query, then writes everything as JSON.
+
+Usage (from server/, against a MySQL database migrated with `flask db upgrade`):
+
+    python -m benchmarks.explain_attendance_filters --rows 3000000 --output explain.json
+
+Seeding only inserts the rows missing to reach --rows, so the script can be
+re-run on the same database.
+"""
+
+import argparse
+import json
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, select, insert, func, extract, text
+
+from app.config import Config
+from app.models import Attendance_logs
+from app.utils.time_ranges import day_range, month_range
+
+
+def seed(engine, target_rows, users, devices, days, chunk_size=20000):
+    """
+    insert random swipes until attendance_logs has target_rows rows
+    """
+    with engine.connect() as connection:
+        existing = connection.execute(select(func.count()).select_from(Attendance_logs)).scalar()
+    missing = target_rows - existing
+    if missing <= 0:
+        print(f'attendance_logs already has {existing} rows, skip seeding')
+        return
+
+    print(f'seeding {missing} rows into attendance_logs...')
+    random.seed(42)
+    start = datetime.now() - timedelta(days=days)
+    inserted = 0
+    while inserted < missing:
+        size = min(chunk_size, missing - inserted)
+        rows = [
+            {
+                'rfid_uid': f'BENCH{random.randrange(users):05d}',
+                'timestamp': start + timedelta(seconds=random.randrange(days * 86400)),
+                'device_id': f'bench-device-{random.randrange(devices):03d}',
+                'code': 'REALTIME',
+                'error_code': None
+            }
+            for _ in range(size)
+        ]
+        with engine.begin() as connection:
+            connection.execute(insert(Attendance_logs), rows)
+        inserted += size
+        print(f'  {inserted}/{missing}', end='\r')
+    print()
+
+
+def build_scenarios(day, rfid_uid, device_id):
+    """
+    (name, old statement, new statement) for each endpoint filter combination
+    """
+    ts = Attendance_logs.timestamp
+    day_start, day_end = day_range(day)
+    month_start, month_end = month_range(day.year, day.month)
+
+    old_day = func.date(ts) == day
+    new_day = (ts >= day_start, ts < day_end)
+    old_month = (extract('year', ts) == day.year, extract('month', ts) == day.month)
+    new_month = (ts >= month_start, ts < month_end)
+
+    base = select(Attendance_logs).order_by(ts.desc()).limit(10)
+    by_user = base.where(Attendance_logs.rfid_uid == rfid_uid)
+    by_device = base.where(Attendance_logs.device_id == device_id)
+
+    return [
+        ('me?day', by_user.where(old_day), by_user.where(*new_day)),
+        ('me?month', by_user.where(*old_month), by_user.where(*new_month)),
+        ('filter?day', base.where(old_day), base.where(*new_day)),
+        ('filter?month', base.where(*old_month), base.where(*new_month)),
+        ('filter?month&device_id', by_device.where(*old_month), by_device.where(*new_month)),
+    ]
+
+
+def explain(connection, statement):
+    compiled = statement.compile(connection, compile_kwargs={'literal_binds': True})
+    result = connection.execute(text(f'EXPLAIN {compiled}'))
+    return [dict(row._mapping) for row in result]
+
+
+def time_query(connection, statement, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        connection.execute(statement).all()
+        samples.append((time.perf_counter() - started) * 1000)
+    return round(statistics.median(samples), 3)
+
+
+def summarize_plan(plan):
+    return [
+        {
+            'table': row.get('table'),
+            'type': row.get('type'),
+            'key': row.get('key'),
+            'rows': row.get('rows'),
+            'extra': row.get('Extra'),
+        }
+        for row in plan
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='EXPLAIN benchmark for attendance log day/month filters')
+    parser.add_argument('--database-url', default=Config.SQLALCHEMY_DATABASE_URI)
+    parser.add_argument('--rows', type=int, default=3000000, help='seed attendance_logs up to this many rows')
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--devices', type=int, default=200)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--repeat', type=int, default=5, help='timed executions per query')
+    parser.add_argument('--output', default='explain_attendance_filters.json')
+    args = parser.parse_args()
+
+    engine = create_engine(args.database_url)
+    if engine.dialect.name != 'mysql':
+        print('this benchmark expects MySQL (EXPLAIN output is MySQL specific)', file=sys.stderr)
+        return 1
+
+    seed(engine, args.rows, args.users, args.devices, args.days)
+
+    day = (datetime.now() - timedelta(days=args.days // 2)).date()
+    results = []
+    with engine.connect() as connection:
+        for name, old_statement, new_statement in build_scenarios(day, 'BENCH00042', 'bench-device-007'):
+            entry = {
+                'scenario': name,
+                'before': {
+                    'plan': summarize_plan(explain(connection, old_statement)),
+                    'median_ms': time_query(connection, old_statement, args.repeat),
+                },
+                'after': {
+                    'plan': summarize_plan(explain(connection, new_statement)),
+                    'median_ms': time_query(connection, new_statement, args.repeat),
+                },
+            }
+            results.append(entry)
+            print(
+                f"{name:<24} before: {entry['before']['median_ms']:>10.3f} ms "
+                f"(key={entry['before']['plan'][0]['key']}, rows={entry['before']['plan'][0]['rows']})  "
+                f"after: {entry['after']['median_ms']:>8.3f} ms "
+                f"(key={entry['after']['plan'][0]['key']}, rows={entry['after']['plan'][0]['rows']})"
+            )
+
+    with open(args.output, 'w') as f:
+        json.dump({'rows': args.rows, 'day': day.isoformat(), 'results': results}, f, indent=2, default=str)
+    print(f'results written to {args.output}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,182 @@
+"""
+Login throughput benchmark
+==========================
+
+Measures logins/sec and latency percentiles of password verification, the
+CPU-bound part of /api/login.
+
+Local mode (default) drives app.utils.password_hashing.PasswordHasher from
+--threads concurrent "request" threads for every combination of
+
+    hashing:  inline (PASSWORD_HASH_WORKERS=0) and process pool (--workers)
+    scheme:   werkzeug default hash and the cheaper --rehash-method
+
+HTTP mode (--url) hammers POST /api/login of a running server instead, with
+an existing account, and reports the same numbers plus status codes
+(503 = LOGIN_BUSY, the hashing queue was saturated).
+
+Usage (from server/):
+
+    python -m benchmarks.login_throughput --threads 32 --duration 10 --output login.json
+    python -m benchmarks.login_throughput --url http://localhost:5000 --email admin --password 1
+"""
+
+import argparse
+import json
+import os
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+
+from werkzeug.security import generate_password_hash
+
+from app.utils.password_hashing import PasswordHasher, PasswordPoolBusy
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def summarize(latencies, outcomes, elapsed):
+    return {
+        'logins': outcomes.get('ok', 0),
+        'logins_per_sec': round(outcomes.get('ok', 0) / elapsed, 1),
+        'outcomes': dict(outcomes),
+        'latency_ms': {
+            'p50': round(percentile(latencies, 0.50) * 1000, 2) if latencies else None,
+            'p99': round(percentile(latencies, 0.99) * 1000, 2) if latencies else None,
+            'mean': round(statistics.mean(latencies) * 1000, 2) if latencies else None,
+        }
+    }
+
+
+def run_threads(threads, duration, attempt):
+    """
+    call attempt() from `threads` threads for `duration` seconds
+
+    attempt returns an outcome label ('ok', 'busy', 'http_503', ...)
+    """
+    latencies = []
+    outcomes = Counter()
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def loop():
+        local_latencies = []
+        local_outcomes = Counter()
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            outcome = attempt()
+            local_latencies.append(time.perf_counter() - started)
+            local_outcomes[outcome] += 1
+        with lock:
+            latencies.extend(local_latencies)
+            outcomes.update(local_outcomes)
+
+    started = time.monotonic()
+    workers = [threading.Thread(target=loop) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return summarize(latencies, outcomes, time.monotonic() - started)
+
+
+def bench_local(args):
+    password = 'benchmark-password'
+    schemes = {
+        'default': generate_password_hash(password),
+        'rehash_method': generate_password_hash(password, args.rehash_method),
+    }
+
+    results = []
+    for workers in (0, args.workers):
+        for scheme, password_hash in schemes.items():
+            hasher = PasswordHasher(
+                workers=workers,
+                queue_size=args.queue_size,
+                queue_timeout=args.queue_timeout
+            )
+            # khởi động pool trước khi đo
+            hasher.verify(password_hash, password)
+
+            def attempt():
+                try:
+                    return 'ok' if hasher.verify(password_hash, password) else 'wrong_password'
+                except PasswordPoolBusy:
+                    return 'busy'
+
+            result = run_threads(args.threads, args.duration, attempt)
+            result.update({
+                'hashing': 'inline' if workers == 0 else f'process_pool({workers})',
+                'scheme': scheme,
+                'method': password_hash.split('$', 1)[0],
+            })
+            results.append(result)
+            print(f"{result['hashing']:>18} {result['method']:>28}: "
+                  f"{result['logins_per_sec']:>8} logins/s  p99={result['latency_ms']['p99']} ms")
+    return results
+
+
+def bench_http(args):
+    body = json.dumps({'email': args.email, 'password': args.password}).encode()
+
+    def attempt():
+        login_request = urllib.request.Request(
+            args.url.rstrip('/') + '/api/login',
+            data=body,
+            headers={'Content-Type': 'application/json'}
+        )
+        try:
+            with urllib.request.urlopen(login_request, timeout=30) as response:
+                response.read()
+                return 'ok'
+        except urllib.error.HTTPError as e:
+            return f'http_{e.code}'
+        except Exception:
+            return 'error'
+
+    result = run_threads(args.threads, args.duration, attempt)
+    result.update({'url': args.url})
+    print(f"{args.url}: {result['logins_per_sec']} logins/s  outcomes={result['outcomes']}")
+    return [result]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, default=32, help='concurrent login requests')
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds per scenario')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='process pool size')
+    parser.add_argument('--queue-size', type=int, default=64)
+    parser.add_argument('--queue-timeout', type=float, default=2.0)
+    parser.add_argument('--rehash-method', default='pbkdf2:sha256:100000')
+    parser.add_argument('--url', help='benchmark a running server instead of the local hasher')
+    parser.add_argument('--email', default='admin')
+    parser.add_argument('--password', default='1')
+    parser.add_argument('--output', help='write results as JSON to this file')
+    args = parser.parse_args()
+
+    results = bench_http(args) if args.url else bench_local(args)
+
+    report = {
+        'threads': args.threads,
+        'duration': args.duration,
+        'cpu_count': os.cpu_count(),
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f'results written to {args.output}')
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,212 @@
+"""
+Benchmark of the organization-wide monthly report (GET /api/worked-day/report)
+=============================================================================
+
+Seeds --users cards (REPORT00000..) with --swipes-per-day swipes on every
+weekday of the last full month, then times calculate_work_day_report for
+all of them:
+
+- scan: the streamed (rfid_uid, timestamp) scan of attendance_logs and the
+  grouping per (rfid_uid, date) alone (iter_user_day_logs)
+- from logs: the whole report computed from the logs (WORK_SUMMARY_ENABLED
+  off); from logs - scan is the cost of the per-day pairing in Python
+- from summaries: the report read from daily_work_summary (rebuilt for the
+  month after seeding, skipped with --skip-summaries)
+
+The pairing is a per-user, per-day sequential rule (in -> out -> in -> out
+over the SUCCESS swipes), computed in the same pass as the scan instead of
+with vectorized array operations (the server has no numpy dependency); this
+benchmark shows how much of the report time it takes.
+
+Usage (from server/, with the environment of the server: MQTT_*):
+
+    python -m benchmarks.work_day_report --users 1000 --repeat 5 --output report.json
+    python -m benchmarks.work_day_report --database-url mysql+pymysql://... --users 5000
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+
+SEED = 42
+
+
+def report_month(today=None):
+    """
+    (first day, last day) of the last full month
+    """
+    last_day = (today or date.today()).replace(day=1) - timedelta(days=1)
+    return last_day.replace(day=1), last_day
+
+
+def create_bench_app(database_url):
+    """
+    flask app with flask-sqlalchemy only (no mqtt connection, the report does not publish)
+    """
+    from flask import Flask
+    from app.config import Config
+    from app.extensions import db
+
+    app = Flask('app')
+    app.config.from_object(Config)
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_url
+    db.init_app(app)
+    return app
+
+
+def seed(app, args):
+    """
+    create the REPORT users and swipes of the month when missing; returns the month
+    """
+    from sqlalchemy import func, insert, select, text
+    from app.extensions import db
+    from app.models import Attendance_logs, User
+    from app.utils.attendance_ingest import insert_ignore_attendance_logs
+    from app.utils.work_day_summary import rebuild_work_day_summaries
+
+    start_date, end_date = report_month()
+    cards = [f'REPORT{i:05d}' for i in range(args.users)]
+
+    with app.app_context():
+        if db.engine.dialect.name == 'sqlite':
+            db.create_all()
+            # rebuild daily_work_summary đọc streaming và ghi bằng connection khác: cần WAL trên sqlite
+            db.session.execute(text('PRAGMA journal_mode=WAL'))
+
+        existing = set(db.session.scalars(select(User.rfid_uid).where(User.rfid_uid.like('REPORT%'))))
+        users = [
+            {'full_name': f'report user {card}', 'rfid_uid': card, 'email': f'{card.lower()}@bench.local',
+             'is_active': True, 'is_admin': False}
+            for card in cards if card not in existing
+        ]
+        if users:
+            db.session.execute(insert(User), users)
+            db.session.commit()
+
+        seeded = db.session.scalar(
+            select(func.count()).select_from(Attendance_logs).where(
+                Attendance_logs.rfid_uid.like('REPORT%'),
+                Attendance_logs.timestamp >= datetime.combine(start_date, datetime.min.time())
+            )
+        )
+        if seeded:
+            print(f'attendance_logs already has {seeded} REPORT rows for {start_date:%Y-%m}, skip seeding')
+            return start_date, end_date
+
+        rng = random.Random(SEED)
+        days = [start_date + timedelta(days=offset) for offset in range((end_date - start_date).days + 1)]
+        rows = []
+        for card in cards:
+            for day in days:
+                if day.weekday() >= 5:
+                    continue
+                # vào ~8h, ra / vào lại buổi trưa, ra ~17h (có khi làm thêm sau 18h)
+                first = datetime.combine(day, datetime.min.time()) + timedelta(hours=8, minutes=rng.randrange(-30, 30))
+                step = timedelta(hours=9) / max(1, args.swipes_per_day - 1)
+                for index in range(args.swipes_per_day):
+                    rows.append({
+                        'rfid_uid': card,
+                        'timestamp': first + step * index + timedelta(minutes=rng.randrange(0, 5)),
+                        'device_id': 'report-device',
+                        'code': 'REALTIME',
+                        'error_code': 'USER_NOT_ACTIVE' if rng.random() < 0.01 else None
+                    })
+        print(f'seeding {len(rows)} rows into attendance_logs...')
+        for index in range(0, len(rows), args.chunk_size):
+            db.session.execute(insert_ignore_attendance_logs(), rows[index:index + args.chunk_size])
+            db.session.commit()
+
+        if not args.skip_summaries:
+            print('rebuilding daily_work_summary...')
+            rebuild_work_day_summaries(start_date, end_date)
+    return start_date, end_date
+
+
+def timed(func, repeat):
+    """
+    median seconds of repeat calls and the result of the last one
+    """
+    durations = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        durations.append(time.perf_counter() - started)
+    return statistics.median(durations), result
+
+
+def bench(app, args, start_date, end_date):
+    from app.utils.work_day_calculator import calculate_work_day_report, iter_user_day_logs
+
+    cards = [f'REPORT{i:05d}' for i in range(args.users)]
+
+    def scan():
+        return sum(
+            len(logs) for _, logs_by_date in iter_user_day_logs(start_date, end_date, cards)
+            for logs in logs_by_date.values()
+        )
+
+    def report():
+        return calculate_work_day_report(start_date, end_date, cards)
+
+    results = {}
+    with app.app_context():
+        app.config['WORK_SUMMARY_ENABLED'] = False
+        scan_seconds, logs = timed(scan, args.repeat)
+        logs_seconds, from_logs = timed(report, args.repeat)
+        results['logs'] = logs
+        results['scan_seconds'] = round(scan_seconds, 4)
+        results['from_logs_seconds'] = round(logs_seconds, 4)
+        results['pairing_seconds'] = round(max(0.0, logs_seconds - scan_seconds), 4)
+        results['logs_per_second'] = round(logs / logs_seconds) if logs_seconds else None
+
+        if not args.skip_summaries:
+            app.config['WORK_SUMMARY_ENABLED'] = True
+            summaries_seconds, from_summaries = timed(report, args.repeat)
+            results['from_summaries_seconds'] = round(summaries_seconds, 4)
+            # 2 cách tính phải cho cùng kết quả
+            results['summaries_match_logs'] = json.loads(json.dumps(from_summaries, default=str)) == \
+                json.loads(json.dumps(from_logs, default=str))
+        results['users'] = len(from_logs)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', help='default: a temporary sqlite database')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--swipes-per-day', type=int, default=4)
+    parser.add_argument('--chunk-size', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs per measurement (median)')
+    parser.add_argument('--skip-summaries', action='store_true', help='do not rebuild / time daily_work_summary')
+    parser.add_argument('--output', help='write results as JSON to this file')
+    args = parser.parse_args()
+
+    database_url = args.database_url or f'sqlite:///{os.path.join(tempfile.mkdtemp(), "report.db")}'
+    app = create_bench_app(database_url)
+    start_date, end_date = seed(app, args)
+    results = bench(app, args, start_date, end_date)
+
+    report = {
+        'database': database_url.split('://', 1)[0],
+        'month': start_date.strftime('%Y-%m'),
+        'swipes_per_day': args.swipes_per_day,
+        'repeat': args.repeat,
+        **results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f'results written to {args.output}')
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,9 @@
 #!/bin/bash
 
+# server mode: dev (werkzeug dev server, default), web (gunicorn), mqtt (mqtt consumer),
+# async-mqtt (asyncio mqtt consumer)
+SERVER_MODE=${1:-${SERVER_MODE:-dev}}
+
 # wait for mysql
 echo "waiting for mysql..."
 while ! nc -z db 3306; do
@@ -7,10 +11,38 @@ while ! nc -z db 3306; do
 done
 echo "mysql is ready!"
 
-# run database migrations
-echo "running database migrations..."
-flask db upgrade
+case "$SERVER_MODE" in
+  web)
+    # run database migrations
+    echo "running database migrations..."
+    flask db upgrade
+
+    # start gunicorn, mqtt messages are handled by the mqtt consumer service
+    echo "starting gunicorn with ${WEB_WORKERS:-4} workers..."
+    exec gunicorn \
+      --workers "${WEB_WORKERS:-4}" \
+      --threads "${WEB_THREADS:-4}" \
+      --bind 0.0.0.0:5000 \
+      --access-logfile - \
+      wsgi:app
+    ;;
+  mqtt)
+    # the web service runs the migrations
+    echo "starting mqtt consumer..."
+    exec python mqtt_consumer.py
+    ;;
+  async-mqtt)
+    # the web service runs the migrations
+    echo "starting async mqtt consumer..."
+    exec python async_mqtt_consumer.py
+    ;;
+  *)
+    # run database migrations
+    echo "running database migrations..."
+    flask db upgrade
 
-# start flask server
-echo "starting flask server..."
-exec python app.py
+    # start flask server
+    echo "starting flask server..."
+    exec python app.py
+    ;;
+esac
@@ -0,0 +1,45 @@
+# production mqtt entry point: python mqtt_consumer.py
+# process duy nhất subscribe esp32/+/... và ghi attendance logs, chạy song song với wsgi.py
+import signal
+import threading
+
+from app import create_app
+from app.utils.log import get_logger
+from app.utils.metrics import start_metrics_server
+
+app = create_app(mqtt_consumer=True)
+logger = get_logger('app.mqtt_consumer')
+
+
+def main():
+    stop_event = threading.Event()
+
+    def handle_signal(signum, frame):
+        logger.info('mqtt consumer shutting down', signal=signum)
+        stop_event.set()
+
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+
+    # /metrics (khi METRICS_ENABLED) và /api/mqtt/ingest-stats của process này, web chuyển tiếp qua INGEST_STATS_URL
+    if app.config['METRICS_PORT']:
+        start_metrics_server(app, app.config['METRICS_PORT'])
+        logger.info('metrics server started', port=app.config['METRICS_PORT'])
+
+    # process duy nhất (không chạy trong gunicorn worker): refresh snapshot analytics định kỳ
+    if app.config['ANALYTICS_REFRESH_INTERVAL'] > 0:
+        from app.utils.analytics_store import analytics_store
+        analytics_store.start_refresher(app.config['ANALYTICS_REFRESH_INTERVAL'])
+
+    logger.info('mqtt consumer started')
+    while not stop_event.wait(1.0):
+        pass
+
+    # ngắt kết nối broker trước, các queue / heartbeat được drain bởi atexit khi thoát
+    from app.extensions import mqtt
+    mqtt.client.disconnect()
+    mqtt.client.loop_stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+# tests/conftest.py
+import os
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+
+# app.config đọc biến môi trường ngay lúc import
+os.environ.setdefault('MQTT_BROKER_PORT', '1883')
+os.environ.setdefault('SECRET_KEY', 'test-secret-key')
+os.environ.setdefault('JWT_SECRET_KEY', 'test-jwt-secret-key')
+
+from flask import Flask
+from app.config import Config
+from app.extensions import db
+from app.models import Attendance_logs, User
+from app.utils.swipe_dedup import recent_swipes
+from app.utils.swipe_cache import swipe_cache
+from app.utils.auth_cache import auth_cache
+from app.utils.password_hashing import password_hasher
+
+
+@pytest.fixture
+def app(tmp_path):
+    """
+    flask app on a fresh sqlite database with the extensions used by app.utils
+
+    built by hand instead of create_app(): create_app connects to the mqtt
+    broker, none of the code under test publishes
+    """
+    app = Flask('app')
+    app.config.from_object(Config)
+    app.config.update(
+        TESTING=True,
+        SQLALCHEMY_DATABASE_URI=f'sqlite:///{tmp_path / "test.db"}',
+        ATTENDANCE_ARCHIVE_DIR=str(tmp_path / 'archive'),
+        ATTENDANCE_JOURNAL_DIR=str(tmp_path / 'journal'),
+        ATTENDANCE_SPOOL_DIR=str(tmp_path / 'spool'),
+        # spool dùng chung cho cả process (thread replay): test của spool tự tạo spool riêng
+        ATTENDANCE_SPOOL_ENABLED=False,
+        # bảng tổng hợp được tính ngay sau commit để test đọc lại được
+        WORK_SUMMARY_BACKGROUND_REFRESH=False,
+    )
+    db.init_app(app)
+    recent_swipes.init_app(app)
+    swipe_cache.init_app(app)
+    auth_cache.init_app(app)
+    password_hasher.init_app(app)
+
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    """
+    test client of app with the /api blueprint
+    """
+    from app.api import api_bp
+    app.register_blueprint(api_bp, url_prefix='/api')
+    return app.test_client()
+
+
+def auth_headers(is_admin=True, rfid_uid='ADMIN0001'):
+    """
+    Authorization header of a new (admin) user
+    """
+    from app.api.auth import generate_token
+    user = User(full_name='Admin', rfid_uid=rfid_uid, email=f'{rfid_uid.lower()}@example.com', is_admin=is_admin)
+    db.session.add(user)
+    db.session.commit()
+    return {'Authorization': f'Bearer {generate_token(user)}'}
+
+
+def make_rows(count, start=None, rfid_uid='CARD0001', device_id='device-01', step=timedelta(minutes=1)):
+    """
+    attendance rows (dict) as built by the ingest path, one every `step`
+    """
+    start = start or datetime(2025, 12, 1, 8, 0, 0)
+    return [
+        {
+            'rfid_uid': rfid_uid,
+            'timestamp': start + step * index,
+            'device_id': device_id,
+            'code': 'REALTIME',
+            'error_code': None
+        }
+        for index in range(count)
+    ]
+
+
+def log_count():
+    return db.session.execute(db.select(db.func.count()).select_from(Attendance_logs)).scalar()
+
+
+def count_queries(func, *args):
+    """
+    call func(*args), returns (result, number of sql statements it ran)
+    """
+    statements = []
+    listener = lambda *_: statements.append(1)
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        result = func(*args)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+    return result, len(statements)
@@ -0,0 +1,72 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.extensions import db
+from app.models import Attendance_logs
+from app.utils.analytics_store import AnalyticsNotReadyError, AnalyticsStore, analytics_store
+from conftest import auth_headers, make_rows
+
+pytest.importorskip('duckdb')
+pytest.importorskip('pyarrow')
+
+SETTLED = datetime.now() - timedelta(hours=1)
+
+
+@pytest.fixture
+def store(app, tmp_path):
+    app.config.update(ANALYTICS_DIR=str(tmp_path / 'analytics'))
+    store = AnalyticsStore()
+    store.init_app(app)
+    return store
+
+
+def add_logs(rows, created_at=SETTLED):
+    db.session.add_all(Attendance_logs(created_at=created_at, **row) for row in rows)
+    db.session.commit()
+
+
+def test_query_before_first_refresh(store):
+    assert store.load_state() is None
+    with pytest.raises(AnalyticsNotReadyError):
+        store.query('SELECT 1')
+
+
+def test_refresh_appends_only_new_settled_logs(store):
+    add_logs(make_rows(5))
+    first = store.refresh()
+    assert (first['version'], first['new_rows'], first['rows']) == (1, 5, 5)
+
+    add_logs(make_rows(3, device_id='device-02'))
+    # log vừa ghi chưa qua settle window: để lại cho lần refresh sau
+    add_logs(make_rows(2, device_id='device-03'), created_at=datetime.now() + timedelta(minutes=5))
+    second = store.refresh()
+    assert (second['new_rows'], second['rows'], second['parts']) == (3, 8, 2)
+
+    rows, state = store.query('SELECT device_id, count(*) AS swipes FROM attendance_logs GROUP BY device_id ORDER BY device_id')
+    assert rows == [{'device_id': 'device-01', 'swipes': 5}, {'device_id': 'device-02', 'swipes': 3}]
+    assert state['version'] == 2
+
+
+def test_full_refresh_rebuilds_the_snapshot(store):
+    add_logs(make_rows(4))
+    store.refresh()
+    store.refresh()
+
+    summary = store.refresh(full=True)
+    assert (summary['rows'], summary['parts']) == (4, 1)
+    rows, _ = store.query('SELECT count(*) AS swipes FROM attendance_logs')
+    assert rows == [{'swipes': 4}]
+
+
+def test_device_traffic_endpoint(client, app, tmp_path):
+    app.config.update(ANALYTICS_DIR=str(tmp_path / 'analytics'))
+    analytics_store.init_app(app)
+    headers = auth_headers()
+    add_logs(make_rows(3, start=datetime(2025, 12, 1, 8)) + make_rows(2, start=datetime(2025, 12, 2, 8), rfid_uid='CARD0002'))
+    analytics_store.refresh()
+
+    response = client.get('/api/analytics/device-traffic?start_date=2025-12-01&end_date=2025-12-31&group=total', headers=headers)
+    assert response.status_code == 200
+    traffic = response.get_json()['data']['traffic']
+    assert [(row['device_id'], row['swipes'], row['users']) for row in traffic] == [('device-01', 5, 2)]
@@ -0,0 +1,31 @@
+from argparse import Namespace
+
+from benchmarks.api_endpoints import build_scenarios, bench_client, issue_tokens, seed
+
+
+def bench_args(**overrides):
+    args = dict(
+        users=20, devices=3, logs=300, days=40, chunk_size=100, skip_summaries=False,
+        requests=3, warmup=1, token_users=5
+    )
+    args.update(overrides)
+    return Namespace(**args)
+
+
+def test_seed_is_idempotent(app):
+    args = bench_args()
+    assert seed(app, args) == seed(app, args)
+
+
+def test_every_scenario_answers_through_the_test_client(client, app):
+    args = bench_args()
+    _, window_end = seed(app, args)
+
+    results = bench_client(app, build_scenarios(args, window_end), issue_tokens(app, args), args)
+
+    assert len(results) == len(build_scenarios(args, window_end))
+    for result in results:
+        assert result['statuses'] == {200: 3}, result['endpoint']
+        assert result['requests'] == 3
+        assert result['latency_ms']['p50'] is not None
+        assert result['queries_per_request']['max'] >= 1
@@ -0,0 +1,97 @@
+import asyncio
+import json
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from app.extensions import db
+from app.models import Attendance_logs, Daily_work_summary, Daily_work_summary_pending, User
+from app.utils import device_heartbeat
+from app.utils.async_ingest import AsyncIngestService, _STOP
+from app.utils.swipe_cache import swipe_cache
+from conftest import make_rows
+
+
+class FakeClient:
+    """
+    aiomqtt client that records what is published
+    """
+
+    def __init__(self):
+        self.published = []
+
+    async def publish(self, topic, payload, qos=0):
+        self.published.append((topic, json.loads(payload)))
+
+
+@pytest.fixture
+def service(app, monkeypatch):
+    # tracker heartbeat là singleton của process: mỗi test 1 tracker mới
+    monkeypatch.setattr(device_heartbeat, '_heartbeat_tracker', None)
+
+    def build(**config):
+        app.config.update(config)
+        service = AsyncIngestService(app)
+        service.client = FakeClient()
+        return service
+    return build
+
+
+def run(service, scenario):
+    async def main():
+        service._loop = asyncio.get_running_loop()
+        try:
+            return await scenario()
+        finally:
+            await service.engine.dispose()
+    return asyncio.run(main())
+
+
+def test_ack_first_journals_the_swipe_before_responding(app, service):
+    db.session.add(User(full_name='Nguyen Van A', rfid_uid='CARD0001', email='a@example.com'))
+    db.session.commit()
+    swipe_cache.expire()
+    ingest = service(ATTENDANCE_DURABILITY_MODE='ack-first', ATTENDANCE_QUEUE_WORKERS=1)
+    swipe_queue = ingest._swipe_queues[0]
+
+    async def scenario():
+        await ingest._enqueue_swipe('device-01', {'rfid_uid': 'CARD0001', 'timestamp': '2025-12-01T08:00:00'})
+        # đã phản hồi, log mới chỉ nằm trong journal
+        assert ingest.client.published[0][1]['is_success'] is True
+        assert ingest.journal.stats()['pending'] == 1
+        assert db.session.scalar(db.select(db.func.count()).select_from(Attendance_logs)) == 0
+
+        writer = asyncio.create_task(ingest._swipe_writer(swipe_queue))
+        await swipe_queue.put(_STOP)
+        await writer
+    run(ingest, scenario)
+
+    assert db.session.scalar(db.select(db.func.count()).select_from(Attendance_logs)) == 1
+    assert ingest.journal.stats()['pending'] == 0
+    ingest.journal.close()
+
+
+def test_summary_of_an_archived_month_is_refreshed(app, service):
+    ingest = service(WORK_SUMMARY_ENABLED=True, ATTENDANCE_RETENTION_MONTHS=1)
+    # log offline sync đến muộn của 1 tháng đã archive
+    rows = make_rows(2, start=datetime(2020, 3, 2, 8, 0), step=timedelta(hours=9))
+
+    saved = run(ingest, lambda: ingest._save_in_new_session(rows))
+
+    assert saved == (2, 0)
+    assert db.session.scalar(db.select(db.func.count()).select_from(Daily_work_summary)) == 1
+    assert db.session.scalar(db.select(db.func.count()).select_from(Daily_work_summary_pending)) == 0
+
+
+def test_cache_invalidation_evicts_the_shared_swipe_cache(app, service):
+    ingest = service()
+    swipe_cache.upsert_user(SimpleNamespace(id=1, rfid_uid='CARD0001', full_name='Nguyen Van A', is_active=True))
+    message = SimpleNamespace(
+        topic=SimpleNamespace(value=app.config['CACHE_INVALIDATION_TOPIC']),
+        payload=json.dumps({'origin': 'other-process', 'users': [{'id': 1, 'rfid_uids': ['CARD0001']}]}).encode()
+    )
+
+    run(ingest, lambda: ingest._dispatch(message))
+
+    assert 'CARD0001' not in swipe_cache._users
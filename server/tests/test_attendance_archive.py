@@ -0,0 +1,246 @@
+import json
+import os
+from datetime import datetime, timedelta
+
+import pytest
+from flask import current_app, request
+
+from app.extensions import db
+from app.models import Attendance_logs, Attendance_archive
+from app.utils import attendance_archive
+from app.utils.attendance_archive import (
+    archive_month, drop_archived_partition, archived_log_paths, archive_filters, iter_archived_logs,
+    read_archived_logs, merge_archived_logs
+)
+from app.utils.attendance_export import build_export_statement, iter_export_chunks
+from app.utils.time_ranges import add_months, month_range
+from app.api.attendance_logs_crud import apply_attendance_log_filters, paginate_attendance_logs
+from conftest import make_rows, log_count
+
+# archive là tính năng tuỳ chọn, cần pyarrow
+pytest.importorskip('pyarrow')
+
+
+def this_month():
+    now = datetime.now()
+    return datetime(now.year, now.month, 1)
+
+
+@pytest.fixture
+def month():
+    # quá ATTENDANCE_RETENTION_MONTHS (mặc định 12) nên archive được
+    return add_months(this_month(), -14)
+
+
+@pytest.fixture
+def archived(app, month):
+    """
+    archive 12 logs of `month` (2 cards swiping at the same times) and keep
+    3 logs of the current month in the database; returns the archived ids
+    """
+    start = month + timedelta(days=2, hours=8)
+    rows = make_rows(6, start=start, step=timedelta(hours=1))
+    rows += make_rows(6, start=start, rfid_uid='CARD0002', step=timedelta(hours=1))
+    db.session.execute(db.insert(Attendance_logs), rows)
+    db.session.execute(db.insert(Attendance_logs), make_rows(3, start=this_month() + timedelta(hours=8)))
+    db.session.commit()
+    ids = db.session.execute(
+        db.select(Attendance_logs.id).where(Attendance_logs.timestamp < this_month()).order_by(Attendance_logs.id)
+    ).scalars().all()
+
+    archive_month(month)
+    return ids
+
+
+def add_late_logs(month, count):
+    """
+    offline-sync logs of the archived month that arrive after the archive run
+    """
+    db.session.execute(
+        db.insert(Attendance_logs),
+        make_rows(count, start=month + timedelta(days=5, hours=9), rfid_uid='CARD0003', step=timedelta(hours=1))
+    )
+    db.session.commit()
+
+
+def restore_archived_log(log):
+    """
+    archived log still in attendance_logs (archive run interrupted before the delete)
+    """
+    db.session.add(Attendance_logs(**log._asdict()))
+    db.session.commit()
+
+
+def expected_ids(month):
+    """
+    logs of month from both sources, counted once, newest first
+    """
+    logs = {log.id: log for log in read_archived_logs(*month_range(month.year, month.month))}
+    logs.update((log.id, log) for log in Attendance_logs.query.filter(
+        Attendance_logs.timestamp >= month, Attendance_logs.timestamp < add_months(month, 1)
+    ))
+    return [log.id for log in sorted(logs.values(), key=lambda log: (log.timestamp, log.id), reverse=True)]
+
+
+def list_logs(**args):
+    with current_app.test_request_context('/api/attendance-logs/filter', query_string=args):
+        query, error = apply_attendance_log_filters(Attendance_logs.query, request.args)
+        assert error is None
+        result = paginate_attendance_logs(
+            query.order_by(Attendance_logs.timestamp.desc()),
+            request.args,
+            rfid_uid=request.args.get('rfid_uid')
+        )
+    return [log['id'] for log in result['attendance_logs']], result['pagination']
+
+
+def test_archive_moves_month_to_parquet(app, month, archived):
+    archive = Attendance_archive.query.one()
+    assert archive.row_count == 12
+    assert archive.max_id == max(archived)
+    assert os.path.exists(os.path.join(current_app.config['ATTENDANCE_ARCHIVE_DIR'], archive.path))
+    assert log_count() == 3
+
+    logs = read_archived_logs(*month_range(month.year, month.month))
+    assert sorted(log.id for log in logs) == sorted(archived)
+    assert logs == sorted(logs, key=lambda log: (log.rfid_uid, log.timestamp, log.id))
+    assert [log.id for log in read_archived_logs(*month_range(month.year, month.month), rfid_uids=['CARD0002'])] == archived[6:]
+
+
+def test_month_inside_retention_is_not_archived(app):
+    with pytest.raises(ValueError):
+        archive_month(add_months(this_month(), -1))
+
+
+def test_reads_inside_retention_skip_the_archive(app, archived):
+    assert archived_log_paths(this_month(), add_months(this_month(), 1)) == []
+
+
+def test_merge_yields_logs_in_both_sources_once(app, month, archived):
+    logs = read_archived_logs(*month_range(month.year, month.month))
+    ascending = sorted(logs, key=lambda log: (log.timestamp, log.id))
+    live = [ascending[3], ascending[4]]
+
+    key = lambda log: (log.timestamp, log.id)
+    assert [log.id for log in merge_archived_logs(ascending, live, key=key)] == [log.id for log in ascending]
+
+    descending = ascending[::-1]
+    merged = merge_archived_logs(descending, live[::-1], key=key, reverse=True)
+    assert [log.id for log in merged] == [log.id for log in descending]
+
+
+def test_cursor_pages_merge_live_and_archived_logs(app, month, archived):
+    add_late_logs(month, 3)
+    restore_archived_log(read_archived_logs(*month_range(month.year, month.month))[0])
+    expected = expected_ids(month)
+    assert len(expected) == 15
+
+    ids, pagination = list_logs(month=f'{month:%Y-%m}', pagination='cursor', per_page=4, count='exact')
+    assert pagination['total_items'] == 15
+    pages = [ids]
+    while pagination['has_next']:
+        ids, pagination = list_logs(month=f'{month:%Y-%m}', per_page=4, after=pagination['next_cursor'])
+        pages.append(ids)
+    assert sum(pages, []) == expected
+    assert [len(page) for page in pages] == [4, 4, 4, 3]
+
+    walked = pages[-1]
+    while pagination['has_prev']:
+        ids, pagination = list_logs(month=f'{month:%Y-%m}', per_page=4, before=pagination['prev_cursor'])
+        walked = ids + walked
+    assert walked == expected
+
+
+def test_offset_pages_merge_live_and_archived_logs(app, month, archived):
+    add_late_logs(month, 2)
+    expected = expected_ids(month)
+
+    ids, pagination = list_logs(month=f'{month:%Y-%m}', page=2, per_page=5)
+    assert ids == expected[5:10]
+    assert pagination['total_items'] == 14
+    assert pagination['total_pages'] == 3
+
+    ids, pagination = list_logs(month=f'{month:%Y-%m}', rfid_uid='CARD0002', per_page=10)
+    assert sorted(ids) == sorted(archived[6:])
+    assert pagination['total_items'] == 6
+
+
+def test_export_streams_archived_months_in_order(app, month, archived):
+    add_late_logs(month, 2)
+    restore_archived_log(read_archived_logs(*month_range(month.year, month.month))[0])
+    expected = expected_ids(month)[::-1] + [
+        log.id for log in Attendance_logs.query.filter(Attendance_logs.timestamp >= this_month()).order_by(Attendance_logs.id)
+    ]
+
+    archive_dir = current_app.config['ATTENDANCE_ARCHIVE_DIR']
+    chunks = iter_export_chunks(
+        db.engine, build_export_statement(), 'ndjson', chunk_size=4,
+        archived=iter_archived_logs(archived_log_paths(), archive_filters(), archive_dir, chunk_size=4)
+    )
+    assert [json.loads(line)['id'] for line in ''.join(chunks).splitlines()] == expected
+
+
+class LockRecordingConnection:
+    """
+    sqlite connection that records LOCK / UNLOCK TABLES instead of running them (mysql only)
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.statements = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.connection.close()
+
+    def exec_driver_sql(self, statement):
+        self.statements.append(statement)
+
+    def execute(self, statement):
+        self.statements.append('SELECT late')
+        return self.connection.execute(statement)
+
+
+def drop_with_recorded_lock(month, max_id):
+    """
+    drop_archived_partition on a recording connection; returns (dropped, statements)
+    """
+    connection = LockRecordingConnection(db.engine.connect())
+
+    def drop(month_start, on_connection):
+        assert on_connection is connection
+        connection.statements.append('DROP PARTITION')
+        return True
+
+    # chỉ thay connect() trong lúc gọi: session của test vẫn dùng engine thật
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(db.engine, 'connect', lambda: connection)
+        patch.setattr(attendance_archive, 'drop_month_partition', drop)
+        dropped = drop_archived_partition(month, max_id)
+    return dropped, connection.statements
+
+
+def add_month_logs(month):
+    db.session.execute(db.insert(Attendance_logs), make_rows(3, start=month + timedelta(days=2, hours=8)))
+    db.session.commit()
+    return db.session.execute(db.select(db.func.max(Attendance_logs.id))).scalar()
+
+
+def test_partition_is_dropped_under_table_lock(app, month):
+    max_id = add_month_logs(month)
+
+    dropped, statements = drop_with_recorded_lock(month, max_id)
+    assert dropped is True
+    assert statements == ['LOCK TABLES attendance_logs WRITE', 'SELECT late', 'DROP PARTITION', 'UNLOCK TABLES']
+
+
+def test_late_logs_keep_the_partition(app, month):
+    max_id = add_month_logs(month)
+    add_late_logs(month, 1)
+
+    # log đến sau max_id được thấy trong lúc giữ khoá: không drop, khoá vẫn được nhả
+    dropped, statements = drop_with_recorded_lock(month, max_id)
+    assert dropped is False
+    assert statements == ['LOCK TABLES attendance_logs WRITE', 'SELECT late', 'UNLOCK TABLES']
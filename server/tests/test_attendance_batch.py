@@ -0,0 +1,85 @@
+import pytest
+
+from app.extensions import db
+from app.models import User
+from app.utils import attendance_ingest
+from app.utils.attendance_ingest import parse_swipe_batch, ingest_swipe_batch
+from app.utils.attendance_spool import AttendanceSpool
+from app.utils.swipe_cache import swipe_cache
+from app.utils.swipe_journal import SwipeJournal
+from conftest import auth_headers, log_count
+
+
+@pytest.fixture
+def user(app):
+    db.session.add(User(full_name='Nguyen Van A', rfid_uid='CARD0001', email='a@example.com'))
+    db.session.commit()
+    swipe_cache.expire()
+
+
+def offline_swipe(minute, rfid_uid='CARD0001'):
+    return {'rfid_uid': rfid_uid, 'timestamp': f'2025-12-01T08:{minute:02d}:00'}
+
+
+def test_batch_payload_forms_and_limits():
+    batch, error = parse_swipe_batch('device-01', {'batch_id': 'b-1', 'swipes': [offline_swipe(0)]}, max_swipes=10)
+    assert error is None
+    assert (batch['batch_id'], batch['swipes'][0]['code']) == ('b-1', 'OFFLINE_SYNC')
+
+    batch, error = parse_swipe_batch('device-01', [offline_swipe(0), offline_swipe(1)], max_swipes=10)
+    assert (batch['batch_id'], len(batch['swipes'])) == (None, 2)
+
+    assert parse_swipe_batch('device-01', [offline_swipe(0)] * 3, max_swipes=2) == (None, 'BATCH_TOO_LARGE')
+    assert parse_swipe_batch('device-01', {'swipes': 'x'}, max_swipes=2) == (None, 'INVALID_PAYLOAD')
+
+
+def test_ack_lists_every_swipe_in_submitted_order(user):
+    payload = {'batch_id': 'b-1', 'swipes': [
+        offline_swipe(0), {'rfid_uid': 'CARD0001', 'timestamp': 'yesterday'}, offline_swipe(1, 'CARD0404'), offline_swipe(2)
+    ]}
+    batch, _ = parse_swipe_batch('device-01', payload, max_swipes=10)
+
+    ack = ingest_swipe_batch(batch)
+    assert [(item['index'], item['error_code']) for item in ack['results']] == [
+        (0, None), (1, 'INVALID_PAYLOAD'), (2, 'USER_NOT_FOUND'), (3, None)
+    ]
+    assert (ack['received'], ack['saved'], ack['duplicates'], ack['rejected']) == (4, 3, 0, 2)
+    assert log_count() == 3
+
+
+
+def test_ack_counts_spooled_rows_when_the_database_fails(app, user, tmp_path, monkeypatch):
+    def database_down(rows):
+        raise RuntimeError('database down')
+
+    spool = AttendanceSpool(app, SwipeJournal(str(tmp_path / 'spool'), prefix='spool'), database_down)
+    app.config['ATTENDANCE_SPOOL_ENABLED'] = True
+    monkeypatch.setattr(attendance_ingest, 'get_attendance_spool', lambda: spool)
+    batch, _ = parse_swipe_batch('device-01', [offline_swipe(0), offline_swipe(1, 'CARD0404')], max_swipes=10)
+
+    ack = ingest_swipe_batch(batch)
+    # log đã fsync vào spool: ack vẫn được gửi, esp32 xoá được bộ nhớ offline
+    assert (ack['saved'], ack['spooled'], ack['rejected']) == (0, 2, 1)
+    assert spool.stats()['spooled'] == 2
+    assert log_count() == 0
+
+
+def test_rest_batch_needs_the_device_token(client, app, user):
+    app.config.update(DEVICE_API_TOKENS='device-01:token-01,device-02:token-02', DEVICE_SERVICE_TOKEN='gateway-token')
+    body = {'device_id': 'device-01', 'batch_id': 'b-1', 'swipes': [offline_swipe(0), offline_swipe(1)]}
+
+    def post(headers):
+        return client.post('/api/attendance-logs/batch', json=body, headers=headers)
+
+    assert post({}).status_code == 401
+    # token của thiết bị khác hoặc jwt của admin không gửi được batch cho device-01
+    assert post({'Authorization': 'Bearer token-02'}).status_code == 401
+    assert post(auth_headers()).status_code == 401
+
+    response = post({'Authorization': 'Bearer token-01'})
+    assert response.status_code == 201
+    assert (response.get_json()['data']['saved'], log_count()) == (2, 2)
+
+    response = post({'Authorization': 'Bearer gateway-token'})
+    assert response.status_code == 201
+    assert response.get_json()['data']['duplicates'] == 2
@@ -0,0 +1,71 @@
+import csv
+import io
+import json
+from datetime import timedelta
+
+import pytest
+
+from app.extensions import db
+from app.models import Attendance_logs
+from app.api import attendance_logs_crud
+from app.utils.attendance_export import EXPORT_COLUMNS, build_export_statement, iter_export_chunks
+from conftest import make_rows, auth_headers
+
+
+@pytest.fixture
+def logs(app):
+    rows = make_rows(5, step=timedelta(hours=1)) + make_rows(3, rfid_uid='CARD0002', step=timedelta(hours=2))
+    db.session.execute(db.insert(Attendance_logs), rows)
+    db.session.commit()
+    return [log.id for log in Attendance_logs.query.order_by(Attendance_logs.timestamp, Attendance_logs.id)]
+
+
+def test_csv_chunks_have_header_then_rows_in_order(logs):
+    chunks = list(iter_export_chunks(db.engine, build_export_statement(), 'csv', chunk_size=3))
+
+    # header + ceil(8 / 3) chunk dữ liệu
+    assert len(chunks) == 4
+    lines = list(csv.reader(io.StringIO(''.join(chunks))))
+    assert lines[0] == EXPORT_COLUMNS
+    assert [int(line[0]) for line in lines[1:]] == logs
+    assert lines[1][2] == '2025-12-01T08:00:00'
+    assert lines[1][5] == ''
+
+
+def test_ndjson_lines_are_json_objects(logs):
+    chunks = iter_export_chunks(db.engine, build_export_statement(), 'ndjson', chunk_size=100)
+    records = [json.loads(line) for line in ''.join(chunks).splitlines()]
+
+    assert [record['id'] for record in records] == logs
+    assert set(records[0]) == set(EXPORT_COLUMNS)
+    assert records[0]['error_code'] is None
+
+
+def test_export_endpoint_streams_filtered_logs(client, logs):
+    response = client.get('/api/attendance-logs/export?format=ndjson&rfid_uid=CARD0002', headers=auth_headers())
+
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    assert 'attachment; filename=attendance_logs_' in response.headers['Content-Disposition']
+    assert [json.loads(line)['rfid_uid'] for line in response.get_data(as_text=True).splitlines()] == ['CARD0002'] * 3
+
+
+def test_export_endpoint_rejects_bad_format_and_non_admin(client, logs):
+    response = client.get('/api/attendance-logs/export?format=xlsx', headers=auth_headers())
+    assert response.status_code == 400
+
+    response = client.get('/api/attendance-logs/export', headers=auth_headers(is_admin=False, rfid_uid='CARD0001'))
+    assert response.status_code == 403
+
+
+def test_failure_mid_export_is_not_a_complete_download(client, logs, monkeypatch):
+    def failing_chunks(*args):
+        yield 'id,rfid_uid\n'
+        raise RuntimeError('database connection lost')
+
+    monkeypatch.setattr(attendance_logs_crud, 'iter_export_chunks', failing_chunks)
+    response = client.get('/api/attendance-logs/export?format=csv', headers=auth_headers())
+
+    # lỗi giữa chừng không bị nuốt: response kết thúc bằng lỗi thay vì 1 file csv thiếu dòng
+    with pytest.raises(RuntimeError):
+        response.get_data()
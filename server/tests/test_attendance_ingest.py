@@ -0,0 +1,104 @@
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from app.extensions import db
+from app.models import Attendance_logs, User
+from app.utils import attendance_ingest
+from app.utils.attendance_ingest import (
+    save_attendance_rows, insert_ignore_attendance_logs, parse_swipe_batch, ingest_swipe_batch,
+    check_durability_mode, process_attendance_batch
+)
+from app.utils.swipe_cache import swipe_cache
+from app.utils.swipe_dedup import recent_swipes
+from conftest import make_rows, log_count
+
+
+def test_saves_batch_with_one_insert(app):
+    assert save_attendance_rows(make_rows(5)) == (5, 0)
+    assert log_count() == 5
+
+
+def test_repeated_swipes_in_batch_are_dropped(app):
+    rows = make_rows(3)
+    assert save_attendance_rows(rows + [dict(rows[0])]) == (3, 1)
+    assert log_count() == 3
+
+
+def test_replayed_batch_is_dropped_in_memory(app):
+    rows = make_rows(4)
+    save_attendance_rows(rows)
+    before = recent_swipes.stats()
+
+    assert save_attendance_rows(rows) == (0, 4)
+    after = recent_swipes.stats()
+    assert after['memory_duplicates'] - before['memory_duplicates'] == 4
+    assert after['db_duplicates'] == before['db_duplicates']
+    assert log_count() == 4
+
+
+def test_replayed_batch_is_ignored_by_unique_key(app):
+    rows = make_rows(4)
+    save_attendance_rows(rows)
+    # process khác (hoặc key đã bị evict): chỉ còn unique key của database chặn log trùng
+    recent_swipes.init_app(app)
+    before = recent_swipes.stats()['db_duplicates']
+
+    assert save_attendance_rows(rows + make_rows(2, start=rows[-1]['timestamp'].replace(hour=12))) == (2, 4)
+    assert recent_swipes.stats()['db_duplicates'] - before == 4
+    assert log_count() == 6
+
+
+def test_same_time_on_other_device_is_kept(app):
+    rows = make_rows(2)
+    save_attendance_rows(rows)
+    recent_swipes.init_app(app)
+
+    assert save_attendance_rows([dict(row, device_id='device-02') for row in rows]) == (2, 0)
+    assert log_count() == 4
+
+
+def test_unique_key_rejects_plain_insert(app):
+    rows = make_rows(1)
+    db.session.execute(insert_ignore_attendance_logs(), rows)
+    db.session.commit()
+
+    with pytest.raises(IntegrityError):
+        db.session.execute(db.insert(Attendance_logs), rows)
+        db.session.commit()
+    db.session.rollback()
+
+
+def test_resent_offline_batch_is_acked_without_new_logs(app):
+    swipes = [{'rfid_uid': row['rfid_uid'], 'timestamp': row['timestamp'].isoformat()} for row in make_rows(2)]
+    batch, _ = parse_swipe_batch('device-01', swipes, max_swipes=10)
+    ingest_swipe_batch(batch)
+
+    # esp32 không nhận được ack nên gửi lại cả batch
+    ack = ingest_swipe_batch(batch)
+    assert (ack['saved'], ack['duplicates']) == (0, 2)
+    assert log_count() == 2
+
+
+def test_queued_mode_requires_the_spool():
+    check_durability_mode({'ATTENDANCE_DURABILITY_MODE': 'sync', 'ATTENDANCE_SPOOL_ENABLED': False})
+    check_durability_mode({'ATTENDANCE_DURABILITY_MODE': 'queued', 'ATTENDANCE_SPOOL_ENABLED': True})
+    with pytest.raises(ValueError):
+        check_durability_mode({'ATTENDANCE_DURABILITY_MODE': 'queued', 'ATTENDANCE_SPOOL_ENABLED': False})
+    with pytest.raises(ValueError):
+        check_durability_mode({'ATTENDANCE_DURABILITY_MODE': 'fire-and-forget', 'ATTENDANCE_SPOOL_ENABLED': True})
+
+
+def test_sync_mode_publishes_after_the_commit(app, monkeypatch):
+    app.config.update(ATTENDANCE_DURABILITY_MODE='sync')
+    db.session.add(User(full_name='Nguyen Van A', rfid_uid='CARD0001', email='a@example.com'))
+    db.session.commit()
+    swipe_cache.expire()
+    monkeypatch.setattr(attendance_ingest, 'mqtt', SimpleNamespace(app=app))
+    # số log đã commit tại thời điểm publish response
+    published = []
+    monkeypatch.setattr(attendance_ingest, 'publish_responses', lambda responses: published.append(log_count()))
+
+    process_attendance_batch(make_rows(3))
+    assert published == [3]
@@ -0,0 +1,53 @@
+from datetime import date, datetime
+
+from app.extensions import db
+from app.models import Attendance_logs
+from app.utils.time_ranges import day_range, month_range
+from app.api.attendance_logs_crud import apply_attendance_log_filters
+from conftest import make_rows
+
+
+def test_day_and_month_ranges_are_half_open():
+    assert day_range(date(2025, 12, 31)) == (datetime(2025, 12, 31), datetime(2026, 1, 1))
+    assert month_range(2025, 2) == (datetime(2025, 2, 1), datetime(2025, 3, 1))
+    assert month_range(2025, 12) == (datetime(2025, 12, 1), datetime(2026, 1, 1))
+
+
+def filtered_ids(**args):
+    query, error = apply_attendance_log_filters(Attendance_logs.query, args)
+    assert error is None
+    return sorted(log.id for log in query)
+
+
+def test_filters_keep_rows_on_the_boundaries(app):
+    last_moment = datetime(2025, 12, 31, 23, 59, 59, 999999)
+    rows = [
+        make_rows(1, start=datetime(2025, 11, 30, 23, 59, 59))[0],
+        make_rows(1, start=datetime(2025, 12, 1))[0],
+        make_rows(1, start=last_moment)[0],
+        make_rows(1, start=datetime(2026, 1, 1))[0],
+        make_rows(1, start=datetime(2025, 12, 31, 8), rfid_uid='CARD0002', device_id='device-02')[0],
+    ]
+    db.session.execute(db.insert(Attendance_logs), rows)
+    db.session.commit()
+    ids = {log.timestamp: log.id for log in Attendance_logs.query}
+
+    assert filtered_ids(month='2025-12') == sorted([ids[datetime(2025, 12, 1)], ids[last_moment], ids[datetime(2025, 12, 31, 8)]])
+    assert filtered_ids(day='2025-12-31') == sorted([ids[last_moment], ids[datetime(2025, 12, 31, 8)]])
+    assert filtered_ids(day='2025-12-31', rfid_uid='CARD0001') == [ids[last_moment]]
+    assert filtered_ids(month='2025-12', device_id='device-02') == [ids[datetime(2025, 12, 31, 8)]]
+
+
+def test_filters_compare_the_raw_timestamp_column(app):
+    query, _ = apply_attendance_log_filters(db.select(Attendance_logs.id), {'day': '2025-12-01', 'month': '2025-12'})
+    sql = str(query.compile(dialect=db.engine.dialect)).lower()
+
+    # không bọc cột timestamp trong hàm (DATE(), EXTRACT()) để database dùng được index
+    assert 'attendance_logs.timestamp >=' in sql
+    assert 'attendance_logs.timestamp <' in sql
+    assert 'date(' not in sql and 'extract(' not in sql
+
+
+def test_invalid_day_or_month_is_rejected(app):
+    assert apply_attendance_log_filters(Attendance_logs.query, {'day': '2025-13-01'})[1][1] == 'INVALID_DAY_FORMAT'
+    assert apply_attendance_log_filters(Attendance_logs.query, {'month': '12-2025'})[1][1] == 'INVALID_MONTH_FORMAT'
@@ -0,0 +1,176 @@
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+from app.utils.attendance_ingest import save_attendance_rows
+from app.utils.attendance_spool import AttendanceSpool
+from app.utils.swipe_journal import SwipeJournal
+from conftest import make_rows, log_count
+
+
+class FlakyDatabase:
+    """
+    save() for the spool that fails while `down` is set
+    """
+
+    def __init__(self, save=save_attendance_rows):
+        self.down = False
+        self.calls = 0
+        self._save = save
+
+    def __call__(self, rows):
+        self.calls += 1
+        if self.down:
+            raise RuntimeError('database down')
+        return self._save(rows)
+
+
+@pytest.fixture
+def database():
+    return FlakyDatabase()
+
+
+def make_spool(app, directory, save, **options):
+    return AttendanceSpool(app, SwipeJournal(directory, prefix='spool'), save, **options)
+
+
+def test_failed_write_is_spooled_and_replayed(app, tmp_path, database):
+    spool = make_spool(app, str(tmp_path / 'spool'), database, cooldown=60)
+    database.down = True
+
+    assert spool.write(make_rows(3)) is None
+    assert spool.degraded()
+    assert spool.stats()['spooled'] == 3
+    assert log_count() == 0
+
+    database.down = False
+    assert spool.replay() == 3
+    assert log_count() == 3
+    assert spool.replay() == 0
+
+
+def test_degraded_spool_skips_database(app, tmp_path, database):
+    spool = make_spool(app, str(tmp_path / 'spool'), database, cooldown=60)
+    database.down = True
+    spool.write(make_rows(1))
+    database.down = False
+
+    assert spool.write(make_rows(2, rfid_uid='CARD0002')) is None
+    assert database.calls == 1
+    assert spool.replay() == 3
+    assert log_count() == 3
+
+
+def test_slow_write_is_saved_then_trips_spool(app, tmp_path, database):
+    spool = make_spool(app, str(tmp_path / 'spool'), database, latency_budget=0, cooldown=60)
+
+    assert spool.write(make_rows(2)) == (2, 0)
+    assert spool.degraded()
+    assert spool.stats()['slow_writes'] == 1
+    assert log_count() == 2
+
+
+def test_replay_is_idempotent_with_rows_already_saved(app, tmp_path, database):
+    rows = make_rows(4)
+    spool = make_spool(app, str(tmp_path / 'spool'), database, cooldown=60)
+    database.down = True
+    spool.write(rows)
+    database.down = False
+    save_attendance_rows(rows[:2])
+
+    assert spool.replay() == 4
+    assert log_count() == 4
+
+
+def test_spool_of_previous_process_is_replayed(app, tmp_path, database):
+    directory = str(tmp_path / 'spool')
+    database.down = True
+    make_spool(app, directory, database).write(make_rows(2))
+    database.down = False
+
+    assert make_spool(app, directory, database).replay() == 2
+    assert log_count() == 2
+
+
+# consumer khác trên cùng host: database lỗi, spool 2 dòng rồi chờ stdin (vẫn đang chạy)
+OTHER_CONSUMER = """
+import sys
+from datetime import datetime
+from app.utils.attendance_spool import AttendanceSpool
+from app.utils.swipe_journal import SwipeJournal
+
+def save(rows):
+    raise RuntimeError('database down')
+
+spool = AttendanceSpool(None, SwipeJournal(sys.argv[1], prefix='spool'), save)
+spool.write([
+    {'rfid_uid': 'CARD0002', 'timestamp': datetime(2025, 12, 1, 8, minute), 'device_id': 'device-02', 'code': 'REALTIME', 'error_code': None}
+    for minute in range(2)
+])
+print('ready', flush=True)
+sys.stdin.readline()
+"""
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.02)
+    return True
+
+
+def test_spool_of_running_process_is_left_alone(app, tmp_path, database):
+    directory = str(tmp_path / 'spool')
+    other = subprocess.Popen(
+        [sys.executable, '-c', OTHER_CONSUMER, directory],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, cwd=os.path.dirname(os.path.dirname(__file__))
+    )
+    spool = make_spool(app, directory, database, cooldown=0, replay_interval=0.02)
+    try:
+        assert other.stdout.readline().strip() == 'ready'
+        spool.start()
+        database.down = True
+        spool.write(make_rows(3))
+        database.down = False
+
+        # chỉ replay spool của process này, spool của consumer kia vẫn đang được ghi
+        assert wait_for(lambda: log_count() == 3)
+        time.sleep(0.1)
+        assert log_count() == 3
+    finally:
+        other.kill()
+        other.wait()
+
+    # consumer kia đã dừng: replayer nhận spool của nó về và replay
+    assert wait_for(lambda: log_count() == 5)
+    spool.stop()
+    assert spool.journal.stats()['adopted'] == 1
+
+
+def test_failed_replay_keeps_rows(app, tmp_path, database):
+    spool = make_spool(app, str(tmp_path / 'spool'), database, cooldown=60)
+    database.down = True
+    spool.write(make_rows(2))
+
+    assert spool.replay() == 0
+    assert spool.stats()['failed_replays'] == 1
+    database.down = False
+    assert spool.replay() == 2
+    assert log_count() == 2
+
+
+def test_spool_without_app(tmp_path):
+    saved = []
+    database = FlakyDatabase(save=lambda rows: saved.extend(rows) or (len(rows), 0))
+    spool = make_spool(None, str(tmp_path / 'spool'), database, cooldown=60)
+    database.down = True
+    spool.write(make_rows(2))
+    database.down = False
+
+    assert spool.replay() == 2
+    assert [row['timestamp'] for row in saved] == [row['timestamp'] for row in make_rows(2)]
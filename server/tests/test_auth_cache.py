@@ -0,0 +1,85 @@
+import time
+
+import pytest
+
+from app.extensions import db
+from app.models import User
+from app.utils.auth_cache import AuthCache, auth_cache
+from conftest import count_queries, auth_headers
+
+
+@pytest.fixture
+def user(app):
+    user = User(full_name='Nguyen Van A', rfid_uid='CARD0001', email='a@example.com')
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+class Decoder:
+    def __init__(self, payload):
+        self.payload = payload
+        self.calls = 0
+
+    def __call__(self, token):
+        self.calls += 1
+        return self.payload
+
+
+def test_verified_token_is_decoded_once():
+    cache = AuthCache()
+    decode = Decoder({'id': 1, 'exp': time.time() + 3600})
+
+    assert cache.get_payload('token', decode) == decode.payload
+    assert cache.get_payload('token', decode) == decode.payload
+    assert decode.calls == 1
+
+
+def test_invalid_or_expired_token_is_not_cached():
+    cache = AuthCache()
+    invalid = Decoder(None)
+    cache.get_payload('bad', invalid)
+    cache.get_payload('bad', invalid)
+    assert invalid.calls == 2
+
+    # token đã hết hạn không được giữ trong cache
+    expired = Decoder({'id': 1, 'exp': time.time() - 1})
+    cache.get_payload('old', expired)
+    cache.get_payload('old', expired)
+    assert expired.calls == 2
+
+
+def test_principal_is_loaded_with_one_query(user):
+    cache = AuthCache()
+
+    principal, queries = count_queries(cache.get_principal, user.id)
+    assert queries == 1
+    assert (principal.rfid_uid, principal.is_active, principal.is_admin) == ('CARD0001', True, False)
+
+    _, queries = count_queries(cache.get_principal, user.id)
+    assert queries == 0
+    assert cache.get_principal(user.id + 100) is None
+
+
+def test_invalidated_principal_is_reloaded(user):
+    cache = AuthCache()
+    cache.get_principal(user.id)
+    user.is_active = False
+    db.session.commit()
+
+    assert cache.get_principal(user.id).is_active
+    cache.invalidate_user(user.id)
+    assert not cache.get_principal(user.id).is_active
+
+
+def test_repeated_requests_skip_user_lookup(client):
+    headers = auth_headers()
+    client.get('/api/attendance-logs/export?format=xlsx', headers=headers)
+    before = auth_cache.stats()
+
+    response, queries = count_queries(lambda: client.get('/api/attendance-logs/export?format=xlsx', headers=headers))
+    assert response.status_code == 400
+    assert queries == 0
+    after = auth_cache.stats()
+    assert after['tokens']['hits'] - before['tokens']['hits'] == 1
+    assert after['principals']['hits'] - before['principals']['hits'] == 1
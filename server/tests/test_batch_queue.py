@@ -0,0 +1,103 @@
+import threading
+
+from app.utils.batch_queue import BatchQueue
+
+
+class Recorder:
+    """
+    batch handler that remembers every batch it was given
+    """
+
+    def __init__(self, fail=False):
+        self.batches = []
+        self.fail = fail
+        self._lock = threading.Lock()
+
+    def __call__(self, batch):
+        with self._lock:
+            self.batches.append(list(batch))
+        if self.fail:
+            raise RuntimeError('handler failed')
+
+    def items(self):
+        return [item for batch in self.batches for item in batch]
+
+
+def test_stop_drains_queued_items_in_batches():
+    handler = Recorder()
+    batch_queue = BatchQueue('test', handler, batch_size=10, flush_interval=5, workers=1)
+
+    for item in range(25):
+        assert batch_queue.put(item)
+    batch_queue.stop()
+
+    assert handler.items() == list(range(25))
+    assert all(len(batch) <= 10 for batch in handler.batches)
+    stats = batch_queue.stats()
+    assert stats['enqueued'] == stats['processed'] == 25
+    assert stats['depth'] == 0
+    assert not stats['running']
+
+
+def test_partial_batch_is_flushed_after_interval():
+    flushed = threading.Event()
+    batch_queue = BatchQueue('test', lambda batch: flushed.set(), batch_size=100, flush_interval=0.05, workers=1)
+
+    batch_queue.put('swipe')
+    assert flushed.wait(2)
+    batch_queue.stop()
+
+
+def test_partition_key_keeps_items_of_one_key_in_order():
+    handler = Recorder()
+    batch_queue = BatchQueue(
+        'test', handler, batch_size=3, flush_interval=5, workers=4,
+        partition_key=lambda item: item[0]
+    )
+
+    items = [(device, index) for index in range(20) for device in ('device-01', 'device-02', 'device-03')]
+    for item in items:
+        batch_queue.put(item)
+    batch_queue.stop()
+
+    for device in ('device-01', 'device-02', 'device-03'):
+        assert [index for key, index in handler.items() if key == device] == list(range(20))
+    assert batch_queue.stats()['partitioned']
+
+
+def test_full_queue_drops_after_backpressure_timeout():
+    release = threading.Event()
+    batch_queue = BatchQueue(
+        'test', lambda batch: release.wait(5), maxsize=1, batch_size=1,
+        flush_interval=0, workers=1, enqueue_timeout=0.05
+    )
+
+    results = [batch_queue.put(item) for item in range(4)]
+    release.set()
+    batch_queue.stop()
+
+    assert results[0] and not all(results)
+    stats = batch_queue.stats()
+    assert stats['dropped'] == results.count(False)
+    assert stats['blocked_puts'] >= stats['dropped']
+
+
+def test_failed_batch_is_counted_and_worker_keeps_running():
+    handler = Recorder(fail=True)
+    batch_queue = BatchQueue('test', handler, batch_size=1, flush_interval=0, workers=1)
+
+    batch_queue.put('a')
+    batch_queue.put('b')
+    batch_queue.stop()
+
+    assert handler.items() == ['a', 'b']
+    assert batch_queue.stats()['failed_batches'] == 2
+
+
+def test_put_after_stop_is_rejected():
+    batch_queue = BatchQueue('test', Recorder(), workers=1)
+    batch_queue.put('a')
+    batch_queue.stop()
+
+    assert not batch_queue.put('b')
+    assert batch_queue.stats()['dropped'] == 1
@@ -0,0 +1,59 @@
+import pytest
+
+from app.extensions import db
+from app.models import User, Device
+from app.api.mqtt_handlers import mqtt_consumer_enabled
+from app.utils.auth_cache import auth_cache
+from app.utils.cache_invalidation import PROCESS_ID, apply_cache_invalidation
+from app.utils.swipe_cache import swipe_cache
+
+
+@pytest.fixture
+def cached_user(app):
+    user = User(full_name='Nguyen Van A', rfid_uid='CARD0001', email='a@example.com')
+    db.session.add_all([user, Device(device_id='device-01', rfid_enabled=True)])
+    db.session.commit()
+    swipe_cache.load()
+    auth_cache.get_principal(user.id)
+    return user
+
+
+def test_consumer_mode(app, monkeypatch):
+    app.config['MQTT_CONSUMER_ENABLED'] = 'true'
+    assert mqtt_consumer_enabled(app)
+    app.config['MQTT_CONSUMER_ENABLED'] = 'false'
+    assert not mqtt_consumer_enabled(app)
+
+    # auto: chỉ process con của reloader (python app.py) xử lý message
+    app.config['MQTT_CONSUMER_ENABLED'] = 'auto'
+    monkeypatch.delenv('WERKZEUG_RUN_MAIN', raising=False)
+    assert not mqtt_consumer_enabled(app)
+    monkeypatch.setenv('WERKZEUG_RUN_MAIN', 'true')
+    assert mqtt_consumer_enabled(app)
+
+
+def test_user_write_of_other_process_is_reloaded(cached_user):
+    cached_user.is_active = False
+    db.session.commit()
+
+    apply_cache_invalidation({'users': [{'id': cached_user.id, 'rfid_uids': ['CARD0001']}], 'origin': 'other'})
+
+    assert not swipe_cache.resolve_users(['CARD0001'])['CARD0001'].is_active
+    assert not auth_cache.get_principal(cached_user.id).is_active
+
+
+def test_device_write_of_other_process_reloads_devices(cached_user):
+    Device.query.filter_by(device_id='device-01').one().rfid_enabled = False
+    db.session.commit()
+
+    apply_cache_invalidation({'devices': ['device-01'], 'origin': 'other'})
+    swipe_cache.ensure_loaded()
+    assert not swipe_cache.is_rfid_enabled('device-01')
+
+
+def test_own_or_malformed_messages_are_ignored(cached_user):
+    apply_cache_invalidation({'users': [{'id': cached_user.id, 'rfid_uids': ['CARD0001']}], 'origin': PROCESS_ID})
+    apply_cache_invalidation(['CARD0001'])
+
+    assert swipe_cache.stats()['users'] == 1
+    assert auth_cache.stats()['principals']['size'] == 1
@@ -0,0 +1,70 @@
+import pytest
+
+from app.extensions import db
+from app.models import Device
+from app.utils.device_heartbeat import DeviceHeartbeatTracker
+
+
+def devices():
+    return {device.device_id: device for device in db.session.execute(db.select(Device)).scalars()}
+
+
+@pytest.fixture
+def tracker(app):
+    """
+    tracker whose background flusher never starts, tests call flush() themselves
+    """
+    tracker = DeviceHeartbeatTracker(app, flush_interval=60)
+    tracker._thread = object()
+    return tracker
+
+
+def test_touch_only_marks_device_pending(tracker):
+    for _ in range(5):
+        tracker.touch('device-01')
+
+    assert tracker.stats()['pending'] == 1
+    assert tracker.stats()['touches'] == 5
+    assert devices() == {}
+
+
+def test_flush_creates_new_and_updates_known_devices(tracker):
+    db.session.add(Device(device_id='device-01', name='Cong chinh', is_active=True))
+    db.session.commit()
+
+    tracker.touch('device-01')
+    tracker.touch('device-02')
+
+    assert tracker.flush() == 2
+    db.session.expire_all()
+    saved = devices()
+    assert saved['device-01'].name == 'Cong chinh'
+    assert saved['device-01'].last_seen is not None
+    assert saved['device-02'].name == 'Device device-02'
+    assert saved['device-02'].last_seen is not None
+
+    stats = tracker.stats()
+    assert (stats['devices_created'], stats['devices_updated'], stats['pending']) == (1, 1, 0)
+    assert tracker.flush() == 0
+
+
+def test_failed_flush_keeps_pending_devices(tracker):
+    tracker.touch('device-01')
+
+    Device.__table__.drop(db.engine)
+    assert tracker.flush() == 0
+    assert tracker.stats()['failed_flushes'] == 1
+    assert tracker.stats()['pending'] == 1
+
+    Device.__table__.create(db.engine)
+    assert tracker.flush() == 1
+    assert 'device-01' in devices()
+
+
+def test_stop_flushes_pending_devices(app):
+    tracker = DeviceHeartbeatTracker(app, flush_interval=60)
+    tracker.touch('device-01')
+    tracker.stop()
+
+    assert 'device-01' in devices()
+    assert not tracker.stats()['running']
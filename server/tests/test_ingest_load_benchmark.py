@@ -0,0 +1,60 @@
+from argparse import Namespace
+from datetime import datetime
+
+from sqlalchemy import func, select
+
+from app.utils.swipe_dedup import swipe_key
+from benchmarks.ingest_load import build_schedule, latency_summary, prepare_database
+
+
+def fleet_args(**overrides):
+    args = dict(seed=1, swipe_rate=2.0, duration=10.0, burst_interval=5.0, burst_size=20)
+    args.update(overrides)
+    return Namespace(**args)
+
+
+def arrivals(schedule):
+    """
+    schedule without the swipe timestamps, which are relative to the start of the run
+    """
+    return [
+        (offset, device_id, kind, [(swipe['rfid_uid'], swipe['code']) for swipe in swipes])
+        for offset, device_id, kind, swipes in schedule
+    ]
+
+
+def test_same_seed_gives_the_same_schedule():
+    devices, cards = ['bench-0000', 'bench-0001'], ['B0001', 'B0002', 'B0003']
+
+    schedule = build_schedule(fleet_args(), devices, cards)
+    assert arrivals(schedule) == arrivals(build_schedule(fleet_args(), devices, cards))
+    assert arrivals(schedule) != arrivals(build_schedule(fleet_args(seed=2), devices, cards))
+
+    offsets = [offset for offset, *_ in schedule]
+    assert offsets == sorted(offsets) and offsets[-1] < 10.0
+    # mỗi device 2 burst (t=0..10, cách nhau 5 giây)
+    bursts = [swipes for _, _, kind, swipes in schedule if kind == 'attendance_batch']
+    assert len(bursts) == 4 and all(len(swipes) == 20 for swipes in bursts)
+
+
+def test_scheduled_swipes_never_collide_on_the_dedup_key():
+    schedule = build_schedule(fleet_args(), ['bench-0000', 'bench-0001'], ['B0001'])
+    # 1 thẻ, 2 device: nếu trùng khoá thì log bị bỏ qua và số dòng ghi được thấp hơn thực tế
+    keys = [
+        swipe_key(swipe['rfid_uid'], device_id, datetime.fromisoformat(swipe['timestamp']))
+        for _, device_id, _, swipes in schedule for swipe in swipes
+    ]
+    assert len(set(keys)) == len(keys)
+
+
+def test_prepare_database_seeds_the_fleet(tmp_path):
+    engine, cards, device_ids, logs = prepare_database(f'sqlite:///{tmp_path / "bench.db"}', 'R1', users=5, devices=2)
+
+    assert len(cards) == 5 and device_ids == ['bench-r1-0000', 'bench-r1-0001']
+    with engine.connect() as conn:
+        assert conn.execute(select(func.count()).select_from(logs)).scalar() == 0
+
+
+def test_latency_summary_in_milliseconds():
+    assert latency_summary([0.001 * value for value in range(1, 101)]) == {'p50': 51.0, 'p90': 91.0, 'p99': 100.0, 'max': 100.0}
+    assert latency_summary([])['p99'] is None
@@ -0,0 +1,39 @@
+from flask import Flask, jsonify, request
+
+from app.utils.metrics import start_metrics_server
+from conftest import auth_headers
+
+
+def test_consumer_process_serves_its_own_queues(client):
+    response = client.get('/api/mqtt/ingest-stats', headers=auth_headers())
+
+    assert response.status_code == 200
+    assert set(response.get_json()['data']) >= {'attendance_queue', 'device_heartbeat', 'swipe_cache'}
+
+
+def test_http_worker_forwards_to_the_consumer(app, client):
+    # stats server của process consumer, trả về token nhận được
+    consumer = Flask('consumer')
+    consumer.add_url_rule('/api/mqtt/ingest-stats', 'stats', lambda: jsonify(
+        is_success=True, data={'authorization': request.headers.get('Authorization')}
+    ))
+    server = start_metrics_server(consumer, 0)
+    app.extensions['mqtt_consumer'] = False
+    app.config['INGEST_STATS_URL'] = f'http://127.0.0.1:{server.server_port}/api/mqtt/ingest-stats'
+    try:
+        headers = auth_headers()
+        response = client.get('/api/mqtt/ingest-stats', headers=headers)
+    finally:
+        server.shutdown()
+
+    assert response.status_code == 200
+    assert response.get_json()['data'] == {'authorization': headers['Authorization']}
+
+
+def test_http_worker_without_consumer_url(app, client):
+    app.extensions['mqtt_consumer'] = False
+
+    response = client.get('/api/mqtt/ingest-stats', headers=auth_headers())
+
+    assert response.status_code == 503
+    assert response.get_json()['error_code'] == 'INGEST_STATS_NOT_CONFIGURED'
@@ -0,0 +1,70 @@
+import json
+import logging
+import queue
+
+import pytest
+
+from app.utils.log import DroppingQueueHandler, JsonFormatter, StructuredLogger, TextFormatter, get_logger
+
+
+class Capture(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+@pytest.fixture
+def captured():
+    handler = Capture()
+    logger = logging.getLogger('app.tests')
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    yield handler
+    logger.removeHandler(handler)
+    StructuredLogger.sample_rate = 1.0
+
+
+def test_fields_are_kept_structured(captured):
+    get_logger('app.tests').info('attendance batch saved', saved=10, duplicates=0)
+
+    record = captured.records[0]
+    line = json.loads(JsonFormatter().format(record))
+    assert line['msg'] == 'attendance batch saved'
+    assert (line['level'], line['logger'], line['saved'], line['duplicates']) == ('info', 'app.tests', 10, 0)
+    assert TextFormatter().format(record).endswith('app.tests: attendance batch saved saved=10 duplicates=0')
+
+
+def test_disabled_level_emits_nothing(captured):
+    get_logger('app.tests').debug('swipe received', rfid_uid='CARD0001')
+    assert captured.records == []
+
+
+def test_sampled_debug_lines(captured):
+    logging.getLogger('app.tests').setLevel(logging.DEBUG)
+    logger = get_logger('app.tests')
+
+    StructuredLogger.sample_rate = 0.0
+    logger.debug('swipe received', sample=True)
+    # dòng không đánh dấu sample luôn được ghi
+    logger.debug('journal replayed')
+    assert [record.getMessage() for record in captured.records] == ['journal replayed']
+
+
+def test_full_log_queue_drops_instead_of_blocking():
+    handler = DroppingQueueHandler(queue.Queue(maxsize=1))
+    logger = logging.getLogger('app.tests.queue')
+    logger.addHandler(handler)
+    logger.propagate = False
+    try:
+        for index in range(3):
+            logger.warning('database slow %s', index)
+    finally:
+        logger.removeHandler(handler)
+
+    assert handler.dropped == 2
+    record = handler.queue.get_nowait()
+    # message đã được format trên thread gọi
+    assert (record.msg, record.args) == ('database slow 0', None)
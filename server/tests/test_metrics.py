@@ -0,0 +1,80 @@
+import gc
+import threading
+
+from app.utils.metrics import MetricsRegistry, metrics, queue_depth
+
+
+def run_in_threads(func, count=4):
+    threads = [threading.Thread(target=func) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def test_counter_sums_shards_of_every_thread():
+    registry = MetricsRegistry()
+    counter = registry.counter('swipes_total', 'swipes', ['error_code'])
+
+    run_in_threads(lambda: [counter.inc('OK') for _ in range(1000)])
+    counter.inc('USER_NOT_FOUND', amount=2)
+
+    assert counter.collect() == [('swipes_total', ('OK',), 4000), ('swipes_total', ('USER_NOT_FOUND',), 2)]
+
+
+def test_shards_of_finished_threads_are_folded():
+    registry = MetricsRegistry()
+    counter = registry.counter('swipes_total', 'swipes')
+    histogram = registry.histogram('latency_seconds', 'latency', buckets=(0.1, 1.0))
+
+    run_in_threads(lambda: (counter.inc(), histogram.observe(0.5)), count=20)
+    gc.collect()
+
+    # thread đã kết thúc: shard được gộp vào tổng, danh sách shard không phình ra
+    assert len(counter._shards) == 0
+    assert counter.collect() == [('swipes_total', (), 20)]
+    assert ('latency_seconds_count', (), 20) in histogram.collect()
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = MetricsRegistry()
+    histogram = registry.histogram('latency_seconds', 'write latency', ['operation'], buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value, 'insert')
+
+    text = registry.render()
+    assert '# TYPE latency_seconds histogram' in text
+    assert 'latency_seconds_bucket{operation="insert",le="0.1"} 2' in text
+    assert 'latency_seconds_bucket{operation="insert",le="1.0"} 3' in text
+    assert 'latency_seconds_bucket{operation="insert",le="+Inf"} 4' in text
+    assert 'latency_seconds_count{operation="insert"} 4' in text
+    assert 'latency_seconds_sum{operation="insert"} 3.65' in text
+
+
+def test_label_values_are_escaped():
+    registry = MetricsRegistry()
+    registry.counter('errors_total', 'errors', ['message']).inc('say "hi"\n')
+    assert 'errors_total{message="say \\"hi\\"\\n"} 1' in registry.render()
+
+
+def test_metrics_endpoint_requires_token(app):
+    app.config.update(METRICS_ENABLED=True, METRICS_TOKEN='scrape-token')
+    metrics.init_app(app)
+    client = app.test_client()
+
+    assert client.get('/metrics').status_code == 401
+    response = client.get('/metrics', headers={'Authorization': 'Bearer scrape-token'})
+    assert response.status_code == 200
+    assert response.content_type.startswith('text/plain; version=0.0.4')
+    assert 'http_request_duration_seconds_bucket' in response.get_data(as_text=True)
+
+
+def test_queue_depth_reports_only_running_queues(monkeypatch):
+    from app.utils import attendance_ingest, device_heartbeat, work_day_summary
+    monkeypatch.setattr(attendance_ingest, 'get_ingest_stats', lambda: {'running': True, 'depth': 3})
+    monkeypatch.setattr(attendance_ingest, 'get_batch_ingest_stats', lambda: {'running': False})
+    monkeypatch.setattr(device_heartbeat, 'get_heartbeat_stats', lambda: {'running': False})
+    monkeypatch.setattr(work_day_summary, 'get_summary_queue_stats', lambda: {'running': False})
+
+    # http worker không có hàng đợi ingest: không báo 0 giả cho các hàng đợi chưa chạy
+    assert queue_depth.collect() == [('ingest_queue_depth', ('attendance',), 3)]
@@ -0,0 +1,43 @@
+import importlib.util
+import os
+
+import sqlalchemy as sa
+from alembic.migration import MigrationContext
+from alembic.operations import Operations
+
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'migrations', 'versions')
+
+
+def load_migration(revision):
+    filename = next(name for name in os.listdir(MIGRATIONS_DIR) if name.startswith(revision))
+    spec = importlib.util.spec_from_file_location(revision, os.path.join(MIGRATIONS_DIR, filename))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_deduplication_keeps_logs_without_device(tmp_path):
+    engine = sa.create_engine(f'sqlite:///{tmp_path / "migration.db"}')
+    with engine.begin() as connection:
+        # attendance_logs ở revision b7e2f40c9d31 (chưa có unique key)
+        connection.exec_driver_sql(
+            'CREATE TABLE attendance_logs (id INTEGER PRIMARY KEY, rfid_uid VARCHAR(50) NOT NULL, '
+            'timestamp DATETIME NOT NULL, device_id VARCHAR(100), code VARCHAR(30), error_code VARCHAR(30), '
+            'created_at DATETIME)'
+        )
+        connection.exec_driver_sql('CREATE INDEX ix_attendance_logs_rfid_uid_timestamp ON attendance_logs (rfid_uid, timestamp)')
+        connection.exec_driver_sql(
+            "INSERT INTO attendance_logs (id, rfid_uid, timestamp, device_id) VALUES "
+            "(1, 'CARD0001', '2025-12-01 08:00:00', 'device-01'), "
+            "(2, 'CARD0001', '2025-12-01 08:00:00', 'device-01'), "
+            "(3, 'CARD0001', '2025-12-01 08:00:00', NULL), "
+            "(4, 'CARD0001', '2025-12-01 08:00:00', NULL)"
+        )
+
+        with Operations.context(MigrationContext.configure(connection)):
+            load_migration('c4a8e1f9d2b6').upgrade()
+
+        ids = [row[0] for row in connection.exec_driver_sql('SELECT id FROM attendance_logs ORDER BY id')]
+    # chỉ bản sao có device_id bị xoá, 2 log không có device_id không phải bản ghi trùng
+    assert ids == [1, 3, 4]
@@ -0,0 +1,34 @@
+from app.api.mqtt_handlers import get_subscription_topics
+
+
+INVALIDATION_TOPIC = 'server/cache/invalidate'
+
+
+def test_single_consumer_subscribes_to_plain_topics():
+    assert get_subscription_topics({'MQTT_SHARED_GROUP': '', 'CACHE_INVALIDATION_TOPIC': INVALIDATION_TOPIC}) == [
+        'esp32/+/attendance',
+        'esp32/+/attendance_batch',
+        'esp32/+/control_response',
+        INVALIDATION_TOPIC,
+    ]
+
+
+def test_shared_group_splits_attendance_topics():
+    topics = get_subscription_topics({
+        'MQTT_SHARED_GROUP': 'attendance', 'MQTT_CONSUMER_PRIMARY': True, 'CACHE_INVALIDATION_TOPIC': INVALIDATION_TOPIC
+    })
+
+    assert topics[:2] == ['$share/attendance/esp32/+/attendance', '$share/attendance/esp32/+/attendance_batch']
+    # control_response không share, chỉ consumer chính xử lý để giữ thứ tự lệnh của device
+    assert 'esp32/+/control_response' in topics
+    # mọi consumer đều nhận invalidation để xoá cache của mình
+    assert INVALIDATION_TOPIC in topics
+
+
+def test_secondary_consumer_skips_control_response():
+    topics = get_subscription_topics({
+        'MQTT_SHARED_GROUP': 'attendance', 'MQTT_CONSUMER_PRIMARY': False, 'CACHE_INVALIDATION_TOPIC': INVALIDATION_TOPIC
+    })
+
+    assert not any(topic.endswith('control_response') for topic in topics)
+    assert INVALIDATION_TOPIC in topics
@@ -0,0 +1,95 @@
+from datetime import timedelta
+
+import pytest
+from flask import current_app
+
+from app.extensions import db
+from app.models import Attendance_logs
+from app.utils import paginate_query, InvalidCursorError
+from conftest import make_rows
+
+
+KEYSET = (Attendance_logs.timestamp, Attendance_logs.id)
+
+
+@pytest.fixture
+def logs(app):
+    """
+    25 logs where groups of 3 share a timestamp, so the id breaks ties
+
+    returns their ids in page order (timestamp, id descending)
+    """
+    rows = []
+    for card in range(3):
+        rows += make_rows(9, rfid_uid=f'CARD{card:04d}', step=timedelta(minutes=5))
+    db.session.execute(db.insert(Attendance_logs), rows[:25])
+    db.session.commit()
+    return [
+        log.id for log in
+        Attendance_logs.query.order_by(Attendance_logs.timestamp.desc(), Attendance_logs.id.desc())
+    ]
+
+
+def paginate(**args):
+    with current_app.test_request_context('/api/attendance-logs', query_string=args):
+        return paginate_query(
+            Attendance_logs.query.order_by(Attendance_logs.timestamp.desc(), Attendance_logs.id.desc()),
+            serialize_func=lambda log: log.to_dict(),
+            data_key_name='attendance_logs',
+            keyset=KEYSET
+        )
+
+
+def ids(result):
+    return [log['id'] for log in result['attendance_logs']]
+
+
+def test_cursor_walks_forward_and_back(logs):
+    pages = [paginate(pagination='cursor', per_page=10)]
+    while pages[-1]['pagination']['has_next']:
+        pages.append(paginate(per_page=10, after=pages[-1]['pagination']['next_cursor']))
+
+    assert [len(ids(page)) for page in pages] == [10, 10, 5]
+    assert sum((ids(page) for page in pages), []) == logs
+    assert pages[0]['pagination']['prev_cursor'] is None
+
+    page = pages[-1]
+    walked = ids(page)
+    while page['pagination']['has_prev']:
+        page = paginate(per_page=10, before=page['pagination']['prev_cursor'])
+        walked = ids(page) + walked
+    assert walked == logs
+
+
+def test_cursor_counts_only_on_request(logs):
+    assert paginate(pagination='cursor')['pagination']['total_items'] is None
+    assert paginate(pagination='cursor', count='exact')['pagination']['total_items'] == 25
+
+
+def test_cursor_survives_per_page_change(logs):
+    token = paginate(pagination='cursor', per_page=5)['pagination']['next_cursor']
+    assert ids(paginate(per_page=7, after=token)) == logs[5:12]
+
+
+def test_cursor_from_other_filter_is_rejected(logs):
+    token = paginate(pagination='cursor', per_page=5)['pagination']['next_cursor']
+    with pytest.raises(InvalidCursorError, match='bo loc'):
+        paginate(per_page=5, after=token, rfid_uid='CARD0001')
+
+
+def test_invalid_cursor_is_rejected(logs):
+    with pytest.raises(InvalidCursorError, match='cursor khong hop le'):
+        paginate(after='not-a-cursor')
+
+
+def test_offset_mode_is_default(logs):
+    result = paginate(page=3, per_page=10)
+    assert ids(result) == logs[20:]
+    assert result['pagination'] == {
+        'page': 3,
+        'per_page': 10,
+        'total_items': 25,
+        'total_pages': 3,
+        'has_next': False,
+        'has_prev': True
+    }
@@ -0,0 +1,43 @@
+from werkzeug.security import generate_password_hash
+
+from app.utils.password_hashing import PasswordHasher, hash_method
+
+
+def test_rehash_disabled_by_default():
+    hasher = PasswordHasher()
+    assert not hasher.needs_rehash(generate_password_hash('secret', 'pbkdf2:sha256:1000'))
+
+
+def test_short_method_matches_its_expanded_hash():
+    hasher = PasswordHasher(rehash_method='pbkdf2:sha256')
+    assert hasher.target_method().startswith('pbkdf2:sha256:')
+    assert not hasher.needs_rehash(generate_password_hash('secret', 'pbkdf2:sha256'))
+
+    hasher = PasswordHasher(rehash_method='scrypt')
+    assert not hasher.needs_rehash(generate_password_hash('secret', 'scrypt'))
+
+
+def test_other_method_or_parameters_need_rehash():
+    hasher = PasswordHasher(rehash_method='pbkdf2:sha256')
+    assert hasher.needs_rehash(generate_password_hash('secret', 'pbkdf2:sha256:1000'))
+    assert hasher.needs_rehash(generate_password_hash('secret', 'scrypt'))
+
+
+def test_rehashed_password_is_current_and_verifies():
+    hasher = PasswordHasher(rehash_method='pbkdf2:sha256:2000')
+    password_hash = hasher.rehash('secret')
+
+    assert hash_method(password_hash) == 'pbkdf2:sha256:2000'
+    assert not hasher.needs_rehash(password_hash)
+    assert hasher.verify(password_hash, 'secret')
+    assert not hasher.verify(password_hash, 'wrong')
+
+
+def test_init_app_resets_target_method(app):
+    hasher = PasswordHasher(rehash_method='scrypt')
+    assert hasher.target_method().startswith('scrypt:')
+
+    app.config['PASSWORD_REHASH_METHOD'] = 'pbkdf2:sha256:1000'
+    hasher.init_app(app)
+    assert hasher.target_method() == 'pbkdf2:sha256:1000'
+    assert not hasher.needs_rehash(generate_password_hash('secret', 'pbkdf2:sha256:1000'))
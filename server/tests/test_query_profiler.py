@@ -0,0 +1,80 @@
+import pytest
+from sqlalchemy import event, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.engine import Engine
+
+from app.extensions import db
+from app.models import User
+from app.utils.query_profiler import QueryProfile, QueryProfiler
+from conftest import auth_headers
+
+
+@pytest.fixture
+def profiler(app):
+    """
+    profiler with headers on, every unit sampled and every query slow
+    """
+    app.config.update(
+        DB_PROFILER_ENABLED=True, DB_PROFILER_HEADERS=True, DB_PROFILER_SAMPLE_RATE=1.0, DB_SLOW_QUERY_MS=0
+    )
+    profiler = QueryProfiler()
+    profiler.init_app(app)
+    yield profiler
+    # listener đăng ký trên class Engine, gỡ ra để không ảnh hưởng các test khác
+    event.remove(Engine, 'before_cursor_execute', profiler._before_cursor_execute)
+    event.remove(Engine, 'after_cursor_execute', profiler._after_cursor_execute)
+    event.remove(Engine, 'handle_error', profiler._handle_error)
+
+
+def test_profile_keeps_the_slowest_statements():
+    profile = QueryProfile('test', top=2)
+    for elapsed, statement in ((0.01, 'a'), (0.05, 'b'), (0.02, 'c'), (0.03, 'd')):
+        profile.record(statement, elapsed)
+
+    summary = profile.summary()
+    assert (summary['queries'], summary['db_time_ms']) == (4, 110.0)
+    assert [query['statement'] for query in summary['slowest']] == ['b', 'd']
+
+
+def test_queries_of_a_block_are_counted(profiler):
+    db.session.add(User(full_name='Nguyen Van A', rfid_uid='CARD0001', email='a@example.com'))
+    db.session.commit()
+
+    with profiler.profile('ingest batch'):
+        User.query.all()
+        assert profiler._local.profile.queries == 1
+    assert profiler._local.profile is None
+
+
+def test_failed_statement_does_not_skew_later_timings(profiler):
+    with db.engine.connect() as connection:
+        with pytest.raises(OperationalError):
+            connection.execute(text('SELECT * FROM missing_table'))
+        # câu lỗi không để lại thời điểm bắt đầu trên connection
+        assert connection.info['query_started'] == []
+
+        connection.execute(text('SELECT 1'))
+        assert connection.info['query_started'] == []
+
+
+def test_slow_queries_are_logged_without_parameters(profiler):
+    User.query.filter_by(email='secret@example.com').all()
+
+    log = profiler.slow_queries(limit=1)
+    assert log['total'] >= 1
+    entry = log['queries'][0]
+    assert entry['statement'].startswith('SELECT')
+    assert 'secret@example.com' not in entry['statement']
+
+    profiler.clear_slow_queries()
+    assert profiler.slow_queries()['total'] == 0
+
+
+def test_response_headers_count_request_queries(client, profiler):
+    headers = auth_headers()
+    response = client.get('/api/attendance-logs/export?format=xlsx', headers=headers)
+
+    assert response.status_code == 400
+    # request đầu tiên: chỉ 1 query nạp principal, token được kiểm tra không cần database
+    assert int(response.headers['X-DB-Query-Count']) == 1
+    assert float(response.headers['X-DB-Time-Ms']) >= 0
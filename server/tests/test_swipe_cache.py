@@ -0,0 +1,97 @@
+from datetime import datetime
+
+import pytest
+
+from app.extensions import db
+from app.models import User, Device
+from app.utils.attendance_ingest import evaluate_swipes
+from app.utils.swipe_cache import SwipeAuthCache, swipe_cache
+from conftest import count_queries
+
+
+@pytest.fixture
+def users(app):
+    db.session.add_all([
+        User(full_name='Nguyen Van A', rfid_uid='CARD0001', email='a@example.com'),
+        User(full_name='Tran Thi B', rfid_uid='CARD0002', email='b@example.com', is_active=False),
+        Device(device_id='device-01', name='Cong chinh'),
+        Device(device_id='device-02', name='Cong sau', rfid_enabled=False),
+    ])
+    db.session.commit()
+    # swipe_cache dùng chung cho cả process: nạp lại từ database của test này
+    swipe_cache.expire()
+
+
+def swipe(rfid_uid, device_id='device-01'):
+    return {'device_id': device_id, 'rfid_uid': rfid_uid, 'timestamp': datetime(2025, 12, 1, 8, 0), 'code': 'REALTIME'}
+
+
+def test_load_resolves_users_and_devices_without_queries(users):
+    cache = SwipeAuthCache()
+    cache.load()
+
+    resolved, queries = count_queries(cache.resolve_users, {'CARD0001', 'CARD0002'})
+    assert queries == 0
+    assert resolved['CARD0001'].full_name == 'Nguyen Van A'
+    assert not resolved['CARD0002'].is_active
+    assert cache.is_rfid_enabled('device-01')
+    assert not cache.is_rfid_enabled('device-02')
+    # thiết bị chưa có trong bảng devices vẫn được quẹt thẻ
+    assert cache.is_rfid_enabled('device-99')
+
+
+def test_missing_cards_are_fetched_once_and_cached(users):
+    cache = SwipeAuthCache()
+    cache.load()
+    db.session.add(User(full_name='Le Van C', rfid_uid='CARD0003', email='c@example.com'))
+    db.session.commit()
+
+    resolved, queries = count_queries(cache.resolve_users, {'CARD0001', 'CARD0003', 'CARD0404'})
+    assert queries == 1
+    assert set(resolved) == {'CARD0001', 'CARD0003'}
+
+    _, queries = count_queries(cache.resolve_users, {'CARD0003'})
+    assert queries == 0
+
+
+def test_crud_updates_replace_cached_entries(users):
+    cache = SwipeAuthCache()
+    cache.load()
+    user = User.query.filter_by(rfid_uid='CARD0001').one()
+    user.rfid_uid = 'CARD0011'
+    db.session.commit()
+
+    cache.upsert_user(user, previous_rfid_uid='CARD0001')
+    cache.set_device('device-02', True)
+    assert cache.resolve_users({'CARD0011'})['CARD0011'].id == user.id
+    assert cache.is_rfid_enabled('device-02')
+
+    cache.evict_users(['CARD0011'])
+    assert cache.stats()['users'] == 1
+
+
+def test_expired_cache_is_reloaded(users):
+    cache = SwipeAuthCache(refresh_interval=3600)
+    cache.load()
+    Device.query.filter_by(device_id='device-01').one().rfid_enabled = False
+    db.session.commit()
+
+    cache.ensure_loaded()
+    assert cache.is_rfid_enabled('device-01')
+    cache.expire()
+    cache.ensure_loaded()
+    assert not cache.is_rfid_enabled('device-01')
+    assert cache.stats()['loads'] == 2
+
+
+def test_swipe_outcomes(users):
+    rows, results = evaluate_swipes([
+        swipe('CARD0001'), swipe('CARD0002'), swipe('CARD0404'), swipe('CARD0001', device_id='device-02')
+    ])
+
+    assert [response['error_code'] for _, response in results] == [None, 'USER_NOT_ACTIVE', 'USER_NOT_FOUND', 'RFID_DISABLED']
+    assert results[0][1]['user_name'] == 'Nguyen Van A'
+    # quẹt trên thiết bị đang tắt rfid không được lưu log
+    assert [(row['rfid_uid'], row['error_code']) for row in rows] == [
+        ('CARD0001', None), ('CARD0002', 'USER_NOT_ACTIVE'), ('CARD0404', 'USER_NOT_FOUND')
+    ]
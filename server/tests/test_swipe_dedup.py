@@ -0,0 +1,45 @@
+from datetime import datetime, timedelta, timezone
+
+from app.utils.attendance_ingest import parse_swipe
+from app.utils.swipe_dedup import RecentSwipeKeys, swipe_key
+from conftest import make_rows
+
+
+def test_key_matches_timestamp_as_stored():
+    stored = datetime(2025, 12, 1, 8, 0, 0)
+    assert swipe_key('CARD0001', 'device-01', stored.replace(microsecond=250000)) == swipe_key('CARD0001', 'device-01', stored)
+    assert swipe_key('CARD0001', 'device-01', stored.replace(tzinfo=timezone.utc)) == swipe_key('CARD0001', 'device-01', stored)
+    assert swipe_key('CARD0001', 'device-01', stored) != swipe_key('CARD0001', 'device-02', stored)
+    assert swipe_key('CARD0001', 'device-01', stored) != swipe_key('CARD0001', 'device-01', stored + timedelta(seconds=1))
+
+
+def test_resent_payload_has_the_same_key():
+    first = parse_swipe('device-01', {'rfid_uid': 'CARD0001', 'timestamp': '2025-12-01T08:00:00Z'})
+    # esp32 gửi lại (QoS 1) cùng lần quẹt với phần mili giây
+    resent = parse_swipe('device-01', {'rfid_uid': 'CARD0001', 'timestamp': '2025-12-01T08:00:00.120Z', 'code': 'OFFLINE_SYNC'})
+
+    assert swipe_key(first['rfid_uid'], first['device_id'], first['timestamp']) == \
+        swipe_key(resent['rfid_uid'], resent['device_id'], resent['timestamp'])
+
+
+def test_only_committed_rows_are_remembered():
+    recent = RecentSwipeKeys()
+    rows = make_rows(3)
+
+    assert recent.filter_new(rows) == rows
+    # chưa remember(): commit có thể đã lỗi, lần gửi lại vẫn phải được ghi
+    assert recent.filter_new(rows) == rows
+
+    recent.remember(rows)
+    assert recent.filter_new(rows + make_rows(1, rfid_uid='CARD0002')) == make_rows(1, rfid_uid='CARD0002')
+    assert recent.stats()['memory_duplicates'] == 3
+
+
+def test_oldest_keys_are_evicted_past_capacity():
+    recent = RecentSwipeKeys(maxsize=2)
+    rows = make_rows(3)
+    recent.remember(rows)
+
+    assert recent.stats()['recent_keys'] == 2
+    # key bị evict không còn bị chặn trong bộ nhớ, unique key của database chặn thay
+    assert recent.filter_new(rows) == rows[:1]
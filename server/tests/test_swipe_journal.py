@@ -0,0 +1,125 @@
+import glob
+import os
+import subprocess
+import sys
+
+import pytest
+
+from app.utils.attendance_ingest import save_attendance_rows
+from app.utils.swipe_journal import SwipeJournal
+from conftest import make_rows, log_count
+
+
+@pytest.fixture
+def directory(tmp_path):
+    return str(tmp_path / 'journal')
+
+
+def segment_files(directory):
+    return sorted(os.path.basename(path) for path in glob.glob(os.path.join(directory, '*', '*.wal')))
+
+
+def test_rows_survive_restart_and_replay_once(app, directory):
+    journal = SwipeJournal(directory)
+    journal.append(make_rows(3))
+    journal.append(make_rows(2, rfid_uid='CARD0002'))
+
+    # process bị kill trước khi các dòng được ghi xuống database
+    restarted = SwipeJournal(directory)
+    assert restarted.replay(save_attendance_rows) == 5
+    assert log_count() == 5
+    assert segment_files(directory) == []
+    assert restarted.replay(save_attendance_rows) == 0
+
+
+def test_replay_of_already_saved_rows_is_idempotent(app, directory):
+    rows = make_rows(4)
+    journal = SwipeJournal(directory)
+    journal.append(rows)
+    # crash sau commit nhưng trước release
+    save_attendance_rows(rows[:3])
+
+    assert SwipeJournal(directory).replay(save_attendance_rows) == 4
+    assert log_count() == 4
+
+
+def test_torn_last_line_is_skipped(app, directory):
+    journal = SwipeJournal(directory)
+    segment = journal.append(make_rows(2))
+    with open(journal._path(segment), 'ab') as f:
+        f.write(b'{"rfid_uid": "CARD0009", "timest')
+
+    assert SwipeJournal(directory).replay(save_attendance_rows) == 2
+    assert log_count() == 2
+
+
+def test_failed_replay_keeps_segment(app, directory):
+    SwipeJournal(directory).append(make_rows(2))
+    restarted = SwipeJournal(directory)
+
+    def failing_save(rows):
+        raise RuntimeError('database down')
+
+    with pytest.raises(RuntimeError):
+        restarted.replay(failing_save)
+    assert len(segment_files(directory)) == 1
+
+    assert restarted.replay(save_attendance_rows) == 2
+    assert segment_files(directory) == []
+
+
+def test_released_segment_is_deleted_after_rotation(directory):
+    journal = SwipeJournal(directory, segment_bytes=1)
+    first = journal.append(make_rows(2))
+    second = journal.append(make_rows(1, rfid_uid='CARD0002'))
+    assert second == first + 1
+
+    journal.release(first, 1)
+    assert len(segment_files(directory)) == 2
+    journal.release(first, 1)
+    assert len(segment_files(directory)) == 1
+
+    # segment đang mở chỉ bị xoá khi đóng journal
+    journal.release(second, 1)
+    journal.close()
+    assert segment_files(directory) == []
+
+
+# journal của 1 consumer khác trên cùng host: ghi 2 dòng rồi chờ stdin, giữ owner lock
+OTHER_CONSUMER = """
+import sys
+from datetime import datetime
+from app.utils.swipe_journal import SwipeJournal
+journal = SwipeJournal(sys.argv[1])
+journal.append([
+    {'rfid_uid': 'CARD0002', 'timestamp': datetime(2025, 12, 1, 8, minute), 'device_id': 'device-02', 'code': 'REALTIME', 'error_code': None}
+    for minute in range(2)
+])
+print('ready', flush=True)
+sys.stdin.readline()
+"""
+
+
+def test_live_journal_of_other_process_is_not_replayed(app, directory):
+    other = subprocess.Popen(
+        [sys.executable, '-c', OTHER_CONSUMER, directory],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, cwd=os.path.dirname(os.path.dirname(__file__))
+    )
+    try:
+        assert other.stdout.readline().strip() == 'ready'
+        SwipeJournal(directory).append(make_rows(3))
+
+        # consumer kia còn chạy: chỉ replay journal của process này
+        journal = SwipeJournal(directory)
+        assert journal.replay(save_attendance_rows) == 3
+        assert log_count() == 3
+        assert len(segment_files(directory)) == 1
+    finally:
+        # consumer kia bị kill: segment của nó còn lại, owner lock được nhả
+        other.kill()
+        other.wait()
+
+    assert journal.adopt() == 1
+    assert journal.replay(save_attendance_rows) == 2
+    assert log_count() == 5
+    assert segment_files(directory) == []
@@ -0,0 +1,98 @@
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from app.extensions import db
+from app.models import Attendance_logs
+from app.utils.work_day_calculator import calculate_work_day_data, calculate_work_day_range, calculate_work_day_report
+from conftest import make_rows, count_queries
+
+
+def day_logs(log_date, times, rfid_uid='CARD0001', error_code=None):
+    """
+    rows of one card swiping at the given 'HH:MM' times of day
+    """
+    rows = []
+    for time in times:
+        hour, minute = map(int, time.split(':'))
+        row = make_rows(1, start=datetime.combine(log_date, datetime.min.time()).replace(hour=hour, minute=minute), rfid_uid=rfid_uid)[0]
+        row['error_code'] = error_code
+        rows.append(row)
+    return rows
+
+
+# tháng trước: nằm trong ATTENDANCE_RETENTION_MONTHS nên không đọc catalog archive
+MONTH = (date.today().replace(day=1) - timedelta(days=1)).replace(day=1)
+
+
+def day(number):
+    return MONTH.replace(day=number)
+
+
+@pytest.fixture
+def logs(app):
+    """
+    days 1, 2, 4 of last month for CARD0001 and days 1, 5 for CARD0002
+    """
+    rows = []
+    rows += day_logs(day(1), ['08:00', '12:00', '13:00', '17:30'])
+    rows += day_logs(day(2), ['08:30', '11:30'])
+    rows += day_logs(day(2), ['09:00'], error_code='USER_NOT_ACTIVE')
+    rows += day_logs(day(4), ['08:00', '17:00', '18:30', '20:30'])
+    rows += day_logs(day(1), ['07:45', '16:45'], rfid_uid='CARD0002')
+    rows += day_logs(day(5), ['08:00'], rfid_uid='CARD0002')
+    db.session.execute(db.insert(Attendance_logs), rows)
+    db.session.commit()
+
+
+def test_day_data(logs):
+    full_day = calculate_work_day_data(day(1), 'CARD0001')
+    assert full_day['times'] == [('08:00', 'SUCCESS'), ('12:00', 'SUCCESS'), ('13:00', 'SUCCESS'), ('17:30', 'SUCCESS')]
+    assert full_day['total_times'] == 8.5
+    assert full_day['type'] == 1
+
+    # log lỗi vẫn hiện trong times nhưng không tính giờ
+    half_day = calculate_work_day_data(day(2), 'CARD0001')
+    assert half_day['times'][1] == ('09:00', 'USER_NOT_ACTIVE')
+    assert (half_day['total_times'], half_day['type']) == (3.0, 0.5)
+
+    overtime = calculate_work_day_data(day(4), 'CARD0001')
+    assert overtime['ot_times'] == [('18:30', 'SUCCESS'), ('20:30', 'SUCCESS')]
+    assert overtime['total_times'] == 11.0
+
+    assert calculate_work_day_data(day(3), 'CARD0001')['type'] == 0
+
+
+def test_range_matches_day_by_day_in_one_query(logs):
+    start, end = day(1) - timedelta(days=1), day(6)
+
+    days, queries = count_queries(calculate_work_day_range, start, end, 'CARD0001')
+    assert queries == 1
+
+    assert [work_data['date'] for work_data in days] == [str(start + timedelta(days=offset)) for offset in range(7)]
+    for work_data in days:
+        expected = calculate_work_day_data(date.fromisoformat(work_data['date']), 'CARD0001')
+        assert {key: value for key, value in work_data.items() if key != 'date'} == expected
+
+
+def test_range_keeps_boundary_days(logs):
+    days = calculate_work_day_range(day(4), day(4), 'CARD0001')
+    assert len(days) == 1
+    assert days[0]['total_times'] == 11.0
+
+
+def test_report_matches_per_user_ranges(logs):
+    start, end = day(1), day(7)
+
+    report, queries = count_queries(calculate_work_day_report, start, end)
+    assert queries == 1
+    assert set(report) == {'CARD0001', 'CARD0002'}
+    for rfid_uid, days in report.items():
+        assert days == calculate_work_day_range(start, end, rfid_uid)
+
+
+def test_report_of_selected_users(logs):
+    report = calculate_work_day_report(day(1), day(7), ['CARD0002', 'CARD0404'])
+    # nhân viên không có log trong khoảng không có trong report
+    assert list(report) == ['CARD0002']
+    assert [work_data['type'] for work_data in report['CARD0002']][:2] == [1, 0]
@@ -0,0 +1,20 @@
+from argparse import Namespace
+
+from benchmarks.work_day_report import bench, create_bench_app, seed
+
+
+def test_report_benchmark_matches_summaries(tmp_path):
+    args = Namespace(users=5, swipes_per_day=4, chunk_size=100, repeat=1, skip_summaries=False)
+    app = create_bench_app(f'sqlite:///{tmp_path / "report.db"}')
+
+    start_date, end_date = seed(app, args)
+    # chạy lại không seed thêm
+    assert seed(app, args) == (start_date, end_date)
+    results = bench(app, args, start_date, end_date)
+
+    assert results['users'] == 5
+    assert results['logs'] > 0
+    assert results['summaries_match_logs'] is True
+    with app.app_context():
+        from app.extensions import db
+        db.engine.dispose()
@@ -0,0 +1,137 @@
+import json
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from app.extensions import db
+from app.models import Attendance_logs, Daily_work_summary, Daily_work_summary_pending
+from app.utils import work_day_summary
+from app.utils.attendance_ingest import save_attendance_rows
+from app.utils.work_day_calculator import build_work_day_data, calculate_work_day_range
+from app.utils.work_day_summary import (
+    mark_work_day_summaries, refresh_work_day_summaries, rebuild_work_day_summaries, summary_key
+)
+from conftest import make_rows
+
+
+# ngày đã kết thúc của tháng trước: report đọc từ bảng tổng hợp
+DAY = (date.today().replace(day=1) - timedelta(days=1)).replace(day=3)
+
+
+def start_of(day, hour=8):
+    return datetime.combine(day, datetime.min.time()).replace(hour=hour)
+
+
+@pytest.fixture
+def summary_app(app):
+    app.config['WORK_SUMMARY_ENABLED'] = True
+    return app
+
+
+def summaries():
+    return {
+        (summary.rfid_uid, summary.date): summary.to_work_data()
+        for summary in db.session.execute(db.select(Daily_work_summary)).scalars()
+    }
+
+
+def pending_keys():
+    return {(pending.rfid_uid, pending.date) for pending in db.session.execute(db.select(Daily_work_summary_pending)).scalars()}
+
+
+def as_json(data):
+    # bảng tổng hợp lưu times dạng json (list), tính trực tiếp trả về tuple
+    return json.loads(json.dumps(data))
+
+
+def test_ingest_refreshes_summary_of_touched_days(summary_app):
+    save_attendance_rows(make_rows(2, start=start_of(DAY), step=timedelta(hours=9)))
+    save_attendance_rows(make_rows(2, start=start_of(DAY, hour=20), rfid_uid='CARD0002', step=timedelta(hours=1)))
+
+    saved = summaries()
+    assert set(saved) == {('CARD0001', DAY), ('CARD0002', DAY)}
+    assert saved[('CARD0001', DAY)]['total_times'] == 9.0
+    assert saved[('CARD0001', DAY)]['type'] == 1
+    assert saved[('CARD0002', DAY)]['ot_times'] == [['20:00', 'SUCCESS'], ['21:00', 'SUCCESS']]
+    assert pending_keys() == set()
+
+    # log đến sau (offline sync) cập nhật lại đúng ngày đó
+    save_attendance_rows(make_rows(1, start=start_of(DAY, hour=18)))
+    assert len(summaries()[('CARD0001', DAY)]['times']) == 3
+
+
+def test_pending_day_is_read_from_logs_until_refreshed(summary_app):
+    rows = make_rows(2, start=start_of(DAY), step=timedelta(hours=4))
+    db.session.execute(db.insert(Attendance_logs), rows)
+    mark_work_day_summaries({summary_key(row['rfid_uid'], row['timestamp']) for row in rows})
+    db.session.commit()
+
+    # refresh chưa chạy (hoặc lỗi): ngày vẫn pending, report tính trực tiếp từ log
+    assert pending_keys() == {('CARD0001', DAY)}
+    days = calculate_work_day_range(DAY, DAY, 'CARD0001')
+    assert days[0]['total_times'] == 4.0
+
+    assert refresh_work_day_summaries({('CARD0001', DAY)}) == 1
+    assert pending_keys() == set()
+    assert summaries()[('CARD0001', DAY)]['total_times'] == 4.0
+
+
+def test_summary_backed_range_matches_logs(summary_app):
+    save_attendance_rows(make_rows(4, start=start_of(DAY), step=timedelta(hours=3)))
+    save_attendance_rows(make_rows(2, start=start_of(DAY + timedelta(days=1)), step=timedelta(hours=5)))
+
+    from_summaries = calculate_work_day_range(DAY - timedelta(days=1), DAY + timedelta(days=2), 'CARD0001')
+    summary_app.config['WORK_SUMMARY_ENABLED'] = False
+    from_logs = calculate_work_day_range(DAY - timedelta(days=1), DAY + timedelta(days=2), 'CARD0001')
+    assert as_json(from_summaries) == as_json(from_logs)
+
+
+def test_rebuild_recomputes_history(summary_app):
+    rows = make_rows(2, start=start_of(DAY), step=timedelta(hours=8))
+    rows += make_rows(2, start=start_of(DAY + timedelta(days=1)), rfid_uid='CARD0002', step=timedelta(hours=2))
+    db.session.execute(db.insert(Attendance_logs), rows)
+    mark_work_day_summaries({('CARD0001', DAY)})
+    db.session.commit()
+
+    assert rebuild_work_day_summaries() == 2
+    saved = summaries()
+    assert set(saved) == {('CARD0001', DAY), ('CARD0002', DAY + timedelta(days=1))}
+    expected = build_work_day_data([row for row in Attendance_logs.query.filter_by(rfid_uid='CARD0001')])
+    assert as_json(saved[('CARD0001', DAY)]['times']) == as_json(expected['times'])
+    assert pending_keys() == set()
+
+    # chạy lại thay thế, không nhân đôi dòng tổng hợp
+    assert rebuild_work_day_summaries() == 2
+    assert len(summaries()) == 2
+
+
+def test_rebuild_keeps_days_refreshed_while_it_runs(summary_app, monkeypatch):
+    db.session.execute(db.insert(Attendance_logs), make_rows(2, start=start_of(DAY), step=timedelta(hours=8)))
+    db.session.commit()
+    iter_user_day_logs = work_day_summary.iter_user_day_logs
+
+    def refreshed_during_rebuild(start_date, end_date):
+        # consumer ghi log mới và tính lại ngày đó sau khi rebuild đã đọc log
+        logs = list(iter_user_day_logs(start_date, end_date))
+        save_attendance_rows(make_rows(1, start=start_of(DAY, hour=18)))
+        return iter(logs)
+
+    monkeypatch.setattr(work_day_summary, 'iter_user_day_logs', refreshed_during_rebuild)
+    rebuild_work_day_summaries()
+
+    # dòng của consumer (3 log) được giữ, không bị rebuild ghi đè hay lỗi unique key
+    assert len(summaries()[('CARD0001', DAY)]['times']) == 3
+
+
+def test_ingest_refreshes_summaries_in_background(summary_app, monkeypatch):
+    summary_app.config['WORK_SUMMARY_BACKGROUND_REFRESH'] = True
+    monkeypatch.setattr(work_day_summary, '_summary_queue', None)
+
+    save_attendance_rows(make_rows(2, start=start_of(DAY), step=timedelta(hours=9)))
+    summary_queue = work_day_summary._summary_queue
+    # stop() chờ worker xử lý hết các ngày trong queue
+    summary_queue.stop()
+
+    assert summary_queue.stats()['processed'] == 1
+    assert summaries()[('CARD0001', DAY)]['total_times'] == 9.0
+    assert pending_keys() == set()
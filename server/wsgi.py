@@ -0,0 +1,5 @@
+# production http entry point: gunicorn wsgi:app
+# các http worker không subscribe mqtt, message do process mqtt_consumer.py xử lý
+from app import create_app
+
+app = create_app(mqtt_consumer=False)